@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+# 模擬分析型查詢：掃描大量資料，讓單一查詢耗時明顯
+HEAVY_SQL = "SELECT count(*) FROM range(3000000) t(i) WHERE i % 7 = ?"
+QUERIES = 32
+THREADS = 8
+
+
+def run(pool_size: int) -> float:
+    db = DuckDBQuery(DB_FILE, pool_size=pool_size)
+    # 暖機
+    db.query_with_params(HEAVY_SQL, [0])
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(lambda i: db.query_with_params(HEAVY_SQL, [i % 7]), range(QUERIES)))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    db.disconnect()
+    return elapsed
+
+
+def main():
+    print(f"=== DuckDB 連線池並行查詢基準 ({QUERIES} 個查詢, {THREADS} 個執行緒) ===")
+    baseline = None
+    for pool_size in (1, 2, 4, 8):
+        elapsed = run(pool_size)
+        baseline = baseline or elapsed
+        print(f"pool_size={pool_size}: {elapsed:.3f}s, {QUERIES / elapsed:.1f} queries/s, 加速 {baseline / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
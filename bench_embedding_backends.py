@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import EMBEDDING_BACKENDS, EmbeddingService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+QUERIES = ["AG958 的電池續航如何", "比較 AG958 和 APX958 的 CPU", "哪台筆電最輕", "AKK839 適合玩遊戲嗎"]
+
+
+def rss_mb() -> float:
+    """目前行程的常駐記憶體 (Linux /proc)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def build_documents(repeat: int) -> list:
+    """以規格資料組成與 ingest 相近的文本區塊 (每個型號的全部欄位，約 500 字元一段)"""
+    store = SpecStore(db_file=DB_FILE)
+    texts = []
+    for record in store.snapshot.records:
+        text = "\n".join(f"{field}: {value}" for field, value in record.items() if value)
+        texts.extend(text[i:i + 500] for i in range(0, len(text), 450))
+    return texts * repeat
+
+
+def run_backend(backend: str, repeat: int) -> dict:
+    """在獨立行程中執行，記憶體量測不受其他後端影響"""
+    documents = build_documents(repeat)
+    baseline_mb = rss_mb()
+    service = EmbeddingService(backend=backend, batch_window_ms=0)
+    start = time.perf_counter()
+    service.embed_query("暖機")
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    service.embed_documents(documents)
+    ingest_seconds = time.perf_counter() - start
+
+    latencies = []
+    for i in range(40):
+        start = time.perf_counter()
+        service.embed_query(f"{QUERIES[i % len(QUERIES)]} #{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"backend": backend, "load_s": load_seconds, "documents": len(documents),
+            "docs_per_sec": len(documents) / ingest_seconds, "query_p50_ms": statistics.median(latencies),
+            "rss_mb": rss_mb() - baseline_mb}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入推論後端 (torch / onnx / onnx-int8) 的吞吐量與記憶體基準")
+    parser.add_argument("--backends", default=",".join(EMBEDDING_BACKENDS), help="要比較的後端 (逗號分隔)")
+    parser.add_argument("--repeat", type=int, default=8, help="文件重複次數 (放大 ingest 的資料量)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args.repeat)))
+        return
+
+    print(f"=== 嵌入推論後端基準 (CPU, 文件重複 {args.repeat} 次) ===")
+    baseline = None
+    for backend in args.backends.split(","):
+        completed = subprocess.run([sys.executable, __file__, "--child", backend, "--repeat", str(args.repeat)],
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "未知錯誤"
+            print(f"{backend:<10} 無法執行: {error}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        baseline = baseline or result["docs_per_sec"]
+        print(f"{backend:<10} 載入 {result['load_s']:.1f}s, ingest {result['docs_per_sec']:.1f} docs/s "
+              f"({result['docs_per_sec'] / baseline:.2f}x, {result['documents']} 段), "
+              f"查詢 p50 {result['query_p50_ms']:.1f}ms, 記憶體 +{result['rss_mb']:.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import DEFAULT_EMBEDDING_MODEL, EmbeddingService
+
+QUERIES = [
+    "AG958 的電池續航如何", "比較 AG958 和 APX958 的 CPU", "哪台筆電最輕", "AKK839 適合玩遊戲嗎",
+    "958 系列的螢幕規格", "AMD819: FT6 有指紋辨識嗎", "哪台的記憶體最大", "APX958 的散熱設計",
+]
+
+# (標籤, 合併等待毫秒, 批次上限)；批次上限 1 等同逐筆編碼
+SCENARIOS = [
+    ("逐筆編碼", 0.0, 1),
+    ("批次 (不等待)", 0.0, 32),
+    ("批次 (等待 2ms)", 2.0, 32),
+    ("批次 (等待 5ms)", 5.0, 32),
+]
+
+
+class SimulatedEncoder:
+    """
+    沒有安裝 sentence-transformers 時使用的模擬編碼器：以佔用 CPU (持有 GIL) 的忙碌迴圈模擬
+    每次呼叫的固定成本 (tokenize、張量配置、前向計算啟動) 與每筆文字的計算成本。
+    """
+
+    def __init__(self, call_ms=6.0, per_text_ms=0.4, dim=384):
+        self.call_ms = call_ms
+        self.per_text_ms = per_text_ms
+        self.dim = dim
+
+    def encode(self, texts, batch_size=32):
+        end = time.perf_counter() + (self.call_ms + self.per_text_ms * len(texts)) / 1000
+        while time.perf_counter() < end:
+            pass
+        return np.zeros((len(texts), self.dim), dtype=np.float32)
+
+
+def load_encoder(simulate: bool):
+    if not simulate:
+        try:
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(DEFAULT_EMBEDDING_MODEL, device="cpu"), DEFAULT_EMBEDDING_MODEL
+        except ImportError:
+            print("未安裝 sentence-transformers，改用模擬編碼器")
+    return SimulatedEncoder(), "模擬編碼器"
+
+
+def run(encoder, window_ms: float, max_batch: int, threads: int, total: int) -> dict:
+    service = EmbeddingService(encoder=encoder, batch_window_ms=window_ms, max_batch_size=max_batch)
+    service.embed_query("暖機")
+    latencies = []
+
+    def embed(i):
+        start = time.perf_counter()
+        service.embed_query(f"{QUERIES[i % len(QUERIES)]} #{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(embed, range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"per_sec": total / elapsed, "p50": statistics.median(latencies),
+            "p95": latencies[int(len(latencies) * 0.95) - 1], "avg_batch": service.get_metrics()["avg_batch"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入服務的批次編碼吞吐量基準")
+    parser.add_argument("--threads", type=int, default=16, help="同時查詢的執行緒數")
+    parser.add_argument("--queries", type=int, default=256, help="查詢總數")
+    parser.add_argument("--simulate", action="store_true", help="強制使用模擬編碼器")
+    args = parser.parse_args()
+
+    encoder, label = load_encoder(args.simulate)
+    print(f"=== 查詢嵌入吞吐量 ({label}, {args.threads} 個執行緒, {args.queries} 個查詢) ===")
+    baseline = None
+    for name, window_ms, max_batch in SCENARIOS:
+        result = run(encoder, window_ms, max_batch, args.threads, args.queries)
+        baseline = baseline or result["per_sec"]
+        print(f"{name:<14} {result['per_sec']:8.1f} embeddings/s ({result['per_sec'] / baseline:.2f}x), "
+              f"延遲 p50 {result['p50']:.1f}ms / p95 {result['p95']:.1f}ms, 平均批次 {result['avg_batch']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import duckdb
+import numpy as np
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Cache.EmbeddingCache import EmbeddingCache
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.DB.HybridRetriever import HybridRetriever
+from sales_rag_app.libs.RAG.DB.LocalVectorQuery import LocalVectorQuery
+from sales_rag_app.libs.RAG.DB.ModelCatalog import ModelCatalog
+from sales_rag_app.libs.RAG.DB.SpecNormalizer import build_normalized_table
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import DEFAULT_EMBEDDING_MODEL, EmbeddingService
+from sales_rag_app.libs.RAG.Tools.SpecExtractor import SPEC_ATTRIBUTES
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+# 沒有指定型號的開放式查詢 (皆含結構化條件或數值排序)
+QUERIES = [
+    "which model is lightest with DDR5",
+    "1.9kg 以下的 DDR5 輕薄筆電",
+    "958 系列 電池 80Wh 以上 適合遊戲嗎",
+    "記憶體至少 64GB 的筆電推薦",
+    "TDP 30W 以下 電池最大的是哪台",
+    "DDR4 筆電的 CPU",
+    "under 1.85kg laptops with at least 32GB memory",
+    "TDP 100W 以上哪台最重",
+]
+
+
+class HashEncoder:
+    """沒有安裝 sentence-transformers 時使用：以字元雜湊產生正規化向量 (只用於量測延遲與過濾正確性)"""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, batch_size=32):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, hash(char) % self.dim] += 1
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9, None)
+
+
+def load_encoder(simulate: bool):
+    if not simulate:
+        try:
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(DEFAULT_EMBEDDING_MODEL, device="cpu"), DEFAULT_EMBEDDING_MODEL
+        except ImportError:
+            print("未安裝 sentence-transformers，改用雜湊編碼器")
+    return HashEncoder(), "雜湊編碼器"
+
+
+def build_scaled_db(db_file: str, scale: int):
+    """將每個型號複製 scale 份 (型號名稱加上序號)，模擬較大的型錄"""
+    connection = duckdb.connect(db_file)
+    connection.execute(f"ATTACH '{DB_FILE}' AS source (READ_ONLY)")
+    connection.execute("CREATE TABLE specs AS SELECT * REPLACE (modelname || '-' || CAST(copy AS VARCHAR) AS modelname) "
+                       f"FROM source.specs, range({scale}) AS copies(copy)")
+    connection.execute("DETACH source")
+    build_normalized_table(connection)
+    connection.close()
+
+
+def ground_truth(retriever: HybridRetriever, query: str) -> tuple:
+    """(符合條件的型號集合, 數值排序的第一名集合)，以記憶體中的正規化欄位計算"""
+    catalog = retriever.model_catalog.snapshot
+    normalized = retriever.model_catalog.spec_store.snapshot.normalized
+    filters = retriever.parser.parse(query)
+    relevant = {name for name in catalog.modelnames if not filters or filters.matches(normalized.get(name))}
+    winners = set()
+    intent = retriever.intent_classifier.classify(query, len(relevant))
+    if intent.kind == "rank":
+        column = SPEC_ATTRIBUTES[intent.attributes[0]].column
+        values = {name: normalized[name][column] for name in relevant if normalized[name].get(column) is not None}
+        if values:
+            best = (max if intent.direction == "max" else min)(values.values())
+            winners = {name for name, value in values.items() if value == best}
+    return relevant, winners
+
+
+def evaluate(name: str, retrieve, retriever: HybridRetriever, top_k: int, repeat: int):
+    recalls, precisions, rank_hits, latencies = [], [], [], []
+    for query in QUERIES:
+        relevant, winners = ground_truth(retriever, query)
+        retrieve(query)  # 暖機 (查詢向量快取)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            returned = retrieve(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        top = returned[:top_k]
+        if relevant:
+            recalls.append(len(set(top) & relevant) / min(top_k, len(relevant)))
+            precisions.append(len(set(top) & relevant) / len(top) if top else 0.0)
+        if winners:
+            # 第一名是否在交給規則引擎排序的候選中
+            rank_hits.append(bool(set(returned) & winners))
+    print(f"  {name:<18} recall@{top_k} {statistics.mean(recalls):.3f}, precision@{top_k} {statistics.mean(precisions):.3f}, "
+          f"排序第一名命中 {sum(rank_hits)}/{len(rank_hits)}, "
+          f"p50 {np.percentile(latencies, 50):.2f}ms, p99 {np.percentile(latencies, 99):.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="混合檢索 (DuckDB 條件 + 向量相似度 + RRF) 與純向量檢索的召回率與延遲")
+    parser.add_argument("--scales", default="1,100,1000", help="型錄放大倍數 (逗號分隔，1 為目前的 15 個型號)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20, help="每個查詢量測的次數")
+    parser.add_argument("--simulate", action="store_true", help="使用雜湊編碼器，不載入嵌入模型")
+    args = parser.parse_args()
+
+    encoder, encoder_name = load_encoder(args.simulate)
+    print(f"=== 混合檢索基準 ({encoder_name}, {len(QUERIES)} 個查詢, top_k {args.top_k}) ===")
+    for scale in map(int, args.scales.split(",")):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_file = DB_FILE
+            if scale > 1:
+                db_file = os.path.join(temp_dir, "specs.db")
+                build_scaled_db(db_file, scale)
+            service = EmbeddingService("bench", encoder=encoder, batch_window_ms=0)
+            vector_store = LocalVectorQuery(index_dir=os.path.join(temp_dir, "index"), db_file=db_file,
+                                            embedding_service=service, query_cache=EmbeddingCache())
+            vector_store.connect()
+            catalog = ModelCatalog(SpecStore(db_file))
+            retriever = HybridRetriever(catalog, DuckDBQuery(db_file=db_file), vector_store, top_k=args.top_k)
+            print(f"\n[{len(catalog.modelnames)} 個型號]")
+
+            def vector_only(query):
+                return [hit["modelname"] for hit in vector_store.search(query, top_k=args.top_k)]
+
+            normalized = catalog.spec_store.snapshot.normalized
+
+            def vector_post_filter(query):
+                # 先取較多的向量結果再套用條件 (沒有預先過濾時的常見作法)
+                filters = retriever.parser.parse(query)
+                hits = vector_store.search(query, top_k=args.top_k * 4)
+                return [hit["modelname"] for hit in hits
+                        if not filters or filters.matches(normalized.get(hit["modelname"]))]
+
+            evaluate("純向量", vector_only, retriever, args.top_k, args.repeat)
+            evaluate("向量 + 後過濾 (4x)", vector_post_filter, retriever, args.top_k, args.repeat)
+            evaluate("混合 (預先過濾+RRF)", lambda query: retriever.retrieve(query).modelnames, retriever, args.top_k,
+                     args.repeat)
+
+
+if __name__ == "__main__":
+    main()
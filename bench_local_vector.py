@@ -0,0 +1,113 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Cache.EmbeddingCache import EmbeddingCache
+from sales_rag_app.libs.RAG.DB.LocalVectorQuery import LocalVectorQuery, write_index
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import EmbeddingService
+
+DIM = 384  # all-MiniLM-L6-v2 的維度
+
+
+def random_unit_vectors(count: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile(latencies: list, q: float) -> float:
+    return float(np.percentile(latencies, q)) if latencies else 0.0
+
+
+def time_searches(search, queries: np.ndarray, top_k: int) -> tuple:
+    """逐筆查詢 (與服務端單一請求相同)，返回 (延遲毫秒列表, 每筆查詢的結果 id 集合)"""
+    search(queries[0], top_k)  # 暖機
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(set(search(query, top_k)))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+def bench_local(index_dir: str, queries: np.ndarray, top_k: int, use_hnsw: bool) -> tuple:
+    store = LocalVectorQuery(index_dir=index_dir, embedding_service=EmbeddingService("bench", encoder=object()),
+                             query_cache=EmbeddingCache(), use_hnsw=use_hnsw)
+    store.connect()
+    if use_hnsw and not store.get_metrics()["hnsw"]:
+        return None
+    return time_searches(lambda q, k: [doc_id for doc_id, _ in store.search_vector(q, k)], queries, top_k)
+
+
+def bench_milvus(vectors: np.ndarray, queries: np.ndarray, top_k: int, host: str, port: str) -> tuple | None:
+    """將相同向量寫入暫時的 Milvus collection (IVF_FLAT，與 ingest_data.py 相同) 後量測搜尋延遲"""
+    try:
+        from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility
+        connections.connect("bench", host=host, port=port, timeout=3)
+    except Exception as e:
+        print(f"Milvus 無法連線 ({host}:{port})，略過: {e}")
+        return None
+    name = f"bench_local_vector_{os.getpid()}"
+    fields = [FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True, auto_id=False),
+              FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=DIM)]
+    collection = Collection(name, CollectionSchema(fields, "本地向量索引基準"), using="bench")
+    try:
+        for start in range(0, len(vectors), 10000):
+            chunk = vectors[start:start + 10000]
+            collection.insert([list(range(start, start + len(chunk))), chunk.tolist()])
+        collection.flush()
+        collection.create_index("embedding", {"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 128}})
+        collection.load()
+
+        def search(query, k):
+            hits = collection.search([query.tolist()], "embedding", {"metric_type": "L2", "params": {"nprobe": 16}},
+                                     limit=k)
+            return [str(hit.id) for hit in hits[0]]
+
+        return time_searches(search, queries, top_k)
+    finally:
+        utility.drop_collection(name, using="bench")
+        connections.disconnect("bench")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地向量索引 (NumPy 精確搜尋 / HNSW) 與 Milvus 的查詢延遲基準")
+    parser.add_argument("--sizes", default="15,1000,10000,100000", help="向量數 (逗號分隔，15 約為目前的型號數)")
+    parser.add_argument("--queries", type=int, default=200, help="每種後端的查詢次數")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--milvus-host", default="localhost")
+    parser.add_argument("--milvus-port", default="19530")
+    args = parser.parse_args()
+
+    print(f"=== 向量檢索延遲基準 (維度 {DIM}, top_k {args.top_k}, 單筆查詢) ===")
+    for size in map(int, args.sizes.split(",")):
+        vectors = random_unit_vectors(size, seed=size)
+        queries = random_unit_vectors(args.queries, seed=0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_dir = os.path.join(temp_dir, "index")
+            start = time.perf_counter()
+            meta = write_index(index_dir, [str(i) for i in range(size)], vectors, [{} for _ in range(size)], "bench")
+            print(f"\n[{size} 筆] 建立索引 {time.perf_counter() - start:.2f}s (HNSW: {meta['hnsw']}), "
+                  f"向量檔 {os.path.getsize(os.path.join(index_dir, 'vectors.f32')) / 2 ** 20:.1f}MB")
+            exact = bench_local(index_dir, queries, args.top_k, use_hnsw=False)
+            backends = [("numpy 精確", exact), ("hnsw", bench_local(index_dir, queries, args.top_k, use_hnsw=True)),
+                        ("milvus", bench_milvus(vectors, queries, args.top_k, args.milvus_host, args.milvus_port))]
+            for name, result in backends:
+                if result is None:
+                    print(f"  {name:<10} 無法執行")
+                    continue
+                latencies, results = result
+                recall = statistics.mean(len(found & truth) / len(truth) for found, truth in zip(results, exact[1]))
+                print(f"  {name:<10} p50 {percentile(latencies, 50):.3f}ms, p99 {percentile(latencies, 99):.3f}ms, "
+                      f"recall@{args.top_k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
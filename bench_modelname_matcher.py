@@ -0,0 +1,59 @@
+import os
+import re
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Tools.ModelNameMatcher import ModelNameMatcher
+
+QUERIES = [
+    "比較 AB819-S: FP6 和 AG958 的 CPU 性能",
+    "AHP819 FP7R2 的電池續航力如何？",
+    "哪個筆電比較適合遊戲？",
+    "APX1050: FP7R2 vs AG777 weight",
+]
+
+
+def legacy_find(modelnames, query):
+    """舊版做法：每個型號各自組出一條正規表達式"""
+    found = []
+    query_lower = query.lower()
+    for modelname in modelnames:
+        if re.search(r'\b' + re.escape(modelname.lower()) + r'\b', query_lower):
+            found.append(modelname)
+    return found
+
+
+def catalog(size):
+    names = [f"{prefix}{number}{suffix}" for prefix in ("AB", "AG", "APX", "AHP", "ARB")
+             for number in range(100, 100000) for suffix in ("", ": FP7R2")]
+    return names[:size]
+
+
+def bench(label, func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in QUERIES:
+            func(query)
+    elapsed = time.perf_counter() - start
+    per_query_us = elapsed / (rounds * len(QUERIES)) * 1e6
+    print(f"  {label}: {per_query_us:,.1f} µs/查詢")
+
+
+def main():
+    print("=== 型號比對基準 ===")
+    for size in (15, 1000, 10000):
+        names = catalog(size)
+        build_start = time.perf_counter()
+        matcher = ModelNameMatcher(names)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        print(f"型錄大小 {size} (比對器建立 {build_ms:.1f}ms):")
+        rounds = max(1, 2000 // size)
+        bench("舊版逐一 re.search", lambda q: legacy_find(names, q), rounds)
+        bench("預先編譯 trie 比對器", matcher.find, rounds * 10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+import random
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Tools.ModelNameSuggester import ModelNameSuggester
+
+PREFIXES = ("AB", "AG", "APX", "AHP", "ARB", "AKK", "AMD")
+SUFFIXES = ("", "V", "P", "-S", ": FP7R2", ": FT6", "-S: FP6")
+
+
+def catalog(size, rng):
+    names = set()
+    while len(names) < size:
+        names.add(f"{rng.choice(PREFIXES)}{rng.randint(100, 99999)}{rng.choice(SUFFIXES)}")
+    return sorted(names)
+
+
+def make_typo(name, rng):
+    """模擬打錯型號：刪除、插入、替換或相鄰換位一個字元"""
+    chars = list(name)
+    position = rng.randrange(len(chars))
+    operation = rng.choice(("delete", "insert", "replace", "swap"))
+    if operation == "delete" and len(chars) > 3:
+        del chars[position]
+    elif operation == "insert":
+        chars.insert(position, rng.choice("0123456789"))
+    elif operation == "swap" and position < len(chars) - 1:
+        chars[position], chars[position + 1] = chars[position + 1], chars[position]
+    else:
+        chars[position] = rng.choice("0123456789")
+    return "".join(chars)
+
+
+def legacy_suggest(modelnames, potential_model):
+    """舊版做法：對每個型號檢查前三碼或後三碼是否出現"""
+    suggestions = []
+    for available_model in modelnames:
+        if potential_model[:3] in available_model or potential_model[-3:] in available_model:
+            suggestions.append(available_model)
+    return suggestions[:3]
+
+
+def bench(label, func, queries, truth):
+    start = time.perf_counter()
+    results = [func(query) for query in queries]
+    elapsed = time.perf_counter() - start
+    top1 = sum(1 for result, expected in zip(results, truth) if result and result[0] == expected)
+    top3 = sum(1 for result, expected in zip(results, truth) if expected in result[:3])
+    per_query_us = elapsed / len(queries) * 1e6
+    print(f"  {label}: {per_query_us:,.1f} µs/查詢, top-1 {top1 / len(queries):.1%}, top-3 {top3 / len(queries):.1%}")
+
+
+def main():
+    rng = random.Random(42)
+    print("=== 型號模糊建議基準 (打錯型號查詢) ===")
+    for size in (15, 1000, 10000, 50000):
+        names = catalog(size, rng)
+        build_start = time.perf_counter()
+        suggester = ModelNameSuggester(names)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        truth = [rng.choice(names) for _ in range(300)]
+        queries = [make_typo(name, rng) for name in truth]
+        print(f"型錄大小 {size} (索引建立 {build_ms:.1f}ms):")
+        bench("舊版前/後三碼比對", lambda q: legacy_suggest(names, q), queries, truth)
+        bench("trigram 索引 + 編輯距離", suggester.suggest, queries, truth)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import statistics
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.LLM.LLMInitializer import LLMInitializer
+from sales_rag_app.libs.RAG.Prompt.ContextBuilder import ContextBuilder
+from sales_rag_app.libs.RAG.Prompt.PromptLayout import PromptLayout
+from stub_ollama_server import StubOllamaServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DB_FILE = os.path.join(ROOT, "sales_rag_app", "db", "sales_specs.db")
+PROMPT_FILE = os.path.join(ROOT, "sales_rag_app", "libs", "services", "sales_assistant", "prompts", "sales_prompt4.txt")
+
+QUERIES = [
+    (["AG958", "APX958"], "比較 AG958 和 APX958 的電池續航"),
+    (["AKK839"], "AKK839 適合玩遊戲嗎"),
+    (["AB819-S: FP6", "AMD819: FT6"], "AB819-S: FP6 和 AMD819: FT6 的 CPU 比較"),
+    (["AHP958", "AG958P", "AG958V"], "958 系列的 USB 接口"),
+    (["ARB839", "APX839"], "ARB839 與 APX839 哪個螢幕比較好"),
+    (["AHP819: FP7R2"], "AHP819: FP7R2 的重量"),
+]
+
+
+def legacy_template(template: str) -> str:
+    """舊版模板：指令中段也有 {context}，每次請求的前綴在第 28 行就開始不同"""
+    return template.replace("explicitly provided in the [DATA CONTEXT] section", "explicitly provided in the {context} data")
+
+
+def build_prompts(layout: PromptLayout, store: SpecStore, builder: ContextBuilder) -> list:
+    prompts = []
+    for modelnames, query in QUERIES:
+        context = builder.build(store.get_records(modelnames), query)
+        prompts.append(layout.render(context.text, query))
+    return prompts
+
+
+def first_token_latency(llm, prompt: str, llm_kwargs: dict) -> float:
+    start = time.perf_counter()
+    stream = llm.stream(prompt, **llm_kwargs)
+    next(iter(stream))
+    latency = time.perf_counter() - start
+    for _ in stream:
+        pass
+    return latency
+
+
+def run_scenario(label: str, prompts: list, keep_alive, rounds: int = 2):
+    with StubOllamaServer() as server:
+        llm = LLMInitializer(model_name="deepseek-r1:7b", num_ctx=8192, keep_alive=keep_alive,
+                             base_url=server.base_url).get_llm()
+        latencies = []
+        for _ in range(rounds):
+            for prompt, llm_kwargs in prompts:
+                latencies.append(first_token_latency(llm, prompt, llm_kwargs))
+        # 第一個請求必定需要載入模型與完整 prefill，不列入穩定狀態的統計
+        steady = latencies[1:]
+        cached = [request["cached_tokens"] / request["prompt_tokens"] for request in server.requests[1:]]
+        reloads = sum(1 for request in server.requests if request["reloaded"])
+        print(f"  {label}: 首個 token 平均 {statistics.mean(steady) * 1000:,.0f}ms, "
+              f"p50 {statistics.median(steady) * 1000:,.0f}ms, 前綴快取比例 {statistics.mean(cached):.0%}, "
+              f"模型載入 {reloads} 次 / {len(latencies)} 個請求")
+
+
+def main():
+    store = SpecStore(DB_FILE)
+    builder = ContextBuilder(store.snapshot.fields)
+    with open(PROMPT_FILE, "r", encoding="utf-8") as f:
+        template = f.read()
+
+    print("=== 提示前綴重用基準 (本地 stub Ollama：載入 0.3s、prefill 0.2ms/token) ===")
+    legacy = build_prompts(PromptLayout(legacy_template(template), "inline"), store, builder)
+    inline = build_prompts(PromptLayout(template, "inline"), store, builder)
+    system = build_prompts(PromptLayout(template, "system"), store, builder)
+    run_scenario("舊版模板 + keep_alive=0 (每次重新載入)", legacy, 0)
+    run_scenario("舊版模板 + keep_alive=30m", legacy, "30m")
+    run_scenario("固定前綴 (inline) + keep_alive=30m", inline, "30m")
+    run_scenario("固定前綴 (system) + keep_alive=30m", system, "30m")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import logging
+import os
+import re
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Tools.ResponseValidator import ResponseValidator
+
+MODELNAMES = frozenset([
+    "AG958", "AG958V", "AG958P", "APX958", "AHP958", "AKK839", "AHP839", "APX839", "ARB839",
+    "AB819-S: FP6", "AMD819-S: FT6", "AMD819: FT6", "ARB819-S: FP7R2", "APX819: FP7R2", "AHP819: FP7R2",
+])
+
+def legacy_validate(has_modelname, parsed_json, target_modelnames):
+    """舊版 service._validate_llm_response (每次呼叫建立變體列表、逐一掃描品牌與 GPU、重新執行未編譯的正規表示式)"""
+    try:
+        logging.info(f"開始驗證LLM回答，目標模型名稱: {target_modelnames}")
+
+        # 定義無效的品牌和GPU型號列表
+        invalid_brands = ["Acer", "ASUS", "Lenovo", "Dell", "MSI", "Razer", "NVIDIA", "Nvidia"]
+        invalid_gpu_models = ["RTX", "GTX", "RTX 3060", "RTX 3070", "RTX 3080", "RTX 3090", "RTX 4060", "RTX 4070", "RTX 4080", "RTX 4090", "GTX 1650", "GTX 1660"]
+
+        # 創建模型名稱的變體列表（處理冒號等格式差異）
+        def get_model_variants(model_name):
+            variants = [model_name]
+            # 添加沒有冒號的版本
+            if ":" in model_name:
+                variants.append(model_name.replace(":", ""))
+            # 添加有冒號的版本
+            else:
+                # 嘗試添加冒號
+                parts = model_name.split()
+                if len(parts) >= 2:
+                    variants.append(f"{parts[0]}: {' '.join(parts[1:])}")
+            return variants
+
+        target_model_variants = []
+        for model_name in target_modelnames:
+            target_model_variants.extend(get_model_variants(model_name))
+
+        logging.info(f"目標模型名稱變體: {target_model_variants}")
+
+        # 檢查answer_summary中是否包含正確的模型名稱
+        answer_summary = parsed_json.get("answer_summary", "")
+        logging.info(f"檢查answer_summary: {answer_summary}")
+
+        if answer_summary:
+            # 首先檢查是否包含任何目標模型名稱或其變體
+            has_valid_model = False
+            for model_variant in target_model_variants:
+                if model_variant in answer_summary:
+                    has_valid_model = True
+                    logging.info(f"找到有效模型名稱變體: {model_variant}")
+                    break
+
+            # 如果没有找到有效模型名称，检查是否有其他可能的模型名称
+            if not has_valid_model:
+                # 根据目标模型名称是否包含特殊符号来选择正则表达式
+                potential_models = []
+
+                for target_model in target_modelnames:
+                    if ":" in target_model:
+                        # 如果目标模型包含冒号，使用匹配冒号格式的正则表达式
+                        pattern = r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s*:\s*[A-Z]+\d+[A-Z]*)'
+                        matches = re.findall(pattern, answer_summary)
+                        potential_models.extend(matches)
+
+                        # 也匹配没有冒号的版本 - 修复正则表达式以匹配完整的模型名称
+                        pattern_no_colon = r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s+[A-Z]+\d+[A-Z]*\d*)'
+                        matches_no_colon = re.findall(pattern_no_colon, answer_summary)
+                        potential_models.extend(matches_no_colon)
+                    else:
+                        # 如果目标模型不包含冒号，使用简单格式的正则表达式
+                        pattern = r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?'
+                        matches = re.findall(pattern, answer_summary)
+                        potential_models.extend(matches)
+
+                # 去重
+                potential_models = list(set(potential_models))
+                logging.info(f"在answer_summary中找到的潜在模型名称: {potential_models}")
+
+                for potential_model in potential_models:
+                    # 检查是否是目标模型的变体
+                    is_valid_variant = False
+                    for model_variant in target_model_variants:
+                        if potential_model == model_variant:
+                            is_valid_variant = True
+                            logging.info(f"找到有效模型名称变体: {potential_model} -> {model_variant}")
+                            break
+
+                    if not is_valid_variant and not has_modelname(potential_model):
+                        # 检查是否是已知的无效模型名称
+                        known_invalid_models = ["M20W", "A520", "R7 5900HS", "Ryzen 7 958", "Ryzen 9 7640H"]
+                        if potential_model not in known_invalid_models:
+                            logging.warning(f"LLM回答包含不存在的模型名称: {potential_model}")
+                            return False
+
+            # 检查无效品牌 - 改进：避免将模型名称中的字母组合误认为品牌
+            for brand in invalid_brands:
+                # 使用单词边界匹配，避免将模型名称中的字母组合误认为品牌
+                if re.search(r'\b' + re.escape(brand) + r'\b', answer_summary):
+                    logging.warning(f"LLM回答包含无效品牌: {brand}")
+                    return False
+
+            # 检查无效GPU型号
+            for gpu_model in invalid_gpu_models:
+                if gpu_model in answer_summary:
+                    logging.warning(f"LLM回答包含无效GPU型号: {gpu_model}")
+                    return False
+
+            # 如果包含正确的模型名称，即使有其他内容也认为有效
+            if has_valid_model:
+                logging.info("LLM回答包含正确的模型名称，验证通过")
+                return True
+            else:
+                logging.warning("LLM回答中未找到任何目标模型名称")
+                return False
+
+        # 检查comparison_table中的模型名称
+        comparison_table = parsed_json.get("comparison_table", [])
+        logging.info(f"检查comparison_table: {comparison_table}")
+
+        if isinstance(comparison_table, list) and comparison_table:
+            # 检查表格中的模型名称
+            for row in comparison_table:
+                if isinstance(row, dict):
+                    # 检查是否包含正确的模型名称作为键
+                    for model_variant in target_model_variants:
+                        if model_variant in row:
+                            logging.info(f"在comparison_table中找到有效模型名称变体: {model_variant}")
+                            return True
+
+                    # 检查是否包含错误的模型名称
+                    for key in row.keys():
+                        if key != "feature" and key not in target_model_variants:
+                            # 检查是否包含常见错误模型名称
+                            invalid_models = ["A520", "M20W", "R7 5900HS", "Ryzen 7 958", "Ryzen 9 7640H"]
+                            for invalid_model in invalid_models:
+                                if invalid_model in key:
+                                    logging.warning(f"LLM回答包含无效模型名称: {invalid_model}")
+                                    return False
+
+                    # 检查值中是否包含无效GPU型号
+                    for value in row.values():
+                        if isinstance(value, str):
+                            for gpu_model in invalid_gpu_models:
+                                if gpu_model in value:
+                                    logging.warning(f"LLM回答包含无效GPU型号: {gpu_model}")
+                                    return False
+
+        # 如果comparison_table是字典格式
+        elif isinstance(comparison_table, dict):
+            # 检查字典中的模型名称
+            for key in comparison_table.keys():
+                if key != "modelname" and key not in target_model_variants:
+                    # 检查是否是模式匹配的无效模型名称
+                    if re.match(r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s*:\s*[A-Z]+\d+)?', key):
+                        if not has_modelname(key):
+                            logging.warning(f"LLM回答包含不存在的模型名称: {key}")
+                            return False
+
+            # 检查是否包含正确的模型名称
+            for model_variant in target_model_variants:
+                if model_variant in comparison_table:
+                    logging.info(f"在comparison_table字典中找到有效模型名称变体: {model_variant}")
+                    return True
+
+        # 如果没有找到任何目标模型名称，认为无效
+        logging.warning("LLM回答中未找到任何目标模型名称")
+        return False
+
+    except Exception as e:
+        logging.error(f"驗證LLM回應時發生錯誤: {e}")
+        return False
+
+
+def make_cases() -> list:
+    """(說明, 回答, 目標型號)，包含長篇回答與各種無效情況"""
+    filler = ("該機種採用 Ryzen 7 7840HS 處理器與 Radeon 780M 內顯，記憶體最高 32GB DDR5-5600，"
+              "支援 PCIe Gen4 NVMe SSD，並提供 USB4、HDMI 2.1 與 WiFi 6E。") * 40
+    table = [{"feature": f"Spec {i}", "AG958": "Radeon RX6550M", "APX958": "Radeon RX7600M"} for i in range(12)]
+    return [
+        ("短摘要 (有效)", {"answer_summary": "AG958 的電池容量為 80.08Wh。", "comparison_table": []}, ["AG958"]),
+        ("一般摘要 (有效)", {"answer_summary": "AG958 與 APX958 比較：" + filler[:300], "comparison_table": table},
+         ["AG958", "APX958"]),
+        ("長摘要 (有效)", {"answer_summary": "AG958 與 APX958 比較：" + filler, "comparison_table": table},
+         ["AG958", "APX958"]),
+        ("長摘要 冒號型號 (有效)", {"answer_summary": filler + "AHP819 FP7R2 與 APX819: FP7R2 相同。",
+                                "comparison_table": []}, ["AHP819: FP7R2", "APX819: FP7R2"]),
+        ("長摘要 無效品牌", {"answer_summary": filler + "AG958 優於 ASUS 的機種。", "comparison_table": []}, ["AG958"]),
+        ("長摘要 無效 GPU", {"answer_summary": "AG958 " + filler + "搭配 RTX 4060。", "comparison_table": []}, ["AG958"]),
+        ("長摘要 未知型號", {"answer_summary": filler + "AG999 的效能較好。", "comparison_table": []}, ["AG958"]),
+        ("只有表格 (有效)", {"answer_summary": "", "comparison_table": table}, ["AG958", "APX958"]),
+        ("字典表格 未知型號", {"answer_summary": "", "comparison_table": {"AG999": ["x"], "AG958": ["y"]}}, ["AG958"]),
+    ]
+
+
+def bench(func, parsed_json, target_modelnames, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(parsed_json, target_modelnames)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    # 兩種做法都關閉日誌，只比較驗證本身的成本
+    logging.disable(logging.CRITICAL)
+    has_modelname = MODELNAMES.__contains__
+    validator = ResponseValidator(has_modelname)
+    print("=== LLM 回答驗證基準 (µs/次) ===")
+    for label, parsed_json, target_modelnames in make_cases():
+        expected = legacy_validate(has_modelname, parsed_json, target_modelnames)
+        result = validator.validate(parsed_json, target_modelnames)
+        assert result == expected, f"{label}: 結果不一致 ({result} != {expected})"
+        legacy_us = bench(lambda p, t: legacy_validate(has_modelname, p, t), parsed_json, target_modelnames, 2000)
+        compiled_us = bench(validator.validate, parsed_json, target_modelnames, 2000)
+        size = len(parsed_json["answer_summary"])
+        print(f"  {label} ({size:,} 字元, 結果 {result}): 舊版 {legacy_us:,.1f} µs, 預先編譯 {compiled_us:,.1f} µs "
+              f"({legacy_us / compiled_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.LLM.LLMInitializer import LLMInitializer
+from sales_rag_app.libs.RAG.LLM.ThinkBudget import ThinkBudget
+from sales_rag_app.libs.RAG.Prompt.ContextBuilder import ContextBuilder
+from sales_rag_app.libs.RAG.Prompt.PromptLayout import PromptLayout
+from sales_rag_app.libs.RAG.Tools.ResponseStreamParser import ResponseStreamParser
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+from stub_ollama_server import StubOllamaServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DB_FILE = os.path.join(ROOT, "sales_rag_app", "db", "sales_specs.db")
+PROMPT_FILE = os.path.join(ROOT, "sales_rag_app", "libs", "services", "sales_assistant", "prompts", "sales_prompt4.txt")
+FIXTURE_FILE = os.path.join(ROOT, "data", "llm_fixtures", "think_budget.json")
+
+# (標籤, 推理模式, 推理 token 上限)
+SCENARIOS = [
+    ("full", "full", None),
+    ("budget 256", "budget", 256),
+    ("budget 128", "budget", 128),
+    ("budget 64", "budget", 64),
+    ("off", "off", None),
+]
+
+
+def load_fixtures(path: str = FIXTURE_FILE) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def make_responder(fixtures: list):
+    """依提示中的問題找到對應的錄製輸出：一般請求回放完整推理，raw 請求 (推理已被強制結束) 回放 answer_forced"""
+    def respond(payload: dict) -> str:
+        prompt = payload.get("prompt") or ""
+        for fixture in fixtures:
+            if fixture["query"] in prompt:
+                if payload.get("raw"):
+                    return fixture["answer_forced"]
+                return "<think>\n" + fixture["think"] + "\n</think>\n\n" + fixture["answer"]
+        raise KeyError("找不到對應的回放資料")
+    return respond
+
+
+async def run_query(service: SalesAssistantService, query: str) -> tuple:
+    start = time.perf_counter()
+    first_answer = None
+    final = None
+    async for chunk in service.chat_stream(query, stream=True):
+        event = json.loads(chunk[len("data: "):])
+        if event.get("event") == "answer" and first_answer is None:
+            first_answer = time.perf_counter() - start
+        elif "event" not in event:
+            final = event
+    total = time.perf_counter() - start
+    return total, first_answer if first_answer is not None else total, final["served_by"] == "llm"
+
+
+def run_scenario(label: str, mode: str, max_think_tokens, document: dict, decode_ms: float):
+    fixtures = document["fixtures"]
+    with StubOllamaServer(responder=make_responder(fixtures), load_seconds=0.0, prefill_ms_per_token=0.0,
+                          decode_ms_per_chunk=decode_ms, chunk_size=4) as server:
+        llm = LLMInitializer(model_name=document["model"], base_url=server.base_url, json_format="off").get_llm()
+        think_budget = ThinkBudget(mode, max_think_tokens or 0, model_name=document["model"])
+        service = SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE),
+                                        json_format="off", think_budget=think_budget)
+        results = [asyncio.run(run_query(service, fixture["query"])) for fixture in fixtures]
+        service.duckdb_query.disconnect()
+        generated = sum(request["chunks_sent"] for request in server.requests)
+    totals = [total for total, _, _ in results]
+    firsts = [first for _, first, _ in results]
+    valid = sum(1 for _, _, is_valid in results if is_valid)
+    metrics = think_budget.get_metrics()
+    print(f"  {label:<11} 端到端平均 {statistics.mean(totals) * 1000:7,.0f}ms  p50 {statistics.median(totals) * 1000:7,.0f}ms  "
+          f"首個答案片段 {statistics.mean(firsts) * 1000:7,.0f}ms  有效回答 {valid}/{len(results)}  "
+          f"推理 {metrics['avg_think_tokens']:5.1f} tokens  截斷 {metrics['truncated']}  生成片段 {generated}")
+
+
+def record(base_url: str, document: dict, path: str):
+    """以實際的 Ollama 模型重新錄製回放資料 (完整推理的輸出與強制結束推理後的輸出)"""
+    store = SpecStore(DB_FILE)
+    builder = ContextBuilder(store.snapshot.fields)
+    layout = PromptLayout.from_file(PROMPT_FILE, "inline")
+    initializer = LLMInitializer(model_name=document["model"], base_url=base_url, json_format="off")
+    llm = initializer.get_llm()
+    think_budget = ThinkBudget("off", model_name=document["model"])
+    for fixture in document["fixtures"]:
+        context = builder.build(store.get_records(fixture["modelnames"]), fixture["query"])
+        prompt, llm_kwargs = layout.render(context.text, fixture["query"])
+        parser = ResponseStreamParser()
+        parser.feed(llm.invoke(prompt, **llm_kwargs))
+        fixture["think"] = parser.think_text.strip()
+        fixture["answer"] = parser.json_text or parser.text[parser.text.find("</think>") + len("</think>"):].strip()
+        raw_prompt, raw_kwargs = think_budget.raw_request(prompt, llm_kwargs)
+        fixture["answer_forced"] = llm.invoke(raw_prompt, **raw_kwargs).strip()
+        print(f"已錄製: {fixture['query']}")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理預算 (full / budget / off) 的端到端延遲與回答有效率基準")
+    parser.add_argument("--fixtures", default=FIXTURE_FILE)
+    parser.add_argument("--decode-ms", type=float, default=4.0, help="stub Ollama 每 4 個字元的解碼時間 (ms)")
+    parser.add_argument("--record", metavar="OLLAMA_URL", help="以實際的 Ollama 重新錄製回放資料後結束")
+    args = parser.parse_args()
+
+    # 服務在 INFO 等級會輸出完整提示與回應，基準只需要結果
+    logging.getLogger().setLevel(logging.WARNING)
+    document = load_fixtures(args.fixtures)
+    if args.record:
+        record(args.record, document, args.fixtures)
+        return
+
+    print(f"=== 推理預算基準 ({len(document['fixtures'])} 筆回放資料, 模型 {document['model']}, "
+          f"stub Ollama 解碼 {args.decode_ms}ms / 4 字元) ===")
+    print("  有效回答 = 通過 _validate_llm_response 而以 LLM 回答結束 (served_by=llm) 的比例")
+    for label, mode, max_think_tokens in SCENARIOS:
+        run_scenario(label, mode, max_think_tokens, document, args.decode_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,19 @@ import os
 import re
 import duckdb
 import pandas as pd
-from pymilvus import connections, utility, Collection, CollectionSchema, FieldSchema, DataType
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import HuggingFaceEmbeddings
+from pymilvus import connections, utility, Collection
+from sales_rag_app.libs.RAG.DB.SpecNormalizer import build_normalized_table
+from sales_rag_app.libs.RAG.DB.LocalVectorQuery import build_index_from_duckdb, embed_documents_from_duckdb
+from sales_rag_app.libs.RAG.DB.MilvusQuery import SPEC_COLLECTION, spec_collection_schema, spec_entities
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import get_embedding_service
 
 # --- 設定 ---
 MILVUS_HOST = "localhost"
 MILVUS_PORT = "19530"
 DUCKDB_FILE = "sales_rag_app/db/sales_specs.db"
-COLLECTION_NAME = "sales_notebook_specs"
-EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+COLLECTION_NAME = SPEC_COLLECTION
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "sales_rag_app/db/vector_index")
 DATA_DIR = "data"
 
 # --- 文本解析函數 ---
@@ -52,6 +55,15 @@ def specs_to_dataframe(specs, model_name):
                 records.append([model_name, section, feature, value_str])
     return pd.DataFrame(records, columns=['model_name', 'section', 'feature', 'value'])
 
+def milvus_collection_data(documents, source="duckdb:specs"):
+    """
+    Milvus collection 的 schema 與插入資料：每個型號一筆 (與本地向量索引相同的文件)，
+    modelname 欄位讓混合檢索可以只在候選型號中搜尋。
+    :param documents: embed_documents_from_duckdb() 的結果
+    """
+    ids, texts, _, vectors = documents
+    return spec_collection_schema(vectors.shape[1]), spec_entities(ids, texts, vectors, source)
+
 # --- 主執行流程 ---
 def main():
     # --- 1. 處理結構化資料 (DuckDB) ---
@@ -71,61 +83,32 @@ def main():
 
     con.execute("CREATE TABLE specs AS SELECT * FROM df_total")
     print(f"成功將 {len(df_total)} 筆規格資料存入 DuckDB。")
+    # 預先解析 weight_g、battery_wh、tdp_w 等欄位存入 specs_normalized (specs 不是 XLSX 寬表格時會自動略過)
+    build_normalized_table(con)
     con.close()
 
-    # --- 2. 處理非結構化資料 (Milvus) ---
-    print("\n--- 正在處理文本資料並存入 Milvus ---")
+    # --- 2. 以規格資料產生每個型號一份文件的嵌入向量 (本地索引與 Milvus 共用) ---
+    print("\n--- 正在產生規格文件的嵌入向量 ---")
+    embeddings = get_embedding_service(EMBEDDING_MODEL)
+    documents = embed_documents_from_duckdb(DUCKDB_FILE, embeddings)
+    ids = documents[0]
+    print(f"共 {len(ids)} 個型號的規格文件。")
+
+    # --- 3. 建立本地向量索引 (VECTOR_STORE=local 時使用，不需要 Milvus) ---
+    print("\n--- 正在建立本地向量索引 ---")
+    build_index_from_duckdb(DUCKDB_FILE, LOCAL_VECTOR_DIR, embeddings, documents=documents)
+
+    # --- 4. 將同一份文件存入 Milvus ---
+    print("\n--- 正在將規格文件存入 Milvus ---")
     connections.connect("default", host=MILVUS_HOST, port=MILVUS_PORT)
 
     if utility.has_collection(COLLECTION_NAME):
         print(f"找到舊的 Collection '{COLLECTION_NAME}'，正在刪除...")
         utility.drop_collection(COLLECTION_NAME)
 
-    # 定義 Collection Schema
-    fields = [
-        FieldSchema(name="pk", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=100),
-        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
-        FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=200),
-        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384)
-    ]
-    schema = CollectionSchema(fields, "銷售筆電規格知識庫")
+    schema, entities = milvus_collection_data(documents)
     collection = Collection(COLLECTION_NAME, schema)
 
-    # 讀取所有文件
-    all_docs = []
-    for filename in os.listdir(DATA_DIR):
-        file_path = os.path.join(DATA_DIR, filename)
-        # 跳過目錄和非 .txt 文件
-        if os.path.isdir(file_path) or not filename.endswith('.txt'):
-            continue
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # 使用 LangChain 的 TextSplitter
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-            chunks = text_splitter.split_text(content)
-            for i, chunk in enumerate(chunks):
-                all_docs.append({
-                    "pk": f"{filename}_{i}",
-                    "text": chunk,
-                    "source": filename
-                })
-
-    print(f"共讀取並分割成 {len(all_docs)} 個文本區塊。")
-
-    # 產生嵌入向量
-    print("正在產生嵌入向量...")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-    texts_to_embed = [doc['text'] for doc in all_docs]
-    vectors = embeddings.embed_documents(texts_to_embed)
-
-    # 準備插入 Milvus 的資料
-    entities = [
-        [doc['pk'] for doc in all_docs],
-        [doc['text'] for doc in all_docs],
-        [doc['source'] for doc in all_docs],
-        vectors
-    ]
-
     # 插入資料
     print("正在將資料插入 Milvus...")
     collection.insert(entities)
@@ -141,7 +124,7 @@ def main():
     collection.create_index("embedding", index_params)
     collection.load()
 
-    print(f"成功將 {len(all_docs)} 筆資料導入 Milvus Collection '{COLLECTION_NAME}'。")
+    print(f"成功將 {len(ids)} 筆資料導入 Milvus Collection '{COLLECTION_NAME}'。")
     print("\n資料導入完成！")
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+import atexit
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int | None = None, ttl_seconds: float | None = None, persist_path: str | None = None):
+        """
+        查詢向量的 LRU + TTL 快取，快取鍵為 (嵌入模型名稱, 正規化查詢)，向量以 float32 陣列保存。
+        :param max_entries: 最多保留的向量數，預設讀取環境變數 EMBEDDING_CACHE_MAX_ENTRIES (2048)
+        :param ttl_seconds: 向量存活秒數，預設讀取環境變數 EMBEDDING_CACHE_TTL (86400)
+        :param persist_path: 持久化檔案 (.npz)，預設讀取環境變數 EMBEDDING_CACHE_PATH，未設定時不持久化；
+                             啟動時載入，save() 或行程結束時寫回
+        """
+        if max_entries is None:
+            max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2048"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+        if persist_path is None:
+            persist_path = os.getenv("EMBEDDING_CACHE_PATH") or None
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        # key -> (到期時間, 向量)；到期時間使用牆上時間，重新啟動後載入的項目仍能判斷是否過期
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loaded = 0
+        # 上次寫回之後是否有新的向量，沒有變更時行程結束不必重寫檔案
+        self._dirty = False
+        if self.persist_path:
+            self.load()
+            atexit.register(self._save_if_dirty)
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """全半形統一並合併空白 (保留大小寫，區分大小寫的模型會得到不同的向量)"""
+        return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", query)).strip()
+
+    def make_key(self, model_name: str, query: str) -> tuple:
+        return model_name, self.normalize_query(query)
+
+    def get(self, key) -> np.ndarray | None:
+        """取得快取的向量，未命中或已過期時返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, vector = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    @staticmethod
+    def _freeze(vector) -> np.ndarray:
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        return vector
+
+    def set(self, key, vector) -> np.ndarray:
+        """寫入向量 (轉為唯讀的 float32 陣列)，超過容量時淘汰最久未使用的項目"""
+        vector = self._freeze(vector)
+        with self._lock:
+            self._set_locked(key, vector, time.time() + self.ttl_seconds)
+            self._dirty = True
+        return vector
+
+    def _set_locked(self, key, vector, expires_at):
+        self._entries[key] = (expires_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, model_name: str, query: str, compute) -> np.ndarray:
+        """命中時直接返回快取的向量，否則以 compute(query) 計算後寫入"""
+        key = self.make_key(model_name, query)
+        vector = self.get(key)
+        if vector is None:
+            vector = self.set(key, compute(query))
+        return vector
+
+    def save(self) -> bool:
+        """將未過期的向量寫入 persist_path (先寫入暫存檔再取代，避免寫到一半的檔案)"""
+        if not self.persist_path:
+            return False
+        now = time.time()
+        with self._lock:
+            items = [(key, expires_at, vector) for key, (expires_at, vector) in self._entries.items() if expires_at >= now]
+            self._dirty = False
+        directory = os.path.dirname(os.path.abspath(self.persist_path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.persist_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f,
+                     models=np.array([key[0] for key, _, _ in items], dtype=np.str_),
+                     queries=np.array([key[1] for key, _, _ in items], dtype=np.str_),
+                     expires=np.array([expires_at for _, expires_at, _ in items], dtype=np.float64),
+                     lengths=np.array([len(vector) for _, _, vector in items], dtype=np.int32),
+                     vectors=np.concatenate([vector for _, _, vector in items]) if items else np.zeros(0, np.float32))
+        os.replace(temp_path, self.persist_path)
+        return True
+
+    def _save_if_dirty(self):
+        if self._dirty:
+            self.save()
+
+    def load(self) -> int:
+        """從 persist_path 載入未過期的向量 (檔案不存在或損毀時略過)，返回載入的筆數"""
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as data:
+                models, queries, expires = data["models"], data["queries"], data["expires"]
+                lengths, vectors = data["lengths"], data["vectors"]
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print(f"讀取查詢向量快取失敗，略過: {self.persist_path} ({e})")
+            return 0
+        now = time.time()
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        loaded = 0
+        with self._lock:
+            for i, expires_at in enumerate(expires):
+                if expires_at < now:
+                    continue
+                vector = self._freeze(vectors[offsets[i]:offsets[i + 1]])
+                self._set_locked((str(models[i]), str(queries[i])), vector, float(expires_at))
+                loaded += 1
+            self.loaded += loaded
+        print(f"已載入 {loaded} 筆查詢向量快取: {self.persist_path}")
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self) -> dict:
+        """返回快取命中率等統計資訊"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "loaded": self.loaded,
+                "bytes": sum(vector.nbytes for _, vector in self._entries.values()),
+                "persist_path": self.persist_path,
+            }
@@ -0,0 +1,117 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int | None = None, ttl_seconds: float | None = None, watch_file: str | None = None):
+        """
+        LRU + TTL 的回應快取，快取鍵為 (目標型號, 正規化查詢)。
+        :param max_entries: 最多保留的回應數，預設讀取環境變數 RESPONSE_CACHE_MAX_ENTRIES (256)
+        :param ttl_seconds: 回應存活秒數，預設讀取環境變數 RESPONSE_CACHE_TTL (3600)
+        :param watch_file: 監看的資料庫檔案，檔案被重新產生 (重新 ingest) 時自動清空快取
+        """
+        if max_entries is None:
+            max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.watch_file = watch_file
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_signature = self._read_file_signature()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """
+        正規化查詢：只統一全半形、大小寫與空白，詞序與型號位置保持不變。
+        「AG958 的 CPU 和 APX958 的 GPU」與型號對調的問題、「A 比 B 輕」與「B 比 A 輕」問的是不同的事，不能共用快取。
+        """
+        return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", query).lower()).strip()
+
+    def make_key(self, target_modelnames: list, query: str) -> tuple:
+        """根據解析後的目標型號與正規化查詢產生快取鍵"""
+        return tuple(sorted(set(target_modelnames))), self.normalize_query(query)
+
+    def get(self, key):
+        """取得快取的回應，未命中或已過期時返回 None"""
+        with self._lock:
+            self._check_file_changed()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """寫入回應，超過容量時淘汰最久未使用的項目"""
+        with self._lock:
+            self._check_file_changed()
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """清空所有快取項目"""
+        with self._lock:
+            self._invalidate_locked()
+
+    def get_metrics(self) -> dict:
+        """返回快取命中率等統計資訊"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _invalidate_locked(self):
+        if self._entries:
+            self._entries.clear()
+        self.invalidations += 1
+
+    def _read_file_signature(self):
+        if not self.watch_file:
+            return None
+        try:
+            stat = os.stat(self.watch_file)
+            return stat.st_ino, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_file_changed(self):
+        if not self.watch_file:
+            return
+        signature = self._read_file_signature()
+        if signature != self._file_signature:
+            print(f"偵測到資料庫檔案變更，清空回應快取: {self.watch_file}")
+            self._file_signature = signature
+            self._invalidate_locked()
@@ -1,42 +1,379 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import duckdb
 from .DatabaseQuery import DatabaseQuery
+from .SpecNormalizer import NORMALIZED_TABLE, NUMERIC_COLUMNS
+
+
+def _fetch_arrow_table(result):
+    """以 Arrow Table 取得結果；fetch_arrow_table() 在新版 DuckDB 已棄用 (arrow() 改為回傳 RecordBatchReader)"""
+    to_arrow_table = getattr(result, "to_arrow_table", None)
+    return to_arrow_table() if to_arrow_table is not None else result.fetch_arrow_table()
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class _PoolRetired(Exception):
+    """等待中的連線池已被重新連線取代"""
+
+
+class _ConnectionPool:
+    def __init__(self, connection, size: int, generation: int):
+        """
+        一個唯讀主連線與其 cursor 組成的連線池 (LIFO，最近使用的 cursor 優先借出)。
+        重新連線時舊的連線池只標記為退役：已借出的 cursor 仍可用完，全部歸還後才關閉主連線
+        (DuckDB 關閉主連線會讓所有 cursor 立即失效)，等待中的執行緒被喚醒改用新的連線池。
+        :param generation: 連線池世代，重新連線時只有失敗的世代仍是目前世代才需要重建
+        """
+        self.connection = connection
+        self.generation = generation
+        # cursor() 會建立共用同一個資料庫實例的獨立連線，可安全地在不同執行緒使用
+        self.idle = [(connection.cursor(), time.monotonic()) for _ in range(size)]
+        self.borrowed = 0
+        self.retired = False
+        self._cond = threading.Condition()
+
+    def get(self, timeout: float) -> tuple:
+        """借出 (cursor, 上次使用時間)；連線池退役時拋出 _PoolRetired"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.idle and not self.retired:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待 DuckDB 連線逾時 ({timeout}s)")
+                self._cond.wait(remaining)
+            if self.retired:
+                raise _PoolRetired()
+            self.borrowed += 1
+            return self.idle.pop()
+
+    def put(self, cursor, healthy: bool = True):
+        """歸還 cursor；失效的 cursor 關閉後以新的 cursor 補上，連線池不會因錯誤而縮小"""
+        close_connection = False
+        with self._cond:
+            self.borrowed -= 1
+            if self.retired:
+                close_connection = self.borrowed == 0
+            else:
+                if not healthy:
+                    _close_quietly(cursor)
+                    try:
+                        cursor = self.connection.cursor()
+                    except Exception:
+                        # 主連線本身已失效，重新連線後整個連線池會被取代
+                        cursor = None
+                if cursor is not None:
+                    self.idle.append((cursor, time.monotonic()))
+                    self._cond.notify()
+                return
+        _close_quietly(cursor)
+        if close_connection:
+            _close_quietly(self.connection)
+
+    def retire(self):
+        """標記為退役並喚醒等待中的執行緒；沒有借出的 cursor 時立即關閉主連線"""
+        with self._cond:
+            if self.retired:
+                return
+            self.retired = True
+            idle, self.idle = self.idle, []
+            close_connection = self.borrowed == 0
+            self._cond.notify_all()
+        for cursor, _ in idle:
+            _close_quietly(cursor)
+        if close_connection:
+            _close_quietly(self.connection)
+
 
 class DuckDBQuery(DatabaseQuery):
-    def __init__(self, db_file: str):
+    def __init__(self, db_file: str, pool_size: int | None = None, acquire_timeout: float = 30.0,
+                 health_check_interval: float = 30.0, max_retries: int = 1):
+        """
+        執行緒安全的 DuckDB 查詢類別：以一個唯讀主連線搭配 cursor 連線池供多執行緒並行查詢。
+        :param db_file: DuckDB 資料庫檔案路徑
+        :param pool_size: 連線池大小，預設讀取環境變數 DUCKDB_POOL_SIZE (4)
+        :param acquire_timeout: 取得連線的最長等待秒數
+        :param health_check_interval: 連線閒置超過此秒數後，取用前先以 SELECT 1 檢查健康狀態
+        :param max_retries: 查詢因連線失效失敗時，重新連線後重試的次數
+        """
+        if pool_size is None:
+            pool_size = int(os.getenv("DUCKDB_POOL_SIZE", "4"))
         self.db_file = db_file
+        self.pool_size = max(1, pool_size)
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.max_retries = max_retries
         self.connection = None
+        self._pool = None
+        self._generation = 0
+        self._columns_cache = {}
+        self._lock = threading.Lock()
         self.connect()
 
-    def connect(self):
+    def connect(self, expected_generation: int | None = None):
+        """
+        (重新) 建立連線池，舊的連線池在借出的 cursor 全部歸還後才關閉。
+        :param expected_generation: 發生錯誤的連線池世代；已被其他執行緒重建 (世代不同) 時不再重複重新連線
+        """
+        with self._lock:
+            if expected_generation is not None and expected_generation != self._generation:
+                return
+            self._close_locked()
+            try:
+                connection = duckdb.connect(database=self.db_file, read_only=True)
+                self._generation += 1
+                self._pool = _ConnectionPool(connection, self.pool_size, self._generation)
+                self.connection = connection
+                self._columns_cache = {}
+                print(f"成功連接到 DuckDB: {self.db_file} (連線池大小: {self.pool_size})")
+            except Exception as e:
+                print(f"連接 DuckDB 失敗: {e}")
+                self.connection = None
+                self._pool = None
+
+    @contextmanager
+    def _acquire(self):
+        """從連線池借出一個 cursor，必要時先做健康檢查或重新連線"""
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            # 在鎖內取得連線池的本地參照，避免並行的 connect()/disconnect() 在檢查與使用之間把 _pool 換成 None
+            with self._lock:
+                pool = self._pool
+            if pool is None:
+                self.connect()
+                with self._lock:
+                    pool = self._pool
+                if pool is None:
+                    raise ConnectionError("DuckDB 未連接。")
+            try:
+                cursor, last_used = pool.get(max(0.0, deadline - time.monotonic()))
+                break
+            except _PoolRetired:
+                # 等待期間連線池被重建，改向新的連線池借用
+                continue
+
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(cursor):
+            print("DuckDB 連線健康檢查失敗，正在重新連線...")
+            pool.put(cursor, healthy=False)
+            self.connect(expected_generation=pool.generation)
+            raise ConnectionError("DuckDB 連線已失效")
+
+        healthy = True
         try:
-            self.connection = duckdb.connect(database=self.db_file, read_only=True)
-            print(f"成功連接到 DuckDB: {self.db_file}")
-        except Exception as e:
-            print(f"連接 DuckDB 失敗: {e}")
-            self.connection = None
+            yield cursor
+        except (duckdb.ConnectionException, duckdb.FatalException):
+            healthy = False
+            raise
+        finally:
+            # 不論成功與否都歸還 (失效的 cursor 會被替換)；連線失效時只重建發生錯誤的那一代連線池
+            pool.put(cursor, healthy)
+            if not healthy:
+                self.connect(expected_generation=pool.generation)
+
+    def _is_healthy(self, cursor) -> bool:
+        try:
+            cursor.execute("SELECT 1").fetchall()
+            return True
+        except Exception:
+            return False
+
+    def _execute(self, sql_query: str, params: list | None = None, fetch=None):
+        """
+        在連線池上執行查詢，連線失效時自動重新連線並重試
+        :param fetch: 取得結果的函數，預設為 fetchall() (回傳 list of tuples)
+        """
+        attempts = self.max_retries + 1
+        for attempt in range(attempts):
+            try:
+                with self._acquire() as cursor:
+                    result = cursor.execute(sql_query) if params is None else cursor.execute(sql_query, params)
+                    return fetch(result) if fetch else result.fetchall()
+            except (ConnectionError, duckdb.ConnectionException, duckdb.FatalException) as e:
+                # _acquire 已依發生錯誤的世代重新連線，這裡只需重試
+                if attempt == attempts - 1:
+                    raise
+                print(f"DuckDB 連線錯誤，重新連線後重試: {e}")
 
     def query(self, sql_query: str):
-        if not self.connection:
-            print("DuckDB 未連接。")
-            return None
         try:
-            return self.connection.execute(sql_query).fetchall()
+            return self._execute(sql_query)
         except Exception as e:
             print(f"DuckDB 查詢失敗: {e}")
             return None
-        
+
     def query_with_params(self, sql_query: str, params: list):
-        if not self.connection:
-            print("DuckDB 未連接。")
-            return None
         try:
-            return self.connection.execute(sql_query, params).fetchall()
+            return self._execute(sql_query, params)
         except Exception as e:
             print(f"DuckDB 參數化查詢失敗: {e}")
             return None
 
+    def query_arrow(self, sql_query: str, params: list | None = None):
+        """以 Arrow Table 回傳結果 (需要安裝 pyarrow)，避免逐列建立 Python 物件"""
+        try:
+            return self._execute(sql_query, params, fetch=_fetch_arrow_table)
+        except Exception as e:
+            print(f"DuckDB Arrow 查詢失敗: {e}")
+            return None
+
+    def query_df(self, sql_query: str, params: list | None = None):
+        """以 pandas DataFrame 回傳結果"""
+        try:
+            return self._execute(sql_query, params, fetch=lambda result: result.df())
+        except Exception as e:
+            print(f"DuckDB DataFrame 查詢失敗: {e}")
+            return None
+
+    def query_numpy(self, sql_query: str, params: list | None = None):
+        """以 {欄位名稱: NumPy 陣列} 的欄式字典回傳結果"""
+        try:
+            return self._execute(sql_query, params, fetch=lambda result: result.fetchnumpy())
+        except Exception as e:
+            print(f"DuckDB NumPy 查詢失敗: {e}")
+            return None
+
+    def get_columns(self, table: str) -> list:
+        """取得資料表的欄位名稱 (依資料表順序)，結果會被快取"""
+        if table not in self._columns_cache:
+            rows = self.query_with_params(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position",
+                [table])
+            if not rows:
+                return []
+            self._columns_cache[table] = [row[0] for row in rows]
+        return self._columns_cache[table]
+
+    def select_specs(self, modelnames: list | None = None, columns: list | None = None,
+                     result_format: str = "arrow", table: str = "specs"):
+        """
+        以欄式格式查詢規格，只取回需要的欄位 (projection)。
+        :param modelnames: 要查詢的型號，None 表示全部
+        :param columns: 要取回的欄位，None 表示全部；不存在的欄位會被拒絕，避免 SQL 注入
+        :param result_format: "arrow"、"pandas"、"numpy" 或 "rows"
+        """
+        available_columns = self.get_columns(table)
+        if not available_columns:
+            print(f"找不到資料表 '{table}' 的欄位資訊。")
+            return None
+        if columns:
+            unknown_columns = [column for column in columns if column not in available_columns]
+            if unknown_columns:
+                raise ValueError(f"未知的欄位: {unknown_columns}")
+            projection = ", ".join(f'"{column}"' for column in columns)
+        else:
+            projection = "*"
+
+        sql_query = f'SELECT {projection} FROM "{table}"'
+        params = None
+        if modelnames is not None:
+            if not modelnames:
+                modelnames = [None]
+            sql_query += f" WHERE modelname IN ({', '.join(['?'] * len(modelnames))})"
+            params = list(modelnames)
+
+        fetchers = {
+            "arrow": self.query_arrow,
+            "pandas": self.query_df,
+            "numpy": self.query_numpy,
+            "rows": lambda sql, p: self.query(sql) if p is None else self.query_with_params(sql, p),
+        }
+        if result_format not in fetchers:
+            raise ValueError(f"不支援的結果格式: {result_format}")
+        return fetchers[result_format](sql_query, params)
+
+    def rank_models(self, modelnames: list | None, column: str, descending: bool = False,
+                    table: str = NORMALIZED_TABLE, modeltypes: list | None = None, memory_types: list | None = None,
+                    ranges: dict | None = None, limit: int | None = None) -> list | None:
+        """
+        在 SQL 中依 specs_normalized 的數值欄位排序型號，缺少數值的型號不列入。
+        :param modelnames: 要排序的型號，None 表示所有符合篩選條件的型號 (條件同 filter_models)
+        :param column: 數值欄位 (例如 weight_g、battery_wh)，只接受 NUMERIC_COLUMNS 以避免 SQL 注入
+        :param descending: True 時由大到小
+        :param limit: 只取前幾名
+        :return: [(modelname, 數值), ...]，查詢失敗時為 None
+        """
+        if column not in NUMERIC_COLUMNS:
+            raise ValueError(f"不支援排序的欄位: {column} (可用: {', '.join(NUMERIC_COLUMNS)})")
+        if modelnames is not None and not modelnames:
+            return []
+        conditions, params = self._filter_conditions(modeltypes, memory_types, ranges)
+        if modelnames is not None:
+            conditions.insert(0, f'modelname IN ({", ".join(["?"] * len(modelnames))})')
+            params = list(modelnames) + params
+        conditions.append(f'"{column}" IS NOT NULL')
+        order = "DESC" if descending else "ASC"
+        sql_query = (f'SELECT modelname, "{column}" FROM "{table}" WHERE {" AND ".join(conditions)} '
+                     f'ORDER BY "{column}" {order}, modelname')
+        if limit is not None:
+            sql_query += f" LIMIT {int(limit)}"
+        return self.query_with_params(sql_query, params)
+
+    def _filter_conditions(self, modeltypes: list | None, memory_types: list | None, ranges: dict | None) -> tuple:
+        """將篩選條件轉為參數化的 WHERE 條件，返回 (條件列表, 參數列表)"""
+        conditions = []
+        params = []
+        if modeltypes:
+            conditions.append(f"modeltype IN ({', '.join(['?'] * len(modeltypes))})")
+            params.extend(modeltypes)
+        if memory_types:
+            # memory_type 以 " / " 分隔多種類型 (SpecExtractor)，逐一完全比對，DDR5 不符合 LPDDR5
+            conditions.append(f"list_has_any(string_split(upper(memory_type), ' / '), "
+                              f"[{', '.join(['?'] * len(memory_types))}])")
+            params.extend(keyword.upper() for keyword in memory_types)
+        for column, (low, high) in (ranges or {}).items():
+            if column not in NUMERIC_COLUMNS:
+                raise ValueError(f"不支援篩選的欄位: {column} (可用: {', '.join(NUMERIC_COLUMNS)})")
+            if low is not None:
+                conditions.append(f'"{column}" >= ?')
+                params.append(low)
+            if high is not None:
+                conditions.append(f'"{column}" <= ?')
+                params.append(high)
+        return conditions, params
+
+    def filter_models(self, modeltypes: list | None = None, memory_types: list | None = None,
+                      ranges: dict | None = None, table: str = NORMALIZED_TABLE) -> list | None:
+        """
+        在 SQL 中依 specs_normalized 的欄位篩選型號 (參數化查詢)，不指定條件時返回全部型號。
+        :param modeltypes: 系列，任一符合即可
+        :param memory_types: 記憶體類型，完全比對 (DDR5 不符合 LPDDR5)
+        :param ranges: 數值欄位 -> (下限, 上限)，欄位只接受 NUMERIC_COLUMNS
+        :return: 符合的型號 (依 modelname 排序)，查詢失敗時為 None
+        """
+        conditions, params = self._filter_conditions(modeltypes, memory_types, ranges)
+        sql_query = f'SELECT modelname FROM "{table}"'
+        if conditions:
+            sql_query += " WHERE " + " AND ".join(conditions)
+        rows = self.query_with_params(sql_query + " ORDER BY modelname", params)
+        return [row[0] for row in rows] if rows is not None else None
+
+    def get_stats(self) -> dict:
+        """返回連線池狀態"""
+        pool = self._pool
+        return {
+            "pool_size": self.pool_size,
+            "idle": len(pool.idle) if pool is not None else 0,
+            "connected": self.connection is not None,
+            "generation": self._generation,
+        }
+
+    def _close_locked(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.retire()
+        self.connection = None
+
     def disconnect(self):
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            print("已斷開 DuckDB 連接。")
\ No newline at end of file
+        with self._lock:
+            was_connected = self.connection is not None
+            self._close_locked()
+        if was_connected:
+            print("已斷開 DuckDB 連接。")
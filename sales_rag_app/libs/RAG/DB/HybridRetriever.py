@@ -0,0 +1,192 @@
+import threading
+import time
+
+from .ModelCatalog import ModelCatalog
+from ..Tools.QueryFilterParser import QueryFilterParser, QueryFilters
+from ..Tools.QueryIntentClassifier import QueryIntentClassifier
+from ..Tools.SpecExtractor import SPEC_ATTRIBUTES
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60, weights: list | None = None) -> list:
+    """
+    Reciprocal Rank Fusion：score(d) = Σ weight / (k + rank)，不需要把不同來源的分數 (L2 距離、公斤) 正規化到同一尺度。
+    :param rankings: 多個已排序的 id 列表
+    :param k: 平滑常數 (原論文建議 60)，越大名次差異的影響越小
+    :return: [(id, 分數)]，分數由高到低，同分時保留第一次出現的順序
+    """
+    scores = {}
+    for i, ranking in enumerate(rankings):
+        weight = weights[i] if weights else 1.0
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class HybridResult:
+    def __init__(self, modelnames: list, filters: QueryFilters, candidates: list, vector_ranking: list,
+                 structured_ranking: list, scores: dict, elapsed_ms: float, reason: str = ""):
+        """
+        混合檢索的結果。
+        :param modelnames: 最終的型號 (依融合分數排序)
+        :param filters: 從查詢擷取的結構化條件
+        :param candidates: 通過結構化條件的型號
+        :param vector_ranking: 向量相似度的排序
+        :param structured_ranking: 依數值屬性的排序 (查詢沒有「最輕/最大」之類的排序時為空)
+        :param scores: 型號 -> RRF 分數
+        :param reason: 沒有結果時的原因，寫入日誌
+        """
+        self.modelnames = modelnames
+        self.filters = filters
+        self.candidates = candidates
+        self.vector_ranking = vector_ranking
+        self.structured_ranking = structured_ranking
+        self.scores = scores
+        self.elapsed_ms = elapsed_ms
+        self.reason = reason
+
+    def __repr__(self):
+        return (f"HybridResult(modelnames={self.modelnames}, filters={self.filters}, candidates={len(self.candidates)}, "
+                f"elapsed_ms={self.elapsed_ms:.1f}, reason={self.reason!r})")
+
+
+class HybridRetriever:
+    def __init__(self, model_catalog: ModelCatalog, duckdb_query=None, vector_store=None, intent_classifier=None,
+                 top_k: int = 5, max_candidates: int = 20, rrf_k: int = 60):
+        """
+        查詢沒有指定型號時的混合檢索：先以結構化條件 (系列、記憶體類型、重量/電池/記憶體/TDP 範圍) 在 DuckDB 的
+        specs_normalized 篩選候選型號，再以向量相似度 (只在候選型號中搜尋，Milvus 的 expr 或本地索引的 allowed_ids)
+        與數值排序 (「最輕」、「電池最大」) 排名，兩個排名以 RRF 融合。
+        :param model_catalog: 型號型錄 (提供系列名稱與記憶體中的正規化欄位，SQL 無法使用時作為備援)
+        :param duckdb_query: 提供 filter_models() / rank_models() 的 DuckDBQuery
+        :param vector_store: 提供 search(query_text, top_k, allowed_ids=...) 的 MilvusQuery 或 LocalVectorQuery
+        :param top_k: 沒有數值排序時返回的型號數
+        :param max_candidates: 有數值排序時返回的型號上限 (數值排序的前幾名一併交給規則引擎，避免漏掉真正的第一名)
+        :param rrf_k: RRF 的平滑常數
+        """
+        self.model_catalog = model_catalog
+        self.duckdb_query = duckdb_query
+        self.vector_store = vector_store
+        self.intent_classifier = intent_classifier if intent_classifier is not None else QueryIntentClassifier()
+        self.top_k = top_k
+        self.max_candidates = max_candidates
+        self.rrf_k = rrf_k
+        self._parser = None
+        self._lock = threading.Lock()
+        self.stats = {"retrievals": 0, "empty": 0, "filtered": 0, "vector_failures": 0, "total_ms": 0.0}
+
+    @property
+    def parser(self) -> QueryFilterParser:
+        """系列名稱隨型錄版本更新"""
+        catalog = self.model_catalog.snapshot
+        parser = self._parser
+        if parser is None or parser[0] != catalog.version:
+            parser = self._parser = (catalog.version, QueryFilterParser(catalog.modeltypes))
+        return parser[1]
+
+    def filter_candidates(self, filters: QueryFilters) -> list:
+        """在 SQL 中篩選候選型號，SQL 無法使用時改以記憶體中的正規化欄位篩選"""
+        catalog = self.model_catalog.snapshot
+        if not filters:
+            return list(catalog.modelnames)
+        filter_models = getattr(self.duckdb_query, "filter_models", None)
+        candidates = None
+        if filter_models is not None:
+            candidates = filter_models(filters.modeltypes, filters.memory_types, filters.ranges)
+        if candidates is None:
+            normalized = self.model_catalog.spec_store.snapshot.normalized
+            candidates = [name for name in catalog.modelnames if filters.matches(normalized.get(name))]
+        return candidates
+
+    def vector_rank(self, query: str, candidates: list, restrict: bool) -> list:
+        """以向量相似度排序候選型號；restrict 為 True 時在向量庫中預先過濾，只搜尋候選型號"""
+        search = getattr(self.vector_store, "search", None)
+        if search is None or not candidates:
+            return []
+        # 融合後最多只取 max_candidates 個型號，更後面的名次不影響結果
+        top_k = min(len(candidates), self.max_candidates)
+        try:
+            if restrict:
+                hits = search(query, top_k=top_k, allowed_ids=candidates)
+            else:
+                hits = search(query, top_k=top_k)
+        except Exception as e:
+            self.stats["vector_failures"] += 1
+            print(f"向量檢索失敗，只使用結構化條件: {e}")
+            return []
+        allowed = set(candidates)
+        ranking = []
+        for hit in hits or []:
+            modelname = hit.get("modelname") or hit.get("id")
+            if modelname in allowed and modelname not in ranking:
+                ranking.append(modelname)
+        return ranking
+
+    def structured_rank(self, query: str, candidates: list, filters: QueryFilters) -> list:
+        """
+        查詢有「最輕」、「電池最大」之類的排序時，依 specs_normalized 的數值排序候選型號 (前 max_candidates 名)。
+        篩選條件直接帶入排序的 SQL，不必把候選型號逐一傳回資料庫。
+        """
+        intent = self.intent_classifier.classify(query, len(candidates))
+        if intent.kind != "rank":
+            return []
+        attribute = SPEC_ATTRIBUTES[intent.attributes[0]]
+        if not attribute.column:
+            return []
+        descending = intent.direction == "max"
+        ranked = None
+        rank_models = getattr(self.duckdb_query, "rank_models", None)
+        if rank_models is not None:
+            ranked = rank_models(None, attribute.column, descending, modeltypes=filters.modeltypes,
+                                 memory_types=filters.memory_types, ranges=filters.ranges, limit=self.max_candidates)
+        if ranked is None:
+            normalized = self.model_catalog.spec_store.snapshot.normalized
+            values = [(name, (normalized.get(name) or {}).get(attribute.column)) for name in candidates]
+            ranked = sorted(((name, value) for name, value in values if value is not None),
+                            key=lambda item: item[1], reverse=descending)[:self.max_candidates]
+        return [name for name, _ in ranked]
+
+    def retrieve(self, query: str, top_k: int | None = None) -> HybridResult:
+        start = time.perf_counter()
+        filters = self.parser.parse(query)
+        candidates, vector_ranking, structured_ranking, scores = [], [], [], {}
+        modelnames = []
+        reason = ""
+        if not filters and not self.intent_classifier.mentions_specs(query):
+            reason = "查詢沒有結構化條件，也沒有提到規格"
+        else:
+            candidates = self.filter_candidates(filters)
+            if not candidates:
+                reason = f"沒有符合條件的型號: {filters}"
+            else:
+                vector_ranking = self.vector_rank(query, candidates, restrict=bool(filters))
+                structured_ranking = self.structured_rank(query, candidates, filters)
+                fused = reciprocal_rank_fusion([ranking for ranking in (vector_ranking, structured_ranking) if ranking],
+                                               k=self.rrf_k)
+                scores = dict(fused)
+                modelnames = [name for name, _ in fused]
+                if not modelnames and filters:
+                    # 向量庫無法使用時，仍以結構化條件的結果回答
+                    modelnames = list(candidates)
+                limit = self.max_candidates if structured_ranking else (top_k or self.top_k)
+                modelnames = modelnames[:limit]
+                if not modelnames:
+                    reason = "向量檢索沒有結果"
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["retrievals"] += 1
+            self.stats["filtered"] += bool(filters)
+            self.stats["empty"] += not modelnames
+            self.stats["total_ms"] += elapsed_ms
+        return HybridResult(modelnames, filters, candidates, vector_ranking, structured_ranking, scores, elapsed_ms,
+                            reason)
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            retrievals = self.stats["retrievals"]
+            return {
+                "retrievals": retrievals,
+                "with_filters": self.stats["filtered"],
+                "empty": self.stats["empty"],
+                "vector_failures": self.stats["vector_failures"],
+                "avg_ms": round(self.stats["total_ms"] / retrievals, 3) if retrievals else 0.0,
+            }
@@ -0,0 +1,294 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from .DatabaseQuery import DatabaseQuery
+from .SpecStore import SpecStore
+from ..Cache.EmbeddingCache import EmbeddingCache
+from ..Embedding.EmbeddingService import get_embedding_service
+
+DEFAULT_INDEX_DIR = os.path.join("sales_rag_app", "db", "vector_index")
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.json"
+META_FILE = "meta.json"
+HNSW_FILE = "hnsw.bin"
+# 向量數達到此門檻且已安裝 hnswlib 時才建立 HNSW 索引，型號目錄很小時精確搜尋更快
+HNSW_MIN_VECTORS = 2000
+
+
+def documents_from_records(records) -> tuple:
+    """
+    將規格記錄整理成每個型號一份文件：返回 (ids, 嵌入用文字, payload)。
+    支援 XLSX 寬表格 (每列一個型號，以 modelname 為鍵) 與 ingest_data.py 的長表格 (model_name, section, feature, value)。
+    """
+    documents = {}
+    for record in records:
+        if "feature" in record and "value" in record:
+            doc_id = str(record.get("model_name") or "")
+            payload = documents.setdefault(doc_id, {"modelname": doc_id})
+            if record.get("value") not in (None, ""):
+                payload[str(record["feature"])] = str(record["value"])
+            continue
+        doc_id = str(record.get("modelname") or "")
+        payload = documents.setdefault(doc_id, {})
+        payload.update({field: value for field, value in record.items() if value not in (None, "")})
+    documents.pop("", None)
+    ids = list(documents)
+    texts = ["\n".join(f"{field}: {value}" for field, value in documents[doc_id].items()) for doc_id in ids]
+    return ids, texts, [documents[doc_id] for doc_id in ids]
+
+
+def _file_signature(path: str | None):
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        return None
+
+
+def write_index(index_dir: str, ids: list, vectors, records: list, model_name: str, source_signature=None,
+                use_hnsw: bool | None = None) -> dict:
+    """
+    將向量寫成可記憶體映射的 float32 檔案 (連同 payload 與描述檔)，先寫入暫存目錄再整個替換，
+    讀取端不會看到寫到一半的索引。use_hnsw 為 None 時向量數達 HNSW_MIN_VECTORS 且已安裝 hnswlib 才建立 HNSW。
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(ids) or len(ids) != len(records):
+        raise ValueError("ids、vectors 與 records 的筆數必須相同")
+    temp_dir = f"{index_dir.rstrip(os.sep)}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    vectors.tofile(os.path.join(temp_dir, VECTORS_FILE))
+    with open(os.path.join(temp_dir, RECORDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, default=str)
+    hnsw_built = False
+    if use_hnsw is None:
+        use_hnsw = len(ids) >= HNSW_MIN_VECTORS
+    if use_hnsw and len(ids):
+        try:
+            import hnswlib
+        except ImportError:
+            print("未安裝 hnswlib，只建立精確搜尋的向量檔")
+        else:
+            index = hnswlib.Index(space="l2", dim=vectors.shape[1])
+            index.init_index(max_elements=len(ids), ef_construction=200, M=16)
+            index.add_items(vectors, np.arange(len(ids)))
+            index.save_index(os.path.join(temp_dir, HNSW_FILE))
+            hnsw_built = True
+    meta = {"model": model_name, "count": len(ids), "dim": int(vectors.shape[1]) if len(ids) else 0,
+            "ids": [str(doc_id) for doc_id in ids], "metric": "L2", "hnsw": hnsw_built,
+            "source_signature": source_signature, "built_at": time.time()}
+    with open(os.path.join(temp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    old_dir = f"{index_dir.rstrip(os.sep)}.{os.getpid()}.old"
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(temp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta
+
+
+def embed_documents_from_duckdb(db_file: str, embedding_service=None, table: str = "specs") -> tuple:
+    """
+    讀取 DuckDB 的規格資料並以每個型號一份文件編碼 (本地索引與 ingest_data.py 的 Milvus collection 共用)。
+    :return: (ids, 嵌入用文字, payload, float32 向量)
+    """
+    embedding_service = embedding_service if embedding_service is not None else get_embedding_service()
+    store = SpecStore(db_file=db_file, table=table)
+    ids, texts, records = documents_from_records(store.snapshot.records)
+    vectors = embedding_service.encode(texts) if texts else np.zeros((0, 0), dtype=np.float32)
+    return ids, texts, records, vectors
+
+
+def build_index_from_duckdb(db_file: str, index_dir: str = DEFAULT_INDEX_DIR, embedding_service=None,
+                            table: str = "specs", use_hnsw: bool | None = None, documents: tuple | None = None) -> dict:
+    """
+    以 DuckDB 的規格資料建立本地向量索引 (ingest 與 LocalVectorQuery 自動重建共用)。
+    :param documents: embed_documents_from_duckdb() 已產生的結果，避免 ingest 時重複編碼
+    """
+    embedding_service = embedding_service if embedding_service is not None else get_embedding_service()
+    start = time.perf_counter()
+    if documents is None:
+        documents = embed_documents_from_duckdb(db_file, embedding_service, table)
+    ids, _, records, vectors = documents
+    meta = write_index(index_dir, ids, vectors, records, getattr(embedding_service, "identity", None) or
+                       getattr(embedding_service, "model_name", ""), _file_signature(db_file), use_hnsw)
+    print(f"成功建立本地向量索引: {index_dir} ({meta['count']} 筆, 維度 {meta['dim']}, "
+          f"HNSW: {meta['hnsw']})，耗時 {time.perf_counter() - start:.1f}s")
+    return meta
+
+
+
+class LoadedIndex:
+    def __init__(self, meta: dict, records: list, vectors, hnsw=None):
+        """
+        已載入的索引 (不可變)，重建時整個替換，查詢中途不會看到新舊混合的資料。
+        向量以記憶體映射方式讀取，多個行程共用同一份頁快取。
+        """
+        self.meta = meta
+        self.ids = meta["ids"]
+        self.records = records
+        self.position = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.vectors = vectors
+        # ||v||² 只計算一次，查詢時 ||v - q||² = ||v||² - 2 v·q + ||q||²
+        self.norms = np.einsum("ij,ij->i", vectors, vectors) if len(vectors) else np.zeros(0, dtype=np.float32)
+        self.hnsw = hnsw
+
+
+class LocalVectorQuery(DatabaseQuery):
+    def __init__(self, index_dir: str | None = None, db_file: str | None = None, embedding_service=None,
+                 query_cache=None, use_hnsw: bool | None = None, ef_search: int = 64):
+        """
+        不需要 Milvus 的本地向量檢索：向量檔以記憶體映射 (np.memmap) 載入，預設以 NumPy 精確搜尋，
+        索引建有 HNSW 且已安裝 hnswlib 時改用 HNSW。search(query_text, top_k) 的回傳格式與 MilvusQuery 相同
+        (payload 欄位 + id + distance，distance 為平方 L2 距離)。
+        第一次查詢時才載入索引；指定 db_file 時，索引不存在或資料庫已重新 ingest 會自動重建。
+        :param index_dir: 索引目錄，預設讀取環境變數 LOCAL_VECTOR_DIR (sales_rag_app/db/vector_index)
+        :param db_file: 建立索引的 DuckDB 規格資料庫
+        :param use_hnsw: 是否使用 HNSW (索引中有 HNSW 時預設使用)
+        :param ef_search: HNSW 搜尋時的候選數
+        """
+        self.index_dir = index_dir or os.getenv("LOCAL_VECTOR_DIR", DEFAULT_INDEX_DIR)
+        self.db_file = db_file
+        self.embedding_model = embedding_service if embedding_service is not None else get_embedding_service()
+        self.query_cache = query_cache if query_cache is not None else EmbeddingCache()
+        self.use_hnsw = use_hnsw
+        self.ef_search = ef_search
+        self._lock = threading.Lock()
+        self._index = None
+        self.stats = {"searches": 0, "exact": 0, "hnsw": 0, "total_ms": 0.0}
+
+    @property
+    def index(self) -> LoadedIndex:
+        """目前的索引；尚未載入或資料庫已重新 ingest 時先 (重新) 載入"""
+        index = self._index
+        if index is None or (self.db_file and index.meta.get("source_signature") != _file_signature(self.db_file)):
+            with self._lock:
+                if self._index is index:
+                    self._index = self._load_index()
+                index = self._index
+        return index
+
+    def connect(self):
+        """載入索引 (必要時先重建)"""
+        with self._lock:
+            self._index = self._load_index()
+
+    def _load_index(self) -> LoadedIndex:
+        meta_path = os.path.join(self.index_dir, META_FILE)
+        meta = None
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        if self.db_file and (meta is None or meta.get("source_signature") != _file_signature(self.db_file)):
+            meta = build_index_from_duckdb(self.db_file, self.index_dir, self.embedding_model)
+        if meta is None:
+            raise FileNotFoundError(f"本地向量索引不存在: {self.index_dir}")
+        with open(os.path.join(self.index_dir, RECORDS_FILE), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        if meta["count"]:
+            vectors = np.memmap(os.path.join(self.index_dir, VECTORS_FILE), dtype=np.float32, mode="r",
+                                shape=(meta["count"], meta["dim"]))
+        else:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        hnsw = None
+        if meta.get("hnsw") and self.use_hnsw is not False:
+            try:
+                import hnswlib
+            except ImportError:
+                print("未安裝 hnswlib，本地向量檢索改用精確搜尋")
+            else:
+                hnsw = hnswlib.Index(space="l2", dim=meta["dim"])
+                hnsw.load_index(os.path.join(self.index_dir, HNSW_FILE), max_elements=meta["count"])
+                hnsw.set_ef(max(self.ef_search, 1))
+        print(f"成功載入本地向量索引: {self.index_dir} ({meta['count']} 筆, {'HNSW' if hnsw is not None else '精確搜尋'})")
+        return LoadedIndex(meta, records, vectors, hnsw)
+
+    def embed_query(self, query_text: str) -> np.ndarray:
+        """取得查詢的 float32 向量，相同 (模型, 正規化查詢) 只計算一次"""
+        model_name = getattr(self.embedding_model, "identity", None) or \
+            getattr(self.embedding_model, "model_name", type(self.embedding_model).__name__)
+        return self.query_cache.get_or_compute(model_name, query_text, self.embedding_model.embed_query)
+
+    def search_vector(self, query_vector, top_k: int = 5, allowed_ids=None) -> list:
+        """
+        以向量搜尋，返回 [(id, 平方 L2 距離)]，依距離由近到遠排序。
+        :param allowed_ids: 只在這些 id 中搜尋 (結構化條件的預先過濾)，此時一律精確搜尋
+        """
+        index = self.index
+        start = time.perf_counter()
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        rows = None
+        if allowed_ids is not None:
+            rows = np.array(sorted(index.position[doc_id] for doc_id in allowed_ids if doc_id in index.position),
+                            dtype=np.int64)
+        count = len(index.ids) if rows is None else len(rows)
+        top_k = min(top_k, count)
+        if top_k <= 0:
+            return []
+        if rows is None and index.hnsw is not None:
+            labels, distances = index.hnsw.knn_query(query_vector, k=top_k)
+            results = [(index.ids[int(label)], float(distance)) for label, distance in zip(labels[0], distances[0])]
+            self.stats["hnsw"] += 1
+        else:
+            if rows is None or len(rows) * 4 > len(index.ids):
+                # 候選佔大部分時直接計算全部距離再取子集，比複製候選向量快
+                distances = index.norms - 2 * (index.vectors @ query_vector) + float(query_vector @ query_vector)
+                if rows is not None:
+                    distances = distances[rows]
+            else:
+                distances = index.norms[rows] - 2 * (index.vectors[rows] @ query_vector) + float(query_vector @ query_vector)
+            order = np.argpartition(distances, top_k - 1)[:top_k] if top_k < count else np.arange(count)
+            order = order[np.argsort(distances[order], kind="stable")]
+            labels = order if rows is None else rows[order]
+            results = [(index.ids[int(label)], max(float(distances[i]), 0.0)) for label, i in zip(labels, order)]
+            self.stats["exact"] += 1
+        self.stats["searches"] += 1
+        self.stats["total_ms"] += (time.perf_counter() - start) * 1000
+        return results
+
+    def get_record(self, doc_id: str) -> dict | None:
+        index = self.index
+        position = index.position.get(doc_id)
+        return index.records[position] if position is not None else None
+
+    def search(self, query_text: str, top_k=5, allowed_ids=None) -> list:
+        """與 MilvusQuery.search 相同的回傳格式：每筆為 payload 欄位加上 id 與 distance"""
+        results = []
+        for doc_id, distance in self.search_vector(self.embed_query(query_text), top_k, allowed_ids):
+            entity_data = dict(self.get_record(doc_id))
+            entity_data['id'] = doc_id
+            entity_data['distance'] = distance
+            results.append(entity_data)
+        return results
+
+    def query(self, *args, **kwargs):
+        if 'query_text' in kwargs:
+            return self.search(kwargs['query_text'], kwargs.get('top_k', 5))
+        return "請提供 'query_text' 參數。"
+
+    def get_metrics(self) -> dict:
+        index = self._index
+        searches = self.stats["searches"]
+        return {
+            "backend": "local",
+            "index_dir": self.index_dir,
+            "loaded": index is not None,
+            "vectors": len(index.ids) if index else 0,
+            "hnsw": index is not None and index.hnsw is not None,
+            "searches": searches,
+            "exact_searches": self.stats["exact"],
+            "hnsw_searches": self.stats["hnsw"],
+            "avg_search_ms": round(self.stats["total_ms"] / searches, 3) if searches else 0.0,
+            "query_cache": self.query_cache.get_metrics(),
+        }
+
+    def disconnect(self):
+        with self._lock:
+            self._index = None
@@ -1,15 +1,64 @@
-from pymilvus import connections, utility, Collection
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import json
+from pymilvus import connections, utility, Collection, CollectionSchema, FieldSchema, DataType
 from .DatabaseQuery import DatabaseQuery
+from ..Embedding.EmbeddingService import get_embedding_service
+from ..Cache.EmbeddingCache import EmbeddingCache
+
+# ingest_data.py 建立的規格 collection：每個型號一筆，modelname 欄位供混合檢索在搜尋前過濾候選型號
+SPEC_COLLECTION = "sales_notebook_specs"
+MODELNAME_FIELD = "modelname"
+TEXT_MAX_LENGTH = 65535
+_VECTOR_TYPES = (DataType.FLOAT_VECTOR, DataType.BINARY_VECTOR)
+
+
+def spec_collection_schema(dim: int) -> CollectionSchema:
+    """規格 collection 的 schema (ingest_data.py 建立 collection 與測試共用)"""
+    fields = [
+        FieldSchema(name="pk", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=200),
+        FieldSchema(name=MODELNAME_FIELD, dtype=DataType.VARCHAR, max_length=200),
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=TEXT_MAX_LENGTH),
+        FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=200),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim)
+    ]
+    return CollectionSchema(fields, "銷售筆電規格知識庫 (每個型號一筆)")
+
+
+def spec_entities(ids: list, texts: list, vectors, source: str) -> list:
+    """
+    將 LocalVectorQuery.documents_from_records() 的文件轉成 spec_collection_schema() 欄位順序的插入資料。
+    文件 id 即型號名稱；文字超過 VARCHAR 上限 (以 UTF-8 位元組計) 時截斷。
+    """
+    texts = [text.encode("utf-8")[:TEXT_MAX_LENGTH].decode("utf-8", errors="ignore") for text in texts]
+    return [list(ids), list(ids), texts, [source] * len(ids), [list(map(float, vector)) for vector in vectors]]
+
+
+def output_fields_for(schema) -> list:
+    """collection 中可回傳的純量欄位 (向量欄位除外)"""
+    return [field.name for field in schema.fields if field.dtype not in _VECTOR_TYPES]
+
+
+def filter_expr(schema, allowed_ids=None, expr: str | None = None) -> str | None:
+    """
+    組出搜尋的過濾運算式：allowed_ids 轉為 modelname in [...]，與 expr 同時指定時兩者皆須符合。
+    collection 沒有 modelname 欄位 (舊版 ingest 的文字區塊) 時無法依型號過濾，拋出 ValueError。
+    """
+    if allowed_ids is None:
+        return expr
+    if MODELNAME_FIELD not in {field.name for field in schema.fields}:
+        raise ValueError(f"Collection 沒有 {MODELNAME_FIELD} 欄位，無法依型號過濾，請以 ingest_data.py 重新匯入")
+    ids_expr = f"{MODELNAME_FIELD} in {json.dumps([str(doc_id) for doc_id in allowed_ids], ensure_ascii=False)}"
+    return f"({expr}) and {ids_expr}" if expr else ids_expr
 
 class MilvusQuery(DatabaseQuery):
-    def __init__(self, host="localhost", port="19530", collection_name=None):
+    def __init__(self, host="localhost", port="19530", collection_name=None, embedding_service=None, query_cache=None):
         self.host = host
         self.port = port
         self.collection_name = collection_name
         self.collection = None
-        # 使用與 ingest_data.py 相同的嵌入模型
-        self.embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # 使用與 ingest_data.py 相同的嵌入模型 (行程內共用，同時到達的查詢合併成批次編碼)
+        self.embedding_model = embedding_service if embedding_service is not None else get_embedding_service()
+        # 相同查詢不再重新向量化 (快取鍵包含嵌入模型名稱)
+        self.query_cache = query_cache if query_cache is not None else EmbeddingCache()
         self.connect()
         if self.collection_name:
             # 指定新的 collection 名稱
@@ -35,39 +84,34 @@ class MilvusQuery(DatabaseQuery):
         except Exception as e:
             print(f"設定 Collection 失敗: {e}")
 
-    def search(self, query_text: str, top_k=5):
+    def search(self, query_text: str, top_k=5, allowed_ids=None, expr: str | None = None):
+        """
+        :param allowed_ids: 只在這些型號中搜尋 (轉為 modelname in [...] 的 expr，由 Milvus 在搜尋前過濾)
+        :param expr: 直接指定的 Milvus 布林過濾運算式，與 allowed_ids 同時指定時兩者皆須符合
+        """
         if not self.collection:
             print("錯誤: 未設定 Collection。")
             return []
 
-        # 1. 將查詢文本向量化
-        query_vector = self.embedding_model.embed_query(query_text)
+        # 1. 將查詢文本向量化 (命中快取時直接使用)
+        query_vector = self.embed_query(query_text)
 
         # 2. 定義要從 Milvus 回傳的欄位
-        #    這些欄位名稱必須與 ingest_data.py 中建立的 Schema 完全對應
-        # output_fields = [
-        #     'Product', 'Segment', 'Model_Year', 'KB_Language', 'OS', 
-        #     'Processor', 'Memory', 'Storage', 'Screen_Spec', 'Touch', 
-        #     'Color', 'Communication', 'Camera', 'Graphics', 'Audio', 
-        #     'Adapter', 'Battery', 'Finger_Print', 'TPM', 'Card_Reader', 
-        #     'Backlit', 'Pen', 'Weight', 'DimensionWDH'
-        # ]
-        output_fields = [
-            'modeltype', 'version', 'modelname', 'mainboard', 'devtime', 'pm', 
-            'structconfig', 'lcd', 'touchpanel', 'iointerface', 'ledind', 
-            'powerbutton', 'keyboard', 'webcamera', 'touchpad', 'fingerprint', 
-            'audio', 'battery', 'cpu', 'gpu', 'memory', 'lcdconnector', 'storage', 
-            'wifislot', 'thermal', 'tpm', 'rtc', 'wireless', 'lan', 'bluetooth', 
-            'softwareconfig', 'ai', 'accessory', 'otherfeatures', 'certfications'
-        ]
+        #    依載入的 collection schema 決定 (ingest_data.py 的規格 collection 或 XLSX 寬表格的 collection)，
+        #    不會要求不存在的欄位
+        output_fields = output_fields_for(self.collection.schema)
 
         # 3. 執行向量搜尋
         search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
+        if allowed_ids is not None and not allowed_ids:
+            return []
+        expr = filter_expr(self.collection.schema, allowed_ids, expr)
         results = self.collection.search(
-            data=[query_vector],
+            data=[query_vector.tolist()],
             anns_field="embedding",
             param=search_params,
             limit=top_k,
+            expr=expr,
             output_fields=output_fields # ★ 修改點：使用新的欄位列表
         )
 
@@ -88,6 +132,16 @@ class MilvusQuery(DatabaseQuery):
             
         return formatted_results
 
+    def embed_query(self, query_text: str):
+        """取得查詢的 float32 向量，相同 (模型, 正規化查詢) 只計算一次"""
+        # 快取鍵包含模型名稱與推論後端 (量化模型的向量與原模型略有差異)
+        model_name = getattr(self.embedding_model, "identity", None) or \
+            getattr(self.embedding_model, "model_name", type(self.embedding_model).__name__)
+        return self.query_cache.get_or_compute(model_name, query_text, self.embedding_model.embed_query)
+
+    def get_metrics(self) -> dict:
+        return {"query_cache": self.query_cache.get_metrics()}
+
     def query(self, *args, **kwargs):
         # 在這個類別中，我們使用 search 方法進行主要操作
         if 'query_text' in kwargs:
@@ -0,0 +1,82 @@
+import threading
+from types import MappingProxyType
+
+from .SpecStore import SpecStore
+from ..Tools.ModelNameMatcher import ModelNameMatcher
+from ..Tools.ModelNameSuggester import ModelNameSuggester
+
+
+class CatalogSnapshot:
+    def __init__(self, by_modeltype, modelnames, version: int):
+        """
+        某一版本的型號型錄，所有查詢皆為 O(1) 的集合/字典操作。
+        :param by_modeltype: modeltype -> 型號列表
+        :param modelnames: 所有型號名稱
+        :param version: 對應的 SpecStore 版本
+        """
+        self.version = version
+        self.modelnames = tuple(sorted(modelnames))
+        self.modeltypes = tuple(sorted(by_modeltype))
+        self.modelname_set = frozenset(self.modelnames)
+        self.modeltype_set = frozenset(self.modeltypes)
+        self.models_by_type = MappingProxyType({modeltype: tuple(models) for modeltype, models in by_modeltype.items()})
+        self.matcher = ModelNameMatcher(self.modelnames)
+        self.suggester = ModelNameSuggester(self.modelnames)
+
+
+class ModelCatalog:
+    def __init__(self, spec_store: SpecStore):
+        """
+        由 SpecStore 衍生的型號型錄 (所有 modelname / modeltype 與 type -> models 對應)。
+        SpecStore 偵測到資料庫重新 ingest 後版本會遞增，型錄在下一次存取時自動重建。
+        :param spec_store: 規格索引
+        """
+        self.spec_store = spec_store
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """目前的型錄 (版本落後時重建)"""
+        store_snapshot = self.spec_store.snapshot
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != store_snapshot.version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != store_snapshot.version:
+                    snapshot = CatalogSnapshot(store_snapshot.by_modeltype, store_snapshot.by_modelname,
+                                               store_snapshot.version)
+                    self._snapshot = snapshot
+                    print(f"型號型錄已更新 (版本 {snapshot.version})：{len(snapshot.modelnames)} 個型號，"
+                          f"{len(snapshot.modeltypes)} 個系列")
+        return snapshot
+
+    @property
+    def modelnames(self) -> tuple:
+        return self.snapshot.modelnames
+
+    @property
+    def modeltypes(self) -> tuple:
+        return self.snapshot.modeltypes
+
+    @property
+    def matcher(self) -> ModelNameMatcher:
+        return self.snapshot.matcher
+
+    def suggest(self, text: str, k: int = 3) -> list:
+        """返回與輸入最接近的 k 個型號 (用於型號打錯時的建議)"""
+        return self.snapshot.suggester.suggest(text, k)
+
+    def has_modelname(self, modelname: str) -> bool:
+        return modelname in self.snapshot.modelname_set
+
+    def has_modeltype(self, modeltype: str) -> bool:
+        return modeltype in self.snapshot.modeltype_set
+
+    def get_models_by_type(self, modeltype: str) -> tuple:
+        return self.snapshot.models_by_type.get(str(modeltype), ())
+
+    def reload(self) -> CatalogSnapshot:
+        """ingest 完成後可呼叫此方法立即重新載入，不必等待檔案變更偵測"""
+        self.spec_store.reload()
+        return self.snapshot
@@ -0,0 +1,84 @@
+import sys
+
+import duckdb
+
+from ..Tools.SpecExtractor import battery_wh, cpu_models, gpu_models, memory_max_gb, memory_type, tdp_w, weight_g
+
+NORMALIZED_TABLE = "specs_normalized"
+
+# 正規化欄位 -> (DuckDB 型別, 擷取函數)，擷取函數與規則引擎共用 SpecExtractor
+NORMALIZED_COLUMNS = {
+    "cpu_model": ("VARCHAR", cpu_models),
+    "gpu_model": ("VARCHAR", gpu_models),
+    "memory_type": ("VARCHAR", memory_type),
+    "memory_gb": ("DOUBLE", memory_max_gb),
+    "battery_wh": ("DOUBLE", battery_wh),
+    "weight_g": ("DOUBLE", weight_g),
+    "tdp_w": ("DOUBLE", tdp_w),
+}
+
+# 可在 SQL 中排序的數值欄位
+NUMERIC_COLUMNS = tuple(column for column, (column_type, _) in NORMALIZED_COLUMNS.items() if column_type == "DOUBLE")
+
+# 擷取時需要的原始欄位
+SOURCE_FIELDS = ("modelname", "modeltype", "cpu", "gpu", "memory", "battery", "structconfig", "thermal")
+
+
+def normalize_record(record) -> dict:
+    """將一筆原始規格記錄轉為正規化欄位 (擷取失敗的欄位為 None)"""
+    normalized = {"modelname": record.get("modelname"), "modeltype": record.get("modeltype")}
+    for column, (_, extract) in NORMALIZED_COLUMNS.items():
+        normalized[column] = extract(record)
+    return normalized
+
+
+def build_normalized_table(connection, source_table: str = "specs", table: str = NORMALIZED_TABLE) -> int:
+    """
+    在 ingest 時由 specs 資料表建立 specs_normalized 資料表 (每個型號一列、欄位為已解析的型別化數值)，
+    請求時直接讀取數值並以 SQL 排序，不再逐次以正規表示式解析原始文字。
+    :param connection: 可寫入的 DuckDB 連線
+    :param source_table: 原始規格資料表 (XLSX ingest 產生的寬表格)
+    :param table: 輸出的資料表名稱
+    :return: 寫入的列數，來源資料表缺少必要欄位時為 0
+    """
+    columns = [row[0] for row in connection.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?", [source_table]).fetchall()]
+    missing = [field for field in SOURCE_FIELDS if field not in columns]
+    if missing:
+        print(f"資料表 '{source_table}' 缺少欄位 {missing}，略過建立 '{table}'。")
+        return 0
+
+    projection = ", ".join(f'"{field}"' for field in SOURCE_FIELDS)
+    cursor = connection.execute(f'SELECT {projection} FROM "{source_table}"')
+    rows = []
+    seen = set()
+    for values in cursor.fetchall():
+        record = dict(zip(SOURCE_FIELDS, values))
+        modelname = record["modelname"]
+        if not modelname or str(modelname).lower() == "nan" or modelname in seen:
+            continue
+        seen.add(modelname)
+        normalized = normalize_record(record)
+        rows.append(tuple(normalized.values()))
+
+    schema = ", ".join(["modelname VARCHAR PRIMARY KEY", "modeltype VARCHAR"] +
+                       [f"{column} {column_type}" for column, (column_type, _) in NORMALIZED_COLUMNS.items()])
+    connection.execute(f'CREATE OR REPLACE TABLE "{table}" ({schema})')
+    if rows:
+        placeholders = ", ".join(["?"] * (2 + len(NORMALIZED_COLUMNS)))
+        connection.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', rows)
+    print(f"成功建立 '{table}' 資料表：{len(rows)} 個型號，欄位 {list(NORMALIZED_COLUMNS)}")
+    return len(rows)
+
+
+def main(db_file: str = "sales_rag_app/db/sales_specs.db"):
+    """為既有的資料庫補建正規化資料表：python -m sales_rag_app.libs.RAG.DB.SpecNormalizer [db_file]"""
+    connection = duckdb.connect(database=db_file, read_only=False)
+    try:
+        build_normalized_table(connection)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from types import MappingProxyType
+
+import duckdb
+
+from .SpecNormalizer import NORMALIZED_TABLE, normalize_record
+
+
+class FrozenSpec(dict):
+    """唯讀的規格記錄：可直接交給 json.dumps，但禁止任何修改"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("規格記錄為唯讀，請先複製 (dict(record)) 再修改。")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+
+class SpecSnapshot:
+    def __init__(self, fields: tuple, records: tuple, signature=None, version: int = 0, normalized: dict | None = None):
+        """
+        某一時間點的 specs 資料表內容，建立後不再變動。
+        :param fields: 欄位名稱 (與資料表順序一致)
+        :param records: FrozenSpec 記錄
+        :param signature: 建立快照時資料庫檔案的簽章，用於偵測變更
+        :param version: 快照版本，每次重新載入遞增
+        :param normalized: modelname -> specs_normalized 的型別化欄位 (weight_g、battery_wh 等)
+        """
+        self.fields = fields
+        self.records = records
+        self.signature = signature
+        self.version = version
+        self.loaded_at = time.time()
+
+        by_modelname = {}
+        by_modeltype = {}
+        for record in records:
+            modelname = record.get("modelname")
+            if not modelname or str(modelname).lower() == "nan" or modelname in by_modelname:
+                continue
+            by_modelname[modelname] = record
+            modeltype = record.get("modeltype")
+            if modeltype and str(modeltype).lower() != "nan":
+                by_modeltype.setdefault(str(modeltype), []).append(modelname)
+
+        self.by_modelname = MappingProxyType(by_modelname)
+        self.by_modeltype = MappingProxyType({k: tuple(sorted(v)) for k, v in by_modeltype.items()})
+        self.normalized = MappingProxyType({modelname: FrozenSpec(values) for modelname, values in (normalized or {}).items()})
+
+
+class SpecStore:
+    def __init__(self, db_file: str, table: str = "specs", check_interval: float | None = None):
+        """
+        常駐記憶體的規格索引，啟動時從 DuckDB 載入整個 specs 資料表，之後的查詢不再經過 DuckDB。
+        資料庫檔案變更 (重新 ingest) 時會重新載入並以單次指派原子性地切換快照。
+        :param db_file: DuckDB 資料庫檔案路徑
+        :param table: 規格資料表名稱
+        :param check_interval: 檢查檔案變更的最短間隔秒數，預設讀取環境變數 SPEC_STORE_CHECK_INTERVAL (2)
+        """
+        if check_interval is None:
+            check_interval = float(os.getenv("SPEC_STORE_CHECK_INTERVAL", "2"))
+        self.db_file = db_file
+        self.table = table
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._snapshot = SpecSnapshot((), ())
+        self.reload()
+
+    @property
+    def snapshot(self) -> SpecSnapshot:
+        """目前的快照 (必要時先重新載入)"""
+        self.refresh_if_changed()
+        return self._snapshot
+
+    def get_record(self, modelname: str) -> FrozenSpec | None:
+        """取得單一型號的規格記錄"""
+        return self.snapshot.by_modelname.get(modelname)
+
+    def get_records(self, modelnames: list) -> list:
+        """依傳入順序取得多個型號的規格記錄，不存在的型號會被略過"""
+        by_modelname = self.snapshot.by_modelname
+        return [by_modelname[name] for name in modelnames if name in by_modelname]
+
+    def get_normalized(self, modelname: str) -> FrozenSpec | None:
+        """取得單一型號在 specs_normalized 中的型別化欄位"""
+        return self.snapshot.normalized.get(modelname)
+
+    def rank_models(self, modelnames: list, column: str, descending: bool = False) -> list | None:
+        """
+        依記憶體中 specs_normalized 的數值欄位排序型號 (與 DuckDBQuery.rank_models 相同的順序：數值，其次型號名稱)，
+        請求路徑上不必查詢 DuckDB。缺少數值的型號不列入。
+        :return: [(modelname, 數值), ...]，資料庫沒有 specs_normalized 時為 None
+        """
+        normalized = self.snapshot.normalized
+        if not normalized:
+            return None
+        values = [(name, (normalized.get(name) or {}).get(column)) for name in dict.fromkeys(modelnames)]
+        ranked = sorted(((name, value) for name, value in values if value is not None), key=lambda item: item[0])
+        return sorted(ranked, key=lambda item: item[1], reverse=descending)
+
+    def get_models_by_type(self, modeltype: str) -> tuple:
+        """取得某個 modeltype 下的所有型號"""
+        return self.snapshot.by_modeltype.get(str(modeltype), ())
+
+    def refresh_if_changed(self) -> bool:
+        """檔案簽章改變時重新載入，返回是否發生重新載入"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        if self._read_signature() == self._snapshot.signature:
+            return False
+        return self.reload()
+
+    def reload(self) -> bool:
+        """重新從資料庫載入並切換快照，失敗時保留舊快照"""
+        with self._lock:
+            signature = self._read_signature()
+            try:
+                connection = duckdb.connect(database=self.db_file, read_only=True)
+                try:
+                    cursor = connection.execute(f"SELECT * FROM {self.table}")
+                    fields = tuple(column[0] for column in cursor.description)
+                    rows = cursor.fetchall()
+                    normalized = self._load_normalized(connection)
+                finally:
+                    connection.close()
+            except Exception as e:
+                print(f"載入規格資料失敗，保留舊的快照: {e}")
+                return False
+
+            records = tuple(FrozenSpec(zip(fields, row)) for row in rows)
+            if normalized is None:
+                # 舊版資料庫沒有 specs_normalized 時，載入時解析一次，請求時同樣只讀取數值
+                print(f"資料庫中沒有 '{NORMALIZED_TABLE}' 資料表，改為載入時解析規格文字。")
+                normalized = {}
+                for record in records:
+                    if record.get("modelname") and record["modelname"] not in normalized:
+                        normalized[record["modelname"]] = normalize_record(record)
+            # 以單次指派切換快照，讀取端不會看到載入到一半的資料
+            self._snapshot = SpecSnapshot(fields, records, signature, self.version + 1, normalized)
+            self.version += 1
+            print(f"成功載入 {len(records)} 筆規格資料至記憶體 (版本 {self.version})")
+            return True
+
+    def _load_normalized(self, connection) -> dict | None:
+        """讀取 ingest 時建立的 specs_normalized 資料表，不存在時返回 None"""
+        try:
+            cursor = connection.execute(f'SELECT * FROM "{NORMALIZED_TABLE}"')
+        except duckdb.CatalogException:
+            return None
+        columns = [column[0] for column in cursor.description]
+        rows = (dict(zip(columns, row)) for row in cursor.fetchall())
+        return {row["modelname"]: row for row in rows}
+
+    def _read_signature(self):
+        try:
+            stat = os.stat(self.db_file)
+            return stat.st_ino, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# 推論後端：torch (SentenceTransformer)、onnx (ONNX Runtime)、onnx-int8 (int8 動態量化的 ONNX 模型)
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def resolve_embedding_backend(backend: str | None = None) -> str:
+    """推論後端：參數 > 環境變數 EMBEDDING_BACKEND > torch"""
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).strip().lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"不支援的嵌入後端: {backend} (可用: {', '.join(EMBEDDING_BACKENDS)})")
+    return backend
+
+
+def get_embedding_service(model_name: str | None = None, backend: str | None = None) -> "EmbeddingService":
+    """
+    取得行程內共用的嵌入服務 (每個模型與後端只載入一次)，MilvusQuery、ingest 與其他服務都應透過此函數取得。
+    :param model_name: 模型名稱，預設讀取環境變數 EMBEDDING_MODEL (all-MiniLM-L6-v2)
+    :param backend: 推論後端 (見 resolve_embedding_backend)
+    """
+    model_name = model_name or os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+    backend = resolve_embedding_backend(backend)
+    with _services_lock:
+        service = _services.get((model_name, backend))
+        if service is None:
+            service = _services[(model_name, backend)] = EmbeddingService(model_name, backend=backend)
+        return service
+
+
+class EmbeddingService:
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, encoder=None, batch_window_ms: float | None = None,
+                 max_batch_size: int = 32, device: str = "cpu", backend: str | None = None):
+        """
+        句向量嵌入服務 (SentenceTransformer 或 ONNX Runtime)，提供與 langchain Embeddings 相同的 embed_query() / embed_documents() 介面。
+        模型在第一次使用時才載入。同時到達的 embed_query() 會在 batch_window_ms 內合併成一個批次編碼，
+        CPU 上一次編碼多筆的吞吐量遠高於逐筆編碼。
+        :param encoder: 提供 encode(texts, batch_size=...) 的模型實例，未指定時依 backend 載入 SentenceTransformer 或 OnnxEncoder
+        :param batch_window_ms: 合併查詢的等待時間，預設讀取環境變數 EMBEDDING_BATCH_WINDOW_MS (3)，0 表示不等待
+        :param max_batch_size: 單一批次的最大筆數
+        :param backend: 推論後端 (見 resolve_embedding_backend)，onnx 後端只支援 CPU
+        """
+        if batch_window_ms is None:
+            batch_window_ms = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "3"))
+        self.model_name = model_name
+        self.backend = resolve_embedding_backend(backend)
+        # 快取查詢向量時使用的名稱：量化模型的向量與原模型略有差異，不可共用快取
+        self.identity = model_name if self.backend == "torch" else f"{model_name}:{self.backend}"
+        self.device = device
+        self.batch_window = max(0.0, batch_window_ms) / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self._encoder = encoder
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # 負責者交出身分時喚醒等待中的呼叫
+        self._ready = threading.Condition(self._lock)
+        self._pending = []
+        self._collecting = False
+        self.stats = {"queries": 0, "documents": 0, "batches": 0, "max_batch": 0, "encode_seconds": 0.0}
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            with self._load_lock:
+                if self._encoder is None:
+                    self._encoder = self._load_encoder()
+        return self._encoder
+
+    def _load_encoder(self):
+        start = time.perf_counter()
+        if self.backend == "torch":
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer(self.model_name, device=self.device)
+        else:
+            from .OnnxEncoder import OnnxEncoder
+            encoder = OnnxEncoder(self.model_name, quantize=self.backend == "onnx-int8")
+        print(f"成功載入嵌入模型: {self.model_name} ({self.backend}, {self.device})，耗時 {time.perf_counter() - start:.1f}s")
+        return encoder
+
+    def encode(self, texts: list) -> np.ndarray:
+        """直接編碼一批文字，返回 (筆數, 維度) 的 float32 陣列"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        start = time.perf_counter()
+        vectors = np.asarray(self.encoder.encode(list(texts), batch_size=self.max_batch_size), dtype=np.float32)
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(texts))
+            self.stats["encode_seconds"] += time.perf_counter() - start
+        return vectors
+
+    def embed_documents(self, texts: list) -> list:
+        """編碼多筆文件 (ingest 使用)"""
+        with self._lock:
+            self.stats["documents"] += len(texts)
+        return self.encode(texts).tolist()
+
+    def embed_query_vector(self, text: str) -> np.ndarray:
+        """
+        編碼單一查詢，返回 float32 向量。
+        沒有負責者時，呼叫成為批次的負責者：等待 batch_window 收集其他執行緒的查詢後編碼一個批次，
+        然後交出負責者身分，由仍在等待的呼叫之一接手下一批；其餘呼叫只需等待結果。
+        """
+        future = Future()
+        waited = False
+        with self._lock:
+            self.stats["queries"] += 1
+            self._pending.append((text, future))
+        while True:
+            with self._ready:
+                while self._collecting and not future.done():
+                    waited = True
+                    self._ready.wait()
+                if future.done():
+                    return future.result()
+                self._collecting = True
+            # 接手的負責者在等待期間已累積了查詢，不必再等 batch_window
+            if self.batch_window and not waited:
+                time.sleep(self.batch_window)
+            self._drain()
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_query_vector(text).tolist()
+
+    def _drain(self):
+        """編碼佇列最前面的一個批次，然後交出負責者身分並喚醒等待中的呼叫"""
+        with self._lock:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+        try:
+            vectors = self.encode([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+        finally:
+            with self._ready:
+                self._collecting = False
+                self._ready.notify_all()
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            embedded = self.stats["queries"] + self.stats["documents"]
+            seconds = self.stats["encode_seconds"]
+            return {
+                "model": self.model_name,
+                "backend": self.backend,
+                "loaded": self._encoder is not None,
+                "queries": self.stats["queries"],
+                "documents": self.stats["documents"],
+                "batches": self.stats["batches"],
+                "avg_batch": round(embedded / self.stats["batches"], 2) if self.stats["batches"] else 0.0,
+                "max_batch": self.stats["max_batch"],
+                "embeddings_per_sec": round(embedded / seconds, 1) if seconds else None,
+            }
@@ -0,0 +1,110 @@
+import os
+import time
+
+import numpy as np
+
+# 匯出後的 ONNX 模型存放目錄，每個 (模型, 是否量化) 一個子目錄
+DEFAULT_ONNX_DIR = os.path.join("sales_rag_app", "models", "onnx")
+
+
+def resolve_hf_model_id(model_name: str) -> str:
+    """SentenceTransformer 的簡短名稱 (all-MiniLM-L6-v2) 對應到 Hugging Face 的完整名稱"""
+    return model_name if "/" in model_name or os.path.isdir(model_name) else f"sentence-transformers/{model_name}"
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray, normalize: bool = True) -> np.ndarray:
+    """
+    與 sentence-transformers 相同的句向量：依 attention mask 對 token 向量取平均，再做 L2 正規化
+    (all-MiniLM-L6-v2 的管線包含 Normalize 層)。
+    """
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    vectors = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return vectors.astype(np.float32)
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = False, opset: int = 14) -> str:
+    """
+    將 Hugging Face 模型匯出為 ONNX (需要 torch 與 transformers，只在第一次使用時執行)，
+    quantize=True 時再以 onnxruntime 做 int8 動態量化 (權重 int8，活化值在執行時量化)。
+    返回 model.onnx 的路徑；分詞器一併存入 output_dir。
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    model_id = resolve_hf_model_id(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModel.from_pretrained(model_id).eval()
+    tokenizer.save_pretrained(output_dir)
+
+    fp32_path = os.path.join(output_dir, "model_fp32.onnx" if quantize else "model.onnx")
+    sample = tokenizer(["onnx export"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in input_names), fp32_path,
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes, opset_version=opset)
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    model_path = os.path.join(output_dir, "model.onnx")
+    quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    return model_path
+
+
+class OnnxEncoder:
+    def __init__(self, model_name: str, quantize: bool = False, model_dir: str | None = None,
+                 max_length: int = 256, num_threads: int | None = None):
+        """
+        以 ONNX Runtime 在 CPU 上執行的句向量編碼器，encode() 與 SentenceTransformer.encode() 相容。
+        模型目錄不存在時自動匯出 (見 export_onnx)，之後只需要 onnxruntime 與分詞器。
+        :param quantize: 使用 int8 動態量化的模型
+        :param model_dir: 匯出的模型目錄，預設為 EMBEDDING_ONNX_DIR (sales_rag_app/models/onnx) 下的子目錄
+        :param max_length: 超過的 token 會被截斷 (all-MiniLM-L6-v2 訓練時的上限為 256)
+        :param num_threads: ONNX Runtime 的執行緒數，預設讀取環境變數 EMBEDDING_ONNX_THREADS (0 表示由 ORT 決定)
+        """
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        if model_dir is None:
+            root = os.getenv("EMBEDDING_ONNX_DIR", DEFAULT_ONNX_DIR)
+            model_dir = os.path.join(root, model_name.replace("/", "__") + ("-int8" if quantize else ""))
+        if num_threads is None:
+            num_threads = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_length = max_length
+        model_path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            start = time.perf_counter()
+            model_path = export_onnx(model_name, model_dir, quantize)
+            print(f"已匯出 ONNX 模型{' (int8)' if quantize else ''}: {model_path}，耗時 {time.perf_counter() - start:.1f}s")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(self, texts, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """編碼一批文字，返回 (筆數, 維度) 的 float32 陣列；依長度排序後分批以減少 padding"""
+        texts = list(texts)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        vectors = [None] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            encoded = self.tokenizer([texts[i] for i in indices], padding=True, truncation=True,
+                                     max_length=self.max_length, return_tensors="np")
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            for i, vector in zip(indices, mean_pool(token_embeddings, encoded["attention_mask"])):
+                vectors[i] = vector
+        return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
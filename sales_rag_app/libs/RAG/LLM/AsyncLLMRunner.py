@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncLLMRunner:
+    def __init__(self, llm, max_concurrency: int | None = None):
+        """
+        以有界執行緒池執行同步的 LLM 呼叫，讓 async 流程不會阻塞事件迴圈。
+        :param llm: 提供 invoke() 的 LLM 實例 (例如 LLMInitializer().get_llm())
+        :param max_concurrency: 同時進行的 LLM 呼叫上限，未指定時讀取環境變數 LLM_MAX_CONCURRENCY (預設 4)
+        """
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        self.llm = llm
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm-worker")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+
+    async def ainvoke(self, prompt: str, **kwargs) -> str:
+        """非同步呼叫 LLM，超過並發上限的請求會在此排隊等待"""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(self.llm.invoke, prompt, **kwargs))
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def astream(self, prompt: str, **kwargs):
+        """
+        以串流方式非同步呼叫 LLM，逐一產出 LLM.stream() 的文字片段。
+        提前關閉此產生器 (aclose) 會通知背景執行緒停止讀取，並在其結束後釋放並發名額。
+        """
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+        finished = object()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # 事件迴圈已關閉
+                cancelled.set()
+
+        def produce():
+            try:
+                for chunk in self.llm.stream(prompt, **kwargs):
+                    if cancelled.is_set():
+                        break
+                    put(chunk)
+            except Exception as e:
+                put(e)
+            finally:
+                put(finished)
+
+        def release(_future):
+            self.in_flight -= 1
+            self._semaphore.release()
+
+        try:
+            producer = loop.run_in_executor(self._executor, produce)
+        except Exception:
+            self.in_flight -= 1
+            self._semaphore.release()
+            raise
+        producer.add_done_callback(release)
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    def get_stats(self) -> dict:
+        """返回目前的並發狀態"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+        }
+
+    def shutdown(self):
+        """關閉執行緒池"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,104 @@
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class OpenAICompatibleLLM:
+    def __init__(self, model: str, base_url: str, temperature: float = 0.1, max_tokens: int = 2048,
+                 api_key: str | None = None, timeout: float = 300.0, pool_size: int = 4, extra_body: dict | None = None):
+        """
+        OpenAI 相容伺服器 (vLLM、llama.cpp server、LM Studio 等) 的 LLM 用戶端，提供與 langchain Ollama 相同的
+        invoke() / stream() 介面，服務程式不需要知道實際使用的引擎。
+        一般請求使用 /chat/completions (由伺服器套用聊天模板，system 參數成為 system 訊息)；
+        raw=True 的請求 (提示已自行套用模板) 使用 /completions。
+        :param base_url: API 根路徑，例如 http://localhost:8001/v1
+        :param pool_size: 保持連線的 HTTP 連線數，應不小於並發上限
+        :param extra_body: 每個請求額外附加的欄位 (例如 llama.cpp 的 cache_prompt)
+        """
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.extra_body = dict(extra_body or {})
+        self.num_ctx = None
+        self._headers = {"Content-Type": "application/json"}
+        if api_key:
+            self._headers["Authorization"] = f"Bearer {api_key}"
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def _build_request(self, prompt: str, stream: bool, kwargs: dict) -> tuple:
+        """將 Ollama 風格的呼叫參數 (system、raw、format、num_predict) 轉為 OpenAI 的請求內容"""
+        body = {"model": self.model, "temperature": self.temperature, "stream": stream,
+                "max_tokens": kwargs.get("num_predict") or self.max_tokens, **self.extra_body}
+        if kwargs.get("raw"):
+            path = "/completions"
+            body["prompt"] = prompt
+        else:
+            path = "/chat/completions"
+            system = kwargs.get("system")
+            body["messages"] = ([{"role": "system", "content": system}] if system else []) + \
+                               [{"role": "user", "content": prompt}]
+        output_format = kwargs.get("format")
+        if isinstance(output_format, dict):
+            body["response_format"] = {"type": "json_schema", "json_schema": {"name": "response", "schema": output_format}}
+        elif output_format == "json":
+            body["response_format"] = {"type": "json_object"}
+        return self.base_url + path, body
+
+    @staticmethod
+    def _choice_text(choice: dict) -> str:
+        if "delta" in choice:
+            return choice["delta"].get("content") or ""
+        if "message" in choice:
+            return choice["message"].get("content") or ""
+        return choice.get("text") or ""
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        url, body = self._build_request(prompt, False, kwargs)
+        response = self._session.post(url, json=body, headers=self._headers, timeout=self.timeout)
+        response.raise_for_status()
+        choices = response.json().get("choices") or []
+        return self._choice_text(choices[0]) if choices else ""
+
+    def stream(self, prompt: str, **kwargs):
+        """逐段產出 SSE 串流的文字；提前關閉產生器時會關閉 HTTP 連線，伺服器隨即停止生成"""
+        url, body = self._build_request(prompt, True, kwargs)
+        with self._session.post(url, json=body, headers=self._headers, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                # 以 UTF-8 解碼 (text/event-stream 沒有 charset 時 requests 會誤用 ISO-8859-1)
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                text = self._choice_text(choices[0]) if choices else ""
+                if text:
+                    yield text
+
+
+class StubLLM:
+    def __init__(self, response_text: str, model: str = "stub", chunk_size: int = 16):
+        """不連線的固定輸出 LLM，用於測試與沒有模型的開發環境；輸出不受提示影響"""
+        self.model = model
+        self.response_text = response_text
+        self.chunk_size = chunk_size
+        self.num_ctx = None
+        self.calls = 0
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        return self.response_text
+
+    def stream(self, prompt: str, **kwargs):
+        self.calls += 1
+        text = self.response_text
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
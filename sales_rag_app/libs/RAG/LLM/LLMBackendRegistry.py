@@ -0,0 +1,305 @@
+import json
+import os
+import time
+
+import requests
+
+from .CompletionClients import OpenAICompatibleLLM, StubLLM
+from .LLMInitializer import LLMInitializer
+from .LoadBalancedLLM import LoadBalancedLLM
+from .StructuredOutput import resolve_json_format
+
+DEFAULT_MODEL = "deepseek-r1:7b"
+
+# stub 後端的固定回答 (可用環境變數 LLM_STUB_RESPONSE 覆寫)
+STUB_RESPONSE = json.dumps({"answer_summary": "這是測試用的固定回答。", "comparison_table": []}, ensure_ascii=False)
+
+
+def resolve_concurrency(backend_name: str, max_concurrency: int | None, default: int) -> int:
+    """
+    每個後端的並發上限：參數 > 環境變數 LLM_MAX_CONCURRENCY_<後端名稱> > LLM_MAX_CONCURRENCY > 後端預設值
+    """
+    if max_concurrency is None:
+        value = os.getenv(f"LLM_MAX_CONCURRENCY_{backend_name.upper()}") or os.getenv("LLM_MAX_CONCURRENCY")
+        max_concurrency = int(value) if value else default
+    return max(1, max_concurrency)
+
+
+class LLMBackend:
+    name = "base"
+    # 未設定環境變數時的並發上限
+    default_concurrency = 4
+
+    def __init__(self, model_name: str | None = None, base_url: str | None = None, max_concurrency: int | None = None,
+                 json_format: str | None = None, probe_timeout: float = 5.0):
+        """
+        LLM 引擎後端：建立 LLM 用戶端 (invoke / stream)，並提供啟動預熱、健康檢查與並發上限。
+        :param model_name: 模型名稱，預設讀取環境變數 LLM_MODEL (deepseek-r1:7b)
+        :param base_url: 引擎的服務位址，未指定時使用各後端的環境變數
+        :param max_concurrency: 同時進行的 LLM 呼叫上限 (見 resolve_concurrency)
+        :param json_format: 結構化輸出模式 (見 StructuredOutput.resolve_json_format)
+        :param probe_timeout: 健康檢查與預熱以外的 HTTP 請求逾時秒數
+        """
+        self.model_name = model_name or os.getenv("LLM_MODEL", DEFAULT_MODEL)
+        self.base_url = base_url
+        self.max_concurrency = resolve_concurrency(self.name, max_concurrency, self.default_concurrency)
+        self.json_format = resolve_json_format(json_format, self.model_name)
+        self.probe_timeout = probe_timeout
+        self.health = {"healthy": None, "checked_at": None, "latency_ms": None, "detail": None}
+        self.warm_up_ms = None
+        self._llm = None
+
+    def _create_llm(self):
+        raise NotImplementedError
+
+    def _warm_up(self):
+        """送出一個最小的請求，讓引擎在第一個使用者請求之前載入模型"""
+        raise NotImplementedError
+
+    def _probe(self) -> str:
+        """檢查引擎是否可用，返回說明文字；不可用時拋出例外"""
+        raise NotImplementedError
+
+    def get_llm(self):
+        """獲取 LLM 用戶端 (同一個後端共用一個實例)"""
+        if self._llm is None:
+            self._llm = self._create_llm()
+        return self._llm
+
+    def warm_up(self) -> bool:
+        """啟動時預熱模型，失敗時只記錄錯誤 (服務仍可啟動，第一個請求再載入)"""
+        start = time.perf_counter()
+        try:
+            self._warm_up()
+        except Exception as e:
+            print(f"LLM 後端 {self.name} ({self.model_name}) 預熱失敗: {e}")
+            return False
+        self.warm_up_ms = round((time.perf_counter() - start) * 1000, 1)
+        print(f"LLM 後端 {self.name} ({self.model_name}) 預熱完成，耗時 {self.warm_up_ms}ms")
+        return True
+
+    def probe(self) -> dict:
+        """執行健康檢查並更新 health"""
+        start = time.perf_counter()
+        try:
+            detail = self._probe()
+            healthy = True
+        except Exception as e:
+            detail = str(e)
+            healthy = False
+        self.health = {"healthy": healthy, "checked_at": time.time(),
+                       "latency_ms": round((time.perf_counter() - start) * 1000, 1), "detail": detail}
+        return self.health
+
+    def get_metrics(self) -> dict:
+        return {
+            "backend": self.name,
+            "model": self.model_name,
+            "base_url": self.base_url,
+            "max_concurrency": self.max_concurrency,
+            "warm_up_ms": self.warm_up_ms,
+            "health": self.health,
+        }
+
+
+def resolve_ollama_urls(base_url=None) -> list:
+    """
+    Ollama 主機清單：參數可為單一位址、逗號分隔的位址或 list；
+    未指定時讀取環境變數 OLLAMA_BASE_URLS (逗號分隔)，其次為 OLLAMA_BASE_URL (http://localhost:11434)。
+    """
+    if base_url is None:
+        base_url = os.getenv("OLLAMA_BASE_URLS") or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    if isinstance(base_url, str):
+        base_url = base_url.split(",")
+    urls = [url.strip().rstrip("/") for url in base_url if url and url.strip()]
+    if not urls:
+        raise ValueError("至少需要一個 Ollama 主機位址")
+    return urls
+
+
+class OllamaBackend(LLMBackend):
+    name = "ollama"
+    default_concurrency = 4
+
+    def __init__(self, model_name: str | None = None, base_url=None, max_concurrency: int | None = None,
+                 json_format: str | None = None, probe_timeout: float = 5.0, warm_up_timeout: float = 300.0,
+                 lb_policy: str | None = None, lb_cooldown: float | None = None, **llm_kwargs):
+        """
+        Ollama 後端 (langchain 的 Ollama 用戶端，參數見 LLMInitializer)。
+        預熱時以與正式請求相同的 num_ctx 與 keep_alive 載入模型，模型常駐後正式請求不會再觸發重新載入。
+        指定多台主機 (見 resolve_ollama_urls) 時以 LoadBalancedLLM 分配請求，預設並發上限為每台主機 4 個。
+        :param warm_up_timeout: 預熱 (載入模型) 的逾時秒數
+        :param lb_policy: 多台主機時的路由策略 (見 LoadBalancedLLM)
+        :param lb_cooldown: 多台主機時斷路器開啟後的冷卻秒數
+        :param llm_kwargs: 傳給 LLMInitializer 的其他參數 (temperature、num_ctx、keep_alive)
+        """
+        base_urls = resolve_ollama_urls(base_url)
+        if max_concurrency is None:
+            max_concurrency = resolve_concurrency(self.name, None, self.default_concurrency * len(base_urls))
+        super().__init__(model_name, base_urls[0], max_concurrency, json_format, probe_timeout)
+        self.base_urls = base_urls
+        self.initializers = [LLMInitializer(model_name=self.model_name, base_url=url, json_format=self.json_format,
+                                            **llm_kwargs) for url in base_urls]
+        self.initializer = self.initializers[0]
+        self.warm_up_timeout = warm_up_timeout
+        self.lb_policy = lb_policy
+        self.lb_cooldown = lb_cooldown
+
+    def _create_llm(self):
+        if len(self.initializers) == 1:
+            return self.initializer.get_llm()
+        return LoadBalancedLLM([initializer.get_llm() for initializer in self.initializers], self.base_urls,
+                               policy=self.lb_policy, cooldown=self.lb_cooldown)
+
+    def _warm_up(self):
+        # 沒有 prompt 的 /api/generate 只會載入模型；num_ctx 不同會讓 Ollama 重新載入，因此必須與正式請求一致
+        errors = []
+        for url in self.base_urls:
+            try:
+                response = requests.post(f"{url}/api/generate", timeout=self.warm_up_timeout, json={
+                    "model": self.model_name, "keep_alive": self.initializer.keep_alive,
+                    "options": {"num_ctx": self.initializer.num_ctx}})
+                response.raise_for_status()
+            except Exception as e:
+                print(f"Ollama 主機 {url} 預熱失敗: {e}")
+                errors.append(e)
+        if len(errors) == len(self.base_urls):
+            raise errors[0]
+
+    def _probe_host(self, url: str):
+        response = requests.get(f"{url}/api/tags", timeout=self.probe_timeout)
+        response.raise_for_status()
+        names = {model.get("name") for model in response.json().get("models", [])}
+        wanted = self.model_name if ":" in self.model_name else f"{self.model_name}:latest"
+        if names and wanted not in names and self.model_name not in names:
+            raise LookupError(f"Ollama 中沒有模型 {self.model_name}")
+
+    def _probe(self) -> str:
+        # 多台主機時只要有一台可用即為健康，說明文字列出每台主機的狀態
+        statuses = []
+        errors = []
+        for url in self.base_urls:
+            try:
+                self._probe_host(url)
+                statuses.append(f"{url}: ok")
+            except Exception as e:
+                statuses.append(f"{url}: {e}")
+                errors.append(e)
+        if len(errors) == len(self.base_urls):
+            raise errors[0] if len(errors) == 1 else ConnectionError("; ".join(statuses))
+        return f"keep_alive={self.initializer.keep_alive}, num_ctx={self.initializer.num_ctx}" + \
+            ("" if len(self.base_urls) == 1 else f", hosts=[{'; '.join(statuses)}]")
+
+    def get_metrics(self) -> dict:
+        metrics = super().get_metrics()
+        if isinstance(self._llm, LoadBalancedLLM):
+            metrics["load_balancer"] = self._llm.get_metrics()
+        return metrics
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    name = "openai"
+    default_concurrency = 16
+
+    def __init__(self, model_name: str | None = None, base_url: str | None = None, max_concurrency: int | None = None,
+                 json_format: str | None = None, probe_timeout: float = 5.0, api_key: str | None = None,
+                 temperature: float = 0.1, max_tokens: int = 2048, timeout: float = 300.0):
+        """
+        OpenAI 相容的本地推論伺服器 (例如 vLLM)，服務位址預設讀取環境變數 OPENAI_BASE_URL (http://localhost:8001/v1)，
+        API key 讀取 OPENAI_API_KEY。
+        """
+        super().__init__(model_name, base_url or os.getenv("OPENAI_BASE_URL", "http://localhost:8001/v1"),
+                         max_concurrency, json_format, probe_timeout)
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY")
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+
+    def _client_kwargs(self) -> dict:
+        return {}
+
+    def _create_llm(self):
+        return OpenAICompatibleLLM(self.model_name, self.base_url, temperature=self.temperature,
+                                   max_tokens=self.max_tokens, api_key=self.api_key, timeout=self.timeout,
+                                   pool_size=self.max_concurrency, **self._client_kwargs())
+
+    def _warm_up(self):
+        self.get_llm().invoke("ping", num_predict=1)
+
+    def _probe(self) -> str:
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        response = requests.get(f"{self.base_url}/models", headers=headers, timeout=self.probe_timeout)
+        response.raise_for_status()
+        models = [model.get("id") for model in response.json().get("data", [])]
+        return f"models={models}"
+
+
+class LlamaCppBackend(OpenAICompatibleBackend):
+    name = "llamacpp"
+    default_concurrency = 4
+
+    def __init__(self, model_name: str | None = None, base_url: str | None = None, max_concurrency: int | None = None,
+                 json_format: str | None = None, probe_timeout: float = 5.0, **kwargs):
+        """
+        llama.cpp 的 llama-server，服務位址預設讀取環境變數 LLAMACPP_BASE_URL (http://localhost:8080)。
+        並發上限應等於伺服器的 slot 數 (--parallel)；請求帶有 cache_prompt 讓 slot 重用相同前綴的 KV cache。
+        """
+        root = (base_url or os.getenv("LLAMACPP_BASE_URL", "http://localhost:8080")).rstrip("/")
+        self.server_url = root[:-len("/v1")] if root.endswith("/v1") else root
+        super().__init__(model_name, self.server_url + "/v1", max_concurrency, json_format, probe_timeout, **kwargs)
+
+    def _client_kwargs(self) -> dict:
+        return {"extra_body": {"cache_prompt": True}}
+
+    def _probe(self) -> str:
+        # 模型載入中時 /health 回傳 503
+        response = requests.get(f"{self.server_url}/health", timeout=self.probe_timeout)
+        response.raise_for_status()
+        return response.json().get("status", "ok")
+
+
+class StubBackend(LLMBackend):
+    name = "stub"
+    default_concurrency = 32
+
+    def __init__(self, model_name: str | None = None, base_url: str | None = None, max_concurrency: int | None = None,
+                 json_format: str | None = None, probe_timeout: float = 5.0, response_text: str | None = None):
+        """不連線的固定輸出後端，用於測試與沒有 GPU 的開發環境"""
+        super().__init__(model_name or "stub", base_url, max_concurrency, json_format, probe_timeout)
+        self.response_text = response_text or os.getenv("LLM_STUB_RESPONSE", STUB_RESPONSE)
+
+    def _create_llm(self):
+        return StubLLM(self.response_text, model=self.model_name)
+
+    def _warm_up(self):
+        self.get_llm()
+
+    def _probe(self) -> str:
+        return "stub"
+
+
+# 後端名稱 -> 後端類別
+LLM_BACKENDS = {}
+
+
+def register_backend(backend_class: type) -> type:
+    """註冊 LLM 後端 (可作為類別裝飾器使用)，名稱取自 backend_class.name"""
+    LLM_BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+for _backend_class in (OllamaBackend, OpenAICompatibleBackend, LlamaCppBackend, StubBackend):
+    register_backend(_backend_class)
+
+
+def create_backend(name: str | None = None, **kwargs) -> LLMBackend:
+    """
+    依名稱建立 LLM 後端，未指定時讀取環境變數 LLM_BACKEND (ollama)。
+    :param kwargs: 傳給後端建構子的參數
+    """
+    if name is None:
+        name = os.getenv("LLM_BACKEND", "ollama")
+    name = name.strip().lower()
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"未知的 LLM 後端: {name} (可用: {', '.join(LLM_BACKENDS)})")
+    return LLM_BACKENDS[name](**kwargs)
@@ -1,27 +1,59 @@
+import os
+
 from langchain_community.llms import Ollama
 
+from ..Prompt.PromptBudget import resolve_context_window
+from .StructuredOutput import format_kwargs, resolve_json_format
+
 class LLMInitializer:
-    def __init__(self, model_name: str = "deepseek-r1:7b", temperature: float = 0.1):
+    def __init__(self, model_name: str = "deepseek-r1:7b", temperature: float = 0.1, num_ctx: int | None = None,
+                 keep_alive: str | int | None = None, base_url: str | None = None, json_format: str | None = None):
         """
         初始化 LLM。
         :param model_name: 在 Ollama 中運行的模型名稱。
         :param temperature: 控制生成文本的隨機性。
+        :param num_ctx: 上下文長度 (提示 + 回答的 tokens)，預設讀取環境變數 OLLAMA_NUM_CTX (8192)，不超過模型上限。
+        :param keep_alive: 模型在 Ollama 中常駐的時間 (例如 "30m"、-1 表示永久)，預設讀取環境變數 OLLAMA_KEEP_ALIVE (30m)。
+                           模型常駐且 num_ctx 固定時，Ollama 才能在請求之間重用提示前綴的 KV cache。
+        :param base_url: Ollama 服務位址，預設讀取環境變數 OLLAMA_BASE_URL (http://localhost:11434)。
+        :param json_format: 結構化輸出模式 "schema"、"json" 或 "off"，預設讀取環境變數 OLLAMA_JSON_FORMAT
+                            (推理模型為 off，其他模型為 schema，見 resolve_json_format)。
+                            schema 模式以 JSON schema 限制解碼，輸出必定是 answer_summary / comparison_table 外框。
         """
+        if num_ctx is None:
+            num_ctx = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+        if keep_alive is None:
+            keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        if isinstance(keep_alive, str) and keep_alive.lstrip("-").isdigit():
+            keep_alive = int(keep_alive)
+        context_window = resolve_context_window(model_name)
         self.model_name = model_name
         self.temperature = temperature
+        self.num_ctx = min(num_ctx, context_window) if context_window else num_ctx
+        self.keep_alive = keep_alive
+        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.json_format = resolve_json_format(json_format, model_name)
         self.llm = None
 
+    def format_kwargs(self, modelnames=()) -> dict:
+        """每次呼叫時傳給 llm.invoke() / llm.stream() 的 format 參數 (schema 模式會限定表格中的型號欄位)"""
+        return format_kwargs(self.json_format, modelnames)
+
     def get_llm(self):
         """獲取已初始化的 LLM 實例"""
         if self.llm is None:
             try:
                 self.llm = Ollama(
                     model=self.model_name,
-                    temperature=self.temperature
+                    base_url=self.base_url,
+                    temperature=self.temperature,
+                    num_ctx=self.num_ctx,
+                    keep_alive=self.keep_alive
                 )
-                print(f"成功初始化 Ollama 模型: {self.model_name}")
+                print(f"成功初始化 Ollama 模型: {self.model_name} (num_ctx: {self.num_ctx}, keep_alive: {self.keep_alive}, "
+                      f"json_format: {self.json_format})")
             except Exception as e:
                 print(f"初始化 Ollama 模型失敗: {e}")
                 # 可以在這裡提供一個備用的 LLM 或拋出異常
                 raise ConnectionError("無法連接到 Ollama 服務。請確保 Ollama 正在運行。") from e
-        return self.llm
\ No newline at end of file
+        return self.llm
@@ -0,0 +1,210 @@
+import os
+import re
+import threading
+import time
+
+import requests
+
+# 路由策略：least_outstanding (進行中請求最少) 或 latency (進行中請求數 × 回應延遲的 EWMA)
+ROUTING_POLICIES = ("least_outstanding", "latency")
+
+# langchain Ollama 在非 200 回應時拋出的 ValueError 訊息
+_STATUS_RE = re.compile(r"status code (\d{3})")
+
+
+def is_host_failure(error: Exception) -> bool:
+    """
+    判斷錯誤是否來自主機本身 (連線失敗、逾時、429、5xx 或該主機沒有模型的 404)，
+    這類錯誤改送其他主機重試並計入斷路器；其他錯誤 (例如 400 參數錯誤) 換主機也不會成功，直接拋出。
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True
+    match = _STATUS_RE.search(str(error))
+    if match:
+        status = int(match.group(1))
+        return status in (404, 429) or status >= 500
+    return False
+
+
+class OllamaHost:
+    def __init__(self, llm, base_url: str, failure_threshold: int = 3, cooldown: float = 30.0, ewma_alpha: float = 0.3):
+        """
+        單一 Ollama 主機的狀態：進行中請求數、回應延遲 EWMA 與斷路器。
+        斷路器連續失敗 failure_threshold 次後開啟 (open)，cooldown 秒內不再送出請求；
+        冷卻後進入半開 (half_open) 只放行一個試探請求，成功即關閉 (closed)，失敗則重新開啟。
+        :param llm: 連到此主機的 LLM 用戶端 (提供 invoke / stream)
+        """
+        self.llm = llm
+        self.base_url = base_url
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.ewma_alpha = ewma_alpha
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.ewma_ms = None
+        self.max_ms = 0.0
+
+    def available(self, now: float) -> bool:
+        """是否可以接收新請求 (必要時將開啟的斷路器轉為半開)"""
+        if self.state == "open" and now - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open":
+            return self.outstanding == 0
+        return self.state == "closed"
+
+    def record_success(self, latency_ms: float):
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.ewma_ms = latency_ms if self.ewma_ms is None else \
+            self.ewma_alpha * latency_ms + (1 - self.ewma_alpha) * self.ewma_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = now
+
+    def get_metrics(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class LoadBalancedLLM:
+    def __init__(self, llms: list, base_urls: list, policy: str | None = None, failure_threshold: int = 3,
+                 cooldown: float | None = None, max_attempts: int | None = None):
+        """
+        在多台 Ollama 主機之間分配 invoke() / stream() 呼叫的用戶端負載平衡器，介面與單一 LLM 相同。
+        :param llms: 每台主機的 LLM 用戶端 (與 base_urls 一一對應)
+        :param policy: 路由策略 (見 ROUTING_POLICIES)，預設讀取環境變數 OLLAMA_LB_POLICY (latency)
+        :param failure_threshold: 斷路器開啟前允許的連續失敗次數
+        :param cooldown: 斷路器開啟後的冷卻秒數，預設讀取環境變數 OLLAMA_LB_COOLDOWN (30)
+        :param max_attempts: 單次呼叫最多嘗試的主機數，預設為全部主機
+        """
+        if not llms or len(llms) != len(base_urls):
+            raise ValueError("llms 與 base_urls 必須一一對應且不可為空")
+        if policy is None:
+            policy = os.getenv("OLLAMA_LB_POLICY", "latency")
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"不支援的路由策略: {policy} (可用: {', '.join(ROUTING_POLICIES)})")
+        if cooldown is None:
+            cooldown = float(os.getenv("OLLAMA_LB_COOLDOWN", "30"))
+        self.hosts = [OllamaHost(llm, base_url, failure_threshold, cooldown) for llm, base_url in zip(llms, base_urls)]
+        self.policy = policy
+        self.max_attempts = max_attempts or len(self.hosts)
+        self.retries = 0
+        self._lock = threading.Lock()
+        # 與單一 LLM 相同的屬性，供 PromptBudget / ThinkBudget 讀取
+        self.model = getattr(llms[0], "model", None)
+        self.num_ctx = getattr(llms[0], "num_ctx", None)
+
+    def _score(self, host: OllamaHost, fallback_ms: float) -> tuple:
+        if self.policy == "latency":
+            # 尚無延遲樣本的主機使用目前最快的延遲估計，同分時優先選請求數較少的主機，讓新主機也能分到請求
+            ewma = host.ewma_ms if host.ewma_ms is not None else fallback_ms
+            return (host.outstanding + 1) * ewma, host.outstanding, host.requests
+        return host.outstanding, host.ewma_ms or 0.0, host.requests
+
+    def _acquire(self, tried: set) -> OllamaHost | None:
+        """選出分數最低的可用主機並將其進行中請求數加一"""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [host for host in self.hosts if host not in tried and host.available(now)]
+            if not candidates:
+                return None
+            known = [host.ewma_ms for host in candidates if host.ewma_ms is not None]
+            fallback_ms = min(known) if known else 0.0
+            host = min(candidates, key=lambda candidate: self._score(candidate, fallback_ms))
+            host.outstanding += 1
+            host.requests += 1
+            return host
+
+    def _release(self, host: OllamaHost, latency_ms: float | None = None, error: Exception | None = None):
+        """請求結束：主機故障時計入斷路器，成功時更新延遲 (沒有延遲樣本時只減少進行中請求數)"""
+        with self._lock:
+            host.outstanding -= 1
+            if error is not None:
+                host.record_failure(time.monotonic())
+            elif latency_ms is not None:
+                host.record_success(latency_ms)
+
+    def _next_host(self, tried: set, last_error: Exception | None) -> OllamaHost:
+        if len(tried) >= self.max_attempts:
+            raise last_error
+        host = self._acquire(tried)
+        if host is None:
+            if last_error is not None:
+                raise last_error
+            raise ConnectionError("沒有可用的 Ollama 主機 (所有主機的斷路器皆為開啟)")
+        if tried:
+            self.retries += 1
+        tried.add(host)
+        return host
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        tried = set()
+        last_error = None
+        while True:
+            host = self._next_host(tried, last_error)
+            started = time.perf_counter()
+            try:
+                result = host.llm.invoke(prompt, **kwargs)
+            except Exception as e:
+                failure = is_host_failure(e)
+                self._release(host, error=e if failure else None)
+                if not failure:
+                    raise
+                print(f"Ollama 主機 {host.base_url} 呼叫失敗，改送其他主機: {e}")
+                last_error = e
+                continue
+            self._release(host, latency_ms=(time.perf_counter() - started) * 1000)
+            return result
+
+    def stream(self, prompt: str, **kwargs):
+        """
+        串流呼叫：延遲以收到第一個片段的時間計算。
+        只有在尚未產出任何片段前失敗才改送其他主機，已產出部分內容後的錯誤直接拋出。
+        """
+        tried = set()
+        last_error = None
+        while True:
+            host = self._next_host(tried, last_error)
+            started = time.perf_counter()
+            first_chunk_ms = None
+            released = False
+            try:
+                for chunk in host.llm.stream(prompt, **kwargs):
+                    if first_chunk_ms is None:
+                        first_chunk_ms = (time.perf_counter() - started) * 1000
+                    yield chunk
+            except Exception as e:
+                failure = is_host_failure(e)
+                released = True
+                self._release(host, error=e if failure else None)
+                if first_chunk_ms is not None or not failure:
+                    raise
+                print(f"Ollama 主機 {host.base_url} 串流失敗，改送其他主機: {e}")
+                last_error = e
+                continue
+            finally:
+                if not released:
+                    # 正常結束，或呼叫端提前關閉串流 (GeneratorExit)
+                    self._release(host, latency_ms=first_chunk_ms)
+            return
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {"policy": self.policy, "retries": self.retries,
+                    "hosts": [host.get_metrics() for host in self.hosts]}
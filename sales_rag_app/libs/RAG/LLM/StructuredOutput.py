@@ -0,0 +1,68 @@
+import os
+from functools import lru_cache
+
+# Ollama 的 format 參數：schema (JSON schema 限制輸出結構)、json (只保證是合法 JSON) 或 off (不限制)
+JSON_FORMAT_MODES = ("schema", "json", "off")
+
+# 會先輸出 <think> 推理段落的模型系列
+REASONING_MODEL_FAMILIES = ("deepseek-r1", "qwen3", "qwq")
+
+
+def is_reasoning_model(model_name: str | None) -> bool:
+    """依模型名稱 (例如 "deepseek-r1:7b") 判斷是否為推理模型"""
+    if not model_name:
+        return False
+    family = model_name.split(":")[0].split("/")[-1].lower()
+    return family.startswith(REASONING_MODEL_FAMILIES)
+
+
+def resolve_json_format(mode: str | None = None, model_name: str | None = None) -> str:
+    """
+    未指定時讀取環境變數 OLLAMA_JSON_FORMAT；環境變數也未設定時，推理模型預設為 off，其他模型為 schema。
+    format (schema 與 json) 從第一個 token 就以文法限制解碼，推理模型因此無法輸出 <think> 段落，
+    推理預算 (ThinkBudget) 與推理串流都會失效；off 模式改由 ResponseStreamParser 與 ResponseValidator
+    在生成後檢查 JSON 與型號，代價是輸出格式不再有保證 (不合法時改用備用回應)。
+    推理模型明確指定 schema / json 時等同放棄推理，換取必定合法的輸出外框。
+    """
+    if mode is None:
+        mode = os.getenv("OLLAMA_JSON_FORMAT") or ("off" if is_reasoning_model(model_name) else "schema")
+    mode = mode.strip().lower()
+    if mode not in JSON_FORMAT_MODES:
+        raise ValueError(f"不支援的 JSON 輸出模式: {mode} (可用: {', '.join(JSON_FORMAT_MODES)})")
+    return mode
+
+
+@lru_cache(maxsize=256)
+def response_schema(modelnames: tuple = ()) -> dict:
+    """
+    answer_summary / comparison_table 回答外框的 JSON schema。
+    指定型號時表格每一列的欄位固定為 feature 與這些型號，解碼時就無法產生資料以外的型號欄位。
+    回傳的 dict 會被快取共用，請勿修改。
+    """
+    row = {"type": "object", "properties": {"feature": {"type": "string"}}, "required": ["feature"]}
+    if modelnames:
+        for modelname in modelnames:
+            row["properties"][modelname] = {"type": "string"}
+        row["required"] = ["feature", *modelnames]
+        row["additionalProperties"] = False
+    return {
+        "type": "object",
+        "properties": {
+            "answer_summary": {"type": "string"},
+            "comparison_table": {"type": "array", "items": row},
+        },
+        "required": ["answer_summary", "comparison_table"],
+    }
+
+
+def format_kwargs(mode: str, modelnames=()) -> dict:
+    """
+    依輸出模式產生每次呼叫傳給 Ollama 的 format 參數 (langchain 的 Ollama 只接受字串的 format 欄位，
+    schema 必須以呼叫參數傳入)。
+    :return: {"format": schema 或 "json"}，off 模式為空 dict
+    """
+    if mode == "schema":
+        return {"format": response_schema(tuple(modelnames))}
+    if mode == "json":
+        return {"format": "json"}
+    return {}
@@ -0,0 +1,100 @@
+import os
+
+from ..Prompt.PromptBudget import estimate_tokens
+
+# 推理模式：full (完整推理)、budget (推理超過 max_think_tokens 時中止並強制作答)、off (不推理)
+THINK_MODES = ("full", "budget", "off")
+
+# raw 模式需要自行套用聊天模板 (與 Ollama 模型內建的模板一致，固定前綴仍可重用 KV cache)
+CHAT_TEMPLATES = {
+    "deepseek-r1": ("{system}<｜User｜>", "<｜Assistant｜>"),
+    "qwen3": ("<|im_start|>system\n{system}<|im_end|>\n<|im_start|>user\n", "<|im_end|>\n<|im_start|>assistant\n"),
+    "qwq": ("<|im_start|>system\n{system}<|im_end|>\n<|im_start|>user\n", "<|im_end|>\n<|im_start|>assistant\n"),
+}
+
+
+def resolve_chat_template(model_name: str | None) -> tuple | None:
+    """依模型名稱 (例如 "deepseek-r1:7b") 找出 raw 模式的聊天模板，未知的模型為 None"""
+    if not model_name:
+        return None
+    family = model_name.split(":")[0].split("/")[-1].lower()
+    for prefix, template in CHAT_TEMPLATES.items():
+        if family.startswith(prefix):
+            return template
+    return None
+
+
+class ThinkBudget:
+    THINK_OPEN = "<think>"
+    # 強制結束推理段落，模型接著直接輸出答案
+    THINK_CLOSE = "\n</think>\n\n"
+
+    def __init__(self, mode: str | None = None, max_think_tokens: int | None = None, model_name: str | None = None,
+                 stream_think: bool | None = None, count_tokens=estimate_tokens):
+        """
+        控制推理模型 (deepseek-r1 等) 的 <think> 段落長度。
+        :param mode: "full"、"budget" 或 "off"，預設讀取環境變數 OLLAMA_THINK_MODE (full)。
+                     budget 模式在推理超過 max_think_tokens 時中止生成，以 raw 模式帶入已產生的推理並接上 </think> 重新請求；
+                     off 模式直接以 raw 模式送出已閉合的空白推理段落 (<think>\n\n</think>)，模型跳過推理直接作答。
+        :param max_think_tokens: budget 模式的推理 token 上限，預設讀取環境變數 OLLAMA_THINK_TOKENS (512)
+        :param model_name: 模型名稱，用於選擇 raw 模式的聊天模板；找不到模板時只能使用 full 模式
+        :param stream_think: 是否把推理段落以 think 事件串流給前端，預設讀取環境變數 OLLAMA_THINK_STREAM (true)
+        :param count_tokens: 文字 -> token 數的函數
+        """
+        if mode is None:
+            mode = os.getenv("OLLAMA_THINK_MODE", "full")
+        mode = mode.strip().lower()
+        if mode not in THINK_MODES:
+            raise ValueError(f"不支援的推理模式: {mode} (可用: {', '.join(THINK_MODES)})")
+        if max_think_tokens is None:
+            max_think_tokens = int(os.getenv("OLLAMA_THINK_TOKENS", "512"))
+        if stream_think is None:
+            stream_think = os.getenv("OLLAMA_THINK_STREAM", "true").strip().lower() not in ("0", "false", "no", "off")
+        self.template = resolve_chat_template(model_name)
+        if mode != "full" and self.template is None:
+            print(f"模型 {model_name} 沒有對應的聊天模板，無法使用 {mode} 推理模式，改用 full。")
+            mode = "full"
+        self.mode = mode
+        self.max_think_tokens = max(0, max_think_tokens)
+        self.stream_think = stream_think
+        self.count_tokens = count_tokens
+        self.stats = {"requests": 0, "truncated": 0, "total_think_tokens": 0, "max_think_tokens": 0}
+
+    @property
+    def limit(self) -> int | None:
+        """串流時的推理 token 上限，非 budget 模式為 None"""
+        return self.max_think_tokens if self.mode == "budget" else None
+
+    def raw_request(self, prompt: str, llm_kwargs: dict, reasoning: str = "") -> tuple:
+        """
+        組成 raw 模式的請求：自行套用聊天模板 (system 參數併入提示)，並以已閉合的推理段落結尾。
+        :param reasoning: 放進 <think> 段落的推理文字，預設為空白 (不推理)
+        :return: (raw 提示, llm_kwargs)
+        """
+        kwargs = dict(llm_kwargs)
+        system = kwargs.pop("system", None) or ""
+        head, tail = self.template
+        raw_prompt = (head.replace("{system}", system) + prompt + tail
+                      + self.THINK_OPEN + (reasoning.rstrip("\n") or "\n") + self.THINK_CLOSE)
+        kwargs["raw"] = True
+        return raw_prompt, kwargs
+
+    def record(self, think_tokens: int, truncated: bool = False):
+        """記錄單次請求的推理 token 數與是否被截斷"""
+        stats = self.stats
+        stats["requests"] += 1
+        stats["truncated"] += int(truncated)
+        stats["total_think_tokens"] += think_tokens
+        stats["max_think_tokens"] = max(stats["max_think_tokens"], think_tokens)
+
+    def get_metrics(self) -> dict:
+        requests = self.stats["requests"]
+        return {
+            "mode": self.mode,
+            "max_think_tokens": self.limit,
+            "stream_think": self.stream_think,
+            "requests": requests,
+            "truncated": self.stats["truncated"],
+            "avg_think_tokens": round(self.stats["total_think_tokens"] / requests, 1) if requests else 0.0,
+            "max_observed_think_tokens": self.stats["max_think_tokens"],
+        }
@@ -0,0 +1,191 @@
+import json
+import os
+import re
+
+from .PromptBudget import estimate_tokens, summarize_field
+
+# 一定會放進上下文的識別欄位
+IDENTITY_FIELDS = ("modelname", "modeltype")
+
+# 沒有偵測到任何意圖時使用的概覽欄位
+DEFAULT_FIELDS = ("cpu", "gpu", "memory", "storage", "lcd", "battery", "structconfig")
+
+# 查詢意圖 -> (關鍵字, 相關欄位)，欄位依重要性排序
+INTENT_FIELDS = {
+    "gaming": (("遊戲", "游戏", "電競", "gaming", "game", "games"), ("cpu", "gpu", "thermal", "memory")),
+    "cpu": (("處理器", "处理器", "效能", "性能", "cpu", "processor", "performance", "ryzen"), ("cpu",)),
+    "gpu": (("顯卡", "显卡", "顯示晶片", "gpu", "graphics", "radeon"), ("gpu",)),
+    "battery": (("電池", "电池", "續航", "续航", "battery"), ("battery",)),
+    "portability": (("重量", "輕便", "轻便", "輕薄", "攜帶", "尺寸", "厚度", "weight", "portable", "portability",
+                     "lightweight", "dimension", "dimensions"), ("structconfig",)),
+    "display": (("螢幕", "屏幕", "顯示器", "解析度", "面板", "觸控螢幕", "display", "screen", "lcd", "resolution",
+                 "touchscreen"), ("lcd", "touchpanel")),
+    "memory": (("記憶體", "内存", "memory", "ram", "ddr5", "ddr4"), ("memory",)),
+    "storage": (("儲存", "存储", "硬碟", "硬盘", "storage", "ssd", "nvme"), ("storage",)),
+    "ports": (("接口", "連接埠", "端口", "介面", "port", "ports", "usb", "hdmi", "type-c", "thunderbolt", "io"),
+              ("iointerface",)),
+    "wireless": (("無線", "无线", "藍牙", "蓝牙", "wifi", "wi-fi", "wireless", "bluetooth"),
+                 ("wireless", "wifislot", "bluetooth")),
+    "lan": (("有線網路", "網路孔", "lan", "ethernet", "rj45"), ("lan",)),
+    "audio": (("音效", "喇叭", "麥克風", "音響", "audio", "speaker", "speakers", "microphone"), ("audio",)),
+    "keyboard": (("鍵盤", "键盘", "背光", "keyboard", "backlight"), ("keyboard",)),
+    "webcam": (("鏡頭", "攝影機", "摄像头", "相機", "webcam", "camera"), ("webcamera",)),
+    "touchpad": (("觸控板", "触控板", "touchpad"), ("touchpad",)),
+    "security": (("指紋", "指纹", "安全", "fingerprint", "tpm", "security"), ("fingerprint", "tpm")),
+    "thermal": (("散熱", "散热", "功耗", "thermal", "cooling", "tdp"), ("thermal",)),
+    "ai": (("人工智慧", "ai", "npu"), ("ai",)),
+    "software": (("作業系統", "軟體", "windows", "software", "os"), ("softwareconfig",)),
+    "certification": (("認證", "认证", "certification", "certifications"), ("certfications",)),
+    "accessory": (("配件", "變壓器", "充電器", "adapter", "accessory", "charger"), ("accessory",)),
+    "led": (("指示燈", "led"), ("ledind",)),
+}
+
+# 視為沒有資料的值，不放進上下文
+_EMPTY_VALUES = {"", "nan", "none", "nodata", "n/a"}
+_INDENT_RE = re.compile(r"[ \t]*\n[ \t]*")
+
+
+def _compile_intent(keywords) -> re.Pattern:
+    # 英文關鍵字需以英數字為邊界 (避免 "ai" 比對到 "detail")，中文關鍵字直接比對
+    ascii_words = [re.escape(word) for word in keywords if word.isascii()]
+    cjk_words = [re.escape(word) for word in keywords if not word.isascii()]
+    parts = []
+    if ascii_words:
+        parts.append(r"(?<![0-9a-z])(?:" + "|".join(ascii_words) + r")(?![0-9a-z])")
+    parts.extend(cjk_words)
+    return re.compile("|".join(parts), re.IGNORECASE)
+
+
+_INTENT_PATTERNS = {intent: _compile_intent(keywords) for intent, (keywords, _) in INTENT_FIELDS.items()}
+
+
+class BuiltContext:
+    def __init__(self, text: str, intents: list, fields: list, dropped_fields: list, tokens: int, full_tokens,
+                 summarized_fields: list | None = None, budget: int | None = None):
+        """
+        ContextBuilder 的輸出。
+        :param text: 放進提示的上下文字串
+        :param intents: 偵測到的查詢意圖
+        :param fields: 實際放進上下文的欄位
+        :param dropped_fields: 因超過 token 預算而捨棄的欄位
+        :param tokens: 上下文的估計 token 數
+        :param full_tokens: 舊做法 (全部欄位、indent=2) 的估計 token 數，用於比較；可傳入無參數的函數，第一次讀取時才計算
+        :param summarized_fields: 因過長而被縮短的欄位
+        :param budget: 組裝時使用的 token 預算
+        """
+        self.text = text
+        self.intents = intents
+        self.fields = fields
+        self.dropped_fields = dropped_fields
+        self.tokens = tokens
+        self._full_tokens = full_tokens
+        self.summarized_fields = summarized_fields or []
+        self.budget = budget
+
+    @property
+    def full_tokens(self) -> int:
+        """只在需要比較時才序列化全部欄位 (每個請求都算一次會浪費 CPU)"""
+        if callable(self._full_tokens):
+            self._full_tokens = self._full_tokens()
+        return self._full_tokens
+
+
+class ContextBuilder:
+    def __init__(self, spec_fields: list, token_budget: int | None = None, count_tokens=None,
+                 max_field_tokens: int | None = None):
+        """
+        依查詢意圖挑選規格欄位並組成精簡的 JSON 上下文，取代把 35 個欄位全部以 indent=2 輸出的做法。
+        :param spec_fields: specs 資料表中可用的欄位
+        :param token_budget: 上下文的 token 上限，預設讀取環境變數 CONTEXT_TOKEN_BUDGET (3000)
+        :param count_tokens: token 計數函數，預設為啟發式估計
+        :param max_field_tokens: 超過預算時單一欄位值縮短後的 token 上限，預設讀取環境變數 CONTEXT_MAX_FIELD_TOKENS (160)
+        """
+        if token_budget is None:
+            token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+        if max_field_tokens is None:
+            max_field_tokens = int(os.getenv("CONTEXT_MAX_FIELD_TOKENS", "160"))
+        self.spec_fields = list(spec_fields)
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens or estimate_tokens
+        self.max_field_tokens = max_field_tokens
+
+    @staticmethod
+    def detect_intents(query: str) -> list:
+        """依 INTENT_FIELDS 的順序返回查詢中出現的意圖"""
+        return [intent for intent, pattern in _INTENT_PATTERNS.items() if pattern.search(query or "")]
+
+    def select_fields(self, query: str) -> tuple:
+        """返回 (意圖列表, 依重要性排序的欄位列表)，識別欄位不包含在內"""
+        intents = self.detect_intents(query)
+        selected = []
+        for intent in intents:
+            for field in INTENT_FIELDS[intent][1]:
+                if field not in selected:
+                    selected.append(field)
+        if not selected:
+            selected = list(DEFAULT_FIELDS)
+        return intents, [field for field in selected if field in self.spec_fields]
+
+    def build(self, records: list, query: str, token_budget: int | None = None) -> BuiltContext:
+        """
+        組出上下文，超過預算時依序：
+        1. 以固定規則縮短過長的欄位值 (summarize_field)
+        2. 從最不重要的欄位開始捨棄 (至少保留一個)
+        3. 逐步降低單一欄位值的上限
+        :param token_budget: 本次請求的上下文預算 (例如扣除提示模板後的剩餘空間)，不超過建構時設定的上限
+        """
+        budget = self.token_budget if token_budget is None else min(self.token_budget, token_budget)
+        intents, fields = self.select_fields(query)
+        records = list(records)
+        full_tokens = lambda: self.count_tokens(json.dumps(records, indent=2, ensure_ascii=False))
+
+        dropped = []
+        field_limit = None
+        text = self.render(records, fields)
+        tokens = self.count_tokens(text)
+        if tokens > budget:
+            field_limit = self.max_field_tokens
+            text = self.render(records, fields, field_limit)
+            tokens = self.count_tokens(text)
+        while tokens > budget and len(fields) > 1:
+            dropped.insert(0, fields.pop())
+            text = self.render(records, fields, field_limit)
+            tokens = self.count_tokens(text)
+        while tokens > budget and field_limit > 16:
+            field_limit //= 2
+            text = self.render(records, fields, field_limit)
+            tokens = self.count_tokens(text)
+        if tokens > budget:
+            print(f"上下文仍超過 token 預算 ({tokens} > {budget})，欄位: {fields}")
+
+        summarized = []
+        if field_limit is not None:
+            summarized = [field for field in fields
+                          if any(self.count_tokens(self._clean_value(record.get(field)) or "") > field_limit
+                                 for record in records)]
+        return BuiltContext(text, intents, fields, dropped, tokens, full_tokens, summarized, budget)
+
+    def render(self, records: list, fields: list, field_limit: int | None = None) -> str:
+        """以精簡 JSON (無縮排、省略空值) 輸出指定欄位，field_limit 為單一欄位值的 token 上限"""
+        columns = [field for field in IDENTITY_FIELDS if field not in fields] + list(fields)
+        rows = []
+        for record in records:
+            row = {}
+            for field in columns:
+                value = self._clean_value(record.get(field))
+                if value is None:
+                    continue
+                if field_limit is not None and field not in IDENTITY_FIELDS:
+                    value = summarize_field(value, field_limit, self.count_tokens)
+                row[field] = value
+            rows.append(row)
+        return json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+
+    @staticmethod
+    def _clean_value(value):
+        if value is None:
+            return None
+        text = str(value).strip()
+        if text.lower() in _EMPTY_VALUES:
+            return None
+        return _INDENT_RE.sub("\n", text)
@@ -0,0 +1,198 @@
+import os
+import re
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # tokenizers 為選用套件，未安裝時使用啟發式估計
+    Tokenizer = None
+
+# 各模型家族支援的最大上下文長度 (tokens)
+MODEL_CONTEXT_WINDOWS = {
+    "deepseek-r1": 131072,
+    "qwen3": 40960,
+    "qwen2.5": 32768,
+    "qwen2": 32768,
+    "llama3.1": 131072,
+    "llama3.2": 131072,
+    "llama3": 8192,
+    "mistral": 32768,
+    "gemma2": 8192,
+    "phi3": 4096,
+}
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d|[⺀-鿿가-힯豈-﫿＀-￯]|\n|[^\sA-Za-z\d]")
+_EMPTY_VALUE_RE = re.compile(r"^[\s\-*▪■]*(?:[^:：]*[:：])?\s*(?:nodata|nan|n/a)\s*$", re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile(r"\{context\}|\{query\}")
+_TRUNCATION_MARK = "…(其餘 {count} 行已省略)"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    啟發式 token 估計 (偏保守)：英文單字每 6 個字母一個 token，數字、中日韓字元、符號與換行各一個 token。
+    Qwen / DeepSeek 系列的 tokenizer 會把數字逐位切開，因此數字不合併計算。
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        tokens += (len(piece) + 5) // 6 if piece[0].isascii() and piece[0].isalpha() else 1
+    return tokens
+
+
+class TokenCounter:
+    def __init__(self, tokenizer_file: str | None = None):
+        """
+        本地 token 計數器。
+        設定 PROMPT_TOKENIZER_FILE (tokenizer.json) 且安裝 tokenizers 套件時使用模型真正的 tokenizer，
+        否則使用 estimate_tokens 的啟發式估計。
+        :param tokenizer_file: tokenizer.json 路徑，預設讀取環境變數 PROMPT_TOKENIZER_FILE
+        """
+        tokenizer_file = tokenizer_file or os.getenv("PROMPT_TOKENIZER_FILE")
+        self._tokenizer = None
+        self.name = "heuristic"
+        if tokenizer_file:
+            if Tokenizer is None:
+                print("未安裝 tokenizers 套件，改用啟發式 token 估計。")
+            else:
+                try:
+                    self._tokenizer = Tokenizer.from_file(tokenizer_file)
+                    self.name = f"tokenizer:{os.path.basename(tokenizer_file)}"
+                except Exception as e:
+                    print(f"載入 tokenizer 失敗 ({tokenizer_file})，改用啟發式 token 估計: {e}")
+
+    def __call__(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return estimate_tokens(text)
+
+
+def summarize_field(value: str, max_tokens: int, count_tokens=estimate_tokens) -> str:
+    """
+    以固定規則縮短過長的規格欄位 (例如 iointerface、cpu、otherfeatures)，相同輸入永遠得到相同輸出：
+    1. 移除值為 nodata / nan 的行
+    2. 仍過長時，先保留區塊標題與頂層項目，再依原順序放入子項目，直到達到上限
+    3. 被省略的行數會明確標示，讓 LLM 知道資料不完整而不是被靜默截斷
+    """
+    if count_tokens(value) <= max_tokens:
+        return value
+    lines = [line for line in value.splitlines() if line.strip() and not _EMPTY_VALUE_RE.match(line)]
+    text = "\n".join(lines)
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    top_level = [index for index, line in enumerate(lines) if not line[:1].isspace()]
+    nested = [index for index, line in enumerate(lines) if line[:1].isspace()]
+    mark_tokens = count_tokens(_TRUNCATION_MARK.format(count=len(lines)))
+    used = mark_tokens
+    kept = set()
+    for index in top_level + nested:
+        line_tokens = count_tokens(lines[index]) + 1
+        if used + line_tokens > max_tokens:
+            # 頂層項目放不下時不再嘗試後面的行，保持結果可預期
+            break
+        kept.add(index)
+        used += line_tokens
+
+    if not kept:
+        # 連第一行都放不下時，依字元比例截斷第一行
+        first = lines[0]
+        ratio = max(0.0, (max_tokens - mark_tokens) / max(1, count_tokens(first)))
+        kept_text = first[:int(len(first) * ratio)].rstrip()
+        return (kept_text + "\n" if kept_text else "") + _TRUNCATION_MARK.format(count=len(lines) - (1 if kept_text else 0))
+    summary = [lines[index] for index in sorted(kept)]
+    summary.append(_TRUNCATION_MARK.format(count=len(lines) - len(kept)))
+    return "\n".join(summary)
+
+
+def resolve_context_window(model_name: str | None) -> int | None:
+    """依模型名稱 (例如 deepseek-r1:7b) 查詢模型家族支援的最大上下文長度，未知模型返回 None"""
+    if not model_name:
+        return None
+    family = model_name.split(":")[0].lower()
+    for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if family.startswith(prefix):
+            return MODEL_CONTEXT_WINDOWS[prefix]
+    return None
+
+
+class PromptBudget:
+    def __init__(self, model_name: str | None = None, num_ctx: int | None = None,
+                 completion_reserve: int | None = None, count_tokens=None):
+        """
+        提示的 token 預算：num_ctx = 提示 + 保留給回答的 token，
+        組好的提示保證不超過 num_ctx - completion_reserve，Ollama 就不會從前面靜默截斷提示。
+        :param model_name: Ollama 模型名稱，用於查詢模型的上下文上限
+        :param num_ctx: 實際使用的上下文長度，預設讀取環境變數 OLLAMA_NUM_CTX (8192)，不超過已知模型的上限
+        :param completion_reserve: 保留給推理與回答的 token，預設讀取環境變數 PROMPT_COMPLETION_RESERVE (2048)
+        :param count_tokens: token 計數函數，預設為 TokenCounter()
+        """
+        if num_ctx is None:
+            num_ctx = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+        if completion_reserve is None:
+            completion_reserve = int(os.getenv("PROMPT_COMPLETION_RESERVE", "2048"))
+        self.model_name = model_name
+        self.context_window = resolve_context_window(model_name)
+        self.num_ctx = min(num_ctx, self.context_window) if self.context_window else num_ctx
+        self.completion_reserve = min(completion_reserve, self.num_ctx // 2)
+        self.count_tokens = count_tokens or TokenCounter()
+        # 啟發式估計的誤差緩衝
+        self.safety_margin = max(32, self.num_ctx // 50)
+        self._template_tokens = {}
+        self.stats = {"requests": 0, "rejected": 0, "total_prompt_tokens": 0, "max_prompt_tokens": 0,
+                      "total_completion_tokens": 0, "max_completion_tokens": 0,
+                      "last_prompt_tokens": 0, "last_context_tokens": 0, "last_completion_tokens": 0}
+
+    @property
+    def prompt_limit(self) -> int:
+        """提示本身可使用的 token 上限"""
+        return self.num_ctx - self.completion_reserve - self.safety_margin
+
+    def context_budget(self, template: str, query: str) -> int:
+        """扣除固定提示模板與使用者查詢之後，上下文可使用的 token 數"""
+        if template not in self._template_tokens:
+            self._template_tokens[template] = self.count_tokens(_PLACEHOLDER_RE.sub("", template))
+        return self.prompt_limit - self._template_tokens[template] - self.count_tokens(query)
+
+    @staticmethod
+    def assemble(template: str, context: str, query: str) -> str:
+        """單次替換 {context} 與 {query}，避免查詢或上下文內容中的大括號被再次替換"""
+        values = {"{context}": context, "{query}": query}
+        return _PLACEHOLDER_RE.sub(lambda match: values[match.group(0)], template)
+
+    def fits(self, prompt_tokens: int) -> bool:
+        return prompt_tokens <= self.prompt_limit
+
+    def llm_options(self) -> dict:
+        """每次呼叫傳給 Ollama 的參數，確保伺服器端使用相同的 num_ctx"""
+        return {"num_ctx": self.num_ctx}
+
+    def record(self, prompt_tokens: int, completion_tokens: int, context_tokens: int = 0):
+        """記錄單次請求的提示與回答 token 數"""
+        stats = self.stats
+        stats["requests"] += 1
+        stats["total_prompt_tokens"] += prompt_tokens
+        stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], prompt_tokens)
+        stats["total_completion_tokens"] += completion_tokens
+        stats["max_completion_tokens"] = max(stats["max_completion_tokens"], completion_tokens)
+        stats["last_prompt_tokens"] = prompt_tokens
+        stats["last_context_tokens"] = context_tokens
+        stats["last_completion_tokens"] = completion_tokens
+
+    def record_rejected(self):
+        self.stats["rejected"] += 1
+
+    def get_metrics(self) -> dict:
+        stats = dict(self.stats)
+        requests = stats["requests"]
+        stats["avg_prompt_tokens"] = round(stats["total_prompt_tokens"] / requests, 1) if requests else 0.0
+        stats["avg_completion_tokens"] = round(stats["total_completion_tokens"] / requests, 1) if requests else 0.0
+        stats.update({
+            "model": self.model_name,
+            "num_ctx": self.num_ctx,
+            "context_window": self.context_window,
+            "completion_reserve": self.completion_reserve,
+            "prompt_limit": self.prompt_limit,
+            "tokenizer": getattr(self.count_tokens, "name", "custom"),
+        })
+        return stats
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import re
+
+from .PromptBudget import PromptBudget
+
+_PLACEHOLDER_RE = re.compile(r"\{context\}|\{query\}")
+_SECTION_RE = re.compile(r"^\[[^\]\n]+\]", re.MULTILINE)
+PREFIX_MODES = ("inline", "system")
+
+
+class PromptLayout:
+    def __init__(self, template: str, prefix_mode: str | None = None):
+        """
+        將提示模板切成「固定前綴 + 動態部分」，讓每次請求的前綴逐位元組相同，
+        Ollama 在模型常駐 (keep_alive) 時即可重用前綴的 KV cache，只需計算上下文與查詢的部分。
+        固定前綴止於第一個佔位符所在段落 (例如 [DATA CONTEXT]) 之前。
+        :param template: 含 {context} 與 {query} 的提示模板
+        :param prefix_mode: "inline" (整份提示以 prompt 傳送) 或 "system" (固定前綴以 Ollama 的 system 參數傳送)，
+                            預設讀取環境變數 PROMPT_PREFIX_MODE (inline)
+        """
+        if prefix_mode is None:
+            prefix_mode = os.getenv("PROMPT_PREFIX_MODE", "inline")
+        if prefix_mode not in PREFIX_MODES:
+            raise ValueError(f"不支援的前綴模式: {prefix_mode} (可用: {', '.join(PREFIX_MODES)})")
+        placeholder = _PLACEHOLDER_RE.search(template)
+        if placeholder is None:
+            raise ValueError("提示模板中缺少 {context} 或 {query} 佔位符")
+
+        split_at = placeholder.start()
+        sections = [match.start() for match in _SECTION_RE.finditer(template, 0, split_at)]
+        if sections:
+            split_at = sections[-1]
+        self.template = template
+        self.prefix_mode = prefix_mode
+        self.prefix = template[:split_at]
+        self.body = template[split_at:]
+        self.prefix_hash = hashlib.sha1(self.prefix.encode("utf-8")).hexdigest()[:12]
+
+    @classmethod
+    def from_file(cls, path: str, prefix_mode: str | None = None) -> "PromptLayout":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read(), prefix_mode)
+
+    def render(self, context: str, query: str) -> tuple:
+        """
+        返回 (prompt, llm_kwargs)。
+        inline 模式下 prompt 為完整提示；system 模式下固定前綴放在 llm_kwargs["system"]，prompt 只含動態部分。
+        """
+        if self.prefix_mode == "system":
+            return PromptBudget.assemble(self.body, context, query), {"system": self.prefix.rstrip()}
+        return PromptBudget.assemble(self.template, context, query), {}
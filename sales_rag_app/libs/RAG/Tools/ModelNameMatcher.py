@@ -0,0 +1,67 @@
+import re
+
+# 型號名稱中冒號與空白視為同一種分隔，可省略 (例如 "AHP819: FP7R2" / "AHP819 FP7R2" / "AHP819FP7R2")
+_SEPARATOR_SPLIT = re.compile(r"[\s:]+")
+_SEPARATOR_PATTERN = r"[\s:]*"
+
+
+class ModelNameMatcher:
+    def __init__(self, modelnames):
+        """
+        預先編譯的型號名稱比對器。
+        所有型號先建立字元 trie，再轉為一條共用前綴的正規表達式，
+        每次查詢只需掃描一次字串，成本與型號數量幾乎無關。
+        :param modelnames: 型錄中的所有型號名稱
+        """
+        self.modelnames = tuple(dict.fromkeys(name for name in modelnames if name))
+        self._by_key = {}
+        trie = {}
+        for name in self.modelnames:
+            self._by_key.setdefault(self.canonical(name), name)
+            node = trie
+            for atom in self._atoms(name):
+                node = node.setdefault(atom, {})
+            node[""] = {}
+
+        body = self._trie_to_regex(trie)
+        # 以英數字作為邊界 (而非 \b)，讓「AG958的」這類緊接中文的寫法也能比對
+        self._pattern = re.compile(r"(?<![0-9a-z])" + body + r"(?![0-9a-z])", re.IGNORECASE) if body else None
+
+    @staticmethod
+    def canonical(text: str) -> str:
+        """移除冒號與空白並轉小寫，作為型號的比對鍵"""
+        return _SEPARATOR_SPLIT.sub("", text).lower()
+
+    def find(self, query: str) -> list:
+        """依出現順序返回查詢中提到的型號 (去重，使用型錄中的標準寫法)"""
+        if not self._pattern or not query:
+            return []
+        found = []
+        for match in self._pattern.finditer(query):
+            modelname = self._by_key.get(self.canonical(match.group(0)))
+            if modelname and modelname not in found:
+                found.append(modelname)
+        return found
+
+    def __contains__(self, text: str) -> bool:
+        return self.canonical(text) in self._by_key
+
+    @staticmethod
+    def _atoms(name: str) -> list:
+        atoms = []
+        for index, token in enumerate(t for t in _SEPARATOR_SPLIT.split(name.strip().lower()) if t):
+            if index:
+                atoms.append(_SEPARATOR_PATTERN)
+            atoms.extend(re.escape(ch) for ch in token)
+        return atoms
+
+    @classmethod
+    def _trie_to_regex(cls, node: dict) -> str:
+        is_end = "" in node
+        branches = [atom + cls._trie_to_regex(child) for atom, child in sorted(node.items()) if atom]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if is_end else body
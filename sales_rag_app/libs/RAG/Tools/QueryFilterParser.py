@@ -0,0 +1,100 @@
+import re
+
+# 數值單位 -> (specs_normalized 欄位, 換算成欄位單位的倍率)
+UNIT_COLUMNS = {
+    "公斤": ("weight_g", 1000.0), "kg": ("weight_g", 1000.0), "公克": ("weight_g", 1.0), "克": ("weight_g", 1.0),
+    "g": ("weight_g", 1.0), "wh": ("battery_wh", 1.0), "gb": ("memory_gb", 1.0), "瓦": ("tdp_w", 1.0),
+    "w": ("tdp_w", 1.0),
+}
+
+# 範圍方向：max 為上限 (以下)、min 為下限 (以上)
+BOUND_KEYWORDS = {
+    "max": ("以下", "以內", "以内", "之內", "之内", "小於", "小于", "低於", "低于", "少於", "少于", "不超過", "不超过",
+            "不到", "under", "below", "less than", "at most", "up to", "within", "<=", "≤", "<"),
+    "min": ("以上", "大於", "大于", "高於", "高于", "多於", "多于", "超過", "超过", "至少", "不少於", "不少于",
+            "over", "above", "more than", "at least", ">=", "≥", ">"),
+}
+
+_KEYWORD_BOUND = {word: bound for bound, words in BOUND_KEYWORDS.items() for word in words}
+_BOUND = "|".join(re.escape(word) for word in sorted(_KEYWORD_BOUND, key=len, reverse=True))
+_UNIT = "|".join(re.escape(unit) for unit in sorted(UNIT_COLUMNS, key=len, reverse=True))
+# 例如 "2kg以下"、"under 1.8 kg"、"至少 32GB"、"電池 70Wh 以上"；數字前後不可緊接英數字 (避免 RX7600M、DDR5)
+_RANGE_RE = re.compile(rf"(?:(?P<before>{_BOUND})\s*)?(?<![A-Za-z0-9.])(?P<number>\d+(?:\.\d+)?)\s*"
+                       rf"(?P<unit>{_UNIT})(?![A-Za-z])(?:\s*(?P<after>{_BOUND}))?", re.IGNORECASE)
+# 記憶體類型：完全比對，DDR5 不符合 LPDDR5
+_MEMORY_TYPE_RE = re.compile(r"(?<![A-Za-z0-9])((?:LP)?DDR[3-5]X?)(?![0-9])", re.IGNORECASE)
+
+
+class QueryFilters:
+    def __init__(self, modeltypes: list | None = None, memory_types: list | None = None, ranges: dict | None = None):
+        """
+        從查詢擷取的結構化條件，對應 specs_normalized 的欄位。
+        :param modeltypes: 系列 (例如 "958")，任一符合即可
+        :param memory_types: 記憶體類型 (例如 "DDR5")，與 memory_type 中以 " / " 分隔的類型完全比對，任一符合即可
+        :param ranges: 數值欄位 -> (下限, 上限)，None 表示不限制
+        """
+        self.modeltypes = modeltypes or []
+        self.memory_types = memory_types or []
+        self.ranges = ranges or {}
+
+    def __bool__(self):
+        return bool(self.modeltypes or self.memory_types or self.ranges)
+
+    def matches(self, normalized) -> bool:
+        """在記憶體中以 specs_normalized 的一列判斷是否符合 (SQL 無法使用時的備援)"""
+        if normalized is None:
+            return False
+        if self.modeltypes and normalized.get("modeltype") not in self.modeltypes:
+            return False
+        if self.memory_types:
+            memory_types = (normalized.get("memory_type") or "").upper().split(" / ")
+            if not any(keyword in memory_types for keyword in self.memory_types):
+                return False
+        for column, (low, high) in self.ranges.items():
+            value = normalized.get(column)
+            if value is None or (low is not None and value < low) or (high is not None and value > high):
+                return False
+        return True
+
+    def to_dict(self) -> dict:
+        return {"modeltypes": self.modeltypes, "memory_types": self.memory_types,
+                "ranges": {column: list(bounds) for column, bounds in self.ranges.items()}}
+
+    def __repr__(self):
+        return f"QueryFilters({self.to_dict()})"
+
+
+class QueryFilterParser:
+    def __init__(self, modeltypes=()):
+        """
+        以規則從查詢擷取結構化條件：系列、記憶體類型與帶單位的數值範圍 ("2kg以下"、"至少 32GB")。
+        沒有方向字眼的數值 (例如只寫 "2kg") 不視為條件。
+        :param modeltypes: 型錄中的系列名稱
+        """
+        self.modeltypes = tuple(modeltypes)
+        self._modeltype_re = None
+        if self.modeltypes:
+            names = "|".join(re.escape(name) for name in sorted(self.modeltypes, key=len, reverse=True))
+            self._modeltype_re = re.compile(rf"(?<![A-Za-z0-9])({names})(?![0-9])", re.IGNORECASE)
+
+    def parse(self, query: str) -> QueryFilters:
+        modeltypes = []
+        if self._modeltype_re is not None:
+            lookup = {name.lower(): name for name in self.modeltypes}
+            modeltypes = list(dict.fromkeys(lookup[match.group(1).lower()]
+                                            for match in self._modeltype_re.finditer(query)))
+        memory_types = list(dict.fromkeys(match.group(1).upper() for match in _MEMORY_TYPE_RE.finditer(query)))
+        ranges = {}
+        for match in _RANGE_RE.finditer(query):
+            keyword = match.group("after") or match.group("before")
+            if not keyword:
+                continue
+            column, scale = UNIT_COLUMNS[match.group("unit").lower()]
+            value = float(match.group("number")) * scale
+            low, high = ranges.get(column, (None, None))
+            if _KEYWORD_BOUND[keyword.lower()] == "max":
+                high = value if high is None else min(high, value)
+            else:
+                low = value if low is None else max(low, value)
+            ranges[column] = (low, high)
+        return QueryFilters(modeltypes, memory_types, ranges)
@@ -0,0 +1,135 @@
+import re
+
+from .SpecExtractor import SPEC_ATTRIBUTES
+
+# 規格屬性 -> 關鍵字 (屬性代號對應 SpecExtractor.SPEC_ATTRIBUTES)
+# 單獨的 "light" 多半指燈光 (light bar、keyboard light)，不列為重量關鍵字，這類功能問題交給 LLM
+ATTRIBUTE_KEYWORDS = {
+    "cpu": ("cpu", "處理器", "处理器", "processor"),
+    "gpu": ("gpu", "顯卡", "显卡", "顯示卡", "顯示晶片", "graphics", "graphics card"),
+    "memory": ("記憶體", "内存", "memory", "ram"),
+    "storage": ("儲存", "存储", "硬碟", "硬盘", "storage", "ssd"),
+    "battery": ("電池", "电池", "電池容量", "电池容量", "battery", "battery capacity"),
+    "battery_life": ("續航", "续航", "電池續航", "电池续航", "續航力", "battery life", "battery runtime"),
+    "weight": ("重量", "多重", "輕", "轻", "最重", "更重", "較重", "weight", "weigh", "heavy", "heavier",
+               "heaviest", "lighter", "lightest", "lightweight"),
+    "dimensions": ("尺寸", "大小", "厚度", "dimension", "dimensions", "size", "thickness"),
+    "thermal": ("散熱", "散热", "功耗", "tdp", "thermal", "cooling"),
+    "display": ("螢幕", "屏幕", "顯示器", "解析度", "更新率", "display", "screen", "lcd", "resolution",
+                "refresh rate"),
+    "wifi": ("wifi", "wi-fi", "無線網路", "无线网络"),
+    "bluetooth": ("藍牙", "蓝牙", "藍芽", "bluetooth"),
+    "os": ("作業系統", "操作系统", "operating system", "os"),
+}
+
+# 需要推理或主觀判斷的問題一律交給 LLM
+OPEN_KEYWORDS = (
+    "適合", "适合", "推薦", "推荐", "建議", "建议", "為什麼", "为什么", "如何", "怎麼", "怎么", "優缺點", "优缺点",
+    "優點", "缺點", "評價", "评价", "值得", "介紹", "介绍", "說明", "說明一下", "解釋", "解释", "遊戲", "游戏",
+    "電競", "电竞", "比較好", "比较好", "較好", "更好", "好不好", "哪個好", "哪个好", "差別在哪", "用途", "體驗",
+    "recommend", "recommendation", "suitable", "suit", "why", "explain", "describe", "introduce", "how to",
+    "how about", "how good", "how well", "should", "better", "worth", "pros", "cons", "review", "gaming", "game",
+    "games", "experience",
+)
+
+# 排序方向：min / max 直接指定方向，best 依屬性的 higher_is_better 決定
+DIRECTION_KEYWORDS = {
+    "min": ("最輕", "最轻", "最小", "最低", "最少", "最薄", "較輕", "较轻", "更輕", "更轻", "比較輕", "lightest",
+            "lighter", "smallest", "lowest", "least", "thinnest"),
+    "max": ("最重", "最大", "最高", "最多", "最長", "最长", "較重", "更重", "更大", "較大", "更多", "heaviest",
+            "heavier", "largest", "biggest", "highest", "most", "longest"),
+    "best": ("最好", "最佳", "最強", "最强", "best", "strongest"),
+}
+
+# 排序結果可直接回答的「哪一台」問題
+_WHICH_KEYWORDS = ("哪", "which", "排名", "排序", "rank", "ranking")
+
+
+def _keyword_pattern(keywords) -> re.Pattern:
+    # 長關鍵字優先 ("電池續航" 不會被拆成 "電池")，英文關鍵字以英數字為邊界
+    parts = []
+    for word in sorted(set(keywords), key=len, reverse=True):
+        escaped = re.escape(word)
+        parts.append(rf"(?<![0-9a-z]){escaped}(?![0-9a-z])" if word.isascii() else escaped)
+    return re.compile("|".join(parts), re.IGNORECASE)
+
+
+_KEYWORD_ATTRIBUTE = {word.lower(): name for name, words in ATTRIBUTE_KEYWORDS.items() for word in words}
+_ATTRIBUTE_RE = _keyword_pattern(_KEYWORD_ATTRIBUTE)
+_OPEN_RE = _keyword_pattern(OPEN_KEYWORDS)
+_KEYWORD_DIRECTION = {word.lower(): direction for direction, words in DIRECTION_KEYWORDS.items() for word in words}
+_DIRECTION_RE = _keyword_pattern(_KEYWORD_DIRECTION)
+_WHICH_RE = _keyword_pattern(_WHICH_KEYWORDS)
+
+
+class QueryIntent:
+    def __init__(self, kind: str, attributes: list, direction: str | None = None, reason: str = ""):
+        """
+        查詢意圖分類結果。
+        :param kind: "lookup" (單一型號查規格)、"compare" (多型號比較規格)、"rank" (依數值屬性找出最高/最低) 或 "open" (交給 LLM)
+        :param attributes: 查詢的規格屬性代號 (依出現順序)
+        :param direction: rank 時的方向 "min" / "max"
+        :param reason: 判斷依據，寫入日誌方便追查
+        """
+        self.kind = kind
+        self.attributes = attributes
+        self.direction = direction
+        self.reason = reason
+
+    @property
+    def structured(self) -> bool:
+        """是否可由規則引擎直接回答"""
+        return self.kind != "open"
+
+    def __repr__(self):
+        return f"QueryIntent(kind={self.kind!r}, attributes={self.attributes}, direction={self.direction!r})"
+
+
+class QueryIntentClassifier:
+    def __init__(self, max_attributes: int = 4):
+        """
+        以關鍵字規則判斷查詢是否為單純的規格查詢/比較，是的話可以不經過 LLM。
+        只要出現主觀或需要推理的字眼 (適合、推薦、為什麼…)，或找不到可擷取的規格屬性，就歸為 open。
+        :param max_attributes: 一次最多直接回答的屬性數，超過時交給 LLM 整理
+        """
+        self.max_attributes = max_attributes
+
+    def mentions_specs(self, query: str) -> bool:
+        """查詢是否提到規格屬性或屬於產品相關的開放式問題 (適合、推薦…)，用於判斷是否值得檢索"""
+        return bool(_ATTRIBUTE_RE.search(query) or _OPEN_RE.search(query))
+
+    def classify(self, query: str, model_count: int) -> QueryIntent:
+        """
+        :param query: 使用者查詢
+        :param model_count: 查詢所對應的型號數
+        """
+        attributes = list(dict.fromkeys(_KEYWORD_ATTRIBUTE[match.group(0).lower()]
+                                        for match in _ATTRIBUTE_RE.finditer(query)))
+        open_match = _OPEN_RE.search(query)
+        if open_match:
+            return QueryIntent("open", attributes, reason=f"開放式問題: {open_match.group(0)}")
+        if not attributes:
+            return QueryIntent("open", attributes, reason="未偵測到可直接擷取的規格屬性")
+        if len(attributes) > self.max_attributes:
+            return QueryIntent("open", attributes, reason=f"屬性過多 ({len(attributes)})")
+        if model_count < 1:
+            return QueryIntent("open", attributes, reason="沒有對應的型號")
+
+        direction_match = _DIRECTION_RE.search(query)
+        if direction_match and model_count > 1:
+            numeric = [name for name in attributes if SPEC_ATTRIBUTES[name].numeric is not None]
+            if len(numeric) != 1:
+                return QueryIntent("open", attributes, reason="排序問題沒有唯一的數值屬性")
+            attribute = SPEC_ATTRIBUTES[numeric[0]]
+            direction = _KEYWORD_DIRECTION[direction_match.group(0).lower()]
+            if direction == "best":
+                if attribute.higher_is_better is None:
+                    return QueryIntent("open", attributes, reason=f"{attribute.label} 沒有客觀的好壞")
+                direction = "max" if attribute.higher_is_better else "min"
+            return QueryIntent("rank", [attribute.name], direction, reason=f"排序: {direction_match.group(0)}")
+        if model_count > 1:
+            if _WHICH_RE.search(query):
+                # 問「哪一台」卻沒有可排序的方向 (例如「哪台螢幕大」)，交給 LLM 判斷
+                return QueryIntent("open", attributes, reason="詢問哪一台但沒有排序方向")
+            return QueryIntent("compare", attributes, reason="多型號規格比較")
+        return QueryIntent("lookup", attributes, reason="單一型號規格查詢")
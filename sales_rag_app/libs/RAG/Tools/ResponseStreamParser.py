@@ -0,0 +1,309 @@
+import re
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+_WHITESPACE = frozenset(" \t\n\r")
+_NUMBER_START = frozenset("-0123456789")
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_LITERALS = ("true", "false", "null")
+# 字串中需要逐字元處理的符號 (與 json 模組相同，未跳脫的控制字元視為不合法)
+_STRING_SPECIAL_RE = re.compile(r'["\\\x00-\x1f]')
+
+
+class ResponseStreamParser:
+    THINK_START = "<think>"
+    THINK_END = "</think>"
+
+    def __init__(self, summary_key: str = "answer_summary"):
+        """
+        增量解析 LLM 的串流輸出：
+        1. 分離 <think> ... </think> 推理段落
+        2. 追蹤 JSON 外框的結構，外框閉合時即標記完成
+        3. 在 answer_summary 字串生成的同時即時解碼並產出其內容
+        4. 逐字元檢查 JSON 文法，輸出一旦不可能是合法 JSON 即設定 malformed，呼叫端可立即中止生成
+        :param summary_key: 需要即時串流的頂層字串欄位
+        """
+        self.summary_key = summary_key
+        self.text = ""
+        self.phase = "init"  # init -> think -> answer -> done (或 error)
+        self.malformed = None
+        self.think_start = -1
+        self._pos = 0
+
+        # JSON 掃描狀態
+        self.json_start = -1
+        self.json_end = -1
+        self._stack = []
+        self._state = None
+        self._token = None
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._unicode_digits = None
+        # 代理對 (\ud83d\ude00) 的前半，等後半到達後合併成一個字元
+        self._high_surrogate = None
+        self._reading_key = False
+        self._key_chars = []
+        self._last_key = None
+        self._capturing = False
+
+    @property
+    def complete(self) -> bool:
+        """JSON 外框是否已經閉合"""
+        return self.phase == "done"
+
+    @property
+    def json_text(self) -> str | None:
+        """已閉合的 JSON 外框原文"""
+        if self.json_start == -1 or self.json_end == -1:
+            return None
+        return self.text[self.json_start:self.json_end + 1]
+
+    @property
+    def think_text(self) -> str:
+        """目前為止的推理文字 (<think> 之後、</think> 之前)"""
+        if self.think_start == -1:
+            return ""
+        end = self.text.find(self.THINK_END, self.think_start)
+        return self.text[self.think_start:] if end == -1 else self.text[self.think_start:end]
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        """
+        輸入一段新的輸出文字
+        :return: 事件列表，每個事件為 ("think", 文字) 或 ("answer", 文字)
+        """
+        if not chunk or self.phase in ("done", "error"):
+            self.text += chunk or ""
+            return []
+        self.text += chunk
+        events = []
+
+        if self.phase == "init":
+            stripped = self.text.lstrip()
+            if stripped.startswith(self.THINK_START):
+                self.phase = "think"
+                self._pos = self.text.index(self.THINK_START) + len(self.THINK_START)
+                self.think_start = self._pos
+            elif self.THINK_START.startswith(stripped):
+                # 可能是被切開的 <think> 標籤，等待更多輸出
+                return events
+            else:
+                self.phase = "answer"
+                self._pos = 0
+
+        if self.phase == "think":
+            end = self.text.find(self.THINK_END, self._pos)
+            if end == -1:
+                # 保留可能被切開的 </think> 標籤前綴
+                safe_end = max(self._pos, len(self.text) - len(self.THINK_END) + 1)
+                if safe_end > self._pos:
+                    events.append(("think", self.text[self._pos:safe_end]))
+                    self._pos = safe_end
+                return events
+            if end > self._pos:
+                events.append(("think", self.text[self._pos:end]))
+            self._pos = end + len(self.THINK_END)
+            self.phase = "answer"
+
+        if self.phase == "answer":
+            answer_delta = self._scan_json()
+            if answer_delta:
+                events.append(("answer", answer_delta))
+        return events
+
+    def _fail(self, message: str, position: int):
+        """標記輸出已不可能是合法的 JSON，之後的輸出不再解析"""
+        self.malformed = f"{message} (位置 {position - self.json_start})"
+        self.phase = "error"
+
+    def _flush_surrogate(self) -> str:
+        """沒有接上後半的代理對前半以 U+FFFD 取代 (單獨的代理字元無法以 UTF-8 編碼送出)"""
+        if self._high_surrogate is None:
+            return ""
+        self._high_surrogate = None
+        return "\ufffd"
+
+    def _decode_unicode(self, code: int) -> str:
+        """解碼一個 \\uXXXX 跳脫序列，代理對的前半先保留，返回可輸出的文字"""
+        if 0xD800 <= code <= 0xDBFF:
+            pending = self._flush_surrogate()
+            self._high_surrogate = code
+            return pending
+        if 0xDC00 <= code <= 0xDFFF:
+            if self._high_surrogate is None:
+                return "\ufffd"
+            high, self._high_surrogate = self._high_surrogate, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        return self._flush_surrogate() + chr(code)
+
+    def _after_value(self):
+        """一個值結束後，依所在的容器決定下一個允許的符號"""
+        if self._stack:
+            self._state = "comma_or_end"
+        else:
+            self._state = "end"
+
+    def _finish_token(self, position: int) -> bool:
+        """數字或 true/false/null 結束時檢查其格式"""
+        token, self._token = self._token, None
+        if token in _LITERALS or _NUMBER_RE.fullmatch(token):
+            self._after_value()
+            return True
+        self._fail(f"無效的值 {token!r}", position)
+        return False
+
+    def _scan_json(self) -> str:
+        """
+        從上次位置繼續掃描 JSON，返回本次新增的 answer_summary 文字。
+        掃描時同時檢查 JSON 文法，一出現不可能合法的符號就設定 malformed 並停止。
+        """
+        delta = []
+        text = self.text
+        length = len(text)
+        i = self._pos
+        while i < length:
+            if self.json_start == -1:
+                i = text.find("{", i)
+                if i == -1:
+                    i = length
+                    break
+                self.json_start = i
+                self._stack.append("{")
+                self._state = "key_or_end"
+                i += 1
+                continue
+
+            ch = text[i]
+            if self._in_string:
+                decoded = None
+                if self._unicode_digits is not None:
+                    if ch not in _HEX_DIGITS:
+                        self._fail("無效的 \\u 跳脫序列", i)
+                        break
+                    self._unicode_digits += ch
+                    if len(self._unicode_digits) == 4:
+                        decoded = self._decode_unicode(int(self._unicode_digits, 16))
+                        self._unicode_digits = None
+                elif self._escape:
+                    self._escape = False
+                    if ch == "u":
+                        self._unicode_digits = ""
+                    elif ch in _ESCAPES:
+                        decoded = self._flush_surrogate() + _ESCAPES[ch]
+                    else:
+                        self._fail(f"無效的跳脫字元 \\{ch}", i)
+                        break
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    pending = self._flush_surrogate()
+                    if pending and self._reading_key:
+                        self._key_chars.append(pending)
+                    elif pending and self._capturing:
+                        delta.append(pending)
+                    if self._string_is_key:
+                        if self._reading_key:
+                            self._reading_key = False
+                            self._last_key = "".join(self._key_chars)
+                        self._state = "colon"
+                    else:
+                        self._capturing = False
+                        self._after_value()
+                elif ch < " ":
+                    self._fail("字串中含有未跳脫的控制字元", i)
+                    break
+                else:
+                    # 一般字元：直接跳到下一個引號、反斜線或控制字元
+                    match = _STRING_SPECIAL_RE.search(text, i)
+                    end = match.start() if match else length
+                    plain = self._flush_surrogate() + text[i:end]
+                    if self._reading_key:
+                        self._key_chars.append(plain)
+                    elif self._capturing:
+                        delta.append(plain)
+                    i = end
+                    continue
+
+                if decoded:
+                    if self._reading_key:
+                        self._key_chars.append(decoded)
+                    elif self._capturing:
+                        delta.append(decoded)
+                i += 1
+                continue
+
+            if self._token is not None:
+                if ch in _NUMBER_CHARS if self._token[0] in _NUMBER_START else "a" <= ch <= "z":
+                    self._token += ch
+                    if self._token[0] not in _NUMBER_START and not any(
+                            literal.startswith(self._token) for literal in _LITERALS):
+                        self._fail(f"無效的值 {self._token!r}", i)
+                        break
+                    i += 1
+                    continue
+                if not self._finish_token(i):
+                    break
+
+            if ch in _WHITESPACE:
+                i += 1
+                continue
+
+            state = self._state
+            if state in ("value", "value_or_end"):
+                if ch == "]" and state == "value_or_end":
+                    self._stack.pop()
+                    self._after_value()
+                elif ch == '"':
+                    self._in_string = True
+                    self._string_is_key = False
+                    if len(self._stack) == 1 and self._last_key == self.summary_key:
+                        self._capturing = True
+                elif ch == "{":
+                    self._stack.append("{")
+                    self._state = "key_or_end"
+                elif ch == "[":
+                    self._stack.append("[")
+                    self._state = "value_or_end"
+                elif ch in _NUMBER_START or ch in "tfn":
+                    self._token = ch
+                else:
+                    self._fail(f"預期為值，卻出現 {ch!r}", i)
+                    break
+            elif state in ("key", "key_or_end"):
+                if ch == '"':
+                    self._in_string = True
+                    self._string_is_key = True
+                    if len(self._stack) == 1:
+                        self._reading_key = True
+                        self._key_chars = []
+                elif ch == "}" and state == "key_or_end":
+                    self._stack.pop()
+                    self._after_value()
+                else:
+                    self._fail(f"預期為欄位名稱，卻出現 {ch!r}", i)
+                    break
+            elif state == "colon":
+                if ch != ":":
+                    self._fail(f"欄位名稱後預期為 ':'，卻出現 {ch!r}", i)
+                    break
+                self._state = "value"
+            elif state == "comma_or_end":
+                container = self._stack[-1]
+                if ch == ",":
+                    self._state = "key" if container == "{" else "value"
+                elif ch == ("}" if container == "{" else "]"):
+                    self._stack.pop()
+                    self._after_value()
+                else:
+                    self._fail(f"預期為 ',' 或 '{'}' if container == '{' else ']'}'，卻出現 {ch!r}", i)
+                    break
+
+            i += 1
+            if self._state == "end":
+                self.json_end = i - 1
+                self.phase = "done"
+                break
+        self._pos = i
+        return "".join(delta)
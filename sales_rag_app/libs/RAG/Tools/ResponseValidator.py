@@ -0,0 +1,161 @@
+import re
+from functools import lru_cache
+
+# LLM 回答中不應出現的品牌 (本資料庫只有自家 AMD 平台機種)
+INVALID_BRANDS = ("Acer", "ASUS", "Lenovo", "Dell", "MSI", "Razer", "NVIDIA", "Nvidia")
+# 不存在於資料庫中的 GPU 型號，以子字串比對
+INVALID_GPU_MODELS = ("RTX", "GTX", "RTX 3060", "RTX 3070", "RTX 3080", "RTX 3090", "RTX 4060", "RTX 4070",
+                      "RTX 4080", "RTX 4090", "GTX 1650", "GTX 1660")
+# LLM 常見的幻覺型號，出現在表格欄位名稱時視為無效；出現在摘要中則不視為未知型號
+KNOWN_INVALID_MODELS = ("M20W", "A520", "R7 5900HS", "Ryzen 7 958", "Ryzen 9 7640H")
+
+
+def _alternation(words) -> str:
+    # 長字串優先，讓回報的是最完整的比對 (例如 "RTX 4060" 而不是 "RTX")
+    return "|".join(re.escape(word) for word in sorted(set(words), key=len, reverse=True))
+
+
+# 品牌與 GPU 合併成單一 alternation，一次掃描完成；品牌的單字邊界在比對後檢查，
+# 開頭放 \b 會讓 re 無法使用首字元的快速跳躍，長回答的掃描成本會增加數倍
+_BLOCKED_RE = re.compile(_alternation(INVALID_BRANDS + INVALID_GPU_MODELS))
+_BLOCKED_GPU_RE = re.compile(_alternation(INVALID_GPU_MODELS))
+_BRAND_SET = frozenset(INVALID_BRANDS)
+_KNOWN_INVALID_RE = re.compile(_alternation(KNOWN_INVALID_MODELS))
+_KNOWN_INVALID_SET = frozenset(KNOWN_INVALID_MODELS)
+
+# 摘要中疑似型號的字串：目標型號含冒號時 (例如 "AHP819: FP7R2") 同時比對冒號與空白寫法
+_COLON_MODEL_RE = re.compile(r"[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s*:\s*[A-Z]+\d+[A-Z]*)")
+_SPACE_MODEL_RE = re.compile(r"[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s+[A-Z]+\d+[A-Z]*\d*)")
+_SIMPLE_MODEL_RE = re.compile(r"[A-Z]{2,3}\d{3}(?:-[A-Z]+)?")
+_TABLE_KEY_MODEL_RE = re.compile(r"[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s*:\s*[A-Z]+\d+)?")
+
+
+class TargetModels:
+    def __init__(self, modelnames: tuple):
+        """
+        一組目標型號預先計算好的變體集合與比對用的正規表示式，同一組型號只建立一次 (見 target_models)。
+        :param modelnames: 目標型號
+        """
+        variants = []
+        for modelname in modelnames:
+            variants.append(modelname)
+            if ":" in modelname:
+                # 沒有冒號的寫法 ("AHP819 FP7R2")
+                variants.append(modelname.replace(":", ""))
+            else:
+                parts = modelname.split()
+                if len(parts) >= 2:
+                    variants.append(f"{parts[0]}: {' '.join(parts[1:])}")
+        self.modelnames = modelnames
+        self.variants = frozenset(variants)
+        self.variant_re = re.compile(_alternation(variants)) if variants else None
+        self.patterns = ()
+        if any(":" in modelname for modelname in modelnames):
+            self.patterns += (_COLON_MODEL_RE, _SPACE_MODEL_RE)
+        if any(":" not in modelname for modelname in modelnames):
+            self.patterns += (_SIMPLE_MODEL_RE,)
+
+    def find_variant(self, text: str) -> str | None:
+        """返回文字中出現的第一個目標型號變體"""
+        if self.variant_re is None:
+            return None
+        match = self.variant_re.search(text)
+        return match.group(0) if match else None
+
+    def potential_models(self, text: str) -> set:
+        """文字中所有疑似型號的字串"""
+        found = set()
+        for pattern in self.patterns:
+            found.update(pattern.findall(text))
+        return found
+
+
+def _is_word_char(char: str) -> bool:
+    # 與 re 的 \w 相同 (Unicode 字母、數字與底線)，因此中文緊鄰品牌名稱時不算獨立單字
+    return char.isalnum() or char == "_"
+
+
+def find_blocked(text: str) -> tuple | None:
+    """
+    單次掃描找出第一個封鎖的品牌 (需為獨立單字) 或 GPU 型號 (子字串)。
+    :return: ("brand" | "gpu", 比對到的字串)，沒有時為 None
+    """
+    match = _BLOCKED_RE.search(text)
+    while match:
+        token = match.group(0)
+        if token not in _BRAND_SET:
+            return "gpu", token
+        start, end = match.span()
+        if (start == 0 or not _is_word_char(text[start - 1])) and (end == len(text) or not _is_word_char(text[end])):
+            return "brand", token
+        match = _BLOCKED_RE.search(text, start + 1)
+    return None
+
+
+@lru_cache(maxsize=256)
+def target_models(modelnames: tuple) -> TargetModels:
+    return TargetModels(modelnames)
+
+
+class ResponseValidator:
+    def __init__(self, has_modelname):
+        """
+        驗證 LLM 回答中的型號、品牌與 GPU 是否都來自資料庫。
+        所有正規表示式在模組載入時編譯，封鎖的品牌與 GPU 各合併成單一 alternation，
+        目標型號的變體集合依型號組合快取，驗證一次回答只需數次掃描。
+        :param has_modelname: modelname -> bool，判斷型號是否存在於型錄
+        """
+        self.has_modelname = has_modelname
+
+    def validate(self, parsed_json: dict, target_modelnames: list) -> bool:
+        return self.check(parsed_json, target_modelnames)[0]
+
+    def check(self, parsed_json: dict, target_modelnames: list) -> tuple:
+        """
+        :return: (是否有效, 判斷原因)
+        """
+        targets = target_models(tuple(target_modelnames))
+        answer_summary = parsed_json.get("answer_summary", "")
+        if answer_summary:
+            if not isinstance(answer_summary, str):
+                # 摘要必須是字串，字典或列表不轉成字串放行 (與原本的驗證一致)
+                return False, f"answer_summary 不是字串: {type(answer_summary).__name__}"
+            valid_variant = targets.find_variant(answer_summary)
+            if valid_variant is None:
+                for potential_model in targets.potential_models(answer_summary):
+                    if (potential_model not in targets.variants and potential_model not in _KNOWN_INVALID_SET
+                            and not self.has_modelname(potential_model)):
+                        return False, f"包含不存在的型號: {potential_model}"
+            blocked = find_blocked(answer_summary)
+            if blocked:
+                kind, token = blocked
+                return False, f"包含無效{'品牌' if kind == 'brand' else ' GPU 型號'}: {token}"
+            if valid_variant is not None:
+                return True, f"包含目標型號: {valid_variant}"
+            return False, "answer_summary 中沒有任何目標型號"
+
+        comparison_table = parsed_json.get("comparison_table", [])
+        if isinstance(comparison_table, list):
+            for row in comparison_table:
+                if not isinstance(row, dict):
+                    continue
+                if not targets.variants.isdisjoint(row):
+                    return True, "comparison_table 中包含目標型號"
+                for key in row:
+                    if key != "feature" and key not in targets.variants:
+                        match = _KNOWN_INVALID_RE.search(str(key))
+                        if match:
+                            return False, f"表格包含無效型號: {match.group(0)}"
+                for value in row.values():
+                    if isinstance(value, str):
+                        match = _BLOCKED_GPU_RE.search(value)
+                        if match:
+                            return False, f"表格包含無效 GPU 型號: {match.group(0)}"
+        elif isinstance(comparison_table, dict):
+            for key in comparison_table:
+                if key != "modelname" and key not in targets.variants and _TABLE_KEY_MODEL_RE.match(key) \
+                        and not self.has_modelname(key):
+                    return False, f"表格包含不存在的型號: {key}"
+            if not targets.variants.isdisjoint(comparison_table):
+                return True, "comparison_table 中包含目標型號"
+        return False, "回答中沒有任何目標型號"
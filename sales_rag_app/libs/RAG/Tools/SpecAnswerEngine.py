@@ -0,0 +1,141 @@
+import re
+
+from .QueryIntentClassifier import QueryIntent
+from .SpecExtractor import SPEC_ATTRIBUTES
+
+# 擷取失敗時從原始欄位取第一行的長度上限
+_RAW_VALUE_LIMIT = 80
+_RAW_LABEL_RE = re.compile(r"^[\s■▪*\-]*[^:：\n]{0,40}[:：]\s*")
+_EMPTY_VALUES = {"", "nan", "none", "nodata", "n/a"}
+
+# rank 方向的描述，未列出的屬性使用「最低 / 最高」
+_DIRECTION_WORDS = {
+    "weight": {"min": "最輕", "max": "最重"},
+}
+
+
+def _format_number(value: float) -> str:
+    return f"{value:g}"
+
+
+def _raw_value(record, field: str) -> str | None:
+    """擷取規則不適用時，退回原始欄位中第一行有內容的文字 (去掉 "■ Battery：" 之類的標題)"""
+    for line in str(record.get(field) or "").splitlines():
+        text = _RAW_LABEL_RE.sub("", line).strip()
+        if text.lower() not in _EMPTY_VALUES:
+            return text if len(text) <= _RAW_VALUE_LIMIT else text[:_RAW_VALUE_LIMIT].rstrip() + "…"
+    return None
+
+
+def _number(attribute, record, normalized) -> float | None:
+    """優先讀取 ingest 時預先解析的數值，沒有正規化資料時才解析原始文字"""
+    if attribute.column and normalized is not None and attribute.column in normalized:
+        return normalized[attribute.column]
+    return attribute.numeric(record)
+
+
+def _display(attribute, record, normalized) -> str | None:
+    if attribute.column and normalized is not None and attribute.column in normalized:
+        value = normalized[attribute.column]
+        if value is None:
+            return None
+        if attribute.numeric is None:
+            return value
+        if attribute.format_value is not None:
+            return attribute.format_value(value)
+    return attribute.extract(record)
+
+
+class SpecAnswerEngine:
+    def __init__(self, attributes: dict | None = None, ranker=None):
+        """
+        由規格記錄直接組出 answer_summary 與 comparison_table，不經過 LLM。
+        任何一個屬性在所有型號上都擷取失敗時返回 None，由呼叫端改走 LLM。
+        :param attributes: 屬性代號 -> SpecAttribute，預設為 SpecExtractor.SPEC_ATTRIBUTES
+        :param ranker: (modelnames, column, descending) -> [(modelname, 數值), ...] 的排序函數
+                       (例如 DuckDBQuery.rank_models，在 SQL 中排序)；未提供或失敗時在記憶體中排序
+        """
+        self.attributes = attributes or SPEC_ATTRIBUTES
+        self.ranker = ranker
+
+    def answer(self, intent: QueryIntent, records: list, normalized: list | None = None) -> dict | None:
+        """
+        :param intent: QueryIntentClassifier 的分類結果 (open 一律返回 None)
+        :param records: SpecStore 的規格記錄
+        :param normalized: 與 records 對應的 specs_normalized 欄位 (weight_g、battery_wh…)，None 表示需解析原始文字
+        :return: {"answer_summary": str, "comparison_table": list}，無法直接回答時為 None
+        """
+        if not intent.structured or not records:
+            return None
+        if normalized is None:
+            normalized = [None] * len(records)
+        modelnames = [record["modelname"] for record in records]
+        numbers = {}
+        values = {}
+        for name in intent.attributes:
+            attribute = self.attributes[name]
+            extracted = [_display(attribute, record, row) for record, row in zip(records, normalized)]
+            if all(value is None for value in extracted):
+                return None
+            values[name] = [value if value is not None else (_raw_value(record, attribute.field) or "N/A")
+                            for value, record in zip(extracted, records)]
+            if attribute.numeric is not None:
+                numbers[name] = {model: _number(attribute, record, row)
+                                 for model, record, row in zip(modelnames, records, normalized)}
+
+        if intent.kind == "rank":
+            return self._rank(intent, modelnames, values, numbers)
+        table = [{"feature": self.attributes[name].label, **dict(zip(modelnames, row))} for name, row in values.items()]
+        if intent.kind == "lookup":
+            parts = [f"{self.attributes[name].label} 為 {row[0]}" for name, row in values.items()]
+            summary = f"{modelnames[0]} 的 " + "；".join(parts) + "。"
+        else:
+            summary = "；".join(self._compare_sentence(name, modelnames, row, numbers.get(name))
+                                for name, row in values.items()) + "。"
+        return {"answer_summary": summary, "comparison_table": table}
+
+    def _compare_sentence(self, name: str, modelnames: list, row: list, numbers: dict | None) -> str:
+        attribute = self.attributes[name]
+        if len(set(row)) == 1:
+            return f"{len(modelnames)} 款型號的 {attribute.label} 相同，皆為 {row[0]}"
+        if numbers is not None:
+            numbers = {model: number for model, number in numbers.items() if number is not None}
+            if len(numbers) >= 2 and len(set(numbers.values())) > 1:
+                words = _DIRECTION_WORDS.get(name, {"min": "最低", "max": "最高"})
+                high = max(numbers.values())
+                low = min(numbers.values())
+                high_models = "、".join(model for model, number in numbers.items() if number == high)
+                low_models = "、".join(model for model, number in numbers.items() if number == low)
+                return (f"{attribute.label} {words['max']}為 {high_models} ({_format_number(high)}{attribute.unit})，"
+                        f"{words['min']}為 {low_models} ({_format_number(low)}{attribute.unit})")
+        return f"{attribute.label} 各型號不同：" + "、".join(f"{model} {value}" for model, value in zip(modelnames, row))
+
+    def _rank(self, intent: QueryIntent, modelnames: list, values: dict, numbers: dict) -> dict | None:
+        name = intent.attributes[0]
+        attribute = self.attributes[name]
+        ranked = None
+        if self.ranker is not None and attribute.column:
+            ranked = self.ranker(modelnames, attribute.column, intent.direction == "max")
+        if ranked is None:
+            ranked = sorted(((model, number) for model, number in numbers[name].items() if number is not None),
+                            key=lambda item: item[1], reverse=intent.direction == "max")
+        if len(ranked) < 2:
+            return None
+        best = ranked[0][1]
+        winners = "、".join(model for model, number in ranked if number == best)
+        word = _DIRECTION_WORDS.get(name, {"min": "最低", "max": "最高"})[intent.direction]
+        order = "、".join(f"{model} ({_format_number(number)}{attribute.unit})" for model, number in ranked)
+        summary = f"{attribute.label} {word}的是 {winners} ({_format_number(best)}{attribute.unit})。排序：{order}。"
+        if len(ranked) < len(modelnames):
+            ranked_models = {model for model, _ in ranked}
+            missing = [model for model in modelnames if model not in ranked_models]
+            summary += f" 以下型號缺少 {attribute.label} 資料：{'、'.join(missing)}。"
+
+        # 名次依數值決定，數值相同的型號名次相同
+        positions = {model: next(position for position, (_, other) in enumerate(ranked, 1) if other == number)
+                     for model, number in ranked}
+        table = [
+            {"feature": attribute.label, **dict(zip(modelnames, values[name]))},
+            {"feature": "Rank", **{model: str(positions[model]) if model in positions else "N/A" for model in modelnames}},
+        ]
+        return {"answer_summary": summary, "comparison_table": table}
@@ -0,0 +1,218 @@
+import re
+
+_FLAGS = re.IGNORECASE
+_CPU_RE = re.compile(r"Ryzen™?\s*(?:AI\s+)?(?:\d+\s+)?(?:Pro\s+)?(?:HX\s+)?\d{3,4}[A-Z]{0,3}\d?", _FLAGS)
+_CPU_FAMILY_RE = re.compile(r"Ryzen™?\s*(\d)\b", _FLAGS)
+_GPU_RE = re.compile(r"Radeon™?\s*(?:(?:RX\s*)?\d{3,4}M?(?:\s*XT)?|Graphics)", _FLAGS)
+_MEMORY_TYPE_RE = re.compile(r"\bL?P?DDR\d[X]?\b", _FLAGS)
+_CAPACITY_GB_RE = re.compile(r"up to\s*((?:\d+\s*G?B?\s*/\s*)*\d+\s*GB?)\b", _FLAGS)
+_MEMORY_SPEED_RE = re.compile(r"(\d{4})\s*(?:MHz|MT/s)", _FLAGS)
+_STORAGE_TB_RE = re.compile(r"up to\s*(\d+)\s*TB", _FLAGS)
+_PCIE_RE = re.compile(r"PCIe\s*(?:Gen\s*|G)(\d)", _FLAGS)
+_WH_RE = re.compile(r"(\d+(?:\.\d+)?)\s*Wh\b", _FLAGS)
+_BATTERY_LIFE_RE = re.compile(r"Life\s*[:：]\s*([^\n]+)", _FLAGS)
+_WEIGHT_RE = re.compile(r"Weight[^:：\n]*[:：]\s*~?\s*(\d+(?:\.\d+)?)\s*(kg|g)\b", _FLAGS)
+_DIMENSION_RE = re.compile(r"(\d+(?:\.\d+)?\s*[×xX]\s*\d+(?:\.\d+)?\s*[×xX]\s*\d+(?:\.\d+)?)\s*mm", _FLAGS)
+_WATT_RE = re.compile(r"(\d+)\s*W\b")
+_SCREEN_SIZE_RE = re.compile(r"(\d{2}(?:\.\d)?)\s*(?:\"|”|inch)", _FLAGS)
+_RESOLUTION_RE = re.compile(r"(\d{4})\s*[×xX]\s*(\d{3,4})")
+_REFRESH_RE = re.compile(r"(\d{2,3})\s*Hz", _FLAGS)
+_WIFI_RE = re.compile(r"Wi-?Fi\s*(\d[E]?)", _FLAGS)
+_BLUETOOTH_RE = re.compile(r"(?:Bluetooth|BT)\s*(\d\.\d)", _FLAGS)
+_OS_RE = re.compile(r"Windows\s*(1[01])\b", _FLAGS)
+_SPACE_RE = re.compile(r"\s+")
+
+# 一個欄位最多列出的選項數
+_MAX_OPTIONS = 4
+
+
+def _unique(values) -> list:
+    return list(dict.fromkeys(_SPACE_RE.sub(" ", value.replace("™", "")).strip() for value in values if value))
+
+
+def _join(values: list) -> str | None:
+    if not values:
+        return None
+    if len(values) > _MAX_OPTIONS:
+        return " / ".join(values[:_MAX_OPTIONS]) + f" 等 {len(values)} 款"
+    return " / ".join(values)
+
+
+def _format_number(value: float) -> str:
+    return f"{value:g}"
+
+
+def cpu_models(record) -> str | None:
+    text = record.get("cpu") or ""
+    models = _unique(_CPU_RE.findall(text))
+    if not models:
+        # 只列出系列 (例如 "Ryzen™ 5 (TDP: 35W~54W)") 時退回系列名稱
+        models = _unique("Ryzen " + family for family in _CPU_FAMILY_RE.findall(text))
+    return _join(models)
+
+
+def gpu_models(record) -> str | None:
+    return _join(_unique(_GPU_RE.findall(record.get("gpu") or "")))
+
+
+def memory_type(record) -> str | None:
+    return _join(_unique(match.upper() for match in _MEMORY_TYPE_RE.findall(record.get("memory") or "")))
+
+
+def memory_max_gb(record) -> float | None:
+    # "up to 32GB"、"up to 4G/8G/16G"、"up to 16G/ 32G/ 64/ 128GB" 取最大值
+    values = [float(value) for capacities in _CAPACITY_GB_RE.findall(record.get("memory") or "")
+              for value in re.findall(r"\d+", capacities)]
+    return max(values) if values else None
+
+
+def memory_summary(record) -> str | None:
+    text = record.get("memory") or ""
+    parts = []
+    kind = memory_type(record)
+    if kind:
+        parts.append(kind)
+    capacity = memory_max_gb(record)
+    if capacity:
+        parts.append(f"最高 {_format_number(capacity)}GB")
+    speeds = _unique(_MEMORY_SPEED_RE.findall(text))
+    if speeds:
+        parts.append("/".join(speeds) + "MHz")
+    return ", ".join(parts) or None
+
+
+def storage_summary(record) -> str | None:
+    text = record.get("storage") or ""
+    parts = []
+    generations = _unique(_PCIE_RE.findall(text))
+    if generations:
+        parts.append("PCIe Gen" + "/".join(generations) + (" NVMe" if "nvme" in text.lower() else ""))
+    capacities = [int(value) for value in _STORAGE_TB_RE.findall(text)]
+    if capacities:
+        parts.append(f"最高 {max(capacities)}TB")
+    return ", ".join(parts) or None
+
+
+def battery_wh(record) -> float | None:
+    values = [float(value) for value in _WH_RE.findall(record.get("battery") or "")]
+    return max(values) if values else None
+
+
+def battery_capacity(record) -> str | None:
+    values = _unique(_format_number(float(value)) + "Wh" for value in _WH_RE.findall(record.get("battery") or ""))
+    return _join(values)
+
+
+def battery_life(record) -> str | None:
+    match = _BATTERY_LIFE_RE.search(record.get("battery") or "")
+    return match.group(1).strip() if match else None
+
+
+def weight_g(record) -> float | None:
+    match = _WEIGHT_RE.search(record.get("structconfig") or "")
+    if not match:
+        return None
+    value = float(match.group(1))
+    return value * 1000 if match.group(2).lower() == "kg" else value
+
+
+def format_weight(grams: float) -> str:
+    return f"{_format_number(grams)}g ({grams / 1000:.2f}kg)"
+
+
+def weight(record) -> str | None:
+    grams = weight_g(record)
+    return format_weight(grams) if grams is not None else None
+
+
+def dimensions(record) -> str | None:
+    values = _unique(_SPACE_RE.sub(" ", value) + " mm" for value in _DIMENSION_RE.findall(record.get("structconfig") or ""))
+    return _join(values)
+
+
+def tdp_w(record) -> float | None:
+    values = [float(value) for value in _WATT_RE.findall(record.get("thermal") or "")]
+    return max(values) if values else None
+
+
+def format_watts(value: float) -> str:
+    return f"{_format_number(value)}W"
+
+
+def thermal(record) -> str | None:
+    value = tdp_w(record)
+    return format_watts(value) if value is not None else None
+
+
+def display_summary(record) -> str | None:
+    text = record.get("lcd") or ""
+    parts = []
+    sizes = _unique(size + '"' for size in _SCREEN_SIZE_RE.findall(text))
+    if sizes:
+        parts.append(" / ".join(sizes))
+    resolutions = _unique(f"{width}×{height}" for width, height in _RESOLUTION_RE.findall(text))
+    if resolutions:
+        parts.append(" / ".join(resolutions))
+    rates = [int(rate) for rate in _REFRESH_RE.findall(text)]
+    if rates:
+        parts.append(f"最高 {max(rates)}Hz")
+    return ", ".join(parts) or None
+
+
+def wifi(record) -> str | None:
+    text = (record.get("wifislot") or "") + "\n" + (record.get("wireless") or "")
+    return _join(_unique("WiFi " + version.upper() for version in _WIFI_RE.findall(text)))
+
+
+def bluetooth(record) -> str | None:
+    text = (record.get("bluetooth") or "") + "\n" + (record.get("wifislot") or "")
+    return _join(_unique("BT " + version for version in _BLUETOOTH_RE.findall(text)))
+
+
+def operating_system(record) -> str | None:
+    return _join(_unique("Windows " + version for version in _OS_RE.findall(record.get("softwareconfig") or "")))
+
+
+class SpecAttribute:
+    def __init__(self, name: str, label: str, field: str, extract, numeric=None, unit: str = "",
+                 higher_is_better: bool | None = None, column: str | None = None, format_value=None):
+        """
+        可由規格文字直接擷取的屬性。
+        :param name: 屬性代號
+        :param label: 表格中顯示的名稱
+        :param field: 來源欄位
+        :param extract: record -> 顯示用字串 (擷取失敗時為 None)
+        :param numeric: record -> 數值，用於排序 (非數值屬性為 None)
+        :param unit: 數值的單位
+        :param higher_is_better: 「最好」時的排序方向，None 表示沒有自然的好壞
+        :param column: ingest 時預先解析的 specs_normalized 欄位 (有值時請求時直接讀取，不再解析文字)
+        :param format_value: 正規化數值 -> 顯示用字串 (未提供時顯示仍由 extract 產生)
+        """
+        self.name = name
+        self.label = label
+        self.field = field
+        self.extract = extract
+        self.numeric = numeric
+        self.unit = unit
+        self.higher_is_better = higher_is_better
+        self.column = column
+        self.format_value = format_value
+
+
+SPEC_ATTRIBUTES = {attribute.name: attribute for attribute in (
+    SpecAttribute("cpu", "CPU", "cpu", cpu_models, column="cpu_model"),
+    SpecAttribute("gpu", "GPU", "gpu", gpu_models, column="gpu_model"),
+    SpecAttribute("memory", "Memory", "memory", memory_summary, memory_max_gb, "GB", True, column="memory_gb"),
+    SpecAttribute("storage", "Storage", "storage", storage_summary),
+    SpecAttribute("battery", "Battery Capacity", "battery", battery_capacity, battery_wh, "Wh", True, column="battery_wh"),
+    SpecAttribute("battery_life", "Battery Life", "battery", battery_life),
+    SpecAttribute("weight", "Weight", "structconfig", weight, weight_g, "g", False, column="weight_g",
+                  format_value=format_weight),
+    SpecAttribute("dimensions", "Dimensions", "structconfig", dimensions),
+    SpecAttribute("thermal", "Thermal / TDP", "thermal", thermal, tdp_w, "W", True, column="tdp_w",
+                  format_value=format_watts),
+    SpecAttribute("display", "Display", "lcd", display_summary),
+    SpecAttribute("wifi", "WiFi", "wifislot", wifi),
+    SpecAttribute("bluetooth", "Bluetooth", "bluetooth", bluetooth),
+    SpecAttribute("os", "Operating System", "softwareconfig", operating_system),
+)}
@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+
+# 佇列優先權：數值越小越先放行，同優先權依抵達順序
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        """
+        請求未被放行 (對應 HTTP 429)。
+        :param reason: queue_full (佇列已滿)、overloaded (預估等待超過上限)、timeout (排隊逾時) 或 evicted (被優先權較高的請求擠出佇列)
+        :param retry_after: 建議的重試秒數
+        """
+        super().__init__(f"請求未被放行 ({reason})，請於 {retry_after} 秒後重試")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    def __init__(self, priority: int, seq: int, future):
+        self.key = (priority, seq)
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+        self.admitted_at = None
+        self.future = future
+        self.released = False
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int | None = None, max_queue: int | None = None,
+                 queue_timeout: float | None = None, retry_after: int | None = None, report_interval: float = 1.0):
+        """
+        LLM 工作的准入控制：同時執行的請求數有上限，其餘進入有界的優先佇列等候。
+        佇列已滿或預估等待超過 queue_timeout 時立即拒絕 (而不是讓所有人一起變慢)，並附上建議的重試秒數。
+        只能在單一事件迴圈中使用 (FastAPI / uvicorn)。
+        :param max_in_flight: 同時執行的上限，預設讀取環境變數 ADMISSION_MAX_IN_FLIGHT (4)
+        :param max_queue: 佇列長度上限，預設讀取環境變數 ADMISSION_MAX_QUEUE (16)
+        :param queue_timeout: 最長排隊秒數，預設讀取環境變數 ADMISSION_QUEUE_TIMEOUT (60)
+        :param retry_after: 尚無處理時間樣本時建議的重試秒數，預設讀取環境變數 ADMISSION_RETRY_AFTER (5)
+        :param report_interval: 排隊期間回報順位的最長間隔秒數
+        """
+        if max_in_flight is None:
+            max_in_flight = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "4"))
+        if max_queue is None:
+            max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+        if queue_timeout is None:
+            queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "60"))
+        if retry_after is None:
+            retry_after = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.default_retry_after = max(1, retry_after)
+        self.report_interval = report_interval
+        self.in_flight = 0
+        self._queue = []
+        self._seq = itertools.count()
+        # 佇列改變時完成的 future，讓排隊中的請求立即回報新的順位
+        self._changed = None
+        # 放行後佔用名額的秒數 (EWMA)，用於預估等待時間與重試秒數
+        self.service_seconds = None
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0, "evicted": 0,
+                      "max_queue_wait_ms": 0.0, "total_queue_wait_ms": 0.0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def estimated_wait(self, position: int) -> float | None:
+        """排在第 position 位的請求預估等待秒數，尚無樣本時為 None"""
+        if self.service_seconds is None:
+            return None
+        return self.service_seconds * math.ceil(position / self.max_in_flight)
+
+    def retry_after(self) -> int:
+        """建議的重試秒數：依目前佇列長度與平均處理時間估計"""
+        wait = self.estimated_wait(self.queued + 1)
+        return self.default_retry_after if wait is None else max(1, math.ceil(wait))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.stats["rejected"] += 1
+        return AdmissionRejected(reason, self.retry_after())
+
+    def enter(self, priority: int = PRIORITY_NORMAL) -> AdmissionTicket:
+        """
+        申請名額：有空位時直接放行，否則排入佇列 (之後以 wait() 等候)。
+        佇列已滿時，優先權較高的請求會擠出佇列中優先權最低、最晚抵達的請求，否則拋出 AdmissionRejected。
+        """
+        ticket = AdmissionTicket(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        if self.in_flight < self.max_in_flight and not self._queue:
+            self._admit(ticket)
+            return ticket
+        # 依新請求的優先權順位預估等待 (只計算排在它前面的請求)，並在擠出其他請求之前判斷，被拒絕時不影響佇列
+        wait = self.estimated_wait(1 + sum(1 for other in self._queue if other.key < ticket.key))
+        if wait is not None and wait > self.queue_timeout:
+            raise self._reject("overloaded")
+        if len(self._queue) >= self.max_queue:
+            worst = max(self._queue) if self._queue else None
+            if worst is None or worst.priority <= priority:
+                raise self._reject("queue_full")
+            self._remove(worst)
+            self.stats["evicted"] += 1
+            worst.future.set_exception(self._reject("evicted"))
+        heapq.heappush(self._queue, ticket)
+        self.stats["queued"] += 1
+        self._notify()
+        return ticket
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """在佇列中的順位 (從 1 開始)，已放行時為 0"""
+        if ticket.admitted_at is not None:
+            return 0
+        return 1 + sum(1 for other in self._queue if other.key < ticket.key)
+
+    async def wait(self, ticket: AdmissionTicket):
+        """
+        等候放行，排隊期間在順位改變時 (或每 report_interval 秒檢查一次) 產出目前的順位。
+        排隊超過 queue_timeout 或被擠出佇列時拋出 AdmissionRejected。
+        """
+        loop = asyncio.get_running_loop()
+        last_position = None
+        deadline = ticket.enqueued_at + self.queue_timeout
+        while not ticket.future.done():
+            position = self.position(ticket)
+            if position != last_position:
+                last_position = position
+                yield position
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.release(ticket)
+                self.stats["timed_out"] += 1
+                raise self._reject("timeout")
+            if self._changed is None:
+                self._changed = loop.create_future()
+            await asyncio.wait((ticket.future, self._changed), timeout=min(self.report_interval, remaining),
+                               return_when=asyncio.FIRST_COMPLETED)
+        ticket.future.result()
+
+    def _admit(self, ticket: AdmissionTicket):
+        ticket.admitted_at = time.perf_counter()
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        waited_ms = (ticket.admitted_at - ticket.enqueued_at) * 1000
+        self.stats["total_queue_wait_ms"] += waited_ms
+        self.stats["max_queue_wait_ms"] = max(self.stats["max_queue_wait_ms"], waited_ms)
+        if not ticket.future.done():
+            ticket.future.set_result(True)
+
+    def _remove(self, ticket: AdmissionTicket):
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        self._notify()
+
+    def _notify(self):
+        if self._changed is not None and not self._changed.done():
+            self._changed.set_result(True)
+        self._changed = None
+
+    def release(self, ticket: AdmissionTicket | None):
+        """歸還名額 (或離開佇列) 並放行下一個請求；可重複呼叫"""
+        if ticket is None or ticket.released:
+            return
+        ticket.released = True
+        if ticket.admitted_at is not None:
+            self.in_flight -= 1
+            held = time.perf_counter() - ticket.admitted_at
+            self.service_seconds = held if self.service_seconds is None else 0.3 * held + 0.7 * self.service_seconds
+        elif ticket in self._queue:
+            self._remove(ticket)
+        while self.in_flight < self.max_in_flight and self._queue:
+            self._admit(heapq.heappop(self._queue))
+            self._notify()
+
+    def get_metrics(self) -> dict:
+        admitted = self.stats["admitted"]
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": admitted,
+            "queued_total": self.stats["queued"],
+            "rejected": self.stats["rejected"],
+            "timed_out": self.stats["timed_out"],
+            "evicted": self.stats["evicted"],
+            "avg_queue_wait_ms": round(self.stats["total_queue_wait_ms"] / admitted, 1) if admitted else 0.0,
+            "max_queue_wait_ms": round(self.stats["max_queue_wait_ms"], 1),
+            "avg_service_ms": round(self.service_seconds * 1000, 1) if self.service_seconds is not None else None,
+        }
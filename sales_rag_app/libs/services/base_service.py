@@ -7,4 +7,22 @@ class BaseService(ABC):
         處理聊天請求並以流式方式返回結果。
         必須是一個生成器 (generator)。
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def get_metrics(self) -> dict:
+        """
+        返回服務的效能統計資訊 (例如快取命中率)，預設為空。
+        """
+        return {}
+
+    def warm_up(self) -> bool:
+        """
+        服務啟動時的預熱 (例如載入 LLM 模型)，預設不做任何事。
+        """
+        return True
+
+    def health(self) -> dict:
+        """
+        返回服務依賴的健康狀態，預設為健康。
+        """
+        return {"healthy": True}
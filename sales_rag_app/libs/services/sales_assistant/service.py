@@ -1,41 +1,37 @@
+import asyncio
 import json
+import os
 import pandas as pd
 from prettytable import PrettyTable
 from ..base_service import BaseService
-from ...RAG.DB.MilvusQuery import MilvusQuery
+from ...admission_control import PRIORITY_NORMAL, AdmissionController, AdmissionRejected
+from ...RAG.DB.MilvusQuery import SPEC_COLLECTION, MilvusQuery
+from ...RAG.DB.LocalVectorQuery import LocalVectorQuery
 from ...RAG.DB.DuckDBQuery import DuckDBQuery
-from ...RAG.LLM.LLMInitializer import LLMInitializer
+from ...RAG.DB.SpecStore import SpecStore
+from ...RAG.DB.ModelCatalog import ModelCatalog
+from ...RAG.DB.HybridRetriever import HybridRetriever
+from ...RAG.LLM.LLMBackendRegistry import create_backend
+from ...RAG.LLM.AsyncLLMRunner import AsyncLLMRunner
+from ...RAG.LLM.StructuredOutput import format_kwargs, resolve_json_format
+from ...RAG.LLM.ThinkBudget import ThinkBudget
+from ...RAG.Tools.ResponseStreamParser import ResponseStreamParser
+from ...RAG.Tools.QueryIntentClassifier import QueryIntentClassifier
+from ...RAG.Tools.SpecAnswerEngine import SpecAnswerEngine
+from ...RAG.Tools.ResponseValidator import ResponseValidator
+from ...RAG.Cache.ResponseCache import ResponseCache
+from ...RAG.Prompt.ContextBuilder import ContextBuilder
+from ...RAG.Prompt.PromptBudget import PromptBudget
+from ...RAG.Prompt.PromptLayout import PromptLayout
 import logging
 import re
+import time
 
 # 設定日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# 全域變數：存儲所有可用的modelname
-AVAILABLE_MODELNAMES = [
-    'AB819-S: FP6',
-    'AG958',
-    'AG958P',
-    'AG958V',
-    'AHP819: FP7R2',
-    'AHP839',
-    'AHP958',
-    'AKK839',
-    'AMD819-S: FT6',
-    'AMD819: FT6',
-    'APX819: FP7R2',
-    'APX839',
-    'APX958',
-    'ARB819-S: FP7R2',
-    'ARB839'
-]
-
-# 全域變數：存儲所有可用的modeltype
-AVAILABLE_MODELTYPES = [
-    '819',
-    '839',
-    '958'
-]
+# 查詢中疑似型號的字串 (字母 + 數字，可帶 -S 與 ": FP7R2" 之類的後綴)，用於找不到型號時提供建議
+_POTENTIAL_MODEL_RE = re.compile(r'(?<![0-9A-Za-z])[A-Za-z]{2,4}\s?\d{2,5}[A-Za-z]?(?:-[A-Za-z]+)?(?::?\s*[A-Za-z]{2}\d[A-Za-z0-9]*)?')
 
 '''
 [
@@ -49,11 +45,35 @@ AVAILABLE_MODELTYPES = [
 ]
 '''
 class SalesAssistantService(BaseService):
-    def __init__(self):
-        self.llm = LLMInitializer().get_llm()
-        self.milvus_query = MilvusQuery(collection_name="sales_notebook_specs")
-        self.duckdb_query = DuckDBQuery(db_file="sales_rag_app/db/sales_specs.db")
+    def __init__(self, llm=None, milvus_query=None, duckdb_query=None, json_format=None, think_budget=None,
+                 backend=None, admission=None):
+        # 允許注入依賴 (測試時可傳入 stub)，未提供時使用預設的 LLM 後端 (環境變數 LLM_BACKEND) / Milvus / DuckDB
+        self.backend = None
+        if llm is None:
+            self.backend = backend if backend is not None else create_backend(json_format=json_format)
+            llm = self.backend.get_llm()
+            json_format = self.backend.json_format
+        self.llm = llm
+        # 結構化輸出模式 (schema / json / off，推理模型預設 off 以保留 <think> 段落)，format 參數隨每次呼叫傳入
+        self.json_format = resolve_json_format(json_format, getattr(self.llm, "model", None))
+        # LLM 呼叫透過有界執行緒池執行，避免阻塞 uvicorn 事件迴圈；並發上限依後端設定
+        self.llm_runner = AsyncLLMRunner(self.llm, self.backend.max_concurrency if self.backend else None)
+        # 需要 LLM 的請求先經過准入控制 (有界優先佇列)，同時執行的上限與 LLM 並發上限相同
+        self.admission = admission if admission is not None else AdmissionController(
+            max_in_flight=self.llm_runner.max_concurrency)
+        self.duckdb_query = duckdb_query if duckdb_query is not None else DuckDBQuery(db_file="sales_rag_app/db/sales_specs.db")
+        # 向量檢索後端 (環境變數 VECTOR_STORE)：milvus 或不需要外部服務的本地記憶體映射索引 (local)
+        self.milvus_query = milvus_query if milvus_query is not None else self._create_vector_store()
+        # 常駐記憶體的規格索引，請求時不再查詢 DuckDB
+        self.spec_store = SpecStore(db_file=self.duckdb_query.db_file)
+        # 型號型錄 (modelname / modeltype 集合、type -> models 對應與型號比對器)，隨規格索引自動重建
+        self.model_catalog = ModelCatalog(self.spec_store)
+        # 回應快取：資料庫檔案重新產生時自動失效
+        self.response_cache = ResponseCache(watch_file=self.duckdb_query.db_file)
         self.prompt_template = self._load_prompt_template("sales_rag_app/libs/services/sales_assistant/prompts/sales_prompt4.txt")
+        # 固定的指令前綴每次請求都逐位元組相同，讓 Ollama 重用前綴的 KV cache
+        self.prompt_layout = PromptLayout(self.prompt_template)
+        logging.info(f"提示前綴模式: {self.prompt_layout.prefix_mode}, 前綴雜湊: {self.prompt_layout.prefix_hash}")
         
         # ★ 修正點 1：修正 spec_fields 列表，使其與 .xlsx 檔案的標題列完全一致
         self.spec_fields = [
@@ -65,11 +85,130 @@ class SalesAssistantService(BaseService):
             'wireless', 'lan', 'bluetooth', 'softwareconfig', 'ai', 'accessory', 
             'certfications', 'otherfeatures'
         ]
+        # 依模型的上下文上限計算提示預算 (num_ctx 會隨每次呼叫傳給 Ollama)
+        self.prompt_budget = PromptBudget(model_name=getattr(self.llm, "model", None),
+                                          num_ctx=getattr(self.llm, "num_ctx", None))
+        # 推理段落的長度控制 (full / budget / off)，可注入自訂的 ThinkBudget
+        self.think_budget = think_budget if think_budget is not None else ThinkBudget(
+            model_name=getattr(self.llm, "model", None), count_tokens=self.prompt_budget.count_tokens)
+        # 依查詢意圖挑選欄位、以精簡 JSON 組成上下文並控制 token 數
+        self.context_builder = ContextBuilder(self.spec_fields, count_tokens=self.prompt_budget.count_tokens)
+        # 單純的規格查詢/比較由規則引擎直接回答，只有開放式問題才送往 LLM
+        self.intent_classifier = QueryIntentClassifier()
+        # 查詢沒有指定型號時：DuckDB 結構化條件篩選 + 向量相似度排序，以 RRF 融合
+        self.hybrid_retriever = HybridRetriever(self.model_catalog, self.duckdb_query, self.milvus_query,
+                                                self.intent_classifier)
+        # 排序依 ingest 時建立的 specs_normalized 數值欄位 (SpecStore 常駐記憶體的副本)，請求路徑上不查詢 DuckDB
+        self.answer_engine = SpecAnswerEngine(ranker=self.spec_store.rank_models)
+        # LLM 回答的型號/品牌/GPU 驗證 (模組層級預先編譯的正規表示式)
+        self.response_validator = ResponseValidator(self.model_catalog.has_modelname)
+        # 各回應路徑 (fast_path / cache / llm / fallback / validation / rejected / error) 的請求數與耗時
+        self.serving_stats = {}
+        # LLM 輸出不是合法 JSON 的次數，以及其中在串流途中提前中止生成的次數
+        self.structured_output_stats = {"malformed": 0, "aborted_early": 0}
+
+    def _create_vector_store(self):
+        """依環境變數 VECTOR_STORE 建立向量檢索後端，預設為 milvus"""
+        vector_store = os.getenv("VECTOR_STORE", "milvus").strip().lower()
+        if vector_store == "local":
+            return LocalVectorQuery(db_file=self.duckdb_query.db_file)
+        if vector_store != "milvus":
+            raise ValueError(f"不支援的向量檢索後端: {vector_store} (可用: milvus, local)")
+        return MilvusQuery(collection_name=SPEC_COLLECTION)
 
     def _load_prompt_template(self, path: str) -> str:
         with open(path, 'r', encoding='utf-8') as f:
             return f.read()
 
+    def _format_sse(self, payload: dict) -> str:
+        """將 payload 格式化為單一 SSE data 事件"""
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def _final_sse(self, payload: dict, served_by: str, started: float) -> str:
+        """產生最終結果事件：標記回應路徑 served_by 並記錄該路徑的耗時"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = self.serving_stats.setdefault(served_by, {"requests": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["requests"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        logging.info(f"回應路徑: {served_by}, 耗時 {elapsed_ms:.1f}ms")
+        return self._format_sse({**payload, "served_by": served_by})
+
+    def warm_up(self) -> bool:
+        """啟動時預熱 LLM 後端 (載入模型並常駐)，注入的 LLM 不需要預熱"""
+        return self.backend.warm_up() if self.backend else True
+
+    def health(self) -> dict:
+        """LLM 後端的健康檢查結果"""
+        if self.backend is None:
+            return {"healthy": True, "detail": "injected llm"}
+        return self.backend.probe()
+
+    def get_metrics(self) -> dict:
+        """返回回應快取、LLM 並發狀態、准入控制與各回應路徑的統計資訊"""
+        serving = {}
+        for served_by, stats in self.serving_stats.items():
+            serving[served_by] = {"requests": stats["requests"],
+                                  "avg_ms": round(stats["total_ms"] / stats["requests"], 2),
+                                  "max_ms": round(stats["max_ms"], 2)}
+        return {
+            "response_cache": self.response_cache.get_metrics(),
+            "retrieval": self.milvus_query.get_metrics() if hasattr(self.milvus_query, "get_metrics") else None,
+            "hybrid_retrieval": self.hybrid_retriever.get_metrics(),
+            "llm": self.llm_runner.get_stats(),
+            "admission": self.admission.get_metrics(),
+            "backend": self.backend.get_metrics() if self.backend else None,
+            "prompt": self.prompt_budget.get_metrics(),
+            "serving": serving,
+            "structured_output": {"json_format": self.json_format, **self.structured_output_stats},
+            "think": self.think_budget.get_metrics(),
+        }
+
+    async def _stream_llm_events(self, final_prompt: str, parser: ResponseStreamParser, **llm_kwargs):
+        """
+        串流呼叫 LLM，將 <think> 推理段落與 answer_summary 片段轉為 SSE 事件。
+        JSON 外框閉合後立即停止讀取，完整原始輸出保存在 parser.text；
+        輸出一旦不可能是合法 JSON (parser.malformed) 也立即中止，不必等到整段生成結束。
+        budget 推理模式下推理超過上限時中止生成，改以 raw 模式帶入已產生的推理並強制結束 </think> 後接續作答。
+        """
+        think_budget = self.think_budget
+        limit = think_budget.limit
+        think_tokens = 0
+        truncated = False
+        prompt, kwargs = final_prompt, llm_kwargs
+        while True:
+            over_budget = False
+            llm_stream = self.llm_runner.astream(prompt, **kwargs)
+            try:
+                async for chunk in llm_stream:
+                    for event_type, delta in parser.feed(chunk):
+                        if event_type == "think":
+                            think_tokens += think_budget.count_tokens(delta)
+                            if not think_budget.stream_think:
+                                continue
+                        yield self._format_sse({"event": event_type, "delta": delta})
+                    if parser.complete:
+                        break
+                    if parser.malformed:
+                        self.structured_output_stats["aborted_early"] += 1
+                        logging.warning(f"LLM 輸出不是合法的 JSON，中止生成 (已收到 {len(parser.text)} 字元): {parser.malformed}")
+                        break
+                    if limit is not None and parser.phase == "think" and think_tokens > limit:
+                        over_budget = True
+                        break
+            finally:
+                await llm_stream.aclose()
+            if not over_budget:
+                break
+            truncated = True
+            limit = None
+            logging.info(f"推理超過 {think_budget.max_think_tokens} tokens，中止推理並強制作答")
+            prompt, kwargs = think_budget.raw_request(final_prompt, llm_kwargs, parser.think_text)
+            for event_type, delta in parser.feed(ThinkBudget.THINK_CLOSE):
+                if event_type == "think" and think_budget.stream_think:
+                    yield self._format_sse({"event": event_type, "delta": delta})
+        think_budget.record(think_tokens, truncated)
+
     def _create_beautiful_markdown_table(self, comparison_table: list | dict, model_names: list) -> str:
         """
         支援 dict of lists 且自動轉置為「型號為欄，規格為列」的 markdown 表格
@@ -583,26 +722,8 @@ class SalesAssistantService(BaseService):
         檢查查詢中是否包含有效的modelname
         返回: (是否包含modelname, 找到的modelname列表)
         """
-        found_modelnames = []
-        query_lower = query.lower()
-        
-        # 改进：使用更严格的匹配逻辑
-        for modelname in AVAILABLE_MODELNAMES:
-            modelname_lower = modelname.lower()
-            # 使用单词边界匹配，避免部分匹配
-            if re.search(r'\b' + re.escape(modelname_lower) + r'\b', query_lower):
-                found_modelnames.append(modelname)
-        
-        # 如果没有找到完全匹配，检查是否有相似的模型名称
-        if not found_modelnames:
-            # 提取查询中可能的模型名称模式
-            potential_models = re.findall(r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?::\s*[A-Z]+\d+)?', query)
-            logging.info(f"查询中发现的潜在模型名称: {potential_models}")
-            
-            # 检查这些潜在模型是否在可用列表中
-            for potential_model in potential_models:
-                if potential_model in AVAILABLE_MODELNAMES:
-                    found_modelnames.append(potential_model)
+        # 單一預先編譯的比對器，冒號/空白寫法 (例如 "AHP819 FP7R2") 皆會對應到型錄中的標準名稱
+        found_modelnames = self.model_catalog.matcher.find(query)
         
         logging.info(f"查询验证结果 - 查询: '{query}', 找到的模型名称: {found_modelnames}")
         return len(found_modelnames) > 0, found_modelnames
@@ -615,7 +736,7 @@ class SalesAssistantService(BaseService):
         found_modeltypes = []
         query_lower = query.lower()
         
-        for modeltype in AVAILABLE_MODELTYPES:
+        for modeltype in self.model_catalog.modeltypes:
             if modeltype.lower() in query_lower:
                 found_modeltypes.append(modeltype)
         
@@ -623,29 +744,30 @@ class SalesAssistantService(BaseService):
 
     def _get_models_by_type(self, modeltype: str) -> list:
         """
-        根據modeltype獲取所有相關的modelname
+        根據modeltype獲取所有相關的modelname (由型錄直接查表，不經過 SQL)
         """
-        try:
-            sql_query = "SELECT DISTINCT modelname FROM specs WHERE modeltype = ? AND modelname IS NOT NULL AND modelname != '' AND modelname != 'nan' ORDER BY modelname"
-            result = self.duckdb_query.query_with_params(sql_query, [modeltype])
-            
-            if result:
-                modelnames = [row[0] for row in result if row[0] and str(row[0]).lower() != 'nan']
-                logging.info(f"根據modeltype '{modeltype}' 找到的modelname: {modelnames}")
-                return modelnames
-            else:
-                logging.warning(f"未找到modeltype為 '{modeltype}' 的modelname")
-                return []
-                
-        except Exception as e:
-            logging.error(f"查詢modeltype '{modeltype}' 相關modelname時發生錯誤: {e}")
-            return []
+        modelnames = list(self.model_catalog.get_models_by_type(modeltype))
+        if modelnames:
+            logging.info(f"根據modeltype '{modeltype}' 找到的modelname: {modelnames}")
+        else:
+            logging.warning(f"未找到modeltype為 '{modeltype}' 的modelname")
+        return modelnames
 
-    async def chat_stream(self, query: str, **kwargs):
+    async def chat_stream(self, query: str, stream: bool = False, priority: int = PRIORITY_NORMAL, **kwargs):
         """
         執行 RAG 流程，使用修正後的欄位名稱。
+        :param stream: 為 True 時額外產出進度、<think> 推理與 answer_summary 片段等中間事件
+                       (帶有 "event" 欄位)，最後一個不含 "event" 欄位的事件為完整結果。
+        :param priority: 需要 LLM 時在准入佇列中的優先權 (見 admission_control)；規則引擎與快取的回答不需排隊
+        最終結果帶有 served_by 欄位，標示由哪個路徑產生：
+        fast_path (規則引擎)、cache (回應快取)、llm、fallback (LLM 回應無法使用時的備用回應)、
+        validation (查無型號或提示過長)、rejected (LLM 忙碌未被放行，帶有 status 429 與 retry_after) 或 error。
         """
+        started = time.perf_counter()
         try:
+            if stream:
+                yield self._format_sse({"event": "progress", "stage": "retrieving", "message": "正在查詢產品規格..."})
+
             # 首先檢查查詢中是否包含有效的modeltype
             contains_modeltype, found_modeltypes = self._check_query_contains_modeltype(query)
             
@@ -679,7 +801,7 @@ class SalesAssistantService(BaseService):
                         "answer_summary": error_message,
                         "comparison_table": []
                     }
-                    yield f"data: {json.dumps(error_obj, ensure_ascii=False)}\n\n"
+                    yield self._final_sse(error_obj, "validation", started)
                     return
                 
                 # 直接使用DuckDB查詢這些modelname的資料
@@ -692,92 +814,165 @@ class SalesAssistantService(BaseService):
                 
             else:
                 # 如果既没有modeltype也没有modelname
-                available_types_str = "\n".join([f"- {modeltype}" for modeltype in AVAILABLE_MODELTYPES])
-                available_models_str = "\n".join([f"- {model}" for model in AVAILABLE_MODELNAMES])
-                
                 # 检查查询中是否包含可能的错误模型名称
-                potential_models = re.findall(r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?::\s*[A-Z]+\d+)?', query)
-                error_message = f"您的查询中提到的模型名称不在我们的数据库中。"
+                potential_models = list(dict.fromkeys(_POTENTIAL_MODEL_RE.findall(query)))
+                # 沒有提到 (可能打錯的) 型號時，以結構化條件 + 向量相似度的混合檢索找出候選型號
+                # (查詢向量編碼、向量庫搜尋與 DuckDB 篩選都會阻塞，在執行緒中進行，不佔用事件迴圈)
+                hybrid = None
+                if not potential_models:
+                    hybrid = await asyncio.to_thread(self.hybrid_retriever.retrieve, query)
+                if hybrid is not None:
+                    logging.info(f"混合檢索: {hybrid}")
+                if hybrid is not None and hybrid.modelnames:
+                    target_modelnames = hybrid.modelnames
+                    logging.info(f"使用混合檢索的型號: {target_modelnames} (條件: {hybrid.filters})")
+                else:
+                    catalog = self.model_catalog.snapshot
+                    available_types_str = "\n".join([f"- {modeltype}" for modeltype in catalog.modeltypes])
+                    available_models_str = "\n".join([f"- {model}" for model in catalog.modelnames])
+
+                    error_message = f"您的查询中提到的模型名称不在我们的数据库中。"
                 
-                if potential_models:
-                    error_message += f"\n\n您提到的模型名称: {', '.join(potential_models)}"
-                    error_message += f"\n\n可能的正确模型名称:"
-                    # 为每个可能的错误模型提供建议
-                    for potential_model in potential_models:
-                        suggestions = []
-                        for available_model in AVAILABLE_MODELNAMES:
-                            # 简单的相似度检查
-                            if potential_model[:3] in available_model or potential_model[-3:] in available_model:
-                                suggestions.append(available_model)
-                        if suggestions:
-                            error_message += f"\n- '{potential_model}' 可能是: {', '.join(suggestions[:3])}"
+                    if potential_models:
+                        error_message += f"\n\n您提到的模型名称: {', '.join(potential_models)}"
+                        error_message += f"\n\n可能的正确模型名称:"
+                        # 为每个可能的错误模型提供建议 (trigram 索引 + 編輯距離排序)
+                        for potential_model in potential_models:
+                            suggestions = catalog.suggester.suggest(potential_model, k=3)
+                            if suggestions:
+                                error_message += f"\n- '{potential_model}' 可能是: {', '.join(suggestions)}"
                 
-                error_message += f"\n\n可用的系列包括：\n{available_types_str}"
-                error_message += f"\n\n可用的型號包括：\n{available_models_str}"
-                error_message += f"\n\n請重新提問，例如：'比較 958 系列的 CPU 性能' 或 '比較 AB819-S: FP6 和 AG958 的 CPU 性能'"
+                    error_message += f"\n\n可用的系列包括：\n{available_types_str}"
+                    error_message += f"\n\n可用的型號包括：\n{available_models_str}"
+                    error_message += f"\n\n請重新提問，例如：'比較 958 系列的 CPU 性能' 或 '比較 AB819-S: FP6 和 AG958 的 CPU 性能'"
                 
-                error_obj = {
-                    "answer_summary": error_message,
-                    "comparison_table": []
-                }
-                yield f"data: {json.dumps(error_obj, ensure_ascii=False)}\n\n"
+                    error_obj = {
+                        "answer_summary": error_message,
+                        "comparison_table": []
+                    }
+                    yield self._final_sse(error_obj, "validation", started)
+                    return
+
+            # 相同型號與相同問題直接使用快取的回應
+            cache_key = self.response_cache.make_key(target_modelnames, query)
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                logging.info(f"命中回應快取: {cache_key}")
+                yield self._final_sse(cached_response, "cache", started)
                 return
 
-            # 使用DuckDB直接查詢指定的modelname
-            logging.info(f"步驟 2: DuckDB 精確查詢 - 型號: {target_modelnames}")
-            
-            placeholders = ', '.join(['?'] * len(target_modelnames))
-            sql_query = f"SELECT * FROM specs WHERE modelname IN ({placeholders})"
+            # 從記憶體中的規格索引取得指定的modelname
+            logging.info(f"步驟 2: 規格索引精確查詢 - 型號: {target_modelnames}")
             
-            full_specs_records = self.duckdb_query.query_with_params(sql_query, target_modelnames)
+            full_specs_records = self.spec_store.get_records(target_modelnames)
 
             if not full_specs_records:
-                logging.error(f"DuckDB 查詢失敗或未找到型號為 {target_modelnames} 的資料。")
+                logging.error(f"規格索引中未找到型號為 {target_modelnames} 的資料。")
                 # 提供更详细的错误信息
                 error_message = f"抱歉，在我们的数据库中未找到以下型号的资料：{', '.join(target_modelnames)}"
                 error_message += f"\n\n请检查型号名称是否正确，或查看可用的型号列表。"
-                yield f"data: {json.dumps({'answer_summary': error_message, 'comparison_table': []}, ensure_ascii=False)}\n\n"
+                yield self._final_sse({'answer_summary': error_message, 'comparison_table': []}, "validation", started)
                 return
 
             logging.info(f"成功查询到 {len(full_specs_records)} 条记录")
             # 记录查询到的实际模型名称
-            found_modelnames = [record[self.spec_fields.index('modelname')] for record in full_specs_records]
+            found_modelnames = [record['modelname'] for record in full_specs_records]
             logging.info(f"查询到的实际模型名称: {found_modelnames}")
 
-            # 3. 將查詢結果格式化為 LLM 需要的上下文
-            context_list_of_dicts = [dict(zip(self.spec_fields, record)) for record in full_specs_records]
-            # ★ 修正點 4：在傳遞給 LLM 的 JSON 中，使用 'modelname' 作為統一的鍵，方便 prompt 處理
-            for item in context_list_of_dicts:
-                item['modelname'] = item.get('modelname', 'Unknown Model')
+            # 單純的規格查詢/比較/排序直接由規則引擎回答，不經過 LLM
+            intent = self.intent_classifier.classify(query, len(full_specs_records))
+            logging.info(f"查詢意圖: {intent} ({intent.reason})")
+            normalized_records = [self.spec_store.get_normalized(name) for name in found_modelnames]
+            fast_answer = self.answer_engine.answer(intent, full_specs_records, normalized_records)
+            if fast_answer is not None:
+                fast_response = self._format_response_with_beautiful_table(
+                    fast_answer["answer_summary"], fast_answer["comparison_table"], found_modelnames)
+                yield self._final_sse(fast_response, "fast_path", started)
+                return
+
+            # 3. 將查詢結果格式化為 LLM 需要的上下文 (記錄為唯讀，直接共用快照中的物件)
+            context_list_of_dicts = full_specs_records
 
-            context_str = json.dumps(context_list_of_dicts, indent=2, ensure_ascii=False)
-            logging.info("成功將 DuckDB 資料轉換為 JSON 上下文。")
+            # 只放入與查詢意圖相關的欄位 (完整記錄仍用於後續驗證與備用回應)，並依模型的上下文上限控制大小
+            context_budget = self.prompt_budget.context_budget(self.prompt_template, query)
+            context = self.context_builder.build(context_list_of_dicts, query, token_budget=context_budget)
+            logging.info(f"成功將規格資料轉換為 JSON 上下文 - 意圖: {context.intents}, 欄位: {context.fields}, "
+                         f"捨棄: {context.dropped_fields}, 縮短: {context.summarized_fields}, "
+                         f"tokens: {context.tokens}/{context.budget}")
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f"全部欄位的上下文 tokens: {context.full_tokens}")
 
             # 4. 建構提示並請求 LLM
-            final_prompt = self.prompt_template.replace("{context}", context_str).replace("{query}", query)
+            final_prompt, prompt_kwargs = self.prompt_layout.render(context.text, query)
+            llm_kwargs = {**self.prompt_budget.llm_options(), **prompt_kwargs,
+                          **format_kwargs(self.json_format, found_modelnames)}
+            prompt_tokens = self.prompt_budget.count_tokens(prompt_kwargs.get("system", "")) + self.prompt_budget.count_tokens(final_prompt)
+            if not self.prompt_budget.fits(prompt_tokens):
+                # 提示放不進模型的上下文時直接回報，避免 Ollama 從前面靜默截斷
+                self.prompt_budget.record_rejected()
+                logging.warning(f"提示超過 token 上限: {prompt_tokens} > {self.prompt_budget.prompt_limit}")
+                yield self._final_sse({"answer_summary": "查詢內容過長，請縮短問題或減少比較的型號後再試一次。",
+                                       "comparison_table": []}, "validation", started)
+                return
+            logging.info(f"提示 token 數: {prompt_tokens} (上下文 {context.tokens}, 上限 {self.prompt_budget.prompt_limit}, "
+                         f"num_ctx {self.prompt_budget.num_ctx})")
             logging.info("\n=== 最終傳送給 LLM 的提示 (Final Prompt) ===\n" + final_prompt + "\n========================================")
 
-            response_str = self.llm.invoke(final_prompt)
+            # 准入控制：LLM 名額已滿時排隊 (回報順位)，佇列已滿或等待過久時直接回覆 429 與建議的重試秒數
+            admission_ticket = None
+            try:
+                admission_ticket = self.admission.enter(priority)
+                async for position in self.admission.wait(admission_ticket):
+                    if stream:
+                        yield self._format_sse({"event": "queued", "position": position,
+                                                "message": f"目前查詢人數較多，排隊中 (第 {position} 位)..."})
+            except AdmissionRejected as e:
+                logging.warning(f"LLM 請求未被放行: {e.reason}, 建議 {e.retry_after} 秒後重試")
+                yield self._final_sse({"answer_summary": f"目前查詢人數較多，請於 {e.retry_after} 秒後再試一次。",
+                                       "comparison_table": [], "status": 429, "retry_after": e.retry_after},
+                                      "rejected", started)
+                return
+            except BaseException:
+                # 排隊中用戶端中斷連線 (GeneratorExit / CancelledError) 時離開佇列
+                self.admission.release(admission_ticket)
+                raise
+            try:
+                if self.think_budget.mode == "off":
+                    # 以 raw 模式送出已閉合的空白推理段落，模型直接作答
+                    final_prompt, llm_kwargs = self.think_budget.raw_request(final_prompt, llm_kwargs)
+                if stream or self.think_budget.mode == "budget":
+                    # budget 模式需要在串流中計算推理長度，未啟用 stream 時只是不把中間事件送出
+                    if stream:
+                        yield self._format_sse({"event": "progress", "stage": "generating", "message": "AI 正在分析規格...",
+                                                "models": target_modelnames, "prompt_tokens": prompt_tokens})
+                    parser = ResponseStreamParser()
+                    async for event in self._stream_llm_events(final_prompt, parser, **llm_kwargs):
+                        if stream:
+                            yield event
+                    response_str = parser.text
+                else:
+                    response_str = await self.llm_runner.ainvoke(final_prompt, **llm_kwargs)
+                    parser = ResponseStreamParser()
+                    parser.feed(response_str)
+                    self.think_budget.record(self.think_budget.count_tokens(parser.think_text))
+            finally:
+                self.admission.release(admission_ticket)
             logging.info(f"\n=== 從 LLM 收到的原始回應 ===\n{response_str}\n=============================")
+            completion_tokens = self.prompt_budget.count_tokens(response_str)
+            self.prompt_budget.record(prompt_tokens, completion_tokens, context.tokens)
+            logging.info(f"token 統計 - 提示: {prompt_tokens}, 回答: {completion_tokens}")
 
-            # 5. 解析並回傳 JSON
+            # 5. 解析並回傳 JSON (ResponseStreamParser 已分離 <think> 段落並檢查過 JSON 文法)
             try:
-                # 首先檢查是否有 <think> 標籤，如果有則提取 </think> 之後的內容
-                think_end = response_str.find("</think>")
-                if think_end != -1:
-                    # 提取 </think> 之後的內容
-                    cleaned_response_str = response_str[think_end + 8:].strip()
-                    logging.info(f"提取 </think> 之後的內容: {cleaned_response_str}")
-                else:
-                    # 如果沒有 <think> 標籤，使用原始回應
-                    cleaned_response_str = response_str
-                
-                # 在清理後的內容中尋找 JSON
-                json_start = cleaned_response_str.find("{")
-                json_end = cleaned_response_str.rfind("}")
-                
-                if json_start != -1 and json_end != -1 and json_end > json_start:
-                    json_content = cleaned_response_str[json_start:json_end+1]
+                if parser.malformed:
+                    self.structured_output_stats["malformed"] += 1
+                    logging.error(f"LLM 輸出不是合法的 JSON: {parser.malformed}")
+                    fallback_response = self._generate_fallback_response(query, context_list_of_dicts, target_modelnames)
+                    yield self._final_sse(fallback_response, "fallback", started)
+                    return
+
+                json_content = parser.json_text
+                if json_content is not None:
                     logging.info(f"提取的 JSON 內容: {json_content}")
                     
                     # 嘗試解析 JSON
@@ -808,31 +1003,33 @@ class SalesAssistantService(BaseService):
                             logging.info("LLM回答驗證通過，使用LLM回答")
                             processed_response = self._process_llm_response(parsed_json, context_list_of_dicts, target_modelnames)
                             logging.info(f"LLM响应处理结果 - answer_summary: {processed_response.get('answer_summary', '')}")
+                            # 只快取通過驗證的 LLM 回答
+                            self.response_cache.set(cache_key, processed_response)
                         
                         logging.info(f"最终处理结果 - answer_summary: {processed_response.get('answer_summary', '')}")
                         logging.info(f"最终处理结果 - comparison_table: {processed_response.get('comparison_table', '')}")
-                        yield f"data: {json.dumps(processed_response, ensure_ascii=False)}\n\n"
+                        yield self._final_sse(processed_response, "llm" if llm_response_valid else "fallback", started)
                         return
                     else:
                         logging.error("LLM回應格式不正確，缺少必要欄位")
                         fallback_response = self._generate_fallback_response(query, context_list_of_dicts, target_modelnames)
-                        yield f"data: {json.dumps(fallback_response, ensure_ascii=False)}\n\n"
+                        yield self._final_sse(fallback_response, "fallback", started)
                         return
                 else:
                     logging.error("無法從LLM回應中提取JSON")
                     fallback_response = self._generate_fallback_response(query, context_list_of_dicts, target_modelnames)
-                    yield f"data: {json.dumps(fallback_response, ensure_ascii=False)}\n\n"
+                    yield self._final_sse(fallback_response, "fallback", started)
                     return
                     
             except json.JSONDecodeError as e:
                 logging.error(f"JSON解析失敗: {e}")
                 fallback_response = self._generate_fallback_response(query, context_list_of_dicts, target_modelnames)
-                yield f"data: {json.dumps(fallback_response, ensure_ascii=False)}\n\n"
+                yield self._final_sse(fallback_response, "fallback", started)
                 return
             except Exception as e:
                 logging.error(f"處理LLM回應時發生錯誤: {e}")
                 fallback_response = self._generate_fallback_response(query, context_list_of_dicts, target_modelnames)
-                yield f"data: {json.dumps(fallback_response, ensure_ascii=False)}\n\n"
+                yield self._final_sse(fallback_response, "fallback", started)
                 return
                 
         except Exception as e:
@@ -841,171 +1038,22 @@ class SalesAssistantService(BaseService):
                 "answer_summary": f"處理您的查詢時發生錯誤: {str(e)}",
                 "comparison_table": []
             }
-            yield f"data: {json.dumps(error_obj, ensure_ascii=False)}\n\n"
+            yield self._final_sse(error_obj, "error", started)
 
     def _validate_llm_response(self, parsed_json, target_modelnames):
         """
-        驗證LLM回答是否包含正確的模型名稱
+        驗證LLM回答是否包含正確的模型名稱 (預先編譯的 ResponseValidator)
         """
         try:
-            logging.info(f"開始驗證LLM回答，目標模型名稱: {target_modelnames}")
-            
-            # 定義無效的品牌和GPU型號列表
-            invalid_brands = ["Acer", "ASUS", "Lenovo", "Dell", "MSI", "Razer", "NVIDIA", "Nvidia"]
-            invalid_gpu_models = ["RTX", "GTX", "RTX 3060", "RTX 3070", "RTX 3080", "RTX 3090", "RTX 4060", "RTX 4070", "RTX 4080", "RTX 4090", "GTX 1650", "GTX 1660"]
-            
-            # 創建模型名稱的變體列表（處理冒號等格式差異）
-            def get_model_variants(model_name):
-                variants = [model_name]
-                # 添加沒有冒號的版本
-                if ":" in model_name:
-                    variants.append(model_name.replace(":", ""))
-                # 添加有冒號的版本
-                else:
-                    # 嘗試添加冒號
-                    parts = model_name.split()
-                    if len(parts) >= 2:
-                        variants.append(f"{parts[0]}: {' '.join(parts[1:])}")
-                return variants
-            
-            target_model_variants = []
-            for model_name in target_modelnames:
-                target_model_variants.extend(get_model_variants(model_name))
-            
-            logging.info(f"目標模型名稱變體: {target_model_variants}")
-            
-            # 檢查answer_summary中是否包含正確的模型名稱
-            answer_summary = parsed_json.get("answer_summary", "")
-            logging.info(f"檢查answer_summary: {answer_summary}")
-            
-            if answer_summary:
-                # 首先檢查是否包含任何目標模型名稱或其變體
-                has_valid_model = False
-                for model_variant in target_model_variants:
-                    if model_variant in answer_summary:
-                        has_valid_model = True
-                        logging.info(f"找到有效模型名稱變體: {model_variant}")
-                        break
-                
-                # 如果没有找到有效模型名称，检查是否有其他可能的模型名称
-                if not has_valid_model:
-                    # 根据目标模型名称是否包含特殊符号来选择正则表达式
-                    potential_models = []
-                    
-                    for target_model in target_modelnames:
-                        if ":" in target_model:
-                            # 如果目标模型包含冒号，使用匹配冒号格式的正则表达式
-                            pattern = r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s*:\s*[A-Z]+\d+[A-Z]*)'
-                            matches = re.findall(pattern, answer_summary)
-                            potential_models.extend(matches)
-                            
-                            # 也匹配没有冒号的版本 - 修复正则表达式以匹配完整的模型名称
-                            pattern_no_colon = r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s+[A-Z]+\d+[A-Z]*\d*)'
-                            matches_no_colon = re.findall(pattern_no_colon, answer_summary)
-                            potential_models.extend(matches_no_colon)
-                        else:
-                            # 如果目标模型不包含冒号，使用简单格式的正则表达式
-                            pattern = r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?'
-                            matches = re.findall(pattern, answer_summary)
-                            potential_models.extend(matches)
-                    
-                    # 去重
-                    potential_models = list(set(potential_models))
-                    logging.info(f"在answer_summary中找到的潜在模型名称: {potential_models}")
-                    
-                    for potential_model in potential_models:
-                        # 检查是否是目标模型的变体
-                        is_valid_variant = False
-                        for model_variant in target_model_variants:
-                            if potential_model == model_variant:
-                                is_valid_variant = True
-                                logging.info(f"找到有效模型名称变体: {potential_model} -> {model_variant}")
-                                break
-                        
-                        if not is_valid_variant and potential_model not in AVAILABLE_MODELNAMES:
-                            # 检查是否是已知的无效模型名称
-                            known_invalid_models = ["M20W", "A520", "R7 5900HS", "Ryzen 7 958", "Ryzen 9 7640H"]
-                            if potential_model not in known_invalid_models:
-                                logging.warning(f"LLM回答包含不存在的模型名称: {potential_model}")
-                                return False
-                
-                # 检查无效品牌 - 改进：避免将模型名称中的字母组合误认为品牌
-                for brand in invalid_brands:
-                    # 使用单词边界匹配，避免将模型名称中的字母组合误认为品牌
-                    if re.search(r'\b' + re.escape(brand) + r'\b', answer_summary):
-                        logging.warning(f"LLM回答包含无效品牌: {brand}")
-                        return False
-                
-                # 检查无效GPU型号
-                for gpu_model in invalid_gpu_models:
-                    if gpu_model in answer_summary:
-                        logging.warning(f"LLM回答包含无效GPU型号: {gpu_model}")
-                        return False
-                
-                # 如果包含正确的模型名称，即使有其他内容也认为有效
-                if has_valid_model:
-                    logging.info("LLM回答包含正确的模型名称，验证通过")
-                    return True
-                else:
-                    logging.warning("LLM回答中未找到任何目标模型名称")
-                    return False
-            
-            # 检查comparison_table中的模型名称
-            comparison_table = parsed_json.get("comparison_table", [])
-            logging.info(f"检查comparison_table: {comparison_table}")
-            
-            if isinstance(comparison_table, list) and comparison_table:
-                # 检查表格中的模型名称
-                for row in comparison_table:
-                    if isinstance(row, dict):
-                        # 检查是否包含正确的模型名称作为键
-                        for model_variant in target_model_variants:
-                            if model_variant in row:
-                                logging.info(f"在comparison_table中找到有效模型名称变体: {model_variant}")
-                                return True
-                        
-                        # 检查是否包含错误的模型名称
-                        for key in row.keys():
-                            if key != "feature" and key not in target_model_variants:
-                                # 检查是否包含常见错误模型名称
-                                invalid_models = ["A520", "M20W", "R7 5900HS", "Ryzen 7 958", "Ryzen 9 7640H"]
-                                for invalid_model in invalid_models:
-                                    if invalid_model in key:
-                                        logging.warning(f"LLM回答包含无效模型名称: {invalid_model}")
-                                        return False
-                        
-                        # 检查值中是否包含无效GPU型号
-                        for value in row.values():
-                            if isinstance(value, str):
-                                for gpu_model in invalid_gpu_models:
-                                    if gpu_model in value:
-                                        logging.warning(f"LLM回答包含无效GPU型号: {gpu_model}")
-                                        return False
-            
-            # 如果comparison_table是字典格式
-            elif isinstance(comparison_table, dict):
-                # 检查字典中的模型名称
-                for key in comparison_table.keys():
-                    if key != "modelname" and key not in target_model_variants:
-                        # 检查是否是模式匹配的无效模型名称
-                        if re.match(r'[A-Z]{2,3}\d{3}(?:-[A-Z]+)?(?:\s*:\s*[A-Z]+\d+)?', key):
-                            if key not in AVAILABLE_MODELNAMES:
-                                logging.warning(f"LLM回答包含不存在的模型名称: {key}")
-                                return False
-                
-                # 检查是否包含正确的模型名称
-                for model_variant in target_model_variants:
-                    if model_variant in comparison_table:
-                        logging.info(f"在comparison_table字典中找到有效模型名称变体: {model_variant}")
-                        return True
-            
-            # 如果没有找到任何目标模型名称，认为无效
-            logging.warning("LLM回答中未找到任何目标模型名称")
-            return False
-            
+            is_valid, reason = self.response_validator.check(parsed_json, target_modelnames)
         except Exception as e:
             logging.error(f"驗證LLM回應時發生錯誤: {e}")
             return False
+        if is_valid:
+            logging.info(f"LLM回答驗證通過 - 目標模型名稱: {target_modelnames}, {reason}")
+        else:
+            logging.warning(f"LLM回答驗證失敗 - 目標模型名稱: {target_modelnames}, {reason}")
+        return is_valid
 
     def _generate_fallback_response(self, query, context_list_of_dicts, target_modelnames):
         """
@@ -1019,7 +1067,7 @@ class SalesAssistantService(BaseService):
                 if potential_models:
                     error_message = f"抱歉，您查詢的模型 '{', '.join(potential_models)}' 在我们的數據庫中不存在。"
                     error_message += f"\n\n可用的模型包括：\n"
-                    for model in AVAILABLE_MODELNAMES:
+                    for model in self.model_catalog.modelnames:
                         error_message += f"- {model}\n"
                     error_message += f"\n請使用正確的模型名稱重新查詢。"
                     
@@ -1084,41 +1132,33 @@ class SalesAssistantService(BaseService):
                 for model_name in target_modelnames:
                     # 找到對應模型的數據
                     model_data = next((item for item in context_list_of_dicts if item.get("modelname") == model_name), None)
+                    # ingest 時預先解析的型別化欄位 (specs_normalized)，不再逐次以正規表示式解析
+                    normalized = self.spec_store.get_normalized(model_name) or {}
                     if model_data:
                         field_data = model_data.get(data_field, "")
                         # 提取關鍵信息
                         if data_field == "cpu":
-                            # 提取CPU型號
-                            cpu_match = re.search(r"Ryzen™\s+\d+\s+\d+[A-Z]*[HS]*", field_data)
-                            row[model_name] = cpu_match.group(0) if cpu_match else "N/A"
+                            row[model_name] = normalized.get("cpu_model") or "N/A"
                         elif data_field == "gpu":
-                            # 提取GPU型號
-                            gpu_match = re.search(r"AMD Radeon™\s+[A-Z0-9]+[A-Z]*", field_data)
-                            row[model_name] = gpu_match.group(0) if gpu_match else "N/A"
+                            row[model_name] = normalized.get("gpu_model") or "N/A"
                         elif data_field == "memory":
-                            # 提取記憶體類型
-                            memory_match = re.search(r"DDR\d+", field_data)
-                            row[model_name] = memory_match.group(0) if memory_match else "N/A"
+                            row[model_name] = normalized.get("memory_type") or "N/A"
                         elif data_field == "storage":
                             # 提取儲存類型
                             storage_match = re.search(r"M\.2.*?PCIe.*?NVMe", field_data)
                             row[model_name] = storage_match.group(0) if storage_match else "N/A"
                         elif data_field == "battery":
-                            # 提取電池容量
-                            battery_match = re.search(r"(\d+\.?\d*)\s*Wh", field_data)
-                            row[model_name] = f"{battery_match.group(1)}Wh" if battery_match else "N/A"
+                            battery_wh = normalized.get("battery_wh")
+                            row[model_name] = f"{battery_wh:g}Wh" if battery_wh is not None else "N/A"
                         elif data_field == "thermal":
-                            # 提取散熱設計
-                            thermal_match = re.search(r"(\d+)W", field_data)
-                            row[model_name] = f"{thermal_match.group(1)}W" if thermal_match else "N/A"
+                            tdp_w = normalized.get("tdp_w")
+                            row[model_name] = f"{tdp_w:g}W" if tdp_w is not None else "N/A"
                         elif data_field == "structconfig":
                             # 提取結構配置信息
                             if feature_name == "Weight":
-                                weight_match = re.search(r"Weight:\s*(\d+)\s*g", field_data)
-                                if weight_match:
-                                    weight_g = int(weight_match.group(1))
-                                    weight_kg = weight_g / 1000
-                                    row[model_name] = f"{weight_g}g ({weight_kg:.1f}kg)"
+                                weight_g = normalized.get("weight_g")
+                                if weight_g is not None:
+                                    row[model_name] = f"{weight_g:g}g ({weight_g / 1000:.1f}kg)"
                                 else:
                                     row[model_name] = "N/A"
                             elif feature_name == "Dimensions":
@@ -1140,26 +1180,17 @@ class SalesAssistantService(BaseService):
             
             # 生成摘要
             if "輕便" in query or "重量" in query or "weight" in query.lower() or "portable" in query.lower():
-                # 提取重量信息進行比較
-                weights = {}
-                for model_name in target_modelnames:
-                    model_data = next((item for item in context_list_of_dicts if item.get("modelname") == model_name), None)
-                    if model_data:
-                        structconfig = model_data.get("structconfig", "")
-                        weight_match = re.search(r"Weight:\s*(\d+)\s*g", structconfig)
-                        if weight_match:
-                            weights[model_name] = int(weight_match.group(1))
+                # 依記憶體中的 specs_normalized.weight_g 排序 (由輕到重)，不在事件迴圈上查詢 DuckDB
+                weights = self.spec_store.rank_models(target_modelnames, "weight_g") or []
                 
                 if len(weights) >= 2:
                     # 找到最輕的型號
-                    lightest_model = min(weights.keys(), key=lambda x: weights[x])
-                    lightest_weight = weights[lightest_model]
-                    heaviest_model = max(weights.keys(), key=lambda x: weights[x])
-                    heaviest_weight = weights[heaviest_model]
+                    lightest_model, lightest_weight = weights[0]
+                    heaviest_model, heaviest_weight = weights[-1]
                     
                     if lightest_weight < heaviest_weight:
                         weight_diff = heaviest_weight - lightest_weight
-                        summary = f"根據重量比較，{lightest_model} 最輕便，重量為 {lightest_weight}g ({lightest_weight/1000:.1f}kg)，比 {heaviest_model} 輕 {weight_diff}g。"
+                        summary = f"根據重量比較，{lightest_model} 最輕便，重量為 {lightest_weight:g}g ({lightest_weight/1000:.1f}kg)，比 {heaviest_model} 輕 {weight_diff:g}g。"
                     else:
                         summary = f"根據提供的数据，{len(target_modelnames)} 个型号的重量相同或相近。"
                 else:
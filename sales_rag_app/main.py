@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 from fastapi import FastAPI, Request
@@ -49,6 +50,14 @@ templates = Jinja2Templates(directory="sales_rag_app/templates")
 # 初始化服務管理器
 service_manager = ServiceManager()
 
+@app.on_event("startup")
+async def warm_up_services():
+    """啟動時預熱各服務的 LLM 後端 (載入模型並常駐)，第一個使用者請求不必等待模型載入；LLM_WARM_UP=false 可停用"""
+    if os.getenv("LLM_WARM_UP", "true").strip().lower() in ("0", "false", "no", "off"):
+        return
+    for name in service_manager.list_services():
+        await asyncio.to_thread(service_manager.get_service(name).warm_up)
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """渲染主頁面"""
@@ -60,6 +69,21 @@ async def get_services():
     services = service_manager.list_services()
     return {"services": services}
 
+@app.get("/api/metrics", response_class=JSONResponse)
+async def get_metrics():
+    """獲取各服務的效能統計 (快取命中率、LLM 並發狀態等)"""
+    metrics = {name: service_manager.get_service(name).get_metrics() for name in service_manager.list_services()}
+    return {"metrics": metrics}
+
+@app.get("/api/health", response_class=JSONResponse)
+async def health():
+    """檢查各服務的 LLM 後端是否可用，任一服務不健康時回傳 503"""
+    services = {}
+    for name in service_manager.list_services():
+        services[name] = await asyncio.to_thread(service_manager.get_service(name).health)
+    healthy = all(status.get("healthy") for status in services.values())
+    return JSONResponse(status_code=200 if healthy else 503, content={"healthy": healthy, "services": services})
+
 @app.post("/api/chat-stream")
 async def chat_stream(request: Request):
     """處理聊天請求並返回流式響應"""
@@ -67,6 +91,7 @@ async def chat_stream(request: Request):
         data = await request.json()
         query = data.get("query")
         service_name = data.get("service_name", "sales_assistant") # 預設使用銷售助理
+        stream = bool(data.get("stream", False)) # 是否串流中間事件 (進度、推理、部分回答)
 
         if not query:
             return JSONResponse(status_code=400, content={"error": "Query cannot be empty"})
@@ -76,7 +101,7 @@ async def chat_stream(request: Request):
              return JSONResponse(status_code=404, content={"error": f"Service '{service_name}' not found"})
 
         # 返回一個流式響應，從服務的 chat_stream 方法獲取內容
-        return StreamingResponse(service.chat_stream(query), media_type="text/event-stream")
+        return StreamingResponse(service.chat_stream(query, stream=stream), media_type="text/event-stream")
 
     except Exception as e:
         print(f"Error in chat_stream: {e}")
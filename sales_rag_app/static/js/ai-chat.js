@@ -21,7 +21,7 @@ document.addEventListener("DOMContentLoaded", () => {
             const response = await fetch("/api/chat-stream", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ query: query, service_name: "sales_assistant" }),
+                body: JSON.stringify({ query: query, service_name: "sales_assistant", stream: true }),
             });
 
             if (!response.ok) throw new Error(`HTTP 錯誤！ 狀態: ${response.status}`);
@@ -31,6 +31,7 @@ document.addEventListener("DOMContentLoaded", () => {
             
             let assistantMessageContainer = null;
             let fullResponseText = "";
+            let partialAnswer = "";
 
             while (true) {
                 const { value, done } = await reader.read();
@@ -47,14 +48,29 @@ document.addEventListener("DOMContentLoaded", () => {
                      if (line.startsWith('data: ')) {
                         const jsonDataString = line.substring(6);
                         if (jsonDataString) {
-                            if (thinkingBubble && document.body.contains(thinkingBubble)) {
-                                 thinkingBubble.remove();
-                            }
                             try {
                                 const jsonData = JSON.parse(jsonDataString);
+
+                                // 中間事件：進度、排隊順位與推理過程更新思考指示器，回答片段即時顯示
+                                if (jsonData.event === 'progress' || jsonData.event === 'queued' || jsonData.event === 'think') {
+                                    updateThinkingIndicator(thinkingBubble, jsonData);
+                                    continue;
+                                }
+                                if (thinkingBubble && document.body.contains(thinkingBubble)) {
+                                     thinkingBubble.remove();
+                                }
                                 if (!assistantMessageContainer) {
                                     assistantMessageContainer = createMessageContainer('assistant');
                                 }
+                                if (jsonData.event === 'answer') {
+                                    partialAnswer += jsonData.delta || "";
+                                    renderPartialAnswer(assistantMessageContainer.querySelector('.message-content'), partialAnswer);
+                                    continue;
+                                }
+                                if (jsonData.event) {
+                                    // 未知的中間事件，忽略
+                                    continue;
+                                }
                                 renderMessageContent(assistantMessageContainer.querySelector('.message-content'), jsonData);
                             } catch (e) {
                                 console.error("JSON 解析錯誤:", e, "Data:", jsonDataString);
@@ -286,6 +302,29 @@ document.addEventListener("DOMContentLoaded", () => {
         scrollToBottom();
         return container;
     }
+    function updateThinkingIndicator(indicator, event) {
+        if (!indicator || !document.body.contains(indicator)) return;
+        if ((event.event === 'progress' || event.event === 'queued') && event.message) {
+            indicator.querySelector('.thinking-indicator span').textContent = event.message;
+        } else if (event.event === 'think' && event.delta) {
+            let thinkBox = indicator.querySelector('.think-stream');
+            if (!thinkBox) {
+                thinkBox = document.createElement('div');
+                thinkBox.className = 'think-stream';
+                indicator.querySelector('.message-card').appendChild(thinkBox);
+            }
+            thinkBox.textContent += event.delta;
+            thinkBox.scrollTop = thinkBox.scrollHeight;
+        }
+        scrollToBottom();
+    }
+    function renderPartialAnswer(container, text) {
+        const summary = document.createElement('div');
+        summary.className = 'answer-summary';
+        summary.textContent = text;
+        container.replaceChildren(summary);
+        scrollToBottom();
+    }
     function toggleInput(disabled) {
         userInput.disabled = disabled;
         sendButton.disabled = disabled;
@@ -0,0 +1,172 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Prompt.PromptBudget import estimate_tokens
+
+DEFAULT_RESPONSE = json.dumps({
+    "answer_summary": "AG958 的電池容量為 80.08Wh。",
+    "comparison_table": [{"feature": "Battery", "AG958": "80.08Wh"}]
+}, ensure_ascii=False)
+
+
+def parse_keep_alive(value) -> float:
+    """將 Ollama 的 keep_alive ("30m"、"10s"、300、-1) 轉為秒數，負數表示永久常駐"""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    text = str(value).strip()
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    for unit in ("ms", "s", "m", "h"):
+        if text.endswith(unit) and text[:-len(unit)].lstrip("-").replace(".", "", 1).isdigit():
+            seconds = float(text[:-len(unit)]) * units[unit]
+            return float("inf") if seconds < 0 else seconds
+    seconds = float(text)
+    return float("inf") if seconds < 0 else seconds
+
+
+class StubOllamaServer:
+    def __init__(self, response_text: str = DEFAULT_RESPONSE, load_seconds: float = 0.3,
+                 prefill_ms_per_token: float = 0.2, decode_ms_per_chunk: float = 1.0, chunk_size: int = 16,
+                 responder=None, models=("deepseek-r1:7b",), fail_status: int | None = None):
+        """
+        模擬 Ollama /api/generate 的本地 HTTP 伺服器 (僅供測試與基準)：
+        - 模型未載入、keep_alive 到期或 num_ctx 改變時需要 load_seconds 重新載入
+        - 與上一個提示相同的前綴視為 KV cache 命中，只有其餘部分需要 prefill
+        - 回應以 NDJSON 串流逐段送出，最後一段帶有 prompt_eval_count / eval_count
+        - 用戶端中途關閉連線時停止生成，統計中的 cancelled 為 True
+        :param responder: payload -> 回應文字，用於依請求 (例如 raw 模式) 回放不同的輸出，未指定時固定回傳 response_text
+        :param models: /api/tags 列出的模型
+        :param fail_status: HTTP 狀態碼 (例如 500)，設定時 /api/generate 一律回傳該錯誤，用於模擬故障的主機；
+                            啟動後也可直接修改 fail_status 屬性，模擬主機故障或恢復
+        """
+        self.response_text = response_text
+        self.responder = responder
+        self.models = list(models)
+        self.load_seconds = load_seconds
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.decode_ms_per_chunk = decode_ms_per_chunk
+        self.chunk_size = chunk_size
+        self.requests = []
+        self.fail_status = fail_status
+        self.failed_requests = 0
+        self._lock = threading.Lock()
+        self._loaded_num_ctx = None
+        self._expires_at = 0.0
+        self._cached_prompt = ""
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _prepare(self, payload: dict) -> dict:
+        """模擬載入模型與 prefill，返回本次請求的統計"""
+        options = payload.get("options") or {}
+        num_ctx = options.get("num_ctx") or 2048
+        system = payload.get("system") or ""
+        full_prompt = (system + "\n\n" if system else "") + (payload.get("prompt") or "")
+        with self._lock:
+            now = time.monotonic()
+            reloaded = self._loaded_num_ctx != num_ctx or now > self._expires_at
+            if reloaded:
+                time.sleep(self.load_seconds)
+                self._loaded_num_ctx = num_ctx
+                self._cached_prompt = ""
+            common = 0
+            for cached_char, char in zip(self._cached_prompt, full_prompt):
+                if cached_char != char:
+                    break
+                common += 1
+            cached_tokens = estimate_tokens(full_prompt[:common])
+            prompt_tokens = estimate_tokens(full_prompt)
+            time.sleep((prompt_tokens - cached_tokens) * self.prefill_ms_per_token / 1000)
+            self._cached_prompt = full_prompt
+            keep_alive = parse_keep_alive(payload.get("keep_alive"))
+            self._expires_at = time.monotonic() + keep_alive
+            if keep_alive == 0:
+                self._loaded_num_ctx = None
+        stats = {"reloaded": reloaded, "prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens,
+                 "num_ctx": num_ctx, "keep_alive": payload.get("keep_alive"), "system": bool(system),
+                 "format": payload.get("format"), "raw": payload.get("raw"), "chunks_sent": 0, "cancelled": False}
+        self.requests.append(stats)
+        return stats
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path in ("/api/tags", "/api/version", "/"):
+                    body = json.dumps({"models": [{"name": name} for name in server.models],
+                                       "version": "0.0.0-stub"}).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if server.fail_status:
+                    server.failed_requests += 1
+                    self.send_error(server.fail_status)
+                    return
+                stats = server._prepare(payload)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                if payload.get("prompt") is None:
+                    # 沒有 prompt 的請求只載入模型 (預熱)，不產生任何輸出
+                    text = ""
+                else:
+                    text = server.responder(payload) if server.responder else server.response_text
+                chunks = [text[i:i + server.chunk_size] for i in range(0, len(text), server.chunk_size)]
+                try:
+                    for chunk in chunks:
+                        line = {"model": payload.get("model"), "response": chunk, "done": False}
+                        self.wfile.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+                        self.wfile.flush()
+                        stats["chunks_sent"] += 1
+                        time.sleep(server.decode_ms_per_chunk / 1000)
+                    final = {"model": payload.get("model"), "response": "", "done": True,
+                             "prompt_eval_count": stats["prompt_tokens"] - stats["cached_tokens"], "eval_count": len(chunks)}
+                    self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # 用戶端已中止串流 (例如 JSON 外框閉合或推理超過預算)
+                    stats["cancelled"] = True
+
+        return Handler
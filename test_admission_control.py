@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.admission_control import (PRIORITY_HIGH, PRIORITY_NORMAL, AdmissionController,
+                                                  AdmissionRejected)
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+class SlowStubLLM:
+    """固定延遲後回傳合法 JSON 的 LLM"""
+
+    def __init__(self, latency=0.3):
+        self.latency = latency
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return json.dumps({"answer_summary": "AKK839 適合輕度遊戲。",
+                           "comparison_table": [{"feature": "GPU", "AKK839": "Radeon"}]}, ensure_ascii=False)
+
+    def stream(self, prompt, **kwargs):
+        yield self.invoke(prompt, **kwargs)
+
+
+async def _rejected(coroutine_or_ticket_fn):
+    try:
+        await coroutine_or_ticket_fn()
+    except AdmissionRejected as e:
+        return e
+    raise AssertionError("應拋出 AdmissionRejected")
+
+
+def test_bounded_priority_queue():
+    async def run():
+        controller = AdmissionController(max_in_flight=1, max_queue=2, queue_timeout=5)
+        first = controller.enter()
+        second = controller.enter(PRIORITY_NORMAL)
+        third = controller.enter(PRIORITY_NORMAL)
+        assert controller.in_flight == 1 and controller.position(second) == 1 and controller.position(third) == 2
+
+        # 佇列已滿：相同優先權直接拒絕，較高優先權擠出最晚抵達的一般請求
+        try:
+            controller.enter(PRIORITY_NORMAL)
+        except AdmissionRejected as e:
+            assert e.reason == "queue_full" and e.retry_after >= 1
+        else:
+            raise AssertionError("佇列已滿時應拒絕")
+        urgent = controller.enter(PRIORITY_HIGH)
+        assert controller.position(urgent) == 1 and controller.position(second) == 2
+        evicted = await _rejected(lambda: anext(controller.wait(third)))
+        assert evicted.reason == "evicted"
+
+        positions = []
+
+        async def wait_second():
+            async for position in controller.wait(second):
+                positions.append(position)
+
+        waiter = asyncio.create_task(wait_second())
+        await asyncio.sleep(0.01)
+        controller.release(first)
+        assert controller.position(urgent) == 0 and controller.in_flight == 1
+        await asyncio.sleep(0.01)
+        controller.release(urgent)
+        await waiter
+        controller.release(second)
+        controller.release(second)
+        assert positions == [2, 1] and controller.in_flight == 0
+        metrics = controller.get_metrics()
+        print(f"准入統計: {metrics}")
+        assert metrics["admitted"] == 3 and metrics["rejected"] == 2 and metrics["evicted"] == 1
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_and_early_shedding():
+    async def run():
+        controller = AdmissionController(max_in_flight=1, max_queue=8, queue_timeout=0.1, report_interval=0.02)
+        holder = controller.enter()
+        waiting = controller.enter()
+        timed_out = await _rejected(lambda: _drain(controller.wait(waiting)))
+        assert timed_out.reason == "timeout" and controller.queued == 0
+
+        # 有處理時間樣本後，預估等待超過上限的請求在抵達時就被拒絕
+        await asyncio.sleep(0.2)
+        controller.release(holder)
+        assert controller.service_seconds >= 0.2
+        controller.enter()
+        try:
+            controller.enter()
+        except AdmissionRejected as e:
+            assert e.reason == "overloaded"
+        else:
+            raise AssertionError("預估等待過久時應立即拒絕")
+
+    async def _drain(generator):
+        async for _ in generator:
+            pass
+
+    asyncio.run(run())
+
+
+def test_overload_estimate_follows_priority():
+    async def run():
+        controller = AdmissionController(max_in_flight=1, max_queue=2, queue_timeout=1)
+        controller.service_seconds = 0.6
+        holder = controller.enter()
+        normal = controller.enter(PRIORITY_NORMAL)
+        # 一般請求排在第二位要等兩輪 (1.2 秒) 而被拒絕，高優先權請求排在它前面只需等一輪
+        try:
+            controller.enter(PRIORITY_NORMAL)
+        except AdmissionRejected as e:
+            assert e.reason == "overloaded"
+        else:
+            raise AssertionError("預估等待過久時應立即拒絕")
+        urgent = controller.enter(PRIORITY_HIGH)
+        assert controller.position(urgent) == 1 and controller.position(normal) == 2
+
+        # 佇列已滿且預估等待過久：直接拒絕，不先擠出佇列中的一般請求
+        try:
+            controller.enter(PRIORITY_HIGH)
+        except AdmissionRejected as e:
+            assert e.reason == "overloaded"
+        else:
+            raise AssertionError("預估等待過久時應立即拒絕")
+        assert controller.queued == 2 and not normal.future.done() and controller.stats["evicted"] == 0
+        for ticket in (holder, urgent, normal):
+            controller.release(ticket)
+        assert controller.in_flight == 0 and controller.stats["admitted"] == 3
+
+    asyncio.run(run())
+
+
+def test_service_queues_sheds_and_keeps_fast_path():
+    """LLM 名額已滿時：後到的請求回報排隊順位，佇列滿時回覆 429，規則引擎的回答不受影響"""
+    llm = SlowStubLLM(0.3)
+    service = SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE),
+                                    admission=AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=10))
+
+    async def ask(query, delay=0.0):
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        events = [json.loads(chunk[len("data: "):]) async for chunk in service.chat_stream(query, stream=True)]
+        return events, time.perf_counter() - started
+
+    async def run():
+        return await asyncio.gather(ask("AKK839 適合玩遊戲嗎"), ask("AKK839 適合出差嗎", 0.05),
+                                    ask("APX958 適合剪輯影片嗎", 0.1), ask("比較 AG958 和 APX958 的電池容量", 0.1))
+
+    (first, _), (second, _), (third, _), (fast, fast_elapsed) = asyncio.run(run())
+    assert first[-1]["served_by"] == "llm" and second[-1]["served_by"] == "llm"
+    assert {"event": "queued", "position": 1}.items() <= next(e for e in second if e.get("event") == "queued").items()
+    assert third[-1]["served_by"] == "rejected" and third[-1]["status"] == 429 and third[-1]["retry_after"] >= 1
+    assert fast[-1]["served_by"] == "fast_path" and fast_elapsed < 0.2
+    assert llm.calls == 2
+    metrics = service.get_metrics()["admission"]
+    print(f"服務准入統計: {metrics}")
+    assert metrics["rejected"] == 1 and metrics["in_flight"] == 0 and metrics["queued"] == 0
+
+    # 排隊中的用戶端中斷連線時離開佇列
+    async def disconnect_while_queued():
+        busy = asyncio.create_task(ask("AKK839 適合剪輯影片嗎"))
+        await asyncio.sleep(0.05)
+        stream = service.chat_stream("AKK839 適合上網課嗎", stream=True)
+        async for chunk in stream:
+            if '"queued"' in chunk:
+                break
+        await stream.aclose()
+        assert service.admission.queued == 0
+        await busy
+
+    asyncio.run(disconnect_while_queued())
+    assert service.admission.in_flight == 0 and llm.calls == 3
+
+
+if __name__ == "__main__":
+    test_bounded_priority_queue()
+    test_queue_timeout_and_early_shedding()
+    test_overload_estimate_follows_priority()
+    test_service_queues_sheds_and_keeps_fast_path()
+    print("准入控制測試通過")
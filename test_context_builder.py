@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import sys
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.Prompt.ContextBuilder import ContextBuilder
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+class RecordingStubLLM:
+    """記錄收到的提示並回傳合法的 JSON 回應"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return json.dumps({"answer_summary": "AG958 的電池容量為 80.08Wh。",
+                           "comparison_table": [{"feature": "Battery", "AG958": "80.08Wh"}]}, ensure_ascii=False)
+
+
+def _store_and_builder(token_budget=3000):
+    store = SpecStore(DB_FILE)
+    return store, ContextBuilder(store.snapshot.fields, token_budget=token_budget)
+
+
+def test_selects_fields_by_intent():
+    """依查詢意圖只放入相關欄位，並保留識別欄位"""
+    store, builder = _store_and_builder()
+    records = store.get_records(list(store.get_models_by_type("958")))
+    cases = {
+        "958 系列哪個電池續航最好？": ["battery"],
+        "AG958 適合玩遊戲嗎": ["cpu", "gpu", "thermal", "memory"],
+        "AG958 有幾個 USB 接口": ["iointerface"],
+        "AG958 的 wifi 和藍牙": ["wireless", "wifislot", "bluetooth"],
+    }
+    for query, expected in cases.items():
+        context = builder.build(records, query)
+        print(f"{query} -> {context.fields}, {context.tokens} tokens (全部欄位 {context.full_tokens})")
+        assert context.fields == expected
+        rows = json.loads(context.text)
+        assert [row["modelname"] for row in rows] == [record["modelname"] for record in records]
+        assert set(rows[0]) == {"modelname", "modeltype", *expected}
+        assert context.tokens * 4 < context.full_tokens
+    # "ai" 不應比對到 "detail" 之類的英文單字
+    assert builder.detect_intents("AG958 details") == []
+    assert builder.select_fields("AG958 details")[1][:2] == ["cpu", "gpu"]
+
+
+def test_enforces_token_budget():
+    """超過預算時從最不重要的欄位開始捨棄"""
+    store, builder = _store_and_builder(token_budget=400)
+    records = store.get_records(list(store.get_models_by_type("958")))
+    context = builder.build(records, "AG958 適合玩遊戲嗎")
+    assert context.tokens <= 400
+    assert context.fields[0] == "cpu"
+    assert context.dropped_fields and context.dropped_fields[-1] == "memory"
+
+
+def test_full_tokens_computed_lazily():
+    """全部欄位的比較數值只在讀取 full_tokens 時才計算"""
+    store = SpecStore(DB_FILE)
+    records = store.get_records(list(store.get_models_by_type("958")))
+    counted = []
+
+    def count_tokens(text):
+        counted.append(text)
+        return len(text) // 4
+
+    builder = ContextBuilder(store.snapshot.fields, count_tokens=count_tokens)
+    context = builder.build(records, "958 系列哪個電池續航最好？")
+    assert not any(text.startswith("[\n  {") for text in counted)
+    calls = len(counted)
+    assert context.full_tokens > context.tokens
+    assert len(counted) == calls + 1
+    assert context.full_tokens == context.full_tokens and len(counted) == calls + 1
+
+
+def test_service_prompt_uses_compact_context():
+    """提示中只出現一次上下文，且記錄每次請求的 token 數"""
+    llm = RecordingStubLLM()
+    service = SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+    async def collect():
+        return [chunk async for chunk in service.chat_stream("958 系列的電池續航適合出差嗎")]
+
+    asyncio.run(collect())
+    prompt = llm.prompts[0]
+    assert prompt.count('"modelname":"AG958"') == 1
+    assert "iointerface" not in prompt.split("[DATA CONTEXT]")[1]
+    metrics = service.get_metrics()["prompt"]
+    print(f"提示 token 統計: {metrics}")
+    assert metrics["requests"] == 1 and metrics["last_prompt_tokens"] > metrics["last_context_tokens"] > 0
+
+
+if __name__ == "__main__":
+    test_selects_fields_by_intent()
+    test_enforces_token_budget()
+    test_full_tokens_computed_lazily()
+    test_service_prompt_uses_compact_context()
@@ -0,0 +1,192 @@
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+def test_parallel_queries_share_pool():
+    """多執行緒同時查詢應全部成功，結束後連線全部歸還"""
+    db = DuckDBQuery(DB_FILE, pool_size=3)
+
+    def lookup(modelname):
+        return db.query_with_params("SELECT modelname FROM specs WHERE modelname = ?", [modelname])
+
+    names = ["AG958", "APX958", "AKK839", "AB819-S: FP6"] * 10
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lookup, names))
+    assert [rows[0][0] for rows in results] == names
+    assert db.get_stats()["idle"] == 3
+    db.disconnect()
+
+
+def test_reconnects_after_disconnect():
+    """連線被關閉後，下一次查詢自動重新連線而不是返回 None"""
+    db = DuckDBQuery(DB_FILE, pool_size=2)
+    db.disconnect()
+    assert db.query("SELECT count(*) FROM specs") == [(15,)]
+    db.disconnect()
+
+
+class RacingDuckDBQuery(DuckDBQuery):
+    """模擬另一個執行緒在 _acquire 檢查連線池之後立刻 disconnect()：第二次讀取 _pool 時已變成 None"""
+
+    def __init__(self, *args, **kwargs):
+        self.reads = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def _pool(self):
+        pool = self.__dict__.get("_real_pool")
+        if self.reads is not None:
+            self.reads += 1
+            if self.reads > 1:
+                return None
+        return pool
+
+    @_pool.setter
+    def _pool(self, pool):
+        self.__dict__["_real_pool"] = pool
+
+
+def test_acquire_uses_single_pool_reference():
+    """_acquire 只讀取一次連線池 (本地參照)，並行的 disconnect() 不會造成 AttributeError"""
+    db = RacingDuckDBQuery(DB_FILE, pool_size=1)
+    db.reads = 0
+    with db._acquire() as cursor:
+        assert cursor.execute("SELECT 1").fetchall() == [(1,)]
+    db.reads = None
+    db.disconnect()
+
+
+def test_reconnects_when_pooled_connections_dropped():
+    """連線池中的連線失效時，重建連線池並重試查詢"""
+    db = DuckDBQuery(DB_FILE, pool_size=2, health_check_interval=0)
+    generation = db.get_stats()["generation"]
+    for cursor, _ in list(db._pool.idle):
+        cursor.close()
+    assert db.query("SELECT count(*) FROM specs") == [(15,)]
+    assert db.get_stats()["generation"] > generation
+    db.disconnect()
+
+
+def test_reconnect_keeps_borrowed_cursors_usable():
+    """重新連線時借出的 cursor 仍可使用，等待中的執行緒改用新的連線池，舊主連線在歸還後才關閉"""
+    db = DuckDBQuery(DB_FILE, pool_size=1, acquire_timeout=5)
+    borrowed, release = threading.Event(), threading.Event()
+    results = {}
+
+    def holder():
+        with db._acquire() as cursor:
+            borrowed.set()
+            release.wait(5)
+            results["holder"] = cursor.execute("SELECT count(*) FROM specs").fetchall()
+
+    def waiter():
+        start = time.monotonic()
+        results["waiter"] = db.query("SELECT count(*) FROM specs")
+        results["waited"] = time.monotonic() - start
+
+    old_pool = db._pool
+    holder_thread = threading.Thread(target=holder)
+    holder_thread.start()
+    borrowed.wait(5)
+    waiter_thread = threading.Thread(target=waiter)
+    waiter_thread.start()
+    time.sleep(0.1)
+    db.connect()
+    waiter_thread.join(5)
+    assert results["waiter"] == [(15,)] and results["waited"] < 2
+    # 舊的主連線仍開著，借出的 cursor 可以繼續查詢
+    release.set()
+    holder_thread.join(5)
+    assert results["holder"] == [(15,)]
+    assert old_pool.retired and old_pool.borrowed == 0
+    try:
+        old_pool.connection.execute("SELECT 1")
+    except Exception:
+        pass
+    else:
+        raise AssertionError("舊的主連線應在 cursor 全部歸還後關閉")
+    # 發生錯誤的世代已被取代時不再重複重新連線
+    generation = db.get_stats()["generation"]
+    db.connect(expected_generation=old_pool.generation)
+    assert db.get_stats()["generation"] == generation
+    db.disconnect()
+
+
+def test_concurrent_queries_survive_reconnect():
+    """多執行緒查詢途中重新連線：沒有查詢失敗，連線池也不會縮小"""
+    db = DuckDBQuery(DB_FILE, pool_size=3, acquire_timeout=5)
+    stop = threading.Event()
+    failures = []
+
+    def worker():
+        while not stop.is_set():
+            if db.query("SELECT count(*) FROM specs") != [(15,)]:
+                failures.append("query")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    generation = db.get_stats()["generation"]
+    for _ in range(3):
+        time.sleep(0.05)
+        db.connect()
+    stop.set()
+    for thread in threads:
+        thread.join(10)
+    stats = db.get_stats()
+    print(f"重新連線後的連線池: {stats}, 失敗 {len(failures)} 次")
+    assert not failures
+    assert stats["generation"] == generation + 3 and stats["idle"] == 3
+    db.disconnect()
+
+
+def test_columnar_projection():
+    """欄式查詢只取回指定欄位，並支援 Arrow / pandas / NumPy 格式"""
+    db = DuckDBQuery(DB_FILE, pool_size=1)
+    columns = ["modelname", "battery"]
+    as_numpy = db.select_specs(["AG958", "APX958"], columns=columns, result_format="numpy")
+    assert list(as_numpy.keys()) == columns
+    assert sorted(as_numpy["modelname"].tolist()) == ["AG958", "APX958"]
+
+    as_df = db.select_specs(["AG958"], columns=columns, result_format="pandas")
+    assert list(as_df.columns) == columns and len(as_df) == 1
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("未安裝 pyarrow，略過 Arrow 格式測試")
+    else:
+        with warnings.catch_warnings():
+            # Arrow 路徑不可使用已棄用的 fetch_arrow_table()
+            warnings.simplefilter("error", DeprecationWarning)
+            as_arrow = db.select_specs(columns=["modelname"], result_format="arrow")
+        assert as_arrow.num_rows == 15 and as_arrow.column_names == ["modelname"]
+
+    try:
+        db.select_specs(columns=["modelname; DROP TABLE specs"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知欄位應被拒絕")
+    db.disconnect()
+
+
+if __name__ == "__main__":
+    test_parallel_queries_share_pool()
+    test_reconnects_after_disconnect()
+    test_acquire_uses_single_pool_reference()
+    test_reconnects_when_pooled_connections_dropped()
+    test_reconnect_keeps_borrowed_cursors_usable()
+    test_concurrent_queries_survive_reconnect()
+    test_columnar_projection()
@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Cache.EmbeddingCache import EmbeddingCache
+from sales_rag_app.libs.RAG.DB.MilvusQuery import MilvusQuery
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import EmbeddingService
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.texts = []
+
+    def encode(self, texts, batch_size=32):
+        self.texts.extend(texts)
+        return np.array([[len(text), sum(map(ord, text)) % 101, 0.5] for text in texts], dtype=np.float64)
+
+
+def test_lru_ttl_and_normalization():
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=0.05)
+    assert cache.make_key("m", "  AG958　的 電池 ") == cache.make_key("m", "AG958 的 電池")
+    assert cache.make_key("m", "AG958") != cache.make_key("other", "AG958")
+    vector = cache.set(("m", "a"), [1.0, 2.0])
+    assert vector.dtype == np.float32 and not vector.flags.writeable
+    cache.set(("m", "b"), [3.0, 4.0])
+    cache.get(("m", "a"))
+    cache.set(("m", "c"), [5.0, 6.0])
+    assert cache.get(("m", "b")) is None and cache.get(("m", "a")) is not None
+    time.sleep(0.06)
+    assert cache.get(("m", "a")) is None
+    metrics = cache.get_metrics()
+    assert metrics["evictions"] == 1 and metrics["expirations"] == 1 and metrics["hits"] == 2
+
+
+def test_persistence_across_restarts():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache", "query_vectors.npz")
+        cache = EmbeddingCache(persist_path=path)
+        cache.set(("all-MiniLM-L6-v2", "AG958 的電池"), np.arange(4))
+        cache.set(("bge-small-zh", "哪台最輕"), np.arange(8))
+        assert cache.save()
+
+        restored = EmbeddingCache(persist_path=path)
+        assert restored.get_metrics()["loaded"] == 2
+        assert np.array_equal(restored.get(("bge-small-zh", "哪台最輕")), np.arange(8, dtype=np.float32))
+
+        with open(path, "wb") as f:
+            f.write(b"not a npz file")
+        assert EmbeddingCache(persist_path=path).get_metrics()["entries"] == 0
+
+
+def test_milvus_query_reuses_cached_vectors():
+    encoder = CountingEncoder()
+    milvus = MilvusQuery(embedding_service=EmbeddingService("test-model", encoder=encoder, batch_window_ms=0),
+                         query_cache=EmbeddingCache())
+    first = milvus.embed_query("AG958 的電池")
+    second = milvus.embed_query("AG958  的電池 ")
+    assert first is second and first.dtype == np.float32 and encoder.texts == ["AG958 的電池"]
+    metrics = milvus.get_metrics()["query_cache"]
+    print(f"查詢向量快取: {metrics}")
+    assert metrics["hit_rate"] == 0.5 and metrics["bytes"] == 12
+
+
+if __name__ == "__main__":
+    test_lru_ttl_and_normalization()
+    test_persistence_across_restarts()
+    test_milvus_query_reuses_cached_vectors()
+    print("查詢向量快取測試通過")
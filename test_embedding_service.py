@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.MilvusQuery import MilvusQuery
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import EmbeddingService, get_embedding_service
+
+
+class HashEncoder:
+    """依文字產生固定向量的編碼器，每次 encode 有固定的呼叫成本 (模擬模型的批次開銷)"""
+
+    def __init__(self, dim=8, call_seconds=0.02):
+        self.dim = dim
+        self.call_seconds = call_seconds
+        self.calls = []
+        self.fail = False
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(len(texts))
+        if self.fail:
+            raise RuntimeError("encoder failed")
+        time.sleep(self.call_seconds)
+        return np.array([[(hash(text) >> shift) % 97 / 97 for shift in range(self.dim)] for text in texts])
+
+
+def test_shared_service_per_model():
+    assert get_embedding_service("all-MiniLM-L6-v2") is get_embedding_service("all-MiniLM-L6-v2")
+    assert get_embedding_service("all-MiniLM-L6-v2") is not get_embedding_service("bge-small-zh")
+    shared = get_embedding_service()
+    assert not shared.get_metrics()["loaded"]  # 模型在第一次使用時才載入
+    assert MilvusQuery().embedding_model is shared
+
+
+def test_concurrent_queries_are_batched():
+    encoder = HashEncoder()
+    service = EmbeddingService(encoder=encoder, batch_window_ms=10, max_batch_size=8)
+    texts = [f"AG958 的電池 {i}" for i in range(20)]
+    barrier = threading.Barrier(len(texts))
+
+    def embed(text):
+        barrier.wait()
+        return service.embed_query(text)
+
+    with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        vectors = list(pool.map(embed, texts))
+    metrics = service.get_metrics()
+    print(f"批次大小: {encoder.calls}, 統計: {metrics}")
+    assert len(encoder.calls) <= 6 and max(encoder.calls) <= 8
+    assert vectors == service.embed_documents(texts)
+    assert isinstance(vectors[0], list) and service.embed_query_vector("q").dtype == np.float32
+    assert metrics["queries"] == 20 and metrics["avg_batch"] > 3
+
+
+def test_errors_reach_every_caller():
+    encoder = HashEncoder(call_seconds=0.0)
+    service = EmbeddingService(encoder=encoder, batch_window_ms=5)
+    encoder.fail = True
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(service.embed_query, f"q{i}") for i in range(4)]
+    assert all(isinstance(future.exception(), RuntimeError) for future in futures)
+    encoder.fail = False
+    assert len(service.embed_query("q")) == encoder.dim
+
+
+def test_leader_encodes_one_batch_and_hands_off():
+    """負責者只編碼一個批次就返回，後續批次由仍在等待的呼叫接手"""
+    gates = [threading.Event(), threading.Event()]
+
+    class GatedEncoder(HashEncoder):
+        def encode(self, texts, batch_size=32):
+            gate = gates[min(len(self.calls), 1)]
+            self.calls.append(len(texts))
+            gate.wait(5)
+            return np.array([[len(text)] * self.dim for text in texts])
+
+    encoder = GatedEncoder(call_seconds=0.0)
+    service = EmbeddingService(encoder=encoder, batch_window_ms=0, max_batch_size=2)
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        leader = pool.submit(service.embed_query, "a")
+        while not encoder.calls:
+            time.sleep(0.001)
+        followers = [pool.submit(service.embed_query, "b" * i) for i in range(2, 6)]
+        while len(service._pending) < 4:
+            time.sleep(0.001)
+        gates[0].set()
+        # 第二個批次仍在編碼時，第一個負責者已經拿到結果
+        assert leader.result(timeout=2) == [1.0] * encoder.dim
+        assert not any(future.done() for future in followers)
+        gates[1].set()
+        assert [future.result(timeout=2)[0] for future in followers] == [2.0, 3.0, 4.0, 5.0]
+    assert encoder.calls == [1, 2, 2] and not service._collecting
+
+
+if __name__ == "__main__":
+    test_shared_service_per_model()
+    test_concurrent_queries_are_batched()
+    test_errors_reach_every_caller()
+    test_leader_encodes_one_batch_and_hands_off()
+    print("嵌入服務測試通過")
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import sys
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.Tools.QueryIntentClassifier import QueryIntentClassifier
+from sales_rag_app.libs.RAG.Tools.SpecAnswerEngine import SpecAnswerEngine
+from sales_rag_app.libs.RAG.Tools.SpecExtractor import SPEC_ATTRIBUTES
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+class CountingStubLLM:
+    """記錄呼叫次數的 stub LLM"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        return json.dumps({"answer_summary": "AKK839 搭載 Radeon 880M，適合輕度遊戲。",
+                           "comparison_table": [{"feature": "GPU", "AKK839": "Radeon 880M"}]}, ensure_ascii=False)
+
+
+def test_classifies_structured_and_open_queries():
+    """單純的規格查詢/比較/排序走規則引擎，主觀或需要推理的問題交給 LLM"""
+    classifier = QueryIntentClassifier()
+    cases = [
+        ("AG958 battery capacity", 1, "lookup", ["battery"], None),
+        ("AG958 的電池續航", 1, "lookup", ["battery_life"], None),
+        ("比較 AG958 和 APX958 的 CPU 和 GPU", 2, "compare", ["cpu", "gpu"], None),
+        ("958 系列哪台最輕", 5, "rank", ["weight"], "min"),
+        ("which has the best battery", 2, "rank", ["battery"], "max"),
+        ("AKK839 適合玩遊戲嗎", 1, "open", [], None),
+        ("AG958 和 APX958 哪個螢幕比較好", 2, "open", ["display"], None),
+        ("AG958 的 USB 接口", 1, "open", [], None),
+        ("958 系列哪台螢幕最大", 5, "open", ["display"], None),
+        # 英文關鍵字以單字比對："light bar" 是功能問題，不是重量
+        ("AG958 的 light bar", 1, "open", [], None),
+        ("AG958 keyboard light", 1, "open", [], None),
+        ("AG958 weight", 1, "lookup", ["weight"], None),
+        ("is AG958 lightweight", 1, "lookup", ["weight"], None),
+        ("which is lighter", 2, "rank", ["weight"], "min"),
+    ]
+    for query, model_count, kind, attributes, direction in cases:
+        intent = classifier.classify(query, model_count)
+        print(f"{query} -> {intent} ({intent.reason})")
+        assert (intent.kind, intent.attributes, intent.direction) == (kind, attributes, direction), query
+
+
+def test_extracts_specs_from_raw_fields():
+    """擷取規則涵蓋只列出系列的 CPU 與 "up to 4G/8G/16G" 之類的容量寫法"""
+    store = SpecStore(DB_FILE)
+    akk839, amd819 = store.get_records(["AKK839", "AMD819: FT6"])
+    assert SPEC_ATTRIBUTES["cpu"].extract(akk839) == "Ryzen 5 / Ryzen 7 / Ryzen 9"
+    assert SPEC_ATTRIBUTES["memory"].numeric(amd819) == 16
+    assert SPEC_ATTRIBUTES["weight"].numeric(amd819) == 1487
+    assert SPEC_ATTRIBUTES["battery"].extract(akk839) == "80Wh / 99Wh"
+
+
+def test_answers_lookup_compare_and_rank():
+    store = SpecStore(DB_FILE)
+    classifier = QueryIntentClassifier()
+    engine = SpecAnswerEngine()
+
+    records = store.get_records(["AG958"])
+    answer = engine.answer(classifier.classify("AG958 的電池容量", 1), records)
+    assert answer["answer_summary"] == "AG958 的 Battery Capacity 為 80.08Wh。"
+    assert answer["comparison_table"] == [{"feature": "Battery Capacity", "AG958": "80.08Wh"}]
+
+    records = store.get_records(["AG958", "AKK839"])
+    answer = engine.answer(classifier.classify("AG958 vs AKK839 memory", 2), records)
+    assert "AKK839 (128GB)" in answer["answer_summary"]
+
+    records = store.get_records(["AG958", "AMD819: FT6", "APX958"])
+    answer = engine.answer(classifier.classify("哪台最輕", 3), records)
+    print(answer)
+    assert answer["answer_summary"].startswith("Weight 最輕的是 AMD819: FT6 (1487g)")
+    assert answer["comparison_table"][1] == {"feature": "Rank", "AG958": "2", "AMD819: FT6": "1", "APX958": "2"}
+
+
+def test_service_reports_serving_path():
+    """規格查詢不呼叫 LLM；開放式問題才送往 LLM，重複問題由快取回答，每個結果都標示 served_by"""
+    llm = CountingStubLLM()
+    service = SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+    def ask(query):
+        async def collect():
+            return [chunk async for chunk in service.chat_stream(query)]
+        return json.loads(asyncio.run(collect())[-1][len("data: "):])
+
+    fast = ask("比較 AG958 和 APX958 的電池容量")
+    assert fast["served_by"] == "fast_path" and llm.calls == 0
+    assert "80.08Wh" in fast["beautiful_table"]
+    assert ask("AKK839 適合玩遊戲嗎")["served_by"] == "llm" and llm.calls == 1
+    assert ask("AKK839 適合玩遊戲嗎")["served_by"] == "cache" and llm.calls == 1
+    assert ask("AKK839 的 light bar")["served_by"] == "llm" and llm.calls == 2
+    assert ask("XYZ123 的電池")["served_by"] == "validation"
+
+    serving = service.get_metrics()["serving"]
+    print(f"回應路徑統計: {serving}")
+    assert {path: stats["requests"] for path, stats in serving.items()} == {
+        "fast_path": 1, "llm": 2, "cache": 1, "validation": 1}
+
+
+if __name__ == "__main__":
+    test_classifies_structured_and_open_queries()
+    test_extracts_specs_from_raw_fields()
+    test_answers_lookup_compare_and_rank()
+    test_service_reports_serving_path()
+    print("fast path 測試通過")
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Cache.EmbeddingCache import EmbeddingCache
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.DB.HybridRetriever import HybridRetriever, reciprocal_rank_fusion
+from sales_rag_app.libs.RAG.DB.LocalVectorQuery import LocalVectorQuery, embed_documents_from_duckdb
+from sales_rag_app.libs.RAG.DB.MilvusQuery import filter_expr, output_fields_for
+from sales_rag_app.libs.RAG.DB.ModelCatalog import ModelCatalog
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import EmbeddingService
+from sales_rag_app.libs.RAG.Tools.QueryFilterParser import QueryFilterParser
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+from ingest_data import milvus_collection_data
+from pymilvus import CollectionSchema, DataType, FieldSchema
+from test_local_vector_query import HashEncoder
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+class RecordingVectorStore:
+    """記錄 allowed_ids 的向量庫，依固定順序回傳型號"""
+
+    def __init__(self, order):
+        self.order = order
+        self.calls = []
+
+    def search(self, query_text, top_k=5, allowed_ids=None):
+        self.calls.append(allowed_ids)
+        names = [name for name in self.order if allowed_ids is None or name in allowed_ids]
+        return [{"modelname": name, "id": name, "distance": float(i)} for i, name in enumerate(names[:top_k])]
+
+
+def test_parses_filters():
+    parser = QueryFilterParser(["819", "839", "958"])
+    filters = parser.parse("958 系列 2.3kg 以下、記憶體至少 32GB 的 DDR5 筆電")
+    assert filters.modeltypes == ["958"] and filters.memory_types == ["DDR5"]
+    assert filters.ranges == {"weight_g": (None, 2300.0), "memory_gb": (32.0, None)}
+    assert parser.parse("under 1800 g, battery over 60Wh, TDP < 30W").ranges == {
+        "weight_g": (None, 1800.0), "battery_wh": (60.0, None), "tdp_w": (None, 30.0)}
+    # 沒有方向的數值、GPU 型號與 DDR5 中的數字都不是範圍條件
+    assert not parser.parse("2kg 的 RX7600M 筆電與 9580 型號")
+    assert parser.parse("LPDDR5 筆電").memory_types == ["LPDDR5"]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["A", "B", "C"], ["C", "A"]], k=60)
+    assert [name for name, _ in fused] == ["A", "C", "B"]
+    assert abs(dict(fused)["A"] - (1 / 61 + 1 / 62)) < 1e-12
+
+
+def test_sql_filters_match_memory_filters():
+    duckdb_query = DuckDBQuery(db_file=DB_FILE)
+    catalog = ModelCatalog(SpecStore(DB_FILE))
+    filters = QueryFilterParser(catalog.modeltypes).parse("DDR5 且 1.9kg 以下")
+    in_sql = duckdb_query.filter_models(filters.modeltypes, filters.memory_types, filters.ranges)
+    normalized = catalog.spec_store.snapshot.normalized
+    in_memory = [name for name in catalog.modelnames if filters.matches(normalized.get(name))]
+    assert in_sql == sorted(in_memory) and "AKK839" in in_sql and "AB819-S: FP6" not in in_sql
+    assert not any(name.endswith("958") for name in in_sql)
+    # 記憶體類型完全比對：DDR5 不包含 LPDDR5 的型號，LPDDR5 只包含 LPDDR5 的型號
+    assert "AMD819: FT6" not in in_sql and not filters.matches(normalized.get("AMD819: FT6"))
+    lpddr5 = QueryFilterParser(catalog.modeltypes).parse("LPDDR5 筆電")
+    assert duckdb_query.filter_models(memory_types=lpddr5.memory_types) == ["AMD819-S: FT6", "AMD819: FT6"]
+    assert sorted(name for name in catalog.modelnames if lpddr5.matches(normalized.get(name))) == \
+        ["AMD819-S: FT6", "AMD819: FT6"]
+    assert duckdb_query.filter_models() == sorted(catalog.modelnames)
+
+
+def test_retriever_prefilters_vector_search_and_fuses():
+    catalog = ModelCatalog(SpecStore(DB_FILE))
+    vector_store = RecordingVectorStore(["AG958", "AKK839", "AB819-S: FP6", "AMD819: FT6", "AHP839"])
+    retriever = HybridRetriever(catalog, DuckDBQuery(db_file=DB_FILE), vector_store)
+
+    result = retriever.retrieve("which model is lightest with DDR5")
+    print(result)
+    assert "AB819-S: FP6" not in result.candidates and "AB819-S: FP6" in vector_store.order
+    assert vector_store.calls[-1] == result.candidates
+    assert "AMD819: FT6" not in result.candidates and result.structured_ranking[0] == "AHP839"
+    # 有數值排序時返回全部候選 (規則引擎才能找出真正的第一名)
+    assert set(result.modelnames) == set(result.candidates)
+    assert result.modelnames[0] in ("AHP839", "AKK839")
+
+    # 沒有條件也沒有排序：只用向量排序，返回 top_k
+    result = retriever.retrieve("適合出差攜帶的筆電", top_k=2)
+    assert result.modelnames == ["AG958", "AKK839"] and vector_store.calls[-1] is None
+
+    # 與產品無關的查詢不檢索
+    assert retriever.retrieve("你好").modelnames == []
+    # 向量庫無法使用時只依結構化條件
+    fallback = HybridRetriever(catalog, DuckDBQuery(db_file=DB_FILE), object()).retrieve("958 series with DDR5 under 3kg")
+    assert fallback.modelnames and all(name.endswith(("958", "958P", "958V")) for name in fallback.modelnames)
+    assert retriever.get_metrics()["retrievals"] == 3
+
+
+def test_local_index_prefilter_with_allowed_ids():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        service = EmbeddingService("hash-model", encoder=HashEncoder(), batch_window_ms=0)
+        vector_store = LocalVectorQuery(index_dir=os.path.join(temp_dir, "index"), db_file=DB_FILE,
+                                        embedding_service=service, query_cache=EmbeddingCache())
+        catalog = ModelCatalog(SpecStore(DB_FILE))
+        retriever = HybridRetriever(catalog, DuckDBQuery(db_file=DB_FILE), vector_store)
+        result = retriever.retrieve("839 系列 電池 90Wh 以上")
+        assert sorted(result.vector_ranking) == sorted(result.candidates) == sorted(catalog.get_models_by_type("839"))
+
+
+def test_service_answers_open_query_without_modelname():
+    service = SalesAssistantService(llm=object(), milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+    def ask(query):
+        async def collect():
+            return [chunk async for chunk in service.chat_stream(query)]
+        return json.loads(asyncio.run(collect())[-1][len("data: "):])
+
+    answer = ask("which model is lightest with DDR5")
+    print(answer["answer_summary"])
+    assert answer["served_by"] == "fast_path"
+    assert answer["answer_summary"].startswith("Weight 最輕的是 AHP839、AKK839、APX839、ARB839 (1800g)")
+    assert "AB819-S: FP6" not in answer["answer_summary"]
+    # LPDDR5 的 AMD819: FT6 雖然最輕，但不符合 DDR5
+    answer = ask("which is the lightest model with DDR5")
+    assert answer["served_by"] == "fast_path" and "AMD819: FT6" not in answer["answer_summary"]
+    assert ask("LPDDR5 最輕的是哪一台")["answer_summary"].startswith("Weight 最輕的是 AMD819: FT6 (1487g)")
+    # 提到不存在的型號時仍提示可能的正確型號
+    assert ask("AG959 最輕嗎")["served_by"] == "validation"
+    assert service.get_metrics()["hybrid_retrieval"]["retrievals"] == 3
+
+
+def test_milvus_prefilter_matches_ingested_schema():
+    """ingest_data.py 寫入 Milvus 的 schema 含 modelname，混合檢索的 expr 與回傳欄位都對得上"""
+    service = EmbeddingService("hash-model", encoder=HashEncoder(), batch_window_ms=0)
+    documents = embed_documents_from_duckdb(DB_FILE, service)
+    schema, entities = milvus_collection_data(documents)
+    names = [field.name for field in schema.fields]
+    assert names == ["pk", "modelname", "text", "source", "embedding"]
+    assert len(entities) == len(names) and all(len(column) == len(documents[0]) for column in entities)
+    catalog = ModelCatalog(SpecStore(DB_FILE))
+    assert sorted(entities[1]) == sorted(catalog.snapshot.modelnames)
+    assert schema.fields[-1].params["dim"] == HashEncoder().dim
+
+    expr = filter_expr(schema, ["AG958", "AMD819: FT6"], "source == 'duckdb:specs'")
+    assert expr == '(source == \'duckdb:specs\') and modelname in ["AG958", "AMD819: FT6"]'
+    output_fields = output_fields_for(schema)
+    assert output_fields == ["pk", "modelname", "text", "source"]
+    # MilvusQuery.search 回傳的 hit 由 output_fields 組成，混合檢索以其中的 modelname 排名
+    hits = [dict(zip(output_fields, row)) for row in zip(*entities[:len(output_fields)])][::-1]
+
+    class IngestedHits:
+        def search(self, query_text, top_k=5, allowed_ids=None):
+            return hits[:top_k]
+
+    retriever = HybridRetriever(catalog, DuckDBQuery(db_file=DB_FILE), IngestedHits())
+    ranking = retriever.vector_rank("DDR5", list(catalog.snapshot.modelnames), restrict=True)
+    assert ranking == [hit["modelname"] for hit in hits][:retriever.max_candidates]
+
+    # 舊版 ingest 的文字區塊 collection 沒有 modelname，無法依型號過濾
+    legacy = CollectionSchema([
+        FieldSchema(name="pk", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=100),
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
+        FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=200),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384)
+    ])
+    assert filter_expr(legacy, None) is None
+    try:
+        filter_expr(legacy, ["AG958"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("沒有 modelname 欄位時應拒絕依型號過濾")
+
+
+class BlockingVectorStore(RecordingVectorStore):
+    """搜尋時阻塞，直到測試放行或逾時，用於確認檢索期間事件迴圈仍可處理其他請求"""
+
+    def __init__(self, order, timeout=3.0):
+        super().__init__(order)
+        self.timeout = timeout
+        self.release = threading.Event()
+        self.released_in_time = None
+
+    def search(self, query_text, top_k=5, allowed_ids=None):
+        self.released_in_time = self.release.wait(self.timeout)
+        return super().search(query_text, top_k, allowed_ids)
+
+
+def test_hybrid_retrieval_does_not_block_event_loop():
+    """混合檢索在執行緒中進行：檢索卡住時，同一事件迴圈上的其他請求仍能完成"""
+    store = BlockingVectorStore(["AG958", "AKK839", "AMD819: FT6", "AHP839"])
+    service = SalesAssistantService(llm=object(), milvus_query=store, duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+    async def ask(query):
+        return json.loads([chunk async for chunk in service.chat_stream(query)][-1][len("data: "):])
+
+    async def second_request():
+        answer = await ask("AG958 的電池容量是多少")
+        # 第二個請求完成後才放行仍在檢索中的第一個請求
+        store.release.set()
+        return answer
+
+    async def run():
+        return await asyncio.gather(ask("which model is lightest with DDR5"), second_request())
+
+    slow, fast = asyncio.run(run())
+    assert fast["served_by"] == "fast_path"
+    assert store.released_in_time is True
+    assert slow["served_by"] == "fast_path" and "AKK839" in slow["answer_summary"]
+
+
+if __name__ == "__main__":
+    test_parses_filters()
+    test_reciprocal_rank_fusion()
+    test_sql_filters_match_memory_filters()
+    test_retriever_prefilters_vector_search_and_fuses()
+    test_local_index_prefilter_with_allowed_ids()
+    test_milvus_prefilter_matches_ingested_schema()
+    test_service_answers_open_query_without_modelname()
+    test_hybrid_retrieval_does_not_block_event_loop()
+    print("混合檢索測試通過")
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.LLM.LLMBackendRegistry import (LLM_BACKENDS, LLMBackend, LlamaCppBackend, OllamaBackend,
+                                                          OpenAICompatibleBackend, StubBackend, create_backend,
+                                                          register_backend, resolve_concurrency)
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+from stub_ollama_server import DEFAULT_RESPONSE, StubOllamaServer
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+class StubOpenAIServer:
+    """模擬 OpenAI 相容伺服器 (/v1/chat/completions、/v1/completions、/v1/models) 與 llama.cpp 的 /health"""
+
+    def __init__(self, response_text=DEFAULT_RESPONSE):
+        self.response_text = response_text
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/v1/models":
+                    self._json({"data": [{"id": "deepseek-r1:7b"}]})
+                elif self.path == "/health":
+                    self._json({"status": "ok"})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                server.requests.append((self.path, body))
+                chat = self.path == "/v1/chat/completions"
+                text = server.response_text
+                if not body.get("stream"):
+                    choice = {"message": {"content": text}} if chat else {"text": text}
+                    self._json({"choices": [choice]})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for i in range(0, len(text), 7):
+                    choice = {"delta": {"content": text[i:i + 7]}} if chat else {"text": text[i:i + 7]}
+                    self.wfile.write(f"data: {json.dumps({'choices': [choice]}, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def test_registry_and_concurrency():
+    assert {"ollama", "openai", "llamacpp", "stub"} <= set(LLM_BACKENDS)
+    assert isinstance(create_backend(" Stub "), StubBackend)
+    try:
+        create_backend("tgi")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知的後端應被拒絕")
+
+    @register_backend
+    class EchoBackend(StubBackend):
+        name = "echo"
+
+    try:
+        assert create_backend("echo", response_text="echo").get_llm().invoke("q") == "echo"
+    finally:
+        LLM_BACKENDS.pop("echo")
+
+    os.environ["LLM_MAX_CONCURRENCY_STUB"] = "3"
+    try:
+        assert create_backend("stub").max_concurrency == 3
+        assert resolve_concurrency("stub", 5, 32) == 5
+        assert resolve_concurrency("llamacpp", None, 4) == int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    finally:
+        del os.environ["LLM_MAX_CONCURRENCY_STUB"]
+
+
+def test_ollama_warm_up_pins_model():
+    """預熱以相同的 num_ctx / keep_alive 載入模型，第一個正式請求不必重新載入"""
+    with StubOllamaServer(load_seconds=0.2, prefill_ms_per_token=0.0) as server:
+        backend = OllamaBackend(base_url=server.base_url, num_ctx=8192, keep_alive="30m", json_format="off")
+        assert backend.warm_up() and backend.warm_up_ms >= 200
+        assert "answer_summary" in backend.get_llm().invoke("AG958 的電池")
+        warm_up, first = server.requests
+        assert warm_up["reloaded"] and warm_up["chunks_sent"] == 0
+        assert not first["reloaded"] and first["num_ctx"] == 8192 and first["keep_alive"] == "30m"
+        assert backend.probe()["healthy"]
+        assert not OllamaBackend(model_name="qwen3:8b", base_url=server.base_url).probe()["healthy"]
+        base_url = server.base_url
+    backend = OllamaBackend(base_url=base_url, json_format="off", probe_timeout=0.5)
+    assert not backend.warm_up()
+    assert backend.probe()["healthy"] is False
+
+
+def test_openai_compatible_and_llamacpp_clients():
+    """OpenAI 相容用戶端：一般請求走 chat，raw 請求走 completions，schema 轉為 response_format，中文串流不亂碼"""
+    with StubOpenAIServer() as server:
+        backend = OpenAICompatibleBackend(base_url=server.base_url + "/v1", json_format="schema")
+        llm = backend.get_llm()
+        assert "".join(llm.stream("問題", system="指令", format={"type": "object"}, num_ctx=8192)) == DEFAULT_RESPONSE
+        assert llm.invoke("<｜User｜>問題<｜Assistant｜>", raw=True) == DEFAULT_RESPONSE
+        (chat_path, chat_body), (raw_path, raw_body) = server.requests
+        assert chat_path == "/v1/chat/completions" and chat_body["messages"][0] == {"role": "system", "content": "指令"}
+        assert chat_body["response_format"]["json_schema"]["schema"] == {"type": "object"}
+        assert raw_path == "/v1/completions" and raw_body["prompt"].startswith("<｜User｜>")
+        assert backend.probe()["healthy"] and backend.warm_up()
+
+        llamacpp = LlamaCppBackend(base_url=server.base_url)
+        assert llamacpp.base_url == server.base_url + "/v1"
+        assert llamacpp.probe()["healthy"]
+        llamacpp.get_llm().invoke("問題")
+        assert server.requests[-1][1]["cache_prompt"] is True
+
+
+def test_service_uses_backend_concurrency():
+    backend = StubBackend(max_concurrency=2, json_format="off", response_text=DEFAULT_RESPONSE)
+    service = SalesAssistantService(milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE), backend=backend)
+
+    async def run():
+        return [json.loads(chunk[len("data: "):]) async for chunk in service.chat_stream("AG958 的電池適合出差嗎")]
+
+    final = asyncio.run(run())[-1]
+    metrics = service.get_metrics()
+    assert final["served_by"] == "llm"
+    assert service.llm_runner.max_concurrency == 2 and metrics["backend"]["backend"] == "stub"
+    assert service.warm_up() and service.health()["healthy"]
+    assert isinstance(backend, LLMBackend)
+
+
+if __name__ == "__main__":
+    test_registry_and_concurrency()
+    test_ollama_warm_up_pins_model()
+    test_openai_compatible_and_llamacpp_clients()
+    test_service_uses_backend_concurrency()
+    print("LLM 後端測試通過")
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.LLM.AsyncLLMRunner import AsyncLLMRunner
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+LLM_LATENCY = 0.5
+
+
+class SlowStubLLM:
+    """模擬 Ollama 的同步 LLM：固定延遲後回傳合法的 JSON 回應"""
+
+    def __init__(self, latency=LLM_LATENCY):
+        self.latency = latency
+
+    def invoke(self, prompt, **kwargs):
+        time.sleep(self.latency)
+        return json.dumps({
+            "answer_summary": "AG958 的電池容量為 80.08Wh。",
+            "comparison_table": [{"feature": "Battery", "AG958": "80.08Wh"}]
+        }, ensure_ascii=False)
+
+
+def _build_service(llm):
+    return SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+
+async def _collect(service, query):
+    return [chunk async for chunk in service.chat_stream(query)]
+
+
+def test_runner_respects_concurrency_limit():
+    """並發上限為 2 時，4 個請求應分兩批完成"""
+    runner = AsyncLLMRunner(SlowStubLLM(0.2), max_concurrency=2)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*[runner.ainvoke("hi") for _ in range(4)])
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    print(f"4 個請求 (上限 2) 耗時: {elapsed:.2f}s")
+    assert 0.4 <= elapsed < 0.7
+    runner.shutdown()
+
+
+def test_concurrent_chats_finish_in_max_latency():
+    """N 個並發聊天應在約 max(latency) 內完成，而非 sum(latency)，且事件迴圈保持回應"""
+    n = 4
+    service = _build_service(SlowStubLLM())
+
+    async def run():
+        ticks = 0
+        stop = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not stop.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker_task = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        results = await asyncio.gather(*[_collect(service, "AG958 的電池適合出差嗎") for _ in range(n)])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await ticker_task
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(run())
+    print(f"{n} 個並發聊天耗時: {elapsed:.2f}s (單次延遲 {LLM_LATENCY}s, 串行總和 {n * LLM_LATENCY:.1f}s), 事件迴圈 tick 數: {ticks}")
+    assert all(chunks and chunks[-1].startswith("data: ") for chunks in results)
+    assert elapsed < LLM_LATENCY * n * 0.6
+    # 事件迴圈在 LLM 生成期間仍持續運作
+    assert ticks > 10
+
+
+if __name__ == "__main__":
+    test_runner_respects_concurrency_limit()
+    test_concurrent_chats_finish_in_max_latency()
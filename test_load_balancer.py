@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.LLM.LLMBackendRegistry import OllamaBackend, resolve_ollama_urls
+from sales_rag_app.libs.RAG.LLM.LLMInitializer import LLMInitializer
+from sales_rag_app.libs.RAG.LLM.LoadBalancedLLM import LoadBalancedLLM, is_host_failure
+from stub_ollama_server import DEFAULT_RESPONSE, StubOllamaServer
+
+# 沒有服務在監聽的位址，模擬已停機的主機
+DEAD_URL = "http://127.0.0.1:9"
+
+
+def _balancer(urls, **kwargs):
+    llms = [LLMInitializer(base_url=url, json_format="off").get_llm() for url in urls]
+    return LoadBalancedLLM(llms, urls, **kwargs)
+
+
+def _stub(decode_ms_per_chunk=1.0):
+    return StubOllamaServer(load_seconds=0.0, prefill_ms_per_token=0.0, decode_ms_per_chunk=decode_ms_per_chunk)
+
+
+def test_least_outstanding_spreads_concurrent_requests():
+    with _stub(2.0) as first, _stub(2.0) as second:
+        balancer = _balancer([first.base_url, second.base_url], policy="least_outstanding")
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda i: balancer.invoke(f"問題 {i}"), range(8)))
+        assert all(result == DEFAULT_RESPONSE for result in results)
+        assert len(first.requests) >= 2 and len(second.requests) >= 2
+        assert all(host["outstanding"] == 0 for host in balancer.get_metrics()["hosts"])
+
+
+def test_latency_policy_prefers_fast_host():
+    with _stub(0.5) as fast, _stub(20.0) as slow:
+        balancer = _balancer([slow.base_url, fast.base_url], policy="latency")
+        for i in range(10):
+            balancer.invoke(f"問題 {i}")
+        metrics = balancer.get_metrics()
+        print(f"延遲感知路由: {metrics}")
+        assert len(fast.requests) > len(slow.requests)
+        assert metrics["hosts"][0]["ewma_ms"] > metrics["hosts"][1]["ewma_ms"]
+
+
+def test_failover_and_circuit_breaker():
+    """停機主機的請求改送其他主機，連續失敗後斷路器開啟，冷卻後以試探請求恢復"""
+    with _stub() as healthy, _stub() as flaky:
+        balancer = _balancer([DEAD_URL, flaky.base_url, healthy.base_url], policy="least_outstanding",
+                             failure_threshold=2, cooldown=0.2)
+        flaky.fail_status = 500
+        for i in range(4):
+            assert balancer.invoke(f"問題 {i}") == DEFAULT_RESPONSE
+        dead, bad, good = balancer.get_metrics()["hosts"]
+        assert dead["state"] == "open" and bad["state"] == "open" and good["failures"] == 0
+        assert balancer.retries >= 4
+        calls_while_open = flaky.failed_requests
+        balancer.invoke("斷路器開啟中")
+        assert flaky.failed_requests == calls_while_open
+
+        flaky.fail_status = None
+        time.sleep(0.25)
+        for i in range(3):
+            balancer.invoke(f"恢復 {i}")
+        assert balancer.get_metrics()["hosts"][1]["state"] == "closed" and len(flaky.requests) >= 1
+
+
+def test_stream_retries_before_first_chunk_only():
+    with _stub() as healthy:
+        balancer = _balancer([DEAD_URL, healthy.base_url], policy="least_outstanding")
+        balancer.hosts[1].outstanding = 1  # 讓第一次選到停機的主機
+        assert "".join(balancer.stream("問題")) == DEFAULT_RESPONSE
+        balancer.hosts[1].outstanding = 0
+        assert balancer.retries == 1 and balancer.hosts[0].failures == 1
+
+        # 呼叫端提前關閉串流時也會釋放主機
+        stream = balancer.stream("問題")
+        next(stream)
+        stream.close()
+        assert all(host.outstanding == 0 for host in balancer.hosts)
+
+    # 全部主機都不可用時拋出最後一個錯誤
+    balancer = _balancer([DEAD_URL], policy="least_outstanding")
+    try:
+        list(balancer.stream("問題"))
+    except Exception as e:
+        assert is_host_failure(e)
+    else:
+        raise AssertionError("沒有可用主機時應拋出錯誤")
+    assert not is_host_failure(ValueError("Ollama call failed with status code 400."))
+
+
+def test_backend_with_multiple_hosts():
+    with _stub() as first, _stub() as second:
+        assert resolve_ollama_urls(f" {first.base_url}/, {second.base_url} ") == [first.base_url, second.base_url]
+        backend = OllamaBackend(base_url=f"{first.base_url},{second.base_url},{DEAD_URL}", json_format="off",
+                                probe_timeout=0.5, lb_policy="least_outstanding")
+        assert backend.max_concurrency == int(os.getenv("LLM_MAX_CONCURRENCY_OLLAMA")
+                                              or os.getenv("LLM_MAX_CONCURRENCY") or 12)
+        assert backend.warm_up()
+        assert first.requests[0]["reloaded"] and second.requests[0]["reloaded"]
+        health = backend.probe()
+        assert health["healthy"] and DEAD_URL in health["detail"]
+        assert backend.get_llm().invoke("問題") == DEFAULT_RESPONSE
+        assert len(backend.get_metrics()["load_balancer"]["hosts"]) == 3
+
+
+if __name__ == "__main__":
+    test_least_outstanding_spreads_concurrent_requests()
+    test_latency_policy_prefers_fast_host()
+    test_failover_and_circuit_breaker()
+    test_stream_retries_before_first_chunk_only()
+    test_backend_with_multiple_hosts()
+    print("負載平衡測試通過")
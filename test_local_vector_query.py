@@ -0,0 +1,141 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import duckdb
+import numpy as np
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Cache.EmbeddingCache import EmbeddingCache
+from sales_rag_app.libs.RAG.DB.LocalVectorQuery import LocalVectorQuery, documents_from_records, write_index
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import EmbeddingService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+class HashEncoder:
+    """以字元雜湊產生固定維度的正規化向量，內容相近的文字向量也相近"""
+
+    def __init__(self, dim=32):
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, texts, batch_size=32):
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, ord(char) % self.dim] += 1
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9, None)
+
+
+def make_query(index_dir, db_file=None, encoder=None, **kwargs):
+    service = EmbeddingService("hash-model", encoder=encoder or HashEncoder(), batch_window_ms=0)
+    return LocalVectorQuery(index_dir=index_dir, db_file=db_file, embedding_service=service,
+                            query_cache=EmbeddingCache(), **kwargs)
+
+
+def test_exact_search_matches_numpy():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16)).astype(np.float32)
+    ids = [f"M{i}" for i in range(200)]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index_dir = os.path.join(temp_dir, "index")
+        write_index(index_dir, ids, vectors, [{"modelname": doc_id} for doc_id in ids], "hash-model", use_hnsw=False)
+        store = make_query(index_dir)
+        query = rng.normal(size=16).astype(np.float32)
+        results = store.search_vector(query, top_k=5)
+        expected = np.argsort(((vectors - query) ** 2).sum(axis=1))[:5]
+        assert [doc_id for doc_id, _ in results] == [ids[i] for i in expected]
+        assert np.isclose(results[0][1], ((vectors[expected[0]] - query) ** 2).sum(), rtol=1e-4)
+        assert isinstance(store.index.vectors, np.memmap)
+
+        # 預先過濾：只在指定的 id 中搜尋
+        allowed = {"M3", "M50", "M199", "missing"}
+        filtered = store.search_vector(query, top_k=10, allowed_ids=allowed)
+        assert {doc_id for doc_id, _ in filtered} == {"M3", "M50", "M199"}
+        assert [d for _, d in filtered] == sorted(d for _, d in filtered)
+        assert store.search_vector(query, top_k=5, allowed_ids=[]) == []
+        metrics = store.get_metrics()
+        print(f"本地向量檢索: {metrics}")
+        assert metrics["exact_searches"] == 2 and metrics["vectors"] == 200
+
+
+def test_build_from_duckdb_and_search_contract():
+    encoder = HashEncoder()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index_dir = os.path.join(temp_dir, "index")
+        store = make_query(index_dir, db_file=DB_FILE, encoder=encoder)
+        results = store.search("AG958 的電池續航", top_k=3)
+        assert len(results) == 3
+        assert all({"id", "distance", "modelname"} <= set(result) for result in results)
+        assert results[0]["distance"] <= results[-1]["distance"]
+        assert os.path.exists(os.path.join(index_dir, "vectors.f32"))
+
+        # 重新啟動時直接載入既有索引，不重新編碼文件
+        calls = encoder.calls
+        reloaded = make_query(index_dir, db_file=DB_FILE, encoder=encoder)
+        assert [r["id"] for r in reloaded.search("AG958 的電池續航", top_k=3)] == [r["id"] for r in results]
+        assert encoder.calls == calls + 1  # 只編碼查詢
+
+
+def test_stale_index_is_rebuilt():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = os.path.join(temp_dir, "specs.db")
+        index_dir = os.path.join(temp_dir, "index")
+        connection = duckdb.connect(db_file)
+        connection.execute("CREATE TABLE specs (model_name VARCHAR, section VARCHAR, feature VARCHAR, value VARCHAR)")
+        connection.execute("INSERT INTO specs VALUES ('AG958', 'CPU', 'Processor', 'Ryzen 7'), "
+                           "('AG958', 'Battery', 'Capacity', '80Wh'), ('AKK839', 'CPU', 'Processor', 'Core i5')")
+        connection.close()
+        store = make_query(index_dir, db_file=db_file)
+        assert sorted(r["id"] for r in store.search("Ryzen", top_k=5)) == ["AG958", "AKK839"]
+        assert store.get_record("AG958")["Capacity"] == "80Wh"
+
+        time.sleep(0.01)
+        connection = duckdb.connect(db_file)
+        connection.execute("INSERT INTO specs VALUES ('APX958', 'CPU', 'Processor', 'Ryzen 9')")
+        connection.close()
+        assert sorted(r["id"] for r in store.search("Ryzen", top_k=5)) == ["AG958", "AKK839", "APX958"]
+
+
+def test_documents_from_wide_records():
+    ids, texts, records = documents_from_records([{"modelname": "AG958", "cpu": "Ryzen", "gpu": None},
+                                                  {"modelname": "", "cpu": "x"}])
+    assert ids == ["AG958"] and texts == ["modelname: AG958\ncpu: Ryzen"] and records == [{"modelname": "AG958", "cpu": "Ryzen"}]
+
+
+def test_hnsw_recall():
+    try:
+        import hnswlib  # noqa: F401
+    except ImportError:
+        print("未安裝 hnswlib，略過 HNSW 測試")
+        return
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(3000, 16)).astype(np.float32)
+    ids = [str(i) for i in range(3000)]
+    index_dir = tempfile.mkdtemp()
+    try:
+        write_index(os.path.join(index_dir, "index"), ids, vectors, [{} for _ in ids], "hash-model", use_hnsw=True)
+        store = make_query(os.path.join(index_dir, "index"))
+        exact = make_query(os.path.join(index_dir, "index"), use_hnsw=False)
+        hits = 0
+        for query in rng.normal(size=(20, 16)).astype(np.float32):
+            approx = {doc_id for doc_id, _ in store.search_vector(query, 10)}
+            hits += len(approx & {doc_id for doc_id, _ in exact.search_vector(query, 10)})
+        assert store.get_metrics()["hnsw"] and hits / 200 >= 0.9
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_exact_search_matches_numpy()
+    test_build_from_duckdb_and_search_contract()
+    test_stale_index_is_rebuilt()
+    test_documents_from_wide_records()
+    test_hnsw_recall()
+    print("本地向量檢索測試通過")
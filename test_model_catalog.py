@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import duckdb
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.DB.ModelCatalog import ModelCatalog
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+def _write_db(db_file, rows):
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    con = duckdb.connect(db_file)
+    con.execute("CREATE TABLE specs (modeltype VARCHAR, modelname VARCHAR, cpu VARCHAR)")
+    con.executemany("INSERT INTO specs VALUES (?, ?, ?)", rows)
+    con.close()
+
+
+def test_catalog_from_database():
+    """型錄由資料庫內容產生，而非寫死的清單"""
+    catalog = ModelCatalog(SpecStore(DB_FILE))
+    print(f"modeltypes: {catalog.modeltypes}, modelnames: {len(catalog.modelnames)}")
+    assert catalog.modeltypes == ("819", "839", "958")
+    assert len(catalog.modelnames) == 15
+    assert catalog.has_modelname("AHP819: FP7R2")
+    assert not catalog.has_modelname("AG999")
+    assert catalog.has_modeltype("839")
+    assert set(catalog.get_models_by_type("839")) == {"AKK839", "AHP839", "APX839", "ARB839"}
+    assert catalog.matcher.find("比較 AG958 與 ahp819 fp7r2") == ["AG958", "AHP819: FP7R2"]
+
+
+def test_catalog_hot_reload():
+    """重新 ingest 後不需重啟，新型號與新系列立即可被辨識"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, "specs.db")
+        _write_db(db_file, [("958", "AG958", "Ryzen 5")])
+        catalog = ModelCatalog(SpecStore(db_file, check_interval=0))
+        first = catalog.snapshot
+        assert catalog.modelnames == ("AG958",)
+        assert catalog.snapshot is first
+
+        time.sleep(0.01)
+        _write_db(db_file, [("958", "AG958", "Ryzen 7"), ("1000", "NEW1000", "Ryzen 9")])
+        assert catalog.has_modelname("NEW1000")
+        assert catalog.modeltypes == ("1000", "958")
+        assert catalog.matcher.find("NEW1000 的 CPU") == ["NEW1000"]
+        assert first.modelnames == ("AG958",)
+
+
+def test_service_uses_catalog():
+    """服務的型號/系列辨識與 type -> models 查詢皆來自型錄"""
+    from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+    from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+    service = SalesAssistantService(llm=object(), milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+    assert service._check_query_contains_modeltype("958 系列電池") == (True, ["958"])
+    assert service._get_models_by_type("958") == list(service.model_catalog.get_models_by_type("958"))
+
+    async def collect():
+        return [chunk async for chunk in service.chat_stream("AG999 的電池")]
+
+    chunks = asyncio.run(collect())
+    assert "AKK839" in chunks[-1]
+
+
+if __name__ == "__main__":
+    test_catalog_from_database()
+    test_catalog_hot_reload()
+    test_service_uses_catalog()
@@ -0,0 +1,62 @@
+import os
+import sys
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.Tools.ModelNameMatcher import ModelNameMatcher
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+def _matcher():
+    return ModelNameMatcher(SpecStore(DB_FILE).snapshot.by_modelname)
+
+
+def test_matches_catalog_names():
+    """與原本逐一比對的結果一致，並依出現順序返回"""
+    matcher = _matcher()
+    cases = {
+        "比較 AB819-S: FP6 和 AG958 的 CPU 性能": ["AB819-S: FP6", "AG958"],
+        "AG958P 的記憶體規格是什麼？": ["AG958P"],
+        "AMD819: FT6 和 APX839 哪個更適合遊戲？": ["AMD819: FT6", "APX839"],
+        "AMD819-S: FT6 的電池": ["AMD819-S: FT6"],
+        "哪個筆電比較好？": [],
+        "比較 958 系列的 CPU": [],
+    }
+    for query, expected in cases.items():
+        print(f"{query} -> {matcher.find(query)}")
+        assert matcher.find(query) == expected
+
+
+def test_colon_and_space_variants():
+    """冒號、空白與大小寫的不同寫法都對應到型錄中的標準名稱"""
+    matcher = _matcher()
+    for query in ("AHP819: FP7R2 電池", "AHP819 FP7R2 電池", "ahp819:fp7r2 電池", "AHP819FP7R2電池"):
+        assert matcher.find(query) == ["AHP819: FP7R2"], query
+    assert "APX819 FP7R2" in matcher
+
+
+def test_boundaries():
+    """不會把較長型號的一部分誤判為較短的型號，緊接中文時仍可比對"""
+    matcher = _matcher()
+    assert matcher.find("AG958V規格") == ["AG958V"]
+    assert matcher.find("XAG958") == []
+    assert matcher.find("AG9581") == []
+    assert matcher.find("AG958的電池與AG958比較") == ["AG958"]
+
+
+def test_large_catalog():
+    """數千個型號時仍能正確比對"""
+    names = [f"{prefix}{number}{suffix}" for prefix in ("AB", "AG", "APX", "AHP") for number in range(100, 1100)
+             for suffix in ("", ": FP7R2")]
+    matcher = ModelNameMatcher(names)
+    assert matcher.find("APX1050 FP7R2 和 AG777 比較") == ["APX1050: FP7R2", "AG777"]
+
+
+if __name__ == "__main__":
+    test_matches_catalog_names()
+    test_colon_and_space_variants()
+    test_boundaries()
+    test_large_catalog()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import random
+import sys
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.Tools.ModelNameSuggester import ModelNameSuggester
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+def _levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def test_typo_suggestions():
+    """常見的打錯型號 (少字、多字、換位、錯字、大小寫與分隔) 都能找回正確型號"""
+    suggester = ModelNameSuggester(SpecStore(DB_FILE).snapshot.by_modelname)
+    cases = {
+        "AG985": "AG958",
+        "APX95": "APX958",
+        "AKK8399": "AKK839",
+        "ahp 839": "AHP839",
+        "AB819-S FP7": "AB819-S: FP6",
+        "APX819: FP7R": "APX819: FP7R2",
+        "AMD819S: FT6": "AMD819-S: FT6",
+    }
+    for typo, expected in cases.items():
+        suggestions = suggester.suggest(typo)
+        print(f"{typo} -> {suggestions}")
+        assert suggestions[0] == expected, (typo, suggestions)
+    assert suggester.suggest("完全不相關") == []
+
+
+def test_bit_parallel_distance_matches_reference():
+    """位元平行編輯距離與標準動態規劃結果一致"""
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("ab12:") for _ in range(rng.randint(1, 14)))
+        b = "".join(rng.choice("ab12:") for _ in range(rng.randint(0, 14)))
+        assert ModelNameSuggester._levenshtein(a, b, ModelNameSuggester._pattern_masks(a)) == _levenshtein(a, b)
+
+
+def test_service_suggests_closest_models():
+    """找不到型號時，錯誤訊息中的建議來自模糊索引"""
+    from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+    from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+    service = SalesAssistantService(llm=object(), milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+    async def collect():
+        return [chunk async for chunk in service.chat_stream("AKK893 的電池續航")]
+
+    message = asyncio.run(collect())[-1]
+    assert "'AKK893' 可能是: AKK839" in message
+
+
+if __name__ == "__main__":
+    test_typo_suggestions()
+    test_bit_parallel_distance_matches_reference()
+    test_service_suggests_closest_models()
@@ -0,0 +1,70 @@
+import importlib.util
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Embedding.EmbeddingService import (EmbeddingService, get_embedding_service,
+                                                               resolve_embedding_backend)
+from sales_rag_app.libs.RAG.Embedding.OnnxEncoder import mean_pool, resolve_hf_model_id
+
+# 一致性測試需要 torch 版 (sentence-transformers) 與 ONNX 版 (onnxruntime、transformers) 的完整環境
+HAS_BACKENDS = all(importlib.util.find_spec(name) for name in ("sentence_transformers", "onnxruntime", "transformers"))
+
+SENTENCES = [
+    "AG958 的電池容量為 80.08Wh，適合長時間出差。",
+    "Compare the CPU of APX958 and AKK839",
+    "哪台筆電最輕？",
+    "AMD Ryzen 7 7735HS, Radeon 680M, DDR5-4800 dual channel, 2x M.2 PCIe 4.0 NVMe SSD slots " * 8,
+]
+
+
+def test_mean_pool_matches_sentence_transformers_pooling():
+    tokens = np.array([[[1.0, 0.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert np.allclose(mean_pool(tokens, mask, normalize=False), [[2.0, 2.0]])
+    assert np.allclose(mean_pool(tokens, mask), [[2 ** -0.5, 2 ** -0.5]])
+    assert resolve_hf_model_id("all-MiniLM-L6-v2") == "sentence-transformers/all-MiniLM-L6-v2"
+    assert resolve_hf_model_id("BAAI/bge-small-zh") == "BAAI/bge-small-zh"
+
+
+def test_backend_selection():
+    assert resolve_embedding_backend(" ONNX-int8 ") == "onnx-int8"
+    with pytest.raises(ValueError):
+        resolve_embedding_backend("openvino")
+    assert get_embedding_service(backend="onnx") is not get_embedding_service(backend="torch")
+    assert get_embedding_service(backend="onnx-int8") is get_embedding_service(backend="onnx-int8")
+    # 量化模型的向量不可與原模型共用查詢向量快取
+    assert EmbeddingService(backend="onnx-int8").identity == "all-MiniLM-L6-v2:onnx-int8"
+    assert EmbeddingService(backend="torch").identity == "all-MiniLM-L6-v2"
+
+
+@pytest.mark.skipif(not HAS_BACKENDS, reason="需要 sentence-transformers、onnxruntime 與 transformers")
+def test_onnx_parity_with_torch():
+    """ONNX (fp32 / int8) 與 torch 版的句向量 cosine 相似度一致"""
+    from sentence_transformers import SentenceTransformer
+    from sales_rag_app.libs.RAG.Embedding.OnnxEncoder import OnnxEncoder
+
+    reference = SentenceTransformer("all-MiniLM-L6-v2", device="cpu").encode(SENTENCES, normalize_embeddings=True)
+    with tempfile.TemporaryDirectory() as directory:
+        for quantize, min_cosine in ((False, 0.9999), (True, 0.98)):
+            encoder = OnnxEncoder("all-MiniLM-L6-v2", quantize=quantize,
+                                  model_dir=os.path.join(directory, "int8" if quantize else "fp32"))
+            vectors = encoder.encode(SENTENCES, batch_size=2)
+            cosine = (vectors * reference).sum(axis=1)
+            print(f"{'int8' if quantize else 'fp32'} cosine: {np.round(cosine, 5)}")
+            assert vectors.dtype == np.float32 and vectors.shape == reference.shape
+            assert cosine.min() >= min_cosine
+
+
+if __name__ == "__main__":
+    test_mean_pool_matches_sentence_transformers_pooling()
+    test_backend_selection()
+    if HAS_BACKENDS:
+        test_onnx_parity_with_torch()
+    print("ONNX 嵌入後端測試通過")
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+import sys
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.RAG.Prompt.PromptBudget import PromptBudget, estimate_tokens, summarize_field
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+class RecordingStubLLM:
+    """記錄收到的提示與參數並回傳合法的 JSON 回應"""
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        return json.dumps({"answer_summary": "958 系列皆提供 USB Type-C。",
+                           "comparison_table": [{"feature": "USB", "AG958": "Type-C"}]}, ensure_ascii=False)
+
+
+def _build_service(llm, **budget_kwargs):
+    service = SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+    if budget_kwargs:
+        service.prompt_budget = PromptBudget(**budget_kwargs)
+    return service
+
+
+async def _collect(service, query):
+    return [chunk async for chunk in service.chat_stream(query)]
+
+
+def test_summarize_field_is_deterministic():
+    """過長的欄位以固定規則縮短：移除 nodata 行、保留標題、明確標示省略的行數"""
+    value = SpecStore(DB_FILE).get_record("AB819-S: FP6")["iointerface"]
+    summary = summarize_field(value, 80)
+    print(summary)
+    assert summary == summarize_field(value, 80)
+    assert estimate_tokens(summary) <= 80
+    assert summary.startswith("[MB IO (Left)]")
+    assert "nodata" not in summary
+    assert summary.splitlines()[-1].startswith("…(其餘")
+    assert summarize_field("short value", 80) == "short value"
+
+
+def test_model_limits_and_assembly():
+    """num_ctx 不超過模型上限，且 {context}/{query} 只替換一次"""
+    assert PromptBudget("deepseek-r1:7b", num_ctx=8192).num_ctx == 8192
+    assert PromptBudget("phi3:mini", num_ctx=8192).num_ctx == 4096
+    budget = PromptBudget("deepseek-r1:7b", num_ctx=8192, completion_reserve=2048)
+    assert budget.prompt_limit < 8192 - 2048
+    assert budget.llm_options() == {"num_ctx": 8192}
+    prompt = budget.assemble("規格: {context}\n問題: {query}", '[{"a":"{query}"}]', "為何 {context} 出現?")
+    assert prompt == '規格: [{"a":"{query}"}]\n問題: 為何 {context} 出現?'
+
+
+def test_service_fits_prompt_into_context_window():
+    """上下文空間不足時縮短欄位，提示不超過上限，並把 num_ctx 傳給 LLM"""
+    llm = RecordingStubLLM()
+    service = _build_service(llm, num_ctx=7000, completion_reserve=2500)
+    asyncio.run(_collect(service, "958 系列的 USB 接口比較"))
+    prompt, kwargs = llm.calls[0]
+    metrics = service.get_metrics()["prompt"]
+    print(f"提示 token 統計: {metrics}")
+    assert kwargs["num_ctx"] == 7000
+    assert metrics["last_prompt_tokens"] <= metrics["prompt_limit"]
+    assert metrics["last_completion_tokens"] > 0
+    assert "其餘" in prompt and "已省略" in prompt
+    assert prompt.count('"modelname":"AG958"') == 1
+
+
+def test_service_rejects_prompt_that_cannot_fit():
+    """連固定提示都放不下時回報錯誤，而不是讓 Ollama 靜默截斷"""
+    llm = RecordingStubLLM()
+    service = _build_service(llm, num_ctx=3000, completion_reserve=1000)
+    chunks = asyncio.run(_collect(service, "AG958 的電池適合出差嗎"))
+    assert not llm.calls
+    assert "查詢內容過長" in chunks[-1]
+    assert service.get_metrics()["prompt"]["rejected"] == 1
+
+
+if __name__ == "__main__":
+    test_summarize_field_is_deterministic()
+    test_model_limits_and_assembly()
+    test_service_fits_prompt_into_context_window()
+    test_service_rejects_prompt_that_cannot_fit()
@@ -0,0 +1,58 @@
+import os
+import sys
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.LLM.LLMInitializer import LLMInitializer
+from sales_rag_app.libs.RAG.Prompt.PromptLayout import PromptLayout
+from stub_ollama_server import StubOllamaServer
+
+PROMPT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "libs", "services",
+                           "sales_assistant", "prompts", "sales_prompt4.txt")
+
+
+def test_static_prefix_is_byte_identical():
+    """不同的上下文與查詢產生的提示共用完全相同的固定前綴"""
+    layout = PromptLayout.from_file(PROMPT_FILE, "inline")
+    first, _ = layout.render('[{"modelname":"AG958"}]', "AG958 的電池")
+    second, _ = layout.render('[{"modelname":"AKK839"}]', "AKK839 {context} 的重量")
+    assert "{context}" not in layout.prefix and "{query}" not in layout.prefix
+    assert first.startswith(layout.prefix) and second.startswith(layout.prefix)
+    assert layout.body.startswith("[DATA CONTEXT]")
+    assert second.count('"modelname":"AKK839"') == 1
+
+
+def test_system_mode_moves_prefix_to_system_param():
+    """system 模式下固定前綴以 system 參數傳送，prompt 只含動態部分"""
+    layout = PromptLayout.from_file(PROMPT_FILE, "system")
+    prompt, llm_kwargs = layout.render('[{"modelname":"AG958"}]', "AG958 的電池")
+    assert llm_kwargs == {"system": layout.prefix.rstrip()}
+    assert prompt.startswith("[DATA CONTEXT]") and "AG958 的電池" in prompt
+    try:
+        PromptLayout("沒有佔位符")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("缺少佔位符的模板應被拒絕")
+
+
+def test_ollama_reuses_prefix_with_keep_alive():
+    """LLMInitializer 傳送固定的 num_ctx 與 keep_alive，第二個請求重用前綴且不重新載入模型"""
+    layout = PromptLayout.from_file(PROMPT_FILE, "system")
+    with StubOllamaServer(load_seconds=0.05, prefill_ms_per_token=0.01) as server:
+        llm = LLMInitializer(num_ctx=8192, keep_alive="30m", base_url=server.base_url).get_llm()
+        for context, query in (('[{"modelname":"AG958"}]', "AG958 的電池"), ('[{"modelname":"AKK839"}]', "AKK839 的重量")):
+            prompt, llm_kwargs = layout.render(context, query)
+            assert "answer_summary" in llm.invoke(prompt, **llm_kwargs)
+        first, second = server.requests
+        print(f"請求統計: {server.requests}")
+        assert first["reloaded"] and not second["reloaded"]
+        assert second["num_ctx"] == 8192 and second["keep_alive"] == "30m" and second["system"]
+        assert second["cached_tokens"] / second["prompt_tokens"] > 0.9
+
+
+if __name__ == "__main__":
+    test_static_prefix_is_byte_identical()
+    test_system_mode_moves_prefix_to_system_param()
+    test_ollama_reuses_prefix_with_keep_alive()
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Cache.ResponseCache import ResponseCache
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+class CountingStubLLM:
+    """記錄呼叫次數的 stub LLM"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        return json.dumps({
+            "answer_summary": "AG958 與 APX958 的電池容量比較。",
+            "comparison_table": [{"feature": "Battery", "AG958": "80.08Wh", "APX958": "80.08Wh"}]
+        }, ensure_ascii=False)
+
+
+def test_normalized_keys_match_equivalent_queries():
+    """只有全半形、大小寫與空白不同的問題共用快取鍵；詞序或型號位置不同的問題不共用"""
+    cache = ResponseCache()
+    key1 = cache.make_key(["AG958", "APX958"], "AG958 vs APX958 battery")
+    key2 = cache.make_key(["APX958", "AG958"], "ａｇ958  vs APX958 Battery ")
+    key3 = cache.make_key(["AG958", "APX958"], "AG958 vs APX958 weight")
+    assert key1 == key2
+    assert key1 != key3
+    swapped = (cache.make_key(["AG958", "APX958"], "AG958 的 CPU 和 APX958 的 GPU"),
+               cache.make_key(["AG958", "APX958"], "APX958 的 CPU 和 AG958 的 GPU"))
+    assert swapped[0] != swapped[1]
+    assert cache.make_key(["AG958", "APX958"], "AG958 比 APX958 輕嗎") != \
+        cache.make_key(["AG958", "APX958"], "APX958 比 AG958 輕嗎")
+
+
+def test_lru_eviction_and_ttl():
+    """超過容量淘汰最久未使用的項目，過期項目視為未命中"""
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.get_metrics()["evictions"] == 1
+
+    short_lived = ResponseCache(ttl_seconds=0.05)
+    short_lived.set("a", 1)
+    time.sleep(0.06)
+    assert short_lived.get("a") is None
+    assert short_lived.get_metrics()["expirations"] == 1
+
+
+def test_invalidated_when_db_file_changes():
+    """資料庫檔案重新產生時自動清空快取"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, "specs.db")
+        with open(db_file, "w") as f:
+            f.write("v1")
+        cache = ResponseCache(watch_file=db_file)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+        os.remove(db_file)
+        with open(db_file, "w") as f:
+            f.write("version 2")
+        assert cache.get("a") is None
+        assert cache.get_metrics()["invalidations"] == 1
+
+
+def test_service_serves_repeated_query_from_cache():
+    """重複的比較問題只呼叫一次 LLM，並記錄命中率"""
+    llm = CountingStubLLM()
+    service = SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+    async def ask(query):
+        return [chunk async for chunk in service.chat_stream(query)]
+
+    first = asyncio.run(ask("AG958 vs APX958 battery, which is better for travel"))
+    second = asyncio.run(ask("ag958 VS apx958  Battery, which is better for travel"))
+    assert llm.calls == 1
+    first_payload = json.loads(first[-1][len("data: "):])
+    second_payload = json.loads(second[-1][len("data: "):])
+    assert first_payload.pop("served_by") == "llm" and second_payload.pop("served_by") == "cache"
+    assert first_payload == second_payload
+    metrics = service.get_metrics()["response_cache"]
+    print(f"快取統計: {metrics}")
+    assert metrics["hits"] == 1 and metrics["misses"] == 1
+
+
+if __name__ == "__main__":
+    test_normalized_keys_match_equivalent_queries()
+    test_lru_eviction_and_ttl()
+    test_invalidated_when_db_file_changes()
+    test_service_serves_repeated_query_from_cache()
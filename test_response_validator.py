@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.Tools.ResponseValidator import ResponseValidator, find_blocked, target_models
+
+MODELNAMES = frozenset(["AG958", "APX958", "AHP958", "AHP819: FP7R2", "APX819: FP7R2"])
+
+
+def test_validates_models_brands_and_gpus():
+    validator = ResponseValidator(MODELNAMES.__contains__)
+    cases = [
+        ({"answer_summary": "AG958 的電池容量為 80.08Wh。"}, ["AG958"], True),
+        ({"answer_summary": "APX819 FP7R2 支援雙通道記憶體。"}, ["APX819: FP7R2"], True),
+        ({"answer_summary": "958 和 AHP958 的螢幕相同。"}, ["AHP958"], True),
+        ({"answer_summary": "AG958 不如 ASUS ROG。"}, ["AG958"], False),
+        ({"answer_summary": "AG958 搭配 RTX 4060。"}, ["AG958"], False),
+        ({"answer_summary": "AG999 的效能較好。"}, ["AG958"], False),
+        ({"answer_summary": "AG958 與 APX958 的差異。"}, ["AG958"], True),
+        ({"answer_summary": "", "comparison_table": [{"feature": "GPU", "AG958": "Radeon RX6550M"}]}, ["AG958"], True),
+        ({"answer_summary": "", "comparison_table": [{"feature": "GPU", "A520": "Radeon"}]}, ["AG958"], False),
+        ({"answer_summary": "", "comparison_table": {"AG999": ["x"], "AG958": ["y"]}}, ["AG958"], False),
+        ({"answer_summary": "", "comparison_table": {"AG958": ["y"]}}, ["AG958"], True),
+    ]
+    for parsed_json, targets, expected in cases:
+        valid, reason = validator.check(parsed_json, targets)
+        print(f"{parsed_json} -> {valid} ({reason})")
+        assert valid == expected, parsed_json
+
+
+def test_rejects_non_string_summary():
+    """answer_summary 為字典或列表時直接視為無效，即使內容包含目標型號"""
+    validator = ResponseValidator(MODELNAMES.__contains__)
+    for summary in ({"AG958": "電池容量為 80.08Wh"}, ["AG958 的電池容量為 80.08Wh。"]):
+        valid, reason = validator.check({"answer_summary": summary,
+                                         "comparison_table": [{"feature": "Battery", "AG958": "80.08Wh"}]}, ["AG958"])
+        print(f"{summary} -> {valid} ({reason})")
+        assert valid is False and "不是字串" in reason
+
+
+def test_brand_needs_word_boundary():
+    """品牌需為獨立單字 (與 \\b 相同，中文緊鄰時不算)，GPU 以子字串比對"""
+    assert find_blocked("ASUSTek 筆電") is None
+    assert find_blocked("比 ASUS 輕") == ("brand", "ASUS")
+    assert find_blocked("比ASUS輕") is None
+    assert find_blocked("MSIRTX 3060") == ("gpu", "RTX 3060")
+    assert find_blocked("GeForce RTX4090") == ("gpu", "RTX")
+
+
+def test_target_variants_are_cached():
+    assert target_models(("AHP819: FP7R2",)) is target_models(("AHP819: FP7R2",))
+    assert target_models(("AHP819: FP7R2",)).variants == {"AHP819: FP7R2", "AHP819 FP7R2"}
+
+
+def test_long_response_costs_microseconds():
+    validator = ResponseValidator(MODELNAMES.__contains__)
+    parsed_json = {"answer_summary": "AG958 與 APX958 比較：" + "Ryzen 7 7840HS 搭配 Radeon 780M，記憶體 DDR5-5600。" * 100}
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        assert validator.validate(parsed_json, ["AG958", "APX958"])
+    per_call_us = (time.perf_counter() - start) / rounds * 1e6
+    print(f"{len(parsed_json['answer_summary'])} 字元的回答驗證耗時 {per_call_us:.1f} µs")
+    assert per_call_us < 1000
+
+
+if __name__ == "__main__":
+    test_validates_models_brands_and_gpus()
+    test_rejects_non_string_summary()
+    test_brand_needs_word_boundary()
+    test_target_variants_are_cached()
+    test_long_response_costs_microseconds()
+    print("回答驗證測試通過")
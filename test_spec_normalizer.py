@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import duckdb
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.DB.SpecNormalizer import NORMALIZED_TABLE, NUMERIC_COLUMNS, build_normalized_table
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+def test_ingest_builds_typed_columns():
+    """ingest 產生的 specs_normalized 為每個型號一列、數值欄位為 DOUBLE"""
+    connection = duckdb.connect(database=DB_FILE, read_only=True)
+    try:
+        types = dict(connection.execute(
+            "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = ?",
+            [NORMALIZED_TABLE]).fetchall())
+        rows = connection.execute(
+            f"SELECT modelname, weight_g, battery_wh, tdp_w, memory_type FROM {NORMALIZED_TABLE} "
+            "WHERE modelname IN ('AG958', 'AMD819: FT6') ORDER BY modelname").fetchall()
+        count = connection.execute(f"SELECT count(*) FROM {NORMALIZED_TABLE}").fetchone()[0]
+        models = connection.execute("SELECT count(DISTINCT modelname) FROM specs").fetchone()[0]
+    finally:
+        connection.close()
+    assert types["weight_g"] == types["battery_wh"] == types["tdp_w"] == "DOUBLE"
+    assert types["cpu_model"] == types["gpu_model"] == types["memory_type"] == "VARCHAR"
+    assert rows == [("AG958", 2300.0, 80.08, 110.0, "DDR5"), ("AMD819: FT6", 1487.0, 55.0, 15.0, "LPDDR5")]
+    assert count == models
+
+
+def test_ranks_in_sql():
+    query = DuckDBQuery(db_file=DB_FILE)
+    try:
+        assert query.rank_models(["AG958", "AMD819: FT6", "AKK839"], "weight_g") == [
+            ("AMD819: FT6", 1487.0), ("AKK839", 1800.0), ("AG958", 2300.0)]
+        assert query.rank_models(["AG958", "AKK839"], "battery_wh", descending=True)[0] == ("AKK839", 99.0)
+        try:
+            query.rank_models(["AG958"], "weight_g; DROP TABLE specs")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("不合法的欄位應被拒絕")
+    finally:
+        query.disconnect()
+
+
+class RecordingDuckDBQuery(DuckDBQuery):
+    """記錄請求路徑上的 SQL 排序呼叫"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rank_calls = []
+
+    def rank_models(self, *args, **kwargs):
+        self.rank_calls.append(args)
+        return super().rank_models(*args, **kwargs)
+
+
+def test_store_ranks_like_sql():
+    """記憶體中的排序與 SQL 的結果相同，規則引擎與備用回應因此不必在事件迴圈上查詢 DuckDB"""
+    store = SpecStore(DB_FILE)
+    query = RecordingDuckDBQuery(db_file=DB_FILE)
+    try:
+        modelnames = list(store.snapshot.by_modelname)
+        for column in NUMERIC_COLUMNS:
+            for descending in (False, True):
+                assert store.rank_models(modelnames, column, descending) == \
+                    [tuple(row) for row in query.rank_models(modelnames, column, descending)]
+
+        service = SalesAssistantService(llm=object(), milvus_query=object(), duckdb_query=query)
+        query.rank_calls.clear()
+
+        async def ask():
+            return [chunk async for chunk in service.chat_stream("AG958 和 AKK839 哪個最輕")]
+
+        final = json.loads(asyncio.run(ask())[-1][len("data: "):])
+        assert final["served_by"] == "fast_path" and "AKK839" in final["answer_summary"].split("。")[0]
+        assert query.rank_calls == []
+    finally:
+        query.disconnect()
+
+
+def test_store_reads_normalized_table_and_falls_back_without_it():
+    """SpecStore 直接載入 specs_normalized；舊資料庫沒有此資料表時在載入時解析一次"""
+    store = SpecStore(DB_FILE)
+    assert store.get_normalized("AG958")["weight_g"] == 2300.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "legacy.db")
+        shutil.copy(DB_FILE, db_file)
+        connection = duckdb.connect(database=db_file)
+        connection.execute(f"DROP TABLE {NORMALIZED_TABLE}")
+        connection.close()
+        legacy = SpecStore(db_file)
+        assert legacy.get_normalized("AG958") == store.get_normalized("AG958")
+
+        # 長表格 (ingest_data.py 的 model_name/section/feature/value) 沒有必要欄位時略過
+        connection = duckdb.connect(database=db_file)
+        connection.execute("CREATE TABLE long_specs (model_name VARCHAR, section VARCHAR, feature VARCHAR, value VARCHAR)")
+        assert build_normalized_table(connection, source_table="long_specs", table="long_normalized") == 0
+        connection.close()
+
+
+if __name__ == "__main__":
+    test_ingest_builds_typed_columns()
+    test_ranks_in_sql()
+    test_store_ranks_like_sql()
+    test_store_reads_normalized_table_and_falls_back_without_it()
+    print("specs_normalized 測試通過")
@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+import duckdb
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.SpecStore import SpecStore
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+
+def _write_db(db_file, rows):
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    con = duckdb.connect(db_file)
+    con.execute("CREATE TABLE specs (modeltype VARCHAR, modelname VARCHAR, cpu VARCHAR)")
+    con.executemany("INSERT INTO specs VALUES (?, ?, ?)", rows)
+    con.close()
+
+
+def test_loads_catalog_indexes():
+    """啟動時載入整個 specs 資料表並建立 modelname / modeltype 索引"""
+    store = SpecStore(DB_FILE)
+    snapshot = store.snapshot
+    print(f"載入 {len(snapshot.records)} 筆記錄, modeltype: {sorted(snapshot.by_modeltype)}")
+    assert len(snapshot.by_modelname) == 15
+    assert set(store.get_models_by_type("958")) == {"AG958", "AG958P", "AG958V", "AHP958", "APX958"}
+    records = store.get_records(["APX958", "不存在", "AG958"])
+    assert [record["modelname"] for record in records] == ["APX958", "AG958"]
+    # 與 DuckDB 欄位順序一致，且可直接序列化
+    assert snapshot.fields[:3] == ("modeltype", "version", "modelname")
+    assert json.loads(json.dumps(records, ensure_ascii=False))[0]["modelname"] == "APX958"
+
+
+def test_records_are_immutable():
+    """記錄為唯讀，避免請求之間互相污染"""
+    record = SpecStore(DB_FILE).get_record("AG958")
+    for mutate in (lambda: record.__setitem__("cpu", "x"), lambda: record.update(cpu="x"), lambda: record.pop("cpu")):
+        try:
+            mutate()
+        except TypeError:
+            continue
+        raise AssertionError("規格記錄應為唯讀")
+    assert dict(record)["cpu"] == record["cpu"]
+
+
+def test_reloads_atomically_on_file_change():
+    """資料庫重新產生後切換到新的快照，舊快照保持不變"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, "specs.db")
+        _write_db(db_file, [("958", "AG958", "Ryzen 5")])
+        store = SpecStore(db_file, check_interval=0)
+        old_snapshot = store.snapshot
+        assert store.version == 1
+
+        time.sleep(0.01)
+        _write_db(db_file, [("958", "AG958", "Ryzen 7"), ("839", "AKK839", "Ryzen 9")])
+        assert store.get_record("AG958")["cpu"] == "Ryzen 7"
+        assert store.get_models_by_type("839") == ("AKK839",)
+        assert store.version == 2
+        assert old_snapshot.by_modelname["AG958"]["cpu"] == "Ryzen 5"
+
+
+if __name__ == "__main__":
+    test_loads_catalog_indexes()
+    test_records_are_immutable()
+    test_reloads_atomically_on_file_change()
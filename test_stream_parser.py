@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.Tools.ResponseStreamParser import ResponseStreamParser
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+LLM_OUTPUT = (
+    "<think>\n使用者想比較電池。\n</think>\n\n"
+    + json.dumps({
+        "answer_summary": "AG958 的電池為 \"80.08Wh\"，\n續航約 10 小時。",
+        "comparison_table": [{"feature": "Battery", "AG958": "80.08Wh"}]
+    }, ensure_ascii=True)
+    + "\n" + "多餘的輸出" * 40
+)
+
+
+class StreamingStubLLM:
+    """逐字元串流輸出的 stub LLM，每個片段之間有固定延遲"""
+
+    def __init__(self, text=LLM_OUTPUT, chunk_size=4, delay=0.005):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.chunks_sent = 0
+
+    def invoke(self, prompt, **kwargs):
+        return self.text
+
+    def stream(self, prompt, **kwargs):
+        for i in range(0, len(self.text), self.chunk_size):
+            time.sleep(self.delay)
+            self.chunks_sent += 1
+            yield self.text[i:i + self.chunk_size]
+
+
+def _feed_all(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+
+def test_parser_splits_think_and_answer():
+    """不論切割大小，推理段落與 answer_summary 都應被正確還原"""
+    for size in (1, 3, 7, 64):
+        parser = ResponseStreamParser()
+        events = _feed_all(parser, LLM_OUTPUT, size)
+        think = "".join(text for kind, text in events if kind == "think")
+        answer = "".join(text for kind, text in events if kind == "answer")
+        assert think.strip() == "使用者想比較電池。"
+        assert answer == "AG958 的電池為 \"80.08Wh\"，\n續航約 10 小時。"
+        assert parser.complete
+        assert json.loads(parser.json_text)["comparison_table"][0]["AG958"] == "80.08Wh"
+
+
+def test_parser_without_think_block():
+    """沒有 <think> 標籤的輸出直接進入 JSON 解析"""
+    parser = ResponseStreamParser()
+    events = _feed_all(parser, '前言 {"answer_summary": "OK", "comparison_table": []}', 2)
+    assert [text for kind, text in events if kind == "think"] == []
+    assert "".join(text for kind, text in events if kind == "answer") == "OK"
+    assert parser.complete
+
+
+def test_parser_joins_surrogate_pairs():
+    """跳脫的代理對 (emoji 等 BMP 以外的字元) 合併成一個字元，每個片段都能以 UTF-8 送出"""
+    text = json.dumps({"answer_summary": "ok \U0001F600 x", "comparison_table": []}, ensure_ascii=True)
+    assert "\\ud83d\\ude00" in text
+    for size in (1, 2, 5, 64):
+        events = _feed_all(ResponseStreamParser(), text, size)
+        deltas = [delta for kind, delta in events if kind == "answer"]
+        for delta in deltas:
+            json.dumps({"event": "answer", "delta": delta}, ensure_ascii=False).encode("utf-8")
+        assert "".join(deltas) == "ok \U0001F600 x"
+    # 沒有後半的代理字元以 U+FFFD 取代
+    events = _feed_all(ResponseStreamParser(), '{"answer_summary": "a\\ud83d", "comparison_table": []}', 3)
+    assert "".join(delta for kind, delta in events if kind == "answer") == "a\ufffd"
+
+
+def test_chat_stream_emits_incremental_events():
+    """stream=True 時應先收到進度與推理事件，最後才是完整結果，且外框閉合後停止讀取"""
+    llm = StreamingStubLLM()
+    service = SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+    async def run():
+        received = []
+        start = time.perf_counter()
+        first_event_at = None
+        async for chunk in service.chat_stream("AG958 的電池適合出差嗎", stream=True):
+            if first_event_at is None:
+                first_event_at = time.perf_counter() - start
+            received.append(json.loads(chunk[len("data: "):]))
+        return received, first_event_at, time.perf_counter() - start
+
+    events, first_event_at, total = asyncio.run(run())
+    kinds = [event.get("event", "final") for event in events]
+    print(f"事件序列: {kinds[:3]}... 共 {len(kinds)} 個, 首事件 {first_event_at * 1000:.1f}ms, 總耗時 {total * 1000:.1f}ms")
+
+    assert kinds[0] == "progress"
+    assert "think" in kinds and "answer" in kinds
+    assert kinds.index("think") < kinds.index("answer")
+    assert kinds[-1] == "final"
+    assert "answer_summary" in events[-1]
+    assert first_event_at < total / 2
+    # JSON 外框閉合後即不再讀取後續輸出
+    assert llm.chunks_sent < -(-len(LLM_OUTPUT) // llm.chunk_size)
+
+
+def test_chat_stream_default_yields_single_event():
+    """未啟用 stream 時維持單一事件的行為"""
+    service = SalesAssistantService(llm=StreamingStubLLM(), milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+    async def run():
+        return [chunk async for chunk in service.chat_stream("AG958 的電池適合出差嗎")]
+
+    chunks = asyncio.run(run())
+    assert len(chunks) == 1
+    assert "event" not in json.loads(chunks[0][len("data: "):])
+
+
+if __name__ == "__main__":
+    test_parser_splits_think_and_answer()
+    test_parser_without_think_block()
+    test_parser_joins_surrogate_pairs()
+    test_chat_stream_emits_incremental_events()
+    test_chat_stream_default_yields_single_event()
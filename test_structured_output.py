@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.LLM.LLMInitializer import LLMInitializer
+from sales_rag_app.libs.RAG.LLM.StructuredOutput import (format_kwargs, is_reasoning_model, resolve_json_format,
+                                                          response_schema)
+from sales_rag_app.libs.RAG.Tools.ResponseStreamParser import ResponseStreamParser
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+from stub_ollama_server import DEFAULT_RESPONSE, StubOllamaServer
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+# 表格第一列少了逗號，之後還有一長段輸出
+MALFORMED_OUTPUT = ('{"answer_summary": "AG958 的電池為 80.08Wh。", "comparison_table": '
+                    '[{"feature": "Battery" "AG958": "80.08Wh"}]}' + "，續航約 10 小時" * 200)
+
+
+class StreamingStubLLM:
+    """逐段串流輸出並記錄呼叫參數的 stub LLM"""
+
+    def __init__(self, text, chunk_size=8, delay=0.002):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.chunks_sent = 0
+        self.calls = []
+
+    def invoke(self, prompt, **kwargs):
+        self.calls.append(kwargs)
+        return self.text
+
+    def stream(self, prompt, **kwargs):
+        self.calls.append(kwargs)
+        for i in range(0, len(self.text), self.chunk_size):
+            time.sleep(self.delay)
+            self.chunks_sent += 1
+            yield self.text[i:i + self.chunk_size]
+
+
+def _parse(text, size=5):
+    """與 chat_stream 相同，偵測到不合法的 JSON 後即停止輸入"""
+    parser = ResponseStreamParser()
+    for i in range(0, len(text), size):
+        parser.feed(text[i:i + size])
+        if parser.malformed:
+            break
+    return parser
+
+
+def test_schema_and_format_modes():
+    schema = response_schema(("AG958", "APX958"))
+    row = schema["properties"]["comparison_table"]["items"]
+    assert schema["required"] == ["answer_summary", "comparison_table"]
+    assert row["required"] == ["feature", "AG958", "APX958"] and row["additionalProperties"] is False
+    assert format_kwargs("schema", ["AG958", "APX958"]) == {"format": schema}
+    assert format_kwargs("json") == {"format": "json"}
+    assert format_kwargs("off") == {}
+    assert resolve_json_format(" Schema ") == "schema"
+    assert LLMInitializer(json_format="off").format_kwargs(["AG958"]) == {}
+    try:
+        resolve_json_format("yaml")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("不支援的模式應被拒絕")
+
+
+def test_parser_flags_malformed_json_early():
+    """不可能合法的 JSON 在出錯的字元就被標記，而不是等輸出結束後 json.loads 失敗"""
+    cases = [
+        MALFORMED_OUTPUT,
+        '{"answer_summary": "OK", "comparison_table": [],}',
+        "{'answer_summary': 'OK'}",
+        '{"answer_summary": "第一行\n第二行"}',
+        '{"answer_summary": "\\x41"}',
+        '{"answer_summary": NaN}',
+        '{"answer_summary": tru}',
+        '<think>\n推理\n</think>\n{"answer_summary": "OK" "comparison_table": []}',
+    ]
+    for text in cases:
+        parser = _parse(text)
+        print(f"{text[:40]!r}... -> {parser.malformed}")
+        assert parser.malformed and not parser.complete and parser.json_text is None
+    parser = _parse(MALFORMED_OUTPUT)
+    assert len(parser.text) < len(MALFORMED_OUTPUT) // 10
+
+    valid = '前言 {"answer_summary": "A\\u0047958", "n": [-1.5e3, 0, true, null, {"a": false}], "comparison_table": []}'
+    parser = _parse(valid)
+    assert parser.complete and parser.malformed is None
+    assert json.loads(parser.json_text)["answer_summary"] == "AG958"
+
+
+def test_chat_stream_aborts_malformed_generation():
+    """串流中偵測到不合法的 JSON 時立即中止生成並改用備用回應"""
+    llm = StreamingStubLLM(MALFORMED_OUTPUT)
+    service = SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE),
+                                    json_format="schema")
+
+    async def run():
+        return [json.loads(chunk[len("data: "):]) async for chunk in service.chat_stream("AG958 的電池適合出差嗎", stream=True)]
+
+    events = asyncio.run(run())
+    total_chunks = -(-len(MALFORMED_OUTPUT) // llm.chunk_size)
+    print(f"送出 {llm.chunks_sent}/{total_chunks} 個片段, 指標: {service.get_metrics()['structured_output']}")
+    assert events[-1]["served_by"] == "fallback"
+    assert llm.chunks_sent < total_chunks // 10
+    assert service.get_metrics()["structured_output"] == {"json_format": "schema", "malformed": 1, "aborted_early": 1}
+    row = llm.calls[0]["format"]["properties"]["comparison_table"]["items"]
+    assert row["required"] == ["feature", "AG958"]
+
+
+def test_ollama_receives_schema_format():
+    """schema 模式的 format 參數經由 langchain 的 Ollama 原樣送到 /api/generate"""
+    with StubOllamaServer(load_seconds=0.0, prefill_ms_per_token=0.0) as server:
+        initializer = LLMInitializer(base_url=server.base_url, json_format="schema")
+        service = SalesAssistantService(llm=initializer.get_llm(), milvus_query=object(),
+                                        duckdb_query=DuckDBQuery(db_file=DB_FILE), json_format=initializer.json_format)
+
+        async def run():
+            return [chunk async for chunk in service.chat_stream("AG958 的電池適合出差嗎")]
+
+        final = json.loads(asyncio.run(run())[-1][len("data: "):])
+        assert final["served_by"] == "llm"
+        assert server.requests[0]["format"] == response_schema(("AG958",))
+
+
+def test_reasoning_model_default_keeps_think_stream():
+    """未設定 OLLAMA_JSON_FORMAT 時推理模型不送 format，<think> 段落仍能串流，輸出在生成後才驗證"""
+    think = "使用者想知道電池是否足夠出差，先查看電池容量。"
+
+    def responder(payload):
+        # 與 Ollama 相同：帶 format 時從第一個 token 就受文法限制，模型無法輸出 <think>
+        if payload.get("format"):
+            return DEFAULT_RESPONSE
+        return "<think>\n" + think + "\n</think>\n\n" + DEFAULT_RESPONSE
+
+    saved = os.environ.pop("OLLAMA_JSON_FORMAT", None)
+    try:
+        assert is_reasoning_model("deepseek-r1:7b") and is_reasoning_model("library/qwen3:8b")
+        assert not is_reasoning_model("llama3:8b") and not is_reasoning_model(None)
+        assert resolve_json_format(model_name="deepseek-r1:7b") == "off"
+        assert resolve_json_format(model_name="llama3:8b") == "schema"
+        assert resolve_json_format("schema", "deepseek-r1:7b") == "schema"
+        with StubOllamaServer(load_seconds=0.0, prefill_ms_per_token=0.0, responder=responder) as server:
+            initializer = LLMInitializer(base_url=server.base_url)
+            service = SalesAssistantService(llm=initializer.get_llm(), milvus_query=object(),
+                                            duckdb_query=DuckDBQuery(db_file=DB_FILE))
+
+            async def run():
+                return [json.loads(chunk[len("data: "):])
+                        async for chunk in service.chat_stream("AG958 的電池適合出差嗎", stream=True)]
+
+            events = asyncio.run(run())
+    finally:
+        if saved is not None:
+            os.environ["OLLAMA_JSON_FORMAT"] = saved
+    streamed_think = "".join(event["delta"] for event in events if event.get("event") == "think")
+    assert initializer.json_format == service.json_format == "off"
+    assert server.requests[0]["format"] is None
+    assert think in streamed_think
+    assert events[-1]["served_by"] == "llm"
+
+
+if __name__ == "__main__":
+    test_schema_and_format_modes()
+    test_parser_flags_malformed_json_early()
+    test_chat_stream_aborts_malformed_generation()
+    test_ollama_receives_schema_format()
+    test_reasoning_model_default_keeps_think_stream()
+    print("結構化輸出測試通過")
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 添加專案路徑
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sales_rag_app.libs.RAG.DB.DuckDBQuery import DuckDBQuery
+from sales_rag_app.libs.RAG.LLM.ThinkBudget import ThinkBudget
+from sales_rag_app.libs.services.sales_assistant.service import SalesAssistantService
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_rag_app", "db", "sales_specs.db")
+
+ANSWER = json.dumps({"answer_summary": "AG958 的 80.08Wh 電池適合出差。",
+                     "comparison_table": [{"feature": "Battery", "AG958": "80.08Wh"}]}, ensure_ascii=False)
+THINK = "使用者想知道電池續航是否足夠出差，我需要查看電池容量與重量。" * 40
+
+
+class ReasoningStubLLM:
+    """模擬 deepseek-r1：一般請求先輸出很長的推理段落，raw 請求 (推理已被結束) 直接作答"""
+
+    def __init__(self, chunk_size=8, delay=0.001):
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.calls = []
+        self.chunks_sent = []
+
+    def _output(self, kwargs):
+        return ANSWER if kwargs.get("raw") else "<think>\n" + THINK + "\n</think>\n\n" + ANSWER
+
+    def invoke(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        return self._output(kwargs)
+
+    def stream(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        self.chunks_sent.append(0)
+        text = self._output(kwargs)
+        for i in range(0, len(text), self.chunk_size):
+            time.sleep(self.delay)
+            self.chunks_sent[-1] += 1
+            yield text[i:i + self.chunk_size]
+
+
+def _service(llm, mode, max_think_tokens=64, stream_think=True):
+    think_budget = ThinkBudget(mode, max_think_tokens, model_name="deepseek-r1:7b", stream_think=stream_think)
+    return SalesAssistantService(llm=llm, milvus_query=object(), duckdb_query=DuckDBQuery(db_file=DB_FILE),
+                                 json_format="off", think_budget=think_budget)
+
+
+def _run(service, query, stream):
+    async def run():
+        return [json.loads(chunk[len("data: "):]) async for chunk in service.chat_stream(query, stream=stream)]
+    return asyncio.run(run())
+
+
+def test_raw_request_closes_think_block():
+    think_budget = ThinkBudget("off", model_name="deepseek-r1:7b")
+    prompt, kwargs = think_budget.raw_request("問題", {"num_ctx": 8192, "system": "指令"})
+    assert prompt == "指令<｜User｜>問題<｜Assistant｜><think>\n\n</think>\n\n"
+    assert kwargs == {"num_ctx": 8192, "raw": True}
+    prompt, _ = think_budget.raw_request("問題", {}, "\n已經想到一半")
+    assert prompt.endswith("<｜Assistant｜><think>\n已經想到一半\n</think>\n\n")
+    # 沒有聊天模板的模型只能完整推理
+    assert ThinkBudget("budget", model_name="llama3:8b").mode == "full"
+    try:
+        ThinkBudget("short")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("不支援的模式應被拒絕")
+
+
+def test_budget_mode_cancels_reasoning_and_forces_answer():
+    """推理超過預算時中止生成，以 raw 模式帶入已產生的推理後接續作答"""
+    llm = ReasoningStubLLM()
+    service = _service(llm, "budget", max_think_tokens=64)
+    events = _run(service, "AG958 的電池適合出差嗎", stream=True)
+    (first_prompt, first_kwargs), (second_prompt, second_kwargs) = llm.calls
+    streamed_think = "".join(event["delta"] for event in events if event.get("event") == "think")
+    metrics = service.get_metrics()["think"]
+    print(f"送出片段: {llm.chunks_sent}, 推理指標: {metrics}")
+
+    assert events[-1]["served_by"] == "llm"
+    assert "raw" not in first_kwargs and second_kwargs["raw"] is True
+    assert llm.chunks_sent[0] < len(THINK) // llm.chunk_size // 4
+    assert second_prompt.endswith("\n</think>\n\n") and streamed_think.strip() in second_prompt
+    assert metrics["truncated"] == 1 and metrics["mode"] == "budget"
+
+
+def test_budget_mode_without_stream_and_hidden_reasoning():
+    """未啟用 stream 時 budget 模式仍以串流計算推理長度，只是不送出中間事件"""
+    llm = ReasoningStubLLM()
+    events = _run(_service(llm, "budget", stream_think=False), "AG958 的電池適合出差嗎", stream=False)
+    assert len(events) == 1 and events[0]["served_by"] == "llm"
+    assert len(llm.calls) == 2
+
+    llm = ReasoningStubLLM()
+    events = _run(_service(llm, "budget", max_think_tokens=64, stream_think=False), "AG958 的電池適合出差嗎", stream=True)
+    assert not any(event.get("event") == "think" for event in events)
+
+
+def test_off_mode_skips_reasoning():
+    llm = ReasoningStubLLM()
+    events = _run(_service(llm, "off"), "AG958 的電池適合出差嗎", stream=False)
+    prompt, kwargs = llm.calls[0]
+    assert events[-1]["served_by"] == "llm"
+    assert kwargs["raw"] is True and prompt.endswith("<think>\n\n</think>\n\n")
+
+
+if __name__ == "__main__":
+    test_raw_request_closes_think_block()
+    test_budget_mode_cancels_reasoning_and_forces_answer()
+    test_budget_mode_without_stream_and_hidden_reasoning()
+    test_off_mode_skips_reasoning()
+    print("推理預算測試通過")